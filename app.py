@@ -3,54 +3,329 @@ ADA Wedge A (Multi-tenant SaaS) - SINGLE FILE BACKEND
 Features:
 - Tenants
 - Users with roles: OWNER / ADMIN / DISPATCHER
-- JWT auth
-- Tenant-scoped carrier cost profiles
-- Profit-first recommendation + negotiation script
-- Tenant-scoped recommendation logs
+- JWT auth (bcrypt runs on a dedicated, bounded hashing pool)
+- Tenant-scoped carrier cost profiles (compiled + cached in-process)
+- Fuel price index: global / per-tenant diesel prices by region and effective date, bulk upload
+- Lane distances: missing loaded / deadhead miles filled in from a bundled city table (cached, vectorized)
+- Multi-worker safe caches: invalidations reach every worker through shared generation counters
+- Profit-first recommendation + negotiation script (per-tenant versioned templates, rendered on read)
+- Idempotent /recommend: Idempotency-Key or content-hash replays of stored responses, no duplicate log rows
+- Per-tenant admission control on /recommend*: token buckets per tenant + role (429 + Retry-After), weighted fair queuing
+- Batch recommendation (vectorized pricing, one bulk log insert)
+- Fleet fan-out: one load priced against every profile in the tenant, ranked by profit
+- Load-board ingestion: push / file / socket feeds (allow-listed ports, per-source token), deduped, screened in chunks, GO/REVIEW over SSE
+- What-if sweep over rate / deadhead / fuel region with exact decision breakpoints (no logs)
+- Tenant-scoped recommendation logs (write-behind buffered; ?durable=true commits inline)
+- Compact log rows: repeated user / broker / city / equipment / region strings dictionary-encoded into id tables (`python app.py encode-logs` converts older databases)
+- Per-tenant log retention: old rows move to gzip NDJSON month archives, still readable via ?include_archived
+- Lane / broker / profile / day analytics rollups (`python app.py rebuild-rollups`)
+- Cold-start friendly: schema migrations run at startup, one worker at a time (or `python app.py init-db`), bcrypt loads on first use
+- Optional async DB request path (async driver in ADA_DATABASE_URL, e.g. sqlite+aiosqlite)
+- Prometheus /metrics (behind ADA_METRICS_TOKEN): per-route latency, per-stage timers, SQL per request; opt-in slow-request profiler
 - Role-based access control:
   - OWNER/ADMIN: manage users, manage profiles
   - DISPATCHER: can recommend + view logs + view profiles (read)
+  - Operators (ADA_OPERATOR_TOKEN, not a tenant role): service-wide /cache/stats, /auth/hashing/stats, /logs/writer/stats
 """
 
+import argparse
+import asyncio
+import atexit
+import base64
+import bisect
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import hmac
+import json
+import logging
+import mmap
+import multiprocessing
 import os
-from datetime import datetime, timedelta
-from typing import Optional, Literal, Dict, Any, List, Tuple
-from dataclasses import dataclass
+import re
+import secrets
+import socket
+import string
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as futures_wait
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque, namedtuple
+from datetime import date, datetime, timedelta
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Optional, Literal, Callable, Dict, Any, Iterable, List, Tuple, Mapping, Union, AbstractSet
+from dataclasses import dataclass, field, replace
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from pydantic import BaseModel, Field, EmailStr
 
+import numpy as np
+
 from sqlalchemy import (
-    create_engine, Integer, String, Float, DateTime, ForeignKey, Text, JSON, UniqueConstraint
+    create_engine, event, inspect, text, insert, select, update, delete, func, cast, case, and_, or_, tuple_,
+    Index, Integer, String, Float, Date, DateTime, ForeignKey, Text, JSON, UniqueConstraint
 )
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, DeclarativeBase, Mapped, mapped_column, relationship, Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
 
-from passlib.context import CryptContext
 from jose import jwt, JWTError
 
+try:
+    import fcntl
+except ImportError:  # non-POSIX: no cross-process file locks (shm cache bus, archive appends)
+    fcntl = None
+
+logger = logging.getLogger("ada")  # background workers report failures here; uvicorn shows WARNING and up
+
 
 # -----------------------------
 # Config (set env vars in prod)
 # -----------------------------
+# An async driver (e.g. sqlite+aiosqlite:///..., postgresql+asyncpg://...) switches the
+# request path to the async session stack; background work keeps a sync engine on the
+# same database.
 DATABASE_URL = os.getenv("ADA_DATABASE_URL", "sqlite:////tmp/ada.db")
 
+def _beside_database(name: str) -> Optional[str]:
+    """A path next to the SQLite database file (None for other databases or :memory:)."""
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(url.database)), name)
+
+# 0: the schema is created / migrated out of band (`python app.py init-db` at deploy time),
+# so a cold instance serves its first request without touching DDL. At 1, every worker
+# migrates at startup, one at a time (MIGRATE_LOCK_PATH on this host, an advisory lock on
+# PostgreSQL); deploys that roll many hosts at once should still prefer init-db.
+MIGRATE_ON_STARTUP = os.getenv("ADA_MIGRATE_ON_STARTUP", "1") == "1"
+MIGRATE_LOCK_PATH = os.getenv("ADA_MIGRATE_LOCK_PATH", os.path.join(
+    tempfile.gettempdir(), f"ada-migrate-{zlib.crc32(DATABASE_URL.encode()):08x}.lock"))
+
 SECRET_KEY = os.getenv("ADA_SECRET_KEY", "CHANGE_ME_TO_A_LONG_RANDOM_SECRET")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ADA_TOKEN_MINUTES", "1440"))  # 24 hours
 
+MAX_BATCH_LOADS = int(os.getenv("ADA_MAX_BATCH_LOADS", "5000"))
+
+RECOMMEND_CACHE_SIZE = int(os.getenv("ADA_RECOMMEND_CACHE_SIZE", "50000"))  # stored /recommend responses
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("ADA_IDEMPOTENCY_TTL", "86400"))  # replays of an Idempotency-Key
+RECOMMEND_DEDUPE_TTL_SECONDS = float(os.getenv("ADA_RECOMMEND_DEDUPE_TTL", "30"))  # identical bodies without a key; 0 disables
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("ADA_IDEMPOTENCY_WAIT", "10"))  # a repeat waits this long for the first, then 409
+# sync routes hold a threadpool thread while they wait: past this, a content-hash repeat is
+# priced on its own and an Idempotency-Key repeat gets a 409
+IDEMPOTENCY_SYNC_WAIT_SECONDS = float(os.getenv("ADA_IDEMPOTENCY_SYNC_WAIT", "1"))
+
+PROFILE_CACHE_SIZE = int(os.getenv("ADA_PROFILE_CACHE_SIZE", "4096"))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("ADA_PROFILE_CACHE_TTL", "300"))
+FLEET_CACHE_SIZE = int(os.getenv("ADA_FLEET_CACHE_SIZE", "256"))  # tenants whose whole profile set is cached
+FUEL_CACHE_SIZE = int(os.getenv("ADA_FUEL_CACHE_SIZE", "4096"))  # tenants with a resolved fuel price snapshot
+MAX_FUEL_UPLOAD_ROWS = int(os.getenv("ADA_MAX_FUEL_UPLOAD_ROWS", "10000"))
+
+GEO_TABLE_PATH = os.getenv("ADA_GEO_TABLE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "us_cities.csv"))
+ROAD_CIRCUITY = float(os.getenv("ADA_ROAD_CIRCUITY", "1.2"))  # road miles per great-circle mile
+LANE_CACHE_SIZE = int(os.getenv("ADA_LANE_CACHE_SIZE", "100000"))  # memoized city-pair distances
+
+SCRIPT_TEMPLATE_CACHE_SIZE = int(os.getenv("ADA_SCRIPT_TEMPLATE_CACHE_SIZE", "1024"))
+SCRIPT_TEMPLATE_MAX_CHARS = int(os.getenv("ADA_SCRIPT_TEMPLATE_MAX_CHARS", "4000"))
+SCRIPT_SPEC_MAX_WIDTH = 64  # width / precision cap in a {field:spec}: "{x:999999999}" would render ~1 GB
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("ADA_PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("ADA_PRINCIPAL_CACHE_TTL", "300"))  # 0 disables
+
+# Cross-worker cache invalidation: "local" (one process) or "shm" (generation counters in
+# a shared memory file every worker on the host maps). Defaults to shm under
+# WEB_CONCURRENCY > 1 (uvicorn --workers); all workers must agree on path and slots.
+CACHE_BUS = os.getenv("ADA_CACHE_BUS", "shm" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "local")
+CACHE_BUS_PATH = os.getenv("ADA_CACHE_BUS_PATH", os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+    f"ada-cache-bus-{zlib.crc32(DATABASE_URL.encode()):08x}",
+))
+CACHE_BUS_SLOTS = int(os.getenv("ADA_CACHE_BUS_SLOTS", "65536"))
+
+HASH_EXECUTOR_KIND = os.getenv("ADA_HASH_EXECUTOR", "process")  # process | thread
+HASH_WORKERS = int(os.getenv("ADA_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.getenv("ADA_HASH_MAX_PENDING", "64"))  # beyond this, 503 + Retry-After
+
+# Admission control on the recommendation path, keyed by the tenant_id / role in the JWT
+def _env_pairs(name: str) -> Dict[str, str]:
+    """Parse an env var of the form "key=value,key=value"."""
+    return {k.strip(): v.strip() for k, _, v in (item.partition("=") for item in os.getenv(name, "").split(",") if item.strip())}
+
+ADMISSION_PATHS = tuple(p for p in os.getenv("ADA_ADMISSION_PATHS", "/recommend").split(",") if p)  # path prefixes; empty disables
+# admitted requests in flight, the rest queue per tenant; 0: no cap. Pricing and SQLite work is CPU-bound,
+# so a couple per core keeps the GIL from timeslicing every request; raise it for a remote database.
+ADMISSION_CONCURRENCY = int(os.getenv("ADA_ADMISSION_CONCURRENCY", str(2 * (os.cpu_count() or 1))))
+ADMISSION_TENANT_QUEUE = int(os.getenv("ADA_ADMISSION_TENANT_QUEUE", "1000"))  # waiting per tenant; beyond this, 429
+# Token buckets per (tenant, role), "ROLE=requests_per_second:burst,..."; roles left out are unlimited
+RATE_LIMITS = {role.upper(): (float(rate), float(burst or rate))
+               for role, (rate, _, burst) in ((r, v.partition(":")) for r, v in _env_pairs("ADA_RATE_LIMITS").items())}
+# Fair-queuing share per tenant, "tenant_id=weight,..." (default 1); also scales its rate limits
+TENANT_WEIGHTS = {int(t): float(w) for t, w in _env_pairs("ADA_TENANT_WEIGHTS").items()}
+
+LOG_WRITE_BEHIND = os.getenv("ADA_LOG_WRITE_BEHIND", "1") == "1"
+LOG_FLUSH_BATCH = int(os.getenv("ADA_LOG_FLUSH_BATCH", "500"))
+LOG_FLUSH_INTERVAL_MS = float(os.getenv("ADA_LOG_FLUSH_INTERVAL_MS", "200"))
+LOG_QUEUE_MAX = int(os.getenv("ADA_LOG_QUEUE_MAX", "50000"))  # rows buffered before callers write inline
+LOG_WRITE_ATTEMPTS = int(os.getenv("ADA_LOG_WRITE_ATTEMPTS", "5"))  # flushes a row may fail before it is dead-lettered
+# NDJSON file for log rows that could not be written (unset beside a non-SQLite database:
+# they are only logged)
+LOG_DEAD_LETTER_PATH = os.getenv("ADA_LOG_DEAD_LETTER") or _beside_database("ada-dead-letter.ndjson")
+LOG_DICT_CACHE_SIZE = int(os.getenv("ADA_LOG_DICT_CACHE_SIZE", "100000"))  # interned broker/city/user/... ids per table
+
+EXPORT_CHUNK_ROWS = int(os.getenv("ADA_EXPORT_CHUNK_ROWS", "5000"))
+
+# Log retention: rows older than a tenant's window move to gzip NDJSON month files
+LOG_RETENTION_DAYS = int(os.getenv("ADA_LOG_RETENTION_DAYS", "0"))  # default window; 0 keeps logs hot forever
+# Archives are the only copy of the rows they hold, so they live next to the SQLite database
+# file; for any other database ADA_LOG_ARCHIVE_DIR must be set or archival stays off.
+LOG_ARCHIVE_DIR = os.getenv("ADA_LOG_ARCHIVE_DIR") or _beside_database("ada-archive")
+LOG_ARCHIVE_BATCH_ROWS = int(os.getenv("ADA_LOG_ARCHIVE_BATCH_ROWS", "5000"))  # rows moved per transaction
+LOG_ARCHIVE_DELETE_CHUNK = 500  # ids per DELETE ... IN (...): stays under SQLite's bound-variable limit
+LOG_ARCHIVE_INTERVAL_S = float(os.getenv("ADA_LOG_ARCHIVE_INTERVAL", "0"))  # > 0 archives in the background
+LOG_ARCHIVE_CACHE_ROWS = int(os.getenv("ADA_LOG_ARCHIVE_CACHE_ROWS", "500000"))  # decoded archive rows kept for reads
+
+MAX_SWEEP_CELLS = int(os.getenv("ADA_MAX_SWEEP_CELLS", "250000"))
+
+INGEST_CHUNK = int(os.getenv("ADA_INGEST_CHUNK", "1000"))  # loads priced per worker pass
+INGEST_QUEUE_MAX = int(os.getenv("ADA_INGEST_QUEUE_MAX", "20000"))  # loads; push gets 503, sources block
+INGEST_DEDUPE_SIZE = int(os.getenv("ADA_INGEST_DEDUPE_SIZE", "200000"))
+INGEST_DEDUPE_TTL_SECONDS = float(os.getenv("ADA_INGEST_DEDUPE_TTL", "3600"))  # reposts inside this window are dropped
+INGEST_SUBSCRIBER_QUEUE = int(os.getenv("ADA_INGEST_SUBSCRIBER_QUEUE", "256"))  # chunks buffered per SSE client
+INGEST_DIR = os.getenv("ADA_INGEST_DIR")  # file sources must live under here; unset disables them
+INGEST_SOCKET_HOST = os.getenv("ADA_INGEST_SOCKET_HOST", "127.0.0.1")
+# ports socket sources may listen on, "9100-9109,9200"; unset disables them
+INGEST_SOCKET_PORTS = frozenset(port for lo, _, hi in (item.strip().partition("-") for item in
+                                                       os.getenv("ADA_INGEST_SOCKET_PORTS", "").split(",") if item.strip())
+                                for port in range(int(lo), int(hi or lo) + 1))
+INGEST_TENANT_SOURCES = int(os.getenv("ADA_INGEST_TENANT_SOURCES", "4"))  # running file + socket sources per tenant
+INGEST_TENANT_CONNECTIONS = int(os.getenv("ADA_INGEST_TENANT_CONNECTIONS", "16"))  # open socket connections per tenant
+INGEST_HANDSHAKE_SECONDS = float(os.getenv("ADA_INGEST_HANDSHAKE_SECONDS", "5"))  # to send the source token line
+
+# Request metrics (GET /metrics, Prometheus text format) and the slow-request profiler. /metrics covers
+# every tenant's traffic, so it needs "Authorization: Bearer <token>" and is only on when a token is set.
+OPERATOR_TOKEN = os.getenv("ADA_OPERATOR_TOKEN")  # GET /cache/stats needs "Authorization: Bearer <token>"; unset: off
+METRICS_TOKEN = os.getenv("ADA_METRICS_TOKEN") or OPERATOR_TOKEN
+METRICS_ENABLED = os.getenv("ADA_METRICS", "1" if METRICS_TOKEN else "0") == "1"
+if METRICS_ENABLED and not METRICS_TOKEN:
+    raise RuntimeError("ADA_METRICS=1 serves service-wide /metrics: set ADA_METRICS_TOKEN (or ADA_OPERATOR_TOKEN)")
+# Tenants whose admission series get their own "tenant" label ("tenant_id,..."), the rest summed as
+# tenant="other"; unset: no tenant label. Tenant ids are not public, so this needs ADA_METRICS_TOKEN.
+ADMISSION_METRIC_TENANTS = frozenset(int(t) for t in os.getenv("ADA_ADMISSION_METRIC_TENANTS", "").split(",") if t.strip())
+if ADMISSION_METRIC_TENANTS and not METRICS_TOKEN:
+    raise RuntimeError("ADA_ADMISSION_METRIC_TENANTS exports per-tenant series: set ADA_METRICS_TOKEN as well")
+METRICS_BUCKETS = tuple(float(b) for b in os.getenv(
+    "ADA_METRICS_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(","))
+PROFILE_SLOW_MS = float(os.getenv("ADA_PROFILE_SLOW_MS", "0"))  # > 0 turns the sampling profiler on
+PROFILE_INTERVAL_MS = float(os.getenv("ADA_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("ADA_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ada-profiles"))
+PROFILE_KEEP = int(os.getenv("ADA_PROFILE_KEEP", "200"))  # newest .folded files kept
+
+# SQLite connection pragmas (applied on every new connection)
+SQLITE_JOURNAL_MODE = os.getenv("ADA_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("ADA_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("ADA_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("ADA_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("ADA_SQLITE_CACHE_SIZE_KB", "65536"))
+
+# Connection pool (file-backed SQLite and server databases)
+DB_POOL_SIZE = int(os.getenv("ADA_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("ADA_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("ADA_DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("ADA_DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("ADA_DB_POOL_PRE_PING", "1") == "1"
+
 # -----------------------------
 # DB setup
 # -----------------------------
-engine_kwargs = {}
-if DATABASE_URL.startswith("sqlite"):
-    engine_kwargs["connect_args"] = {"check_same_thread": False}
+_database_url = make_url(DATABASE_URL)
+ASYNC_DB = _database_url.get_dialect().is_async
+
+IS_SQLITE = _database_url.get_backend_name() == "sqlite"
+IS_SQLITE_MEMORY = IS_SQLITE and _database_url.database in (None, "", ":memory:")
 
-engine = create_engine(DATABASE_URL, **engine_kwargs)
+def build_engine_kwargs() -> Dict[str, Any]:
+    engine_kwargs: Dict[str, Any] = {}
+    if IS_SQLITE:
+        # timeout is pysqlite's busy handler; busy_timeout below covers other drivers
+        engine_kwargs["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0}
+        if IS_SQLITE_MEMORY:
+            return engine_kwargs
+    else:
+        engine_kwargs["pool_recycle"] = DB_POOL_RECYCLE
+        engine_kwargs["pool_pre_ping"] = DB_POOL_PRE_PING
+    engine_kwargs["pool_size"] = DB_POOL_SIZE
+    engine_kwargs["max_overflow"] = DB_MAX_OVERFLOW
+    engine_kwargs["pool_timeout"] = DB_POOL_TIMEOUT
+    return engine_kwargs
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        if not IS_SQLITE_MEMORY:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    finally:
+        cursor.close()
+
+engine_kwargs = build_engine_kwargs()
+
+engine = create_engine(
+    _database_url.set(drivername=_database_url.get_backend_name()) if ASYNC_DB else _database_url,
+    **engine_kwargs,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    # optional: needs sqlalchemy[asyncio] plus the async driver (aiosqlite, asyncpg, ...)
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    async_engine = create_async_engine(_database_url, **engine_kwargs)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _sqlite_pragmas)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+def upsert_insert(dialect: str):
+    """The dialect's insert() with on_conflict_* ("sqlite" or "postgresql"); the postgresql
+    dialect module is only imported by deployments that run on it."""
+    if dialect == "sqlite":
+        return sqlite.insert
+    from sqlalchemy.dialects import postgresql
+    return postgresql.insert
+
+def database_settings() -> Dict[str, Any]:
+    """Effective pool configuration and, on SQLite, the pragmas a live connection reports."""
+    info: Dict[str, Any] = {"backend": _database_url.get_backend_name(), "async": ASYNC_DB, "pool": engine.pool.status()}
+    if IS_SQLITE:
+        with engine.connect() as conn:
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size"):
+                info[pragma] = conn.execute(text(f"PRAGMA {pragma}")).scalar()
+    return info
+
 class Base(DeclarativeBase):
     pass
 
@@ -61,6 +336,341 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# -----------------------------
+# Metrics + request profiling
+# -----------------------------
+# A pure ASGI middleware opens a RequestStats per request and parks it in a context var,
+# which worker threads (run_in_threadpool copies the context) and the async engine's
+# greenlets see as well. stage() timers and the cursor hooks below add to it; when the
+# request ends it is folded into process-wide histograms. With ADA_METRICS=0 nothing is
+# installed and stage() is a context-var lookup returning a shared null context.
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+class Histogram:
+    """Prometheus-style histogram for one label set: per-bucket counts + sum + count."""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _label_str(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+class MetricsRegistry:
+    """Counters and histograms keyed by (name, labels), rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._routes: Dict[Tuple[str, str, int], tuple] = {}  # per (method, route, status) series handles
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Tuple[float, ...] = METRICS_BUCKETS) -> None:
+        self._meta[name] = (kind, help_text, tuple(sorted(buckets)))
+
+    def inc(self, name: str, labels: Tuple[Tuple[str, str], ...] = (), value: float = 1.0) -> None:
+        with self._lock:
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def _histogram(self, name: str, labels: Tuple[Tuple[str, str], ...]) -> Histogram:
+        h = self._histograms.get((name, labels))
+        if h is None:
+            h = self._histograms[(name, labels)] = Histogram(self._meta[name][2])
+        return h
+
+    def observe(self, name: str, labels: Tuple[Tuple[str, str], ...], value: float) -> None:
+        with self._lock:
+            self._histogram(name, labels).observe(value)
+
+    def observe_request(self, method: str, route: str, status: int, elapsed: float, stats: "RequestStats") -> None:
+        """Everything one finished request contributes, under a single lock acquisition."""
+        with self._lock:
+            series = self._routes.get((method, route, status))
+            if series is None:
+                labels = (("method", method), ("route", route))
+                series = self._routes[(method, route, status)] = (
+                    labels,
+                    ("ada_http_requests_total", labels + (("status", str(status)),)),
+                    self._histogram("ada_http_request_duration_seconds", labels),
+                    self._histogram("ada_db_queries_per_request", labels),
+                    self._histogram("ada_db_query_seconds_per_request", labels),
+                    {},
+                )
+            labels, counter, latency, queries, query_s, stages = series
+            self._counters[counter] = self._counters.get(counter, 0.0) + 1
+            latency.observe(elapsed)
+            queries.observe(stats.queries)
+            query_s.observe(stats.query_s)
+            if stats.stages:
+                attributed = 0.0
+                # "framework" = routing, body parsing + validation, response serialization, middleware
+                for name, seconds in (*stats.stages.items(), ("framework", None)):
+                    h = stages.get(name)
+                    if h is None:
+                        h = stages[name] = self._histogram("ada_request_stage_seconds", labels + (("stage", name),))
+                    if seconds is None:
+                        seconds = max(0.0, elapsed - attributed)
+                    h.observe(seconds)
+                    attributed += seconds
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._routes.clear()
+
+    def render(self, gauges: Iterable[Tuple[str, float]] = ()) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+        out: List[str] = []
+        seen = set()
+
+        def header(name):
+            if name not in seen and name in self._meta:
+                seen.add(name)
+                kind, help_text, _ = self._meta[name]
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name)
+            out.append(f"{name}{_label_str(labels)} {value:g}")
+        for (name, labels), h in histograms:
+            header(name)
+            cumulative = 0
+            for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                out.append(f"{name}_bucket{_label_str(labels + (('le', le),))} {cumulative}")
+            out.append(f"{name}_sum{_label_str(labels)} {h.sum:.9g}")
+            out.append(f"{name}_count{_label_str(labels)} {h.count}")
+        for name, value in gauges:
+            out.append(f"# TYPE {name} gauge")
+            out.append(f"{name} {value:g}")
+        return "\n".join(out) + "\n"
+
+metrics_registry = MetricsRegistry()
+metrics_registry.describe("ada_http_requests_total", "counter", "HTTP requests by route template and status")
+metrics_registry.describe("ada_http_request_duration_seconds", "histogram", "Request latency (first byte in to last byte out)")
+metrics_registry.describe("ada_request_stage_seconds", "histogram", "Time per named stage inside a request")
+metrics_registry.describe("ada_db_queries_per_request", "histogram", "SQL statements executed per request", QUERY_COUNT_BUCKETS)
+metrics_registry.describe("ada_db_query_seconds_per_request", "histogram", "Time spent in SQL statements per request")
+metrics_registry.describe("ada_profiles_written_total", "counter", "Slow-request profiles dumped by the sampling profiler")
+metrics_registry.describe("ada_admission_requests_total", "counter", "Admission decisions on the recommendation path")
+metrics_registry.describe("ada_admission_wait_seconds", "histogram", "Time admitted requests spent queued for a slot")
+
+class RequestStats:
+    __slots__ = ("started", "queries", "query_s", "stages", "threads", "samples")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_s = 0.0
+        self.stages: Dict[str, float] = {}
+        self.threads: Optional[set] = None  # thread idents the profiler samples (profiler on only)
+        self.samples: Optional[Dict[str, int]] = None
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("ada_request_stats", default=None)
+_NO_STAGE = nullcontext()
+
+class _Stage:
+    __slots__ = ("stats", "name", "t0")
+
+    def __init__(self, stats: RequestStats, name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        if self.stats.threads is not None:
+            self.stats.threads.add(threading.get_ident())
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stages = self.stats.stages
+        stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.t0
+        return False
+
+def stage(name: str):
+    """Time a block as a named stage of the current request (no-op outside one)."""
+    stats = _current_request.get()
+    return _NO_STAGE if stats is None else _Stage(stats, name)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _current_request.get() is not None:
+        conn.info.setdefault("ada_query_t0", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current_request.get()
+    starts = conn.info.get("ada_query_t0")
+    if stats is not None and starts:
+        stats.query_s += time.perf_counter() - starts.pop()
+        stats.queries += 1
+        if stats.threads is not None:
+            stats.threads.add(threading.get_ident())
+
+class SamplingProfiler:
+    """Samples the stacks of threads serving in-flight requests every PROFILE_INTERVAL_MS.
+
+    Requests slower than PROFILE_SLOW_MS get their samples written to PROFILE_DIR in
+    collapsed-stack format (flamegraph.pl / speedscope / inferno). A request is sampled on
+    the event loop thread plus every worker thread a stage() or SQL statement of it ran on,
+    so under concurrency stacks of other requests sharing those threads can bleed in.
+    """
+
+    def __init__(self, slow_ms: float = PROFILE_SLOW_MS, interval_ms: float = PROFILE_INTERVAL_MS,
+                 out_dir: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.slow_s = slow_ms / 1000.0
+        self.interval_s = max(0.0005, interval_ms / 1000.0)
+        self.out_dir = out_dir
+        self.keep = max(1, keep)
+        self._active: Dict[int, RequestStats] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._written: deque = deque()
+        self.written = 0
+
+    def begin(self, stats: RequestStats) -> None:
+        stats.threads = {threading.get_ident()}
+        stats.samples = {}
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="ada-profiler", daemon=True)
+                self._thread.start()
+            if not self._active:
+                self._cond.notify()
+            self._active[id(stats)] = stats
+
+    def end(self, stats: RequestStats, method: str, route: str, elapsed: float) -> Optional[str]:
+        with self._cond:
+            self._active.pop(id(stats), None)
+            samples = dict(stats.samples)
+        if elapsed < self.slow_s or not samples:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in route.strip("/")) or "root"
+        path = os.path.join(self.out_dir, f"{time.time():.3f}-{method}-{slug}-{elapsed * 1000:.0f}ms.folded")
+        with open(path, "w") as f:
+            f.writelines(f"{stack} {n}\n" for stack, n in sorted(samples.items()))
+        with self._cond:
+            self.written += 1
+            self._written.append(path)
+            stale = [self._written.popleft() for _ in range(len(self._written) - self.keep)]
+        for old in stale:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        return path
+
+    @staticmethod
+    def collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._cond:
+                while not self._active and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+            time.sleep(self.interval_s)
+            frames = sys._current_frames()
+            collapsed: Dict[int, str] = {}
+            with self._cond:
+                for stats in self._active.values():
+                    for tid in tuple(stats.threads):
+                        if tid == me or tid not in frames:
+                            continue
+                        stack = collapsed.get(tid)
+                        if stack is None:
+                            stack = collapsed[tid] = self.collapse(frames[tid])
+                        stats.samples[stack] = stats.samples.get(stack, 0) + 1
+
+    def stop(self, timeout: float = 2.0) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"slow_ms": self.slow_s * 1000, "interval_ms": self.interval_s * 1000, "in_flight": len(self._active),
+                    "written": self.written, "out_dir": self.out_dir}
+
+request_profiler: Optional[SamplingProfiler] = SamplingProfiler() if METRICS_ENABLED and PROFILE_SLOW_MS > 0 else None
+if request_profiler is not None:
+    atexit.register(request_profiler.stop)
+
+class MetricsMiddleware:
+    """Per-request latency / status / stage / query accounting, labelled by route template."""
+
+    def __init__(self, app, registry: MetricsRegistry, profiler: Optional[SamplingProfiler] = None):
+        self.app = app
+        self.registry = registry
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        if self.profiler is not None:
+            self.profiler.begin(stats)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - stats.started
+            _current_request.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            method = scope["method"]
+            self.registry.observe_request(method, route, status, elapsed, stats)
+            if self.profiler is not None and self.profiler.end(stats, method, route, elapsed):
+                self.registry.inc("ada_profiles_written_total", (("route", route),))
+
+if METRICS_ENABLED:
+    for _engine in (engine, async_engine.sync_engine if async_engine is not None else None):
+        if _engine is not None:
+            event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
 # -----------------------------
 # Models
 # -----------------------------
@@ -70,6 +680,8 @@ class Tenant(Base):
     __tablename__ = "tenants"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(120), unique=True, index=True)
+    script_template_id: Mapped[Optional[str]] = mapped_column(String(80), nullable=True)  # None: built-in "default"
+    log_retention_days: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # None: LOG_RETENTION_DAYS; 0: forever
 
     users = relationship("User", back_populates="tenant", cascade="all, delete-orphan")
     profiles = relationship("CarrierCostProfile", back_populates="tenant", cascade="all, delete-orphan")
@@ -120,28 +732,67 @@ class CarrierCostProfile(Base):
 
     tenant = relationship("Tenant", back_populates="profiles")
 
+# Dimension tables for recommendation_logs: every distinct user, broker, city, equipment
+# type and fuel region string is stored once and log rows carry its integer id. Rows are
+# only ever added, so an id, once committed, is valid forever (see LogDictionary).
+class LogUser(Base):
+    __tablename__ = "log_users"
+    __table_args__ = (UniqueConstraint("email", "role", name="uq_log_user"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    email: Mapped[str] = mapped_column(String(255))
+    role: Mapped[str] = mapped_column(String(20))
+
+class LogBroker(Base):
+    __tablename__ = "log_brokers"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(255), unique=True)
+
+class LogLocation(Base):
+    __tablename__ = "log_locations"
+    __table_args__ = (UniqueConstraint("city", "state", name="uq_log_location"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    city: Mapped[str] = mapped_column(String(120))
+    state: Mapped[str] = mapped_column(String(10))
+
+class LogEquipment(Base):
+    __tablename__ = "log_equipment"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(40), unique=True)
+
+class LogFuelRegion(Base):
+    __tablename__ = "log_fuel_regions"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(60), unique=True)
+
 class RecommendationLog(Base):
     __tablename__ = "recommendation_logs"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    # Newest-first tenant listings (and their keyset cursors) walk these instead of sorting.
+    # Every read is tenant-scoped, so these are the only secondary indexes an insert pays for.
+    __table_args__ = (
+        Index("ix_logs_tenant_created_id", "tenant_id", "created_at", "id"),
+        Index("ix_logs_tenant_profile_created_id", "tenant_id", "profile_id", "created_at", "id"),
+        Index("ix_logs_tenant_broker_created_id", "tenant_id", "broker_id", "created_at", "id"),
+        Index("ix_logs_tenant_decision_created_id", "tenant_id", "decision", "created_at", "id"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
 
-    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id"), index=True)
-    user_email: Mapped[str] = mapped_column(String(255), index=True)
-    user_role: Mapped[str] = mapped_column(String(20), index=True)
+    # Repeated strings live in the log_* dimension tables; code reads and writes the
+    # logical string columns (LOG_FIELDS / write_logs), never these ids.
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id"))
+    log_user_id: Mapped[int] = mapped_column(ForeignKey("log_users.id"))
 
-    profile_id: Mapped[str] = mapped_column(String(80), index=True)
-    broker_name: Mapped[str] = mapped_column(String(255), index=True)
+    profile_id: Mapped[str] = mapped_column(String(80))
+    broker_id: Mapped[int] = mapped_column(ForeignKey("log_brokers.id"))
 
-    origin_city: Mapped[str] = mapped_column(String(120))
-    origin_state: Mapped[str] = mapped_column(String(10))
-    dest_city: Mapped[str] = mapped_column(String(120))
-    dest_state: Mapped[str] = mapped_column(String(10))
+    origin_id: Mapped[int] = mapped_column(ForeignKey("log_locations.id"))
+    dest_id: Mapped[int] = mapped_column(ForeignKey("log_locations.id"))
 
-    equipment_type: Mapped[str] = mapped_column(String(40))
+    equipment_id: Mapped[int] = mapped_column(ForeignKey("log_equipment.id"))
 
     loaded_miles: Mapped[float] = mapped_column(Float)
     deadhead_miles: Mapped[float] = mapped_column(Float)
     offered_total_rate: Mapped[float] = mapped_column(Float)
-    fuel_region: Mapped[str] = mapped_column(String(60))
+    fuel_region_id: Mapped[int] = mapped_column(ForeignKey("log_fuel_regions.id"))
 
     decision: Mapped[str] = mapped_column(String(20))
     offered_rpm: Mapped[float] = mapped_column(Float)
@@ -150,24 +801,493 @@ class RecommendationLog(Base):
     projected_profit: Mapped[float] = mapped_column(Float)
     projected_margin_percent: Mapped[float] = mapped_column(Float)
 
+    # Templated rows keep "" here and are re-rendered from (template id, version) + the
+    # columns above on read; rows written before templating keep their full text.
     negotiation_script: Mapped[str] = mapped_column(Text)
+    script_template_id: Mapped[Optional[str]] = mapped_column(String(80), nullable=True)
+    script_template_version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class ScriptTemplate(Base):
+    """One immutable version of a tenant's negotiation-script template. Logs point at
+    (template_id, version), so versions are never edited or deleted."""
+    __tablename__ = "script_templates"
+    __table_args__ = (UniqueConstraint("tenant_id", "template_id", "version", name="uq_script_template_version"),)
 
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id"), index=True)
+    template_id: Mapped[str] = mapped_column(String(80))
+    version: Mapped[int] = mapped_column(Integer)
+    body: Mapped[str] = mapped_column(Text)
+    created_by: Mapped[str] = mapped_column(String(255))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+class LogArchive(Base):
+    """Catalog entry for one tenant-month of archived logs: a gzip NDJSON file under
+    LOG_ARCHIVE_DIR that grows by one gzip member per archival batch. `bytes` is the
+    committed length; anything past it is an unfinished append and is ignored."""
+    __tablename__ = "log_archives"
+    __table_args__ = (UniqueConstraint("tenant_id", "month", name="uq_log_archive_month"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id"))
+    month: Mapped[str] = mapped_column(String(7))  # YYYY-MM of created_at
+    path: Mapped[str] = mapped_column(String(255))  # relative to LOG_ARCHIVE_DIR
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+    bytes: Mapped[int] = mapped_column(Integer, default=0)
+    min_id: Mapped[int] = mapped_column(Integer)
+    max_id: Mapped[int] = mapped_column(Integer)
+    min_created_at: Mapped[datetime] = mapped_column(DateTime)
+    max_created_at: Mapped[datetime] = mapped_column(DateTime)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class FuelPrice(Base):
+    """Diesel price for a region from effective_date until the next row of the same
+    (tenant_id, region). tenant_id 0 is the global index every tenant inherits; a
+    tenant's own rows override it region by region."""
+    __tablename__ = "fuel_prices"
+    __table_args__ = (UniqueConstraint("tenant_id", "region", "effective_date", name="uq_fuel_price"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tenant_id: Mapped[int] = mapped_column(Integer)  # 0 = global (no FK)
+    region: Mapped[str] = mapped_column(String(60))
+    effective_date: Mapped[date] = mapped_column(Date)
+    price: Mapped[float] = mapped_column(Float)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class LogRollup(Base):
+    """Running per-tenant aggregates of recommendation_logs along one dimension
+    (lane / broker / profile / day). Maintained in the same transaction as the log insert."""
+    __tablename__ = "log_rollups"
+    __table_args__ = (UniqueConstraint("tenant_id", "dimension", "key", name="uq_rollup_key"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id"))
+    dimension: Mapped[str] = mapped_column(String(20))
+    key: Mapped[str] = mapped_column(String(255))
+
+    loads: Mapped[int] = mapped_column(Integer, default=0)
+    go_count: Mapped[int] = mapped_column(Integer, default=0)
+    review_count: Mapped[int] = mapped_column(Integer, default=0)
+    nogo_count: Mapped[int] = mapped_column(Integer, default=0)
+    sum_offered_total_rate: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_offered_rpm: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_break_even_rpm: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_projected_profit: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+@dataclass(frozen=True)
+class LogDimension:
+    """One group of logical log columns stored as an id into a dimension table."""
+    fk: str  # id column on recommendation_logs
+    model: Any
+    fields: Tuple[str, ...]  # logical names, as in log rows, archives and exports
+    columns: Tuple[str, ...]  # the dimension table's matching columns
+
+LOG_DIMENSIONS = (
+    LogDimension("log_user_id", LogUser, ("user_email", "user_role"), ("email", "role")),
+    LogDimension("broker_id", LogBroker, ("broker_name",), ("name",)),
+    LogDimension("origin_id", LogLocation, ("origin_city", "origin_state"), ("city", "state")),
+    LogDimension("dest_id", LogLocation, ("dest_city", "dest_state"), ("city", "state")),
+    LogDimension("equipment_id", LogEquipment, ("equipment_type",), ("name",)),
+    LogDimension("fuel_region_id", LogFuelRegion, ("fuel_region",), ("name",)),
+)
+LOG_DIMENSION_FIELDS = frozenset(f for d in LOG_DIMENSIONS for f in d.fields)
+
+def _log_view():
+    """recommendation_logs joined to its dimensions, plus every logical column's
+    expression over that join in the original column order."""
+    L = RecommendationLog.__table__
+    by_fk = {d.fk: d for d in LOG_DIMENSIONS}
+    source, fields = L, {}
+    for c in L.columns:
+        dim = by_fk.get(c.name)
+        if dim is None:
+            fields[c.name] = c
+            continue
+        t = dim.model.__table__.alias(c.name[:-3])
+        # LEFT JOIN keeps recommendation_logs the driving table, so its tenant indexes
+        # still choose and order the rows; each dimension is one primary-key probe
+        source = source.outerjoin(t, t.c.id == c)
+        fields.update((f, t.c[col]) for f, col in zip(dim.fields, dim.columns))
+    return source, fields
+
+LOG_FROM, LOG_FIELDS = _log_view()
+LOG_COLUMNS = tuple(expr.label(name) for name, expr in LOG_FIELDS.items())
+
+
+def _add_missing_columns(bind, table) -> None:
+    """ALTER TABLE ... ADD COLUMN for model columns an older table lacks. Only nullable
+    columns are added this way, so existing rows stay valid without a backfill."""
+    existing = {c["name"] for c in inspect(bind).get_columns(table.name)}
+    missing = [c for c in table.columns if c.name not in existing]
+    if not missing:
+        return
+    quote = bind.dialect.identifier_preparer.quote
+    with bind.begin() as conn:
+        for column in missing:
+            if not column.nullable:
+                raise RuntimeError(f"{table.name}.{column.name} is NOT NULL and missing: it needs a backfill migration")
+            conn.execute(text(
+                f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=bind.dialect)}"
+            ))
+
+# Indexes older databases still carry but the models no longer declare.
+RETIRED_INDEXES = {
+    "recommendation_logs": (
+        "ix_recommendation_logs_id", "ix_recommendation_logs_tenant_id", "ix_recommendation_logs_user_email",
+        "ix_recommendation_logs_user_role", "ix_recommendation_logs_profile_id", "ix_recommendation_logs_broker_name",
+    ),
+}
+
+def legacy_log_layout(bind) -> bool:
+    """True while recommendation_logs still stores its strings inline, or an encode-logs
+    run was interrupted half way."""
+    insp = inspect(bind)
+    if insp.has_table("recommendation_logs_legacy"):
+        return True
+    return insp.has_table("recommendation_logs") and "broker_name" in {c["name"] for c in insp.get_columns("recommendation_logs")}
+
+def encode_legacy_logs(bind, chunk_rows: int = 50000, progress: Optional[Callable[[int], None]] = None) -> int:
+    """`python app.py encode-logs`, with the API stopped: rebuild a recommendation_logs
+    table that still stores its strings inline. The table is renamed aside and an empty
+    encoded one created; rows are then copied in id order, chunk_rows per transaction,
+    after adding the chunk's strings to the dimension tables; the old table goes last.
+    An interrupted run resumes after the last copied id. Returns rows copied."""
+    if not legacy_log_layout(bind):
+        return 0
+    table = RecommendationLog.__table__
+    by_fk = {d.fk: d for d in LOG_DIMENSIONS}
+    q = bind.dialect.identifier_preparer.quote
+    if not inspect(bind).has_table("recommendation_logs_legacy"):
+        with bind.begin() as conn:
+            for ix in inspect(conn).get_indexes("recommendation_logs"):
+                conn.execute(text(f"DROP INDEX {q(ix['name'])}"))
+            conn.execute(text("ALTER TABLE recommendation_logs RENAME TO recommendation_logs_legacy"))
+            table.create(conn)
+    present = {c["name"] for c in inspect(bind).get_columns("recommendation_logs_legacy")}
+    window = "l.id > :after AND l.id <= :upto"
+    fills = []
+    for dim in LOG_DIMENSIONS:
+        dt = q(dim.model.__tablename__)
+        match = " AND ".join(f"d.{q(col)} = l.{q(f)}" for f, col in zip(dim.fields, dim.columns))
+        fills.append(text(
+            f"INSERT INTO {dt} ({', '.join(map(q, dim.columns))}) "
+            f"SELECT DISTINCT {', '.join(f'l.{q(f)}' for f in dim.fields)} FROM recommendation_logs_legacy l "
+            f"WHERE {window} AND NOT EXISTS (SELECT 1 FROM {dt} d WHERE {match})"
+        ))
+    names, values, joins = [], [], []
+    for c in table.columns:
+        dim = by_fk.get(c.name)
+        if dim is not None:
+            alias = q(c.name[:-3])
+            joins.append(f"JOIN {q(dim.model.__tablename__)} {alias} ON " + " AND ".join(
+                f"{alias}.{q(col)} = l.{q(f)}" for f, col in zip(dim.fields, dim.columns)))
+            values.append(f"{alias}.id")
+        elif c.name in present:  # nullable columns the legacy table never got stay NULL
+            values.append(f"l.{q(c.name)}")
+        else:
+            continue
+        names.append(q(c.name))
+    copy = text(f"INSERT INTO recommendation_logs ({', '.join(names)}) "
+                f"SELECT {', '.join(values)} FROM recommendation_logs_legacy l {' '.join(joins)} WHERE {window}")
+
+    copied = 0
+    while True:
+        with bind.begin() as conn:
+            after = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM recommendation_logs")).scalar()
+            upto = conn.execute(text(
+                "SELECT MAX(id) FROM (SELECT id FROM recommendation_logs_legacy WHERE id > :after ORDER BY id LIMIT :n) t"
+            ), {"after": after, "n": max(1, chunk_rows)}).scalar()
+            if upto is None:
+                break
+            bounds = {"after": after, "upto": upto}
+            for fill in fills:
+                conn.execute(fill, bounds)
+            copied += conn.execute(copy, bounds).rowcount
+        if progress is not None:
+            progress(copied)
+    with bind.begin() as conn:
+        conn.execute(text("DROP TABLE recommendation_logs_legacy"))
+        if bind.dialect.name == "postgresql":
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('recommendation_logs', 'id'), "
+                              "COALESCE(MAX(id), 0) + 1, false) FROM recommendation_logs"))
+    return copied
+
+_MIGRATE_ADVISORY_KEY = 0x41444131  # "ADA1"
+
+@contextmanager
+def migrate_lock(bind):
+    """One migrator at a time: flock on MIGRATE_LOCK_PATH for the workers of this host
+    (uvicorn --workers N runs every lifespan at once), plus pg_advisory_lock for hosts
+    sharing a PostgreSQL database. Whoever waited then finds the schema current."""
+    with open(MIGRATE_LOCK_PATH, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            if bind.dialect.name != "postgresql":
+                yield
+                return
+            with bind.connect() as conn:
+                conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _MIGRATE_ADVISORY_KEY})
+                try:
+                    yield
+                finally:
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MIGRATE_ADVISORY_KEY})
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def migrate_schema(bind) -> None:
+    """create_all only creates missing tables; also add columns and indexes introduced
+    since a table was first created, and drop retired indexes. Serialized by migrate_lock."""
+    with migrate_lock(bind):
+        _migrate_schema(bind)
+
+def _migrate_schema(bind) -> None:
+    Base.metadata.create_all(bind=bind)
+    legacy = legacy_log_layout(bind)
+    if legacy:  # rewriting every log row is too long for a startup path
+        logger.warning("recommendation_logs still has the legacy inline-string layout; "
+                       "stop the API and run `python app.py encode-logs`")
+    for table in Base.metadata.sorted_tables:
+        if legacy and table is RecommendationLog.__table__:
+            continue
+        _add_missing_columns(bind, table)
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+        retired = set(RETIRED_INDEXES.get(table.name, ()))
+        if retired:
+            present = {ix["name"] for ix in inspect(bind).get_indexes(table.name)}
+            quote = bind.dialect.identifier_preparer.quote
+            with bind.begin() as conn:
+                for name in sorted(retired & present):
+                    conn.execute(text(f"DROP INDEX {quote(name)}"))
+
+# -----------------------------
+# Cache generations (cross-worker invalidation)
+# -----------------------------
+# Caches stay in-process; what workers share is one counter per (namespace, tenant).
+# A cache entry remembers the counter it was loaded under and is only served while the
+# counter is unchanged, so a writer's invalidate() -- a bump after its commit -- retires
+# the tenant's entries in every worker at their next lookup, with no message to deliver.
+# The same counter keeps a reader that loaded before the bump from caching its result.
+# A cache's clear() bumps its namespace's epoch, which every tenant's counter includes.
+ALL_TENANTS = -1  # the epoch key
+
+class LocalGenerations:
+    """Counters held by this process only (a single worker)."""
+
+    backend = "local"
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def read(self, namespace: str, tenant_id: int) -> int:
+        return self._counters.get((namespace, tenant_id), 0) + self._counters.get((namespace, ALL_TENANTS), 0)
+
+    def bump(self, namespace: str, tenant_id: int) -> int:
+        with self._lock:
+            value = self._counters[(namespace, tenant_id)] = self._counters.get((namespace, tenant_id), 0) + 1
+            self.bumps += 1
+            return value
+
+    def bump_all(self, namespace: str) -> int:
+        return self.bump(namespace, ALL_TENANTS)
 
-Base.metadata.create_all(bind=engine)
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "keys": len(self._counters), "bumps": self.bumps}
+
+class SharedGenerations:
+    """Counters in a memory-mapped file (on /dev/shm by default) shared by every worker.
+
+    (namespace, tenant) hashes with crc32 onto one of `slots` 64-bit counters. Tenants
+    that collide share a slot, which costs spurious misses, never stale hits. Reads are
+    a plain load from the mapping; bumps hold an flock on the file so increments from
+    concurrent workers are never lost. The file's contents survive restarts harmlessly:
+    only changes of a counter matter, not its value.
+    """
+
+    backend = "shm"
+
+    def __init__(self, path: str = CACHE_BUS_PATH, slots: int = CACHE_BUS_SLOTS):
+        if fcntl is None:
+            raise RuntimeError("ADA_CACHE_BUS=shm needs fcntl (POSIX)")
+        self.path = path
+        self.slots = slots
+        size = slots * 8
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            existing = os.fstat(self._fd).st_size
+            if existing == 0:
+                os.ftruncate(self._fd, size)
+            elif existing != size:
+                raise RuntimeError(f"{path} holds {existing // 8} slots, ADA_CACHE_BUS_SLOTS is {slots}")
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._counters = memoryview(self._map).cast("Q")
+        self._slot_of: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def slot(self, namespace: str, tenant_id: int) -> int:
+        key = (namespace, tenant_id)
+        slot = self._slot_of.get(key)
+        if slot is None:
+            slot = self._slot_of[key] = zlib.crc32(f"{namespace}:{tenant_id}".encode()) % self.slots
+        return slot
+
+    def read(self, namespace: str, tenant_id: int) -> int:
+        slot = self._slot_of.get((namespace, tenant_id))
+        epoch = self._slot_of.get((namespace, ALL_TENANTS))
+        return (self._counters[self.slot(namespace, tenant_id) if slot is None else slot]
+                + self._counters[self.slot(namespace, ALL_TENANTS) if epoch is None else epoch])
+
+    def bump(self, namespace: str, tenant_id: int) -> int:
+        slot = self.slot(namespace, tenant_id)
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                value = self._counters[slot] = (self._counters[slot] + 1) & 0xFFFFFFFFFFFFFFFF
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self.bumps += 1
+            return value
+
+    def bump_all(self, namespace: str) -> int:
+        return self.bump(namespace, ALL_TENANTS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "path": self.path, "slots": self.slots, "keys": len(self._slot_of), "bumps": self.bumps}
+
+def build_generations(kind: str = CACHE_BUS):
+    if kind == "local":
+        return LocalGenerations()
+    if kind == "shm":
+        return SharedGenerations()
+    raise RuntimeError(f"Unknown ADA_CACHE_BUS {kind!r} (expected local or shm)")
+
+cache_generations = build_generations()
 
 # -----------------------------
 # Auth helpers
 # -----------------------------
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+@lru_cache(maxsize=None)
+def password_context():
+    """Built on first use: passlib and the bcrypt backend load in whichever process hashes
+    (a hashing-pool worker, usually), not at import."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 def verify_password(password: str, password_hash: str) -> bool:
-    return pwd_context.verify(password, password_hash)
+    return password_context().verify(password, password_hash)
+
+def _timed_hash_job(fn, *args) -> Tuple[Any, float, float]:
+    # Runs in the worker; wall-clock start/end let the caller split queue wait from bcrypt time.
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+class HashingExecutor:
+    """Dedicated, bounded pool for bcrypt so login bursts don't occupy Starlette's shared
+    threadpool. Defaults to processes so hashing also runs outside the GIL.
+
+    At most max_pending jobs may be queued or running; past that, callers get a 503 with
+    Retry-After instead of piling up behind the pool.
+    """
+
+    def __init__(self, kind: str = HASH_EXECUTOR_KIND, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.queue_wait_sum = 0.0
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.kind == "thread":
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ada-hash")
+                else:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Authentication is busy, retry shortly", headers={"Retry-After": "1"})
+            self.pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(self._get_pool(), _timed_hash_job, fn, *args)
+        except HTTPException:
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+        latency = time.time() - submitted
+        with self._lock:
+            self.completed += 1
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.queue_wait_sum += max(0.0, started - submitted)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self.run(verify_password, password, password_hash)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self.pending,
+                "queue_depth": max(0, self.pending - self.workers),
+                "max_in_flight_seen": self.max_pending_seen,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "latency_avg_ms": self.latency_sum / self.completed * 1000 if self.completed else 0.0,
+                "latency_max_ms": self.latency_max * 1000,
+                "queue_wait_avg_ms": self.queue_wait_sum / self.completed * 1000 if self.completed else 0.0,
+            }
+
+hashing_executor = HashingExecutor()
 
 def create_access_token(*, sub: str, tenant_id: int, role: str, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
     expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
@@ -180,112 +1300,3207 @@ def decode_token(token: str) -> dict:
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The authenticated caller, as verified against the users table."""
+    id: int
+    email: str
+    tenant_id: int
+    role: str
+
+class PrincipalCache:
+    """Verified principals keyed by the raw bearer token.
+
+    Only tokens that decoded and matched a user row are cached, and an entry never
+    outlives its token's exp. change_role / delete_user call invalidate_user(), which
+    drops the user's tokens here and bumps the tenant's "principals" generation, so
+    every worker re-reads the tenant's users on their next request.
+    """
+
+    namespace = "principals"
+
+    def __init__(self, max_entries: int = PRINCIPAL_CACHE_SIZE, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS,
+                 generations=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, int, Principal]]" = OrderedDict()
+        self._tokens_by_email: Dict[str, set[str]] = {}
+        self._generations = generations or cache_generations
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, tenant_id: int) -> int:
+        return self._generations.read(self.namespace, tenant_id)
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, generation, principal = entry
+            stale = generation != self._generations.read(self.namespace, principal.tenant_id)
+            if stale or expires_at < time.monotonic():
+                self.invalidations += stale
+                self._drop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: Optional[float], generation: int) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, float(token_exp) - time.time())
+            if ttl <= 0:
+                return
+        with self._lock:
+            if self._generations.read(self.namespace, principal.tenant_id) != generation:
+                return
+            self._entries[token] = (time.monotonic() + ttl, generation, principal)
+            self._entries.move_to_end(token)
+            self._tokens_by_email.setdefault(principal.email, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, token: str) -> None:
+        principal = self._entries.pop(token)[2]
+        tokens = self._tokens_by_email.get(principal.email)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_email[principal.email]
+
+    def invalidate_user(self, tenant_id: int, email: str) -> None:
+        self._generations.bump(self.namespace, tenant_id)
+        with self._lock:
+            for token in list(self._tokens_by_email.get(email, ())):
+                self._drop(token)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_email.clear()
+            self._generations.bump_all(self.namespace)  # loads already in flight must not land
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+principal_cache = PrincipalCache()
+
+def _token_claims(token: str) -> Tuple[dict, str, int]:
     payload = decode_token(token)
     email = payload.get("sub")
     tenant_id = payload.get("tenant_id")
     role = payload.get("role")
     if not email or tenant_id is None or not role:
         raise HTTPException(status_code=401, detail="Invalid token payload")
+    return payload, email, tenant_id
 
-    user = db.query(User).filter(User.email == email).first()
+def _verified_principal(token: str, payload: dict, tenant_id: int, user: Optional[User], generation: int) -> Principal:
     if not user or user.tenant_id != tenant_id:
         raise HTTPException(status_code=401, detail="User not found / tenant mismatch")
-    return user
+    principal = Principal(id=user.id, email=user.email, tenant_id=user.tenant_id, role=user.role)
+    principal_cache.put(token, principal, payload.get("exp"), generation)
+    return principal
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> Principal:
+    with stage("auth"):
+        cached = principal_cache.get(token)
+        if cached is not None:
+            return cached
+
+        payload, email, tenant_id = _token_claims(token)
+        generation = principal_cache.generation(tenant_id)
+        user = db.query(User).filter(User.email == email).first()
+        return _verified_principal(token, payload, tenant_id, user, generation)
 
 def require_role(allowed: set[str]):
-    def _guard(user: User = Depends(get_current_user)) -> User:
+    def _guard(user: Principal = Depends(get_current_user)) -> Principal:
         if user.role not in allowed:
             raise HTTPException(status_code=403, detail=f"Requires role: {', '.join(sorted(allowed))}")
         return user
     return _guard
 
-
 # -----------------------------
-# Pricing / recommendation logic
+# Admission control (per-tenant rate limits + fair queuing)
 # -----------------------------
+# Requests under ADMISSION_PATHS are admitted before they reach routing, auth or the
+# threadpool. Each (tenant, role) has a token bucket; past it the caller gets a 429 with
+# Retry-After. Admitted requests then need one of ADMISSION_CONCURRENCY in-flight slots.
+# When none is free they wait in per-tenant queues served by start-time fair queuing: every
+# request is tagged max(virtual time, tenant's previous tag) + cost / weight and the lowest
+# tag runs next, so a tenant with a deep backlog only pushes its own tags out while a
+# light tenant's next request goes to the front. cost grows with the request body, so
+# fairness is in work asked for rather than requests (a 5000-load batch is not one unit).
+# Everything runs on the event loop.
+class AdmissionRejected(Exception):
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
 @dataclass
-class CostBreakdown:
-    fuel_cost: float
-    variable_cost: float
-    fixed_allocated: float
-    total_cost: float
+class TenantAdmission:
+    weight: float
+    last_tag: float = 0.0
+    in_flight: int = 0
+    waiting: int = 0
+    admitted: int = 0
+    rate_limited: int = 0
+    queue_full: int = 0
+    wait_sum: float = 0.0
+    wait_max: float = 0.0
 
-def _fuel_price(profile: CarrierCostProfile, region: str) -> float:
-    prices = profile.fuel_price_by_region or {}
-    return float(prices.get(region, prices.get("National", 3.85)))
+class AdmissionController:
+    def __init__(self, concurrency: int = ADMISSION_CONCURRENCY, tenant_queue: int = ADMISSION_TENANT_QUEUE,
+                 rate_limits: Mapping[str, Tuple[float, float]] = MappingProxyType(RATE_LIMITS),
+                 weights: Mapping[int, float] = MappingProxyType(TENANT_WEIGHTS), registry: Optional[MetricsRegistry] = None,
+                 metric_tenants: AbstractSet[int] = ADMISSION_METRIC_TENANTS):
+        self.concurrency = max(0, concurrency)
+        self.tenant_queue = max(0, tenant_queue)
+        self.rate_limits = dict(rate_limits)
+        self.weights = dict(weights)
+        self.registry = registry
+        self.metric_tenants = frozenset(metric_tenants)  # the rest share tenant="other"; empty: no tenant label
+        self._lock = threading.Lock()  # state changes on the event loop; stats() may read from a worker thread
+        self._tenants: Dict[int, TenantAdmission] = {}
+        self._buckets: Dict[Tuple[int, str], List[float]] = {}  # (tenant, role) -> [tokens, refilled_at]
+        self._queue: List[Tuple[float, int, int, asyncio.Future]] = []  # (tag, seq, tenant_id, waiter)
+        self._seq = itertools.count()
+        self.vtime = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.queue_full = 0
 
-def compute_costs(profile: CarrierCostProfile, req: dict) -> CostBreakdown:
-    total_miles = float(req["loaded_miles"]) + float(req.get("deadhead_miles", 0))
+    def _tenant(self, tenant_id: int) -> TenantAdmission:
+        t = self._tenants.get(tenant_id)
+        if t is None:
+            t = self._tenants[tenant_id] = TenantAdmission(weight=max(1e-6, self.weights.get(tenant_id, 1.0)))
+        return t
 
-    f_price = _fuel_price(profile, req.get("fuel_region", "National"))
-    gallons = total_miles / float(profile.mpg)
-    fuel_cost = gallons * f_price
+    def _take_token(self, tenant_id: int, role: str, t: TenantAdmission, now: float) -> Optional[int]:
+        """None if the bucket had a token, else seconds until it will."""
+        limit = self.rate_limits.get(role)
+        if limit is None:
+            return None
+        rate, burst = limit[0] * t.weight, max(1.0, limit[1] * t.weight)
+        bucket = self._buckets.get((tenant_id, role))
+        if bucket is None:
+            bucket = self._buckets[(tenant_id, role)] = [burst, now]
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return None
+        return max(1, int(-(-(1.0 - bucket[0]) // rate))) if rate > 0 else 60
 
-    var_per_mile = (
-        float(profile.driver_pay_per_mile)
-        + float(profile.maintenance_per_mile)
-        + float(profile.insurance_per_mile)
-        + float(profile.tires_per_mile)
-        + float(profile.permits_tolls_per_mile)
-        + float(profile.other_variable_per_mile)
+    def _record(self, tenant_id: int, outcome: str, wait: Optional[float] = None) -> None:
+        if self.registry is not None:
+            labels = ()
+            if self.metric_tenants:
+                labels = (("tenant", str(tenant_id) if tenant_id in self.metric_tenants else "other"),)
+            self.registry.inc("ada_admission_requests_total", labels + (("outcome", outcome),))
+            if wait is not None:
+                self.registry.observe("ada_admission_wait_seconds", labels, wait)
+
+    def _grant(self, t: TenantAdmission, tag: float) -> None:
+        self.vtime = tag
+        self.in_flight += 1
+        self.admitted += 1
+        t.in_flight += 1
+        t.admitted += 1
+
+    async def acquire(self, tenant_id: int, role: str, cost: float = 1.0) -> None:
+        """Wait for a slot; raises AdmissionRejected (-> 429) instead of queueing without bound."""
+        t0 = time.monotonic()
+        with self._lock:
+            t = self._tenant(tenant_id)
+            saturated = self.concurrency > 0 and (self.in_flight >= self.concurrency or bool(self._queue))
+            if saturated and t.waiting >= self.tenant_queue:
+                t.queue_full += 1
+                self.queue_full += 1
+                outcome = "queue_full"
+                rejected = AdmissionRejected("Too many queued requests for this tenant, retry shortly", 1)
+            else:
+                retry_after = self._take_token(tenant_id, role, t, t0)
+                if retry_after is not None:
+                    t.rate_limited += 1
+                    self.rate_limited += 1
+                    outcome = "rate_limited"
+                    rejected = AdmissionRejected(f"Rate limit exceeded for role {role}", retry_after)
+                else:
+                    rejected = None
+                    tag = max(self.vtime, t.last_tag)
+                    t.last_tag = tag + cost / t.weight
+                    if not saturated:
+                        self._grant(t, tag)
+                        waiter = None
+                    else:
+                        waiter = asyncio.get_running_loop().create_future()
+                        heapq.heappush(self._queue, (tag, next(self._seq), tenant_id, waiter))
+                        t.waiting += 1
+                        self.waiting += 1
+        if rejected is not None:
+            self._record(tenant_id, outcome)
+            raise rejected
+        if waiter is not None:
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.done() and not waiter.cancelled()
+                    if not granted:
+                        waiter.cancel()
+                        t.waiting -= 1
+                        self.waiting -= 1
+                if granted:  # the slot arrived as the client went away: hand it on
+                    self.release(tenant_id)
+                raise
+        wait = time.monotonic() - t0
+        with self._lock:
+            t.wait_sum += wait
+            t.wait_max = max(t.wait_max, wait)
+        self._record(tenant_id, "admitted", wait)
+
+    def release(self, tenant_id: int) -> None:
+        """Free a slot and hand it to the lowest queued tag."""
+        with self._lock:
+            t = self._tenants[tenant_id]
+            t.in_flight -= 1
+            self.in_flight -= 1
+            while self._queue:
+                tag, _, next_id, waiter = heapq.heappop(self._queue)
+                if waiter.cancelled():
+                    continue
+                nt = self._tenants[next_id]
+                nt.waiting -= 1
+                self.waiting -= 1
+                self._grant(nt, tag)
+                waiter.set_result(None)
+                break
+
+    def tenant_stats(self, tenant_id: int) -> Dict[str, Any]:
+        with self._lock:
+            t = self._tenants.get(tenant_id) or TenantAdmission(weight=self.weights.get(tenant_id, 1.0))
+            tokens = {role: round(b[0], 2) for (tid, role), b in self._buckets.items() if tid == tenant_id}
+            return {
+                "weight": t.weight,
+                "in_flight": t.in_flight,
+                "waiting": t.waiting,
+                "admitted": t.admitted,
+                "rate_limited": t.rate_limited,
+                "queue_full": t.queue_full,
+                "wait_avg_ms": t.wait_sum / t.admitted * 1000 if t.admitted else 0.0,
+                "wait_max_ms": t.wait_max * 1000,
+                "rate_limits": {role: {"per_second": r * t.weight, "burst": max(1.0, b * t.weight)}
+                                for role, (r, b) in self.rate_limits.items()},
+                "tokens": tokens,
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "tenant_queue": self.tenant_queue,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "tenants": len(self._tenants),
+                "tenants_waiting": sum(1 for t in self._tenants.values() if t.waiting),
+                "admitted": self.admitted,
+                "rate_limited": self.rate_limited,
+                "queue_full": self.queue_full,
+            }
+
+admission_controller = AdmissionController(registry=metrics_registry if METRICS_ENABLED else None)
+
+def _user_by_email(email: str) -> Optional[User]:
+    with SessionLocal() as db:
+        return db.query(User).filter(User.email == email).first()
+
+class AdmissionMiddleware:
+    """Runs requests under `paths` through the controller. The tenant / role come from the
+    verified principal, not the token's claims, so change_role / delete_user move a live
+    token to its new class: principal_cache serves it, and a miss reads the user (the
+    route then finds it cached). Requests without a valid token pass through and get
+    their 401 from the route. A request costs one queuing unit per `unit_bytes` of body
+    (Content-Length), at least one: a single load is ~400 bytes."""
+
+    def __init__(self, app, controller: AdmissionController, paths: Tuple[str, ...] = ADMISSION_PATHS,
+                 unit_bytes: int = 1024):
+        self.app = app
+        self.controller = controller
+        self.paths = paths
+        self.unit_bytes = unit_bytes
+
+    async def _caller(self, auth: str) -> Optional[Tuple[int, str]]:
+        scheme, _, token = auth.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        with stage("auth"):
+            principal = principal_cache.get(token)
+            if principal is None:
+                try:
+                    payload, email, tenant_id = _token_claims(token)
+                    generation = principal_cache.generation(tenant_id)
+                    if ASYNC_DB:
+                        async with AsyncSessionLocal() as db:
+                            user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+                    else:
+                        user = await run_in_threadpool(_user_by_email, email)
+                    principal = _verified_principal(token, payload, tenant_id, user, generation)
+                except HTTPException:
+                    return None
+        return principal.tenant_id, principal.role
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        caller = await self._caller(headers.get(b"authorization", b"").decode("latin-1"))
+        if caller is None:
+            return await self.app(scope, receive, send)
+        tenant_id, role = caller
+        length = headers.get(b"content-length", b"")
+        cost = max(1.0, int(length) / self.unit_bytes) if length.isdigit() else 1.0
+        try:
+            with stage("admission"):
+                await self.controller.acquire(tenant_id, role, cost)
+        except AdmissionRejected as e:
+            response = JSONResponse({"detail": e.detail}, status_code=429, headers={"Retry-After": str(e.retry_after)})
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(tenant_id)
+
+# -----------------------------
+# Fuel price index
+# -----------------------------
+# A tenant's fuel prices as of today resolve into one FuelPrices snapshot: the global
+# index (tenant_id 0), then the tenant's own rows on top. Compiled profiles take a region's
+# price from the snapshot and fall back to their own fuel_price_by_region only for regions
+# the index does not cover, so a daily upload reaches every recommendation without
+# rewriting profiles. Snapshots are cached per tenant under the "fuel" generations of the
+# tenant and of tenant 0, and expire when the next uploaded effective date arrives.
+GLOBAL_FUEL_TENANT = 0
+
+@dataclass(frozen=True, eq=False)
+class FuelPrices:
+    tenant_id: int
+    as_of: date
+    prices: Mapping[str, float]
+    sources: Mapping[str, Tuple[date, str]]  # region -> (effective_date, "global" | "tenant")
+    next_change: Optional[date]  # earliest effective date after as_of, if any was uploaded
+
+def _fuel_stmts(tenant_id: int, as_of: date):
+    """(latest row per scope and region on or before as_of, next effective date after it)."""
+    F = FuelPrice
+    scopes = F.tenant_id.in_((GLOBAL_FUEL_TENANT, tenant_id))
+    latest = (
+        select(F.tenant_id, F.region, func.max(F.effective_date).label("effective_date"))
+        .where(scopes, F.effective_date <= as_of)
+        .group_by(F.tenant_id, F.region)
+        .subquery()
     )
-    variable_cost = var_per_mile * total_miles
+    current = select(F.tenant_id, F.region, F.effective_date, F.price).join(latest, and_(
+        F.tenant_id == latest.c.tenant_id, F.region == latest.c.region, F.effective_date == latest.c.effective_date,
+    ))
+    return current, select(func.min(F.effective_date)).where(scopes, F.effective_date > as_of)
 
-    fixed_per_mile = float(profile.fixed_costs_per_day) / float(profile.target_miles_per_day)
-    fixed_allocated = fixed_per_mile * total_miles
+def build_fuel_prices(tenant_id: int, as_of: date, rows, next_change: Optional[date]) -> FuelPrices:
+    prices: Dict[str, float] = {}
+    sources: Dict[str, Tuple[date, str]] = {}
+    for r in sorted(rows, key=lambda r: r.tenant_id != GLOBAL_FUEL_TENANT):  # global first, tenant overrides
+        prices[r.region] = float(r.price)
+        sources[r.region] = (r.effective_date, "global" if r.tenant_id == GLOBAL_FUEL_TENANT else "tenant")
+    return FuelPrices(tenant_id, as_of, MappingProxyType(prices), MappingProxyType(sources), next_change)
 
-    total_cost = fuel_cost + variable_cost + fixed_allocated
-    return CostBreakdown(fuel_cost=fuel_cost, variable_cost=variable_cost, fixed_allocated=fixed_allocated, total_cost=total_cost)
+def resolve_fuel(own: Mapping[str, float], fuel: Optional[FuelPrices]) -> Mapping[str, float]:
+    """A profile's effective region -> price map: the index wins where it has a price
+    (including National, the fallback for unknown regions)."""
+    if fuel is None or not fuel.prices:
+        return own
+    return MappingProxyType({**own, **fuel.prices})
 
-def offered_rpm(req: dict) -> float:
-    return float(req["offered_total_rate"]) / float(req["loaded_miles"])
+class FuelPriceCache:
+    """LRU of resolved FuelPrices per tenant. Uploads call invalidate() after commit,
+    bumping the tenant's "fuel" generation, or tenant 0's for the global index, which
+    every snapshot also checks."""
 
-def break_even_rpm(profile: CarrierCostProfile, req: dict) -> float:
-    costs = compute_costs(profile, req)
-    return costs.total_cost / float(req["loaded_miles"])
+    namespace = "fuel"
 
-def target_rpm(profile: CarrierCostProfile, req: dict) -> float:
-    be = break_even_rpm(profile, req)
-    return be * (1.0 + float(profile.preferred_margin_percent))
+    def __init__(self, max_entries: int = FUEL_CACHE_SIZE, ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS, generations=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, Tuple[int, int], FuelPrices]]" = OrderedDict()
+        self._generations = generations or cache_generations
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
 
-def decision_logic(profile: CarrierCostProfile, req: dict) -> Tuple[str, list[str]]:
-    reasons: list[str] = []
-    block = (profile.block_brokers or {}).get(req["broker_name"])
-    if block:
-        reasons.append(f"Broker is blocked: {block}")
-        return "NO-GO", reasons
+    def generation(self, tenant_id: int) -> Tuple[int, int]:
+        return (self._generations.read(self.namespace, tenant_id), self._generations.read(self.namespace, GLOBAL_FUEL_TENANT))
 
-    dead = float(req.get("deadhead_miles", 0))
-    if dead > float(profile.max_deadhead_miles):
-        reasons.append(f"Deadhead {dead:.0f}mi exceeds soft cap {profile.max_deadhead_miles:.0f}mi (review)")
+    def get(self, tenant_id: int) -> Optional[FuelPrices]:
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, generation, fuel = entry
+            stale = generation != self.generation(tenant_id)
+            if stale or expires_at < time.monotonic():
+                del self._entries[tenant_id]
+                self.invalidations += stale
+                self.misses += 1
+                return None
+            self._entries.move_to_end(tenant_id)
+            self.hits += 1
+            return fuel
 
-    be = break_even_rpm(profile, req)
-    off = offered_rpm(req)
-    min_rpm = be * (1.0 + float(profile.min_margin_percent))
+    def put(self, fuel: FuelPrices, generation: Tuple[int, int]) -> None:
+        ttl = self.ttl_seconds
+        if fuel.next_change is not None:
+            change_at = datetime(fuel.next_change.year, fuel.next_change.month, fuel.next_change.day)
+            ttl = min(ttl, (change_at - datetime.utcnow()).total_seconds())
+        with self._lock:
+            if self.generation(fuel.tenant_id) != generation:
+                return
+            self._entries[fuel.tenant_id] = (time.monotonic() + ttl, generation, fuel)
+            self._entries.move_to_end(fuel.tenant_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
 
-    if off >= min_rpm and dead <= float(profile.max_deadhead_miles):
-        reasons.append(f"Offered RPM ${off:.2f} meets minimum ${min_rpm:.2f}")
-        return "GO", reasons
+    def invalidate(self, tenant_id: int) -> None:
+        self._generations.bump(self.namespace, tenant_id)
+        with self._lock:
+            if tenant_id == GLOBAL_FUEL_TENANT:
+                self._entries.clear()
+            else:
+                self._entries.pop(tenant_id, None)
 
-    if off < be:
-        reasons.append(f"Offered RPM ${off:.2f} is below break-even ${be:.2f}")
-        return "NO-GO", reasons
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.bump_all(self.namespace)
 
-    reasons.append(f"Offered RPM ${off:.2f} is between break-even ${be:.2f} and minimum ${min_rpm:.2f}")
-    return "REVIEW", reasons
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
 
-def negotiation_script(req: dict, be_rpm_value: float, tgt_rpm_value: float) -> str:
-    off_r = offered_rpm(req)
-    return (
-        f"Hi — thanks for sending this over. For {req['origin_city']}, {req['origin_state']} → "
-        f"{req['dest_city']}, {req['dest_state']} ({float(req['loaded_miles']):.0f} loaded mi, {float(req.get('deadhead_miles',0)):.0f} deadhead), "
-        f"we’re currently at ${off_r:.2f}/mi (${float(req['offered_total_rate']):,.0f} total). "
-        f"Given operating costs and deadhead, we need ${be_rpm_value:.2f}/mi to break even. "
-        f"If you can do ${tgt_rpm_value:.2f}/mi (${tgt_rpm_value * float(req['loaded_miles']):,.0f} total), we can confirm and roll now. "
-        f"Can you check with your customer and get me as close as possible?"
+fuel_cache = FuelPriceCache()
+
+def _store_fuel(tenant_id: int, as_of: date, rows, next_change: Optional[date], generation: Tuple[int, int]) -> FuelPrices:
+    fuel = build_fuel_prices(tenant_id, as_of, rows, next_change)
+    fuel_cache.put(fuel, generation)
+    return fuel
+
+def get_fuel_prices(db: Session, tenant_id: int) -> FuelPrices:
+    """The tenant's resolved fuel prices as of today (UTC)."""
+    fuel = fuel_cache.get(tenant_id)
+    if fuel is None:
+        generation = fuel_cache.generation(tenant_id)
+        as_of = datetime.utcnow().date()
+        current, next_change = _fuel_stmts(tenant_id, as_of)
+        fuel = _store_fuel(tenant_id, as_of, db.execute(current).all(), db.execute(next_change).scalar(), generation)
+    return fuel
+
+def upsert_fuel_prices(conn: Union[Session, Any], tenant_id: int, prices: Iterable[Mapping[str, Any]]) -> int:
+    """Insert or replace (region, effective_date) -> price rows for tenant_id (0 = global);
+    the last entry wins for a repeated key. Returns distinct rows written."""
+    now = datetime.utcnow()
+    params = list({
+        (p["region"], p["effective_date"]): {"tenant_id": tenant_id, "region": p["region"], "effective_date": p["effective_date"],
+                                             "price": float(p["price"]), "updated_at": now}
+        for p in prices
+    }.values())
+    if not params:
+        return 0
+    table = FuelPrice.__table__
+    dialect = conn.get_bind().dialect.name if isinstance(conn, Session) else conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = upsert_insert(dialect)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["tenant_id", "region", "effective_date"],
+            set_={"price": stmt.excluded.price, "updated_at": stmt.excluded.updated_at},
+        )
+        conn.execute(stmt, params)
+        return len(params)
+    for p in params:
+        changed = conn.execute(
+            update(table)
+            .where(table.c.tenant_id == tenant_id, table.c.region == p["region"], table.c.effective_date == p["effective_date"])
+            .values(price=p["price"], updated_at=now)
+        ).rowcount
+        if not changed:
+            conn.execute(insert(table), p)
+    return len(params)
+
+# -----------------------------
+# Compiled profile cache
+# -----------------------------
+# Profiles change a few times a day but are read on every recommendation. The hot path
+# prices against a CompiledProfile: an immutable snapshot with the per-mile rates already
+# summed and fuel prices resolved against the tenant's FuelPrices, so it never re-coerces
+# ORM columns or JSON. The pricing functions accept either type.
+@dataclass(frozen=True, slots=True)
+class CompiledProfile:
+    tenant_id: int
+    profile_id: str
+    display_name: str
+    var_per_mile: float
+    fixed_per_mile: float
+    mpg: float
+    fuel_price_by_region: Mapping[str, float]  # effective: index prices over the profile's own
+    block_brokers: Mapping[str, str]  # only brokers that are actually blocked
+    min_margin_percent: float
+    preferred_margin_percent: float
+    max_deadhead_miles: float
+    updated_at: Optional[datetime] = None
+    own_fuel_prices: Mapping[str, float] = field(default_factory=lambda: MappingProxyType({}))  # the row's fuel_price_by_region
+    fuel: Optional[FuelPrices] = None  # snapshot fuel_price_by_region was resolved against
+
+def compile_profile(profile: CarrierCostProfile, fuel: Optional[FuelPrices] = None) -> CompiledProfile:
+    var_per_mile, fixed_per_mile = _per_mile_rates(profile)
+    own = MappingProxyType({k: float(v) for k, v in (profile.fuel_price_by_region or {}).items()})
+    return CompiledProfile(
+        tenant_id=profile.tenant_id,
+        profile_id=profile.profile_id,
+        display_name=profile.display_name,
+        var_per_mile=var_per_mile,
+        fixed_per_mile=fixed_per_mile,
+        mpg=float(profile.mpg),
+        fuel_price_by_region=resolve_fuel(own, fuel),
+        block_brokers=MappingProxyType({k: v for k, v in (profile.block_brokers or {}).items() if v}),
+        min_margin_percent=float(profile.min_margin_percent),
+        preferred_margin_percent=float(profile.preferred_margin_percent),
+        max_deadhead_miles=float(profile.max_deadhead_miles),
+        updated_at=profile.updated_at,
+        own_fuel_prices=own,
+        fuel=fuel,
+    )
+
+def with_fuel(compiled: CompiledProfile, fuel: Optional[FuelPrices]) -> CompiledProfile:
+    """The same profile re-resolved against a newer fuel snapshot (no DB read)."""
+    if compiled.fuel is fuel:
+        return compiled
+    return replace(compiled, fuel_price_by_region=resolve_fuel(compiled.own_fuel_prices, fuel), fuel=fuel)
+
+ProfileLike = Union[CarrierCostProfile, CompiledProfile]
+
+@dataclass(frozen=True)
+class ProfileSet:
+    """Every profile of one tenant, column-wise, for pricing one load against the fleet.
+
+    Fuel prices are resolved per region up front (unknown regions fall back to each
+    profile's National price) and block lists are inverted to broker -> profiles.
+    """
+    tenant_id: int
+    profiles: Tuple[CompiledProfile, ...]
+    var_per_mile: np.ndarray
+    fixed_per_mile: np.ndarray
+    mpg: np.ndarray
+    min_margin_percent: np.ndarray
+    preferred_margin_percent: np.ndarray
+    max_deadhead_miles: np.ndarray
+    fuel_by_region: Mapping[str, np.ndarray]
+    fuel_default: np.ndarray
+    blocked_by_broker: Mapping[str, Tuple[Tuple[int, str], ...]]
+    index: Mapping[str, int]  # profile_id -> row
+    fuel: Optional[FuelPrices] = None
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def fuel_prices(self, region: str) -> np.ndarray:
+        return self.fuel_by_region.get(region, self.fuel_default)
+
+    def blocked(self, broker_name: str) -> List[Optional[str]]:
+        out: List[Optional[str]] = [None] * len(self.profiles)
+        for i, reason in self.blocked_by_broker.get(broker_name, ()):
+            out[i] = reason
+        return out
+
+def build_profile_set(tenant_id: int, profiles: List[CompiledProfile], fuel: Optional[FuelPrices] = None) -> ProfileSet:
+    profiles = [with_fuel(p, fuel) for p in profiles] if fuel is not None else profiles
+
+    def column(attr: str) -> np.ndarray:
+        return np.fromiter((getattr(p, attr) for p in profiles), dtype=np.float64, count=len(profiles))
+
+    regions = {region for p in profiles for region in p.fuel_price_by_region}
+    blocked: Dict[str, List[Tuple[int, str]]] = {}
+    for i, p in enumerate(profiles):
+        for broker, reason in p.block_brokers.items():
+            blocked.setdefault(broker, []).append((i, reason))
+
+    return ProfileSet(
+        tenant_id=tenant_id,
+        profiles=tuple(profiles),
+        var_per_mile=column("var_per_mile"),
+        fixed_per_mile=column("fixed_per_mile"),
+        mpg=column("mpg"),
+        min_margin_percent=column("min_margin_percent"),
+        preferred_margin_percent=column("preferred_margin_percent"),
+        max_deadhead_miles=column("max_deadhead_miles"),
+        fuel_by_region=MappingProxyType({
+            region: np.array([_fuel_price(p, region) for p in profiles], dtype=np.float64) for region in regions
+        }),
+        fuel_default=np.array([_fuel_price(p, "National") for p in profiles], dtype=np.float64),
+        blocked_by_broker=MappingProxyType({broker: tuple(v) for broker, v in blocked.items()}),
+        index=MappingProxyType({p.profile_id: i for i, p in enumerate(profiles)}),
+        fuel=fuel,
     )
 
+class ProfileCache:
+    """LRU + TTL cache of CompiledProfile keyed by (tenant_id, profile_id), plus a
+    smaller LRU of whole-tenant ProfileSets for fleet fan-out.
+
+    Writers call invalidate() after commit. It bumps the tenant's "profiles" generation:
+    a reader that loaded from the DB before the bump cannot put its (possibly stale)
+    snapshot back afterwards, and entries loaded under an older generation -- in this
+    worker or any other -- are dropped at their next lookup, fleets included.
+    """
+
+    namespace = "profiles"
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_SIZE, ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS,
+                 max_fleets: int = FLEET_CACHE_SIZE, generations=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_fleets = max_fleets
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[float, int, CompiledProfile]]" = OrderedDict()
+        self._fleets: "OrderedDict[int, Tuple[float, int, ProfileSet]]" = OrderedDict()
+        self.fleet_hits = 0
+        self.fleet_misses = 0
+        self._generations = generations or cache_generations
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def generation(self, tenant_id: int) -> int:
+        return self._generations.read(self.namespace, tenant_id)
+
+    def get(self, tenant_id: int, profile_id: str, fuel: Optional[FuelPrices] = None) -> Optional[CompiledProfile]:
+        """A hit is re-resolved in place when `fuel` is a newer snapshot than it was
+        compiled against; fuel=None returns it as cached."""
+        key = (tenant_id, profile_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, generation, compiled = entry
+            if generation != self._generations.read(self.namespace, tenant_id):
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if fuel is not None and compiled.fuel is not fuel:
+                compiled = with_fuel(compiled, fuel)
+                self._entries[key] = (expires_at, generation, compiled)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return compiled
+
+    def put(self, compiled: CompiledProfile, generation: int) -> None:
+        key = (compiled.tenant_id, compiled.profile_id)
+        with self._lock:
+            if self._generations.read(self.namespace, compiled.tenant_id) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, generation, compiled)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_fleet(self, tenant_id: int, fuel: Optional[FuelPrices] = None) -> Optional[ProfileSet]:
+        with self._lock:
+            entry = self._fleets.get(tenant_id)
+            if entry is None or entry[0] < time.monotonic() or entry[1] != self._generations.read(self.namespace, tenant_id):
+                if entry is not None:
+                    del self._fleets[tenant_id]
+                    self.expirations += 1
+                self.fleet_misses += 1
+                return None
+            expires_at, generation, fleet = entry
+            if fuel is not None and fleet.fuel is not fuel:
+                fleet = build_profile_set(tenant_id, list(fleet.profiles), fuel)
+                self._fleets[tenant_id] = (expires_at, generation, fleet)
+            self._fleets.move_to_end(tenant_id)
+            self.fleet_hits += 1
+            return fleet
+
+    def put_fleet(self, fleet: ProfileSet, generation: int) -> None:
+        with self._lock:
+            if self._generations.read(self.namespace, fleet.tenant_id) != generation:
+                return
+            self._fleets[fleet.tenant_id] = (time.monotonic() + self.ttl_seconds, generation, fleet)
+            self._fleets.move_to_end(fleet.tenant_id)
+            while len(self._fleets) > self.max_fleets:
+                self._fleets.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tenant_id: int, profile_id: Optional[str] = None) -> None:
+        self._generations.bump(self.namespace, tenant_id)
+        with self._lock:
+            self._fleets.pop(tenant_id, None)
+            if profile_id is not None:
+                dropped = 1 if self._entries.pop((tenant_id, profile_id), None) else 0
+            else:
+                keys = [k for k in self._entries if k[0] == tenant_id]
+                for k in keys:
+                    del self._entries[k]
+                dropped = len(keys)
+            self.invalidations += dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._fleets.clear()
+            self._generations.bump_all(self.namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "fleets": len(self._fleets),
+                "max_fleets": self.max_fleets,
+                "fleet_hits": self.fleet_hits,
+                "fleet_misses": self.fleet_misses,
+            }
+
+profile_cache = ProfileCache()
+
+def _cached_profiles(tenant_id: int, profile_ids: List[str], fuel: FuelPrices) -> Tuple[Dict[str, CompiledProfile], List[str]]:
+    found: Dict[str, CompiledProfile] = {}
+    missing: List[str] = []
+    for pid in dict.fromkeys(profile_ids):
+        compiled = profile_cache.get(tenant_id, pid, fuel)
+        if compiled is None:
+            missing.append(pid)
+        else:
+            found[pid] = compiled
+    return found, missing
+
+def _profiles_stmt(tenant_id: int, profile_ids: List[str]):
+    return select(CarrierCostProfile).where(
+        CarrierCostProfile.tenant_id == tenant_id,
+        CarrierCostProfile.profile_id.in_(profile_ids),
+    )
+
+def _store_profiles(rows, generation: int, found: Dict[str, CompiledProfile], fuel: FuelPrices) -> Dict[str, CompiledProfile]:
+    for row in rows:
+        compiled = compile_profile(row, fuel)
+        profile_cache.put(compiled, generation)
+        found[compiled.profile_id] = compiled
+    return found
+
+def get_compiled_profiles(db: Session, tenant_id: int, profile_ids: List[str]) -> Dict[str, CompiledProfile]:
+    """Compiled profiles for the given ids; cache misses are loaded in one query."""
+    fuel = get_fuel_prices(db, tenant_id)
+    found, missing = _cached_profiles(tenant_id, profile_ids, fuel)
+    if missing:
+        generation = profile_cache.generation(tenant_id)
+        _store_profiles(db.execute(_profiles_stmt(tenant_id, missing)).scalars(), generation, found, fuel)
+    return found
+
+def get_compiled_profile(db: Session, tenant_id: int, profile_id: str) -> Optional[CompiledProfile]:
+    return get_compiled_profiles(db, tenant_id, [profile_id]).get(profile_id)
+
+def _fleet_stmt(tenant_id: int):
+    return select(CarrierCostProfile).where(CarrierCostProfile.tenant_id == tenant_id).order_by(CarrierCostProfile.profile_id)
+
+def _store_fleet(tenant_id: int, rows, generation: int, fuel: FuelPrices) -> ProfileSet:
+    fleet = build_profile_set(tenant_id, [compile_profile(row, fuel) for row in rows], fuel)
+    profile_cache.put_fleet(fleet, generation)
+    return fleet
+
+def get_profile_set(db: Session, tenant_id: int) -> ProfileSet:
+    """All of a tenant's profiles as one ProfileSet; a miss loads them in one query."""
+    fuel = get_fuel_prices(db, tenant_id)
+    fleet = profile_cache.get_fleet(tenant_id, fuel)
+    if fleet is None:
+        generation = profile_cache.generation(tenant_id)
+        fleet = _store_fleet(tenant_id, db.execute(_fleet_stmt(tenant_id)).scalars(), generation, fuel)
+    return fleet
+
+
+# -----------------------------
+# Lane distances
+# -----------------------------
+# Loads posted without loaded_miles / deadhead_miles get them from a bundled city/state
+# coordinate table (ADA_GEO_TABLE, CSV city,state,lat,lon): great-circle miles times
+# ROAD_CIRCUITY, to a tenth of a mile. The same lanes come up all day, so distances are
+# memoized per unordered city pair; a batch computes its uncached lanes in one numpy pass.
+EARTH_RADIUS_MILES = 3958.8
+
+class UnknownLocation(ValueError):
+    index: int = 0  # which load of the batch, set by fill_miles
+
+def place_key(city: str, state: str) -> Tuple[str, str]:
+    """'St. Louis, mo' and 'Saint Louis, MO' name the same place."""
+    name = " ".join(city.replace(".", " ").casefold().split())
+    if name.startswith("saint "):
+        name = "st " + name[6:]
+    return name, state.strip().upper()
+
+class GeoTable:
+    """City/state -> row in the coordinate arrays (radians), read on first use. Spellings
+    as posted are remembered once resolved, so repeat lookups skip normalizing."""
+
+    max_spellings = 65536
+
+    def __init__(self, path: str = GEO_TABLE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[Tuple[str, str], int]] = None
+        self._spellings: Dict[Tuple[str, str], int] = {}
+        self.lat = self.lon = np.empty(0, dtype=np.float64)
+
+    def _load(self) -> Dict[Tuple[str, str], int]:
+        with self._lock:
+            if self._index is None:
+                with open(self.path, newline="") as f:
+                    rows = list(csv.DictReader(f))
+                self.lat = np.radians(np.array([float(r["lat"]) for r in rows], dtype=np.float64))
+                self.lon = np.radians(np.array([float(r["lon"]) for r in rows], dtype=np.float64))
+                self._index = {place_key(r["city"], r["state"]): i for i, r in enumerate(rows)}
+            return self._index
+
+    def locate(self, city: str, state: str) -> int:
+        i = self._spellings.get((city, state))
+        if i is not None:
+            return i
+        index = self._index if self._index is not None else self._load()
+        i = index.get(place_key(city, state))
+        if i is None:
+            raise UnknownLocation(f"Unknown location: {city}, {state}")
+        if len(self._spellings) < self.max_spellings:
+            self._spellings[(city, state)] = i
+        return i
+
+    def __len__(self) -> int:
+        return len(self._index if self._index is not None else self._load())
+
+def great_circle_miles(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Haversine distance between points given in radians."""
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class LaneDistanceCache:
+    """LRU of road miles per unordered (place, place) pair."""
+
+    def __init__(self, geo: GeoTable, max_size: int = LANE_CACHE_SIZE, circuity: float = ROAD_CIRCUITY):
+        self.geo = geo
+        self.max_size = max_size
+        self.circuity = circuity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def miles(self, lanes: List[Tuple[str, str, str, str]]) -> List[float]:
+        """Road miles for each (from_city, from_state, to_city, to_state)."""
+        keys = []
+        for i, (from_city, from_state, to_city, to_state) in enumerate(lanes):
+            try:
+                a, b = self.geo.locate(from_city, from_state), self.geo.locate(to_city, to_state)
+            except UnknownLocation as e:
+                e.index = i
+                raise
+            keys.append((a, b) if a <= b else (b, a))
+
+        out: List[Optional[float]] = [None] * len(keys)
+        missing: Dict[Tuple[int, int], List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                miles = self._entries.get(key)
+                if miles is None:
+                    missing.setdefault(key, []).append(i)
+                    continue
+                self._entries.move_to_end(key)
+                out[i] = miles
+            self.hits += len(keys) - sum(len(idxs) for idxs in missing.values())
+            self.misses += len(missing)
+        if not missing:
+            return out
+
+        a = np.fromiter((k[0] for k in missing), dtype=np.intp, count=len(missing))
+        b = np.fromiter((k[1] for k in missing), dtype=np.intp, count=len(missing))
+        lat, lon = self.geo.lat, self.geo.lon
+        computed = np.round(great_circle_miles(lat[a], lon[a], lat[b], lon[b]) * self.circuity, 1).tolist()
+        with self._lock:
+            for (key, idxs), miles in zip(missing.items(), computed):
+                for i in idxs:
+                    out[i] = miles
+                self._entries[key] = miles
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "max_size": self.max_size, "places": len(self.geo),
+                    "circuity": self.circuity, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+geo_table = GeoTable()
+lane_cache = LaneDistanceCache(geo_table)
+
+def fill_miles(reqs: List[dict]) -> None:
+    """Fill in, in place, loaded_miles (origin -> dest) and deadhead_miles (truck_city/state
+    -> origin, 0 when the truck's position is not given) where a load left them out."""
+    lanes: List[Tuple[str, str, str, str]] = []
+    slots: List[Tuple[int, str]] = []
+    for n, r in enumerate(reqs):
+        if r.get("loaded_miles") is None:
+            lanes.append((r["origin_city"], r["origin_state"], r["dest_city"], r["dest_state"]))
+            slots.append((n, "loaded_miles"))
+        if r.get("deadhead_miles") is None:
+            if r.get("truck_city") and r.get("truck_state"):
+                lanes.append((r["truck_city"], r["truck_state"], r["origin_city"], r["origin_state"]))
+                slots.append((n, "deadhead_miles"))
+            else:
+                r["deadhead_miles"] = 0.0
+    if not lanes:
+        return
+    try:
+        miles = lane_cache.miles(lanes)
+    except UnknownLocation as e:
+        e.index = slots[e.index][0]
+        raise
+    for (n, key), value in zip(slots, miles):
+        reqs[n][key] = value
+
+
+# -----------------------------
+# Pricing / recommendation logic
+# -----------------------------
+@dataclass
+class CostBreakdown:
+    fuel_cost: float
+    variable_cost: float
+    fixed_allocated: float
+    total_cost: float
+
+def _fuel_price(profile: ProfileLike, region: str) -> float:
+    prices = profile.fuel_price_by_region or {}
+    return float(prices.get(region, prices.get("National", 3.85)))
+
+def _per_mile_rates(profile: ProfileLike) -> Tuple[float, float]:
+    """(variable cost per mile, fixed cost per mile) for a profile."""
+    if isinstance(profile, CompiledProfile):
+        return profile.var_per_mile, profile.fixed_per_mile
+    var_per_mile = (
+        float(profile.driver_pay_per_mile)
+        + float(profile.maintenance_per_mile)
+        + float(profile.insurance_per_mile)
+        + float(profile.tires_per_mile)
+        + float(profile.permits_tolls_per_mile)
+        + float(profile.other_variable_per_mile)
+    )
+    fixed_per_mile = float(profile.fixed_costs_per_day) / float(profile.target_miles_per_day)
+    return var_per_mile, fixed_per_mile
+
+@dataclass
+class PricingContext:
+    """Everything priced for one (profile, load) pair. Built once per request;
+    the decision, negotiation script and log row all read from it."""
+    total_miles: float
+    var_per_mile: float
+    fixed_per_mile: float
+    fuel_price: float
+    costs: CostBreakdown
+    offered_rpm: float
+    break_even_rpm: float
+    min_rpm: float
+    target_rpm: float
+    revenue: float
+    profit: float
+    margin: float
+
+def pricing_context(profile: ProfileLike, req: dict) -> PricingContext:
+    loaded = float(req["loaded_miles"])
+    total_miles = loaded + float(req.get("deadhead_miles", 0))
+
+    f_price = _fuel_price(profile, req.get("fuel_region", "National"))
+    var_per_mile, fixed_per_mile = _per_mile_rates(profile)
+
+    fuel_cost = (total_miles / float(profile.mpg)) * f_price
+    variable_cost = var_per_mile * total_miles
+    fixed_allocated = fixed_per_mile * total_miles
+    total_cost = fuel_cost + variable_cost + fixed_allocated
+
+    be = total_cost / loaded
+    revenue = float(req["offered_total_rate"])
+    profit = revenue - total_cost
+    return PricingContext(
+        total_miles=total_miles,
+        var_per_mile=var_per_mile,
+        fixed_per_mile=fixed_per_mile,
+        fuel_price=f_price,
+        costs=CostBreakdown(fuel_cost=fuel_cost, variable_cost=variable_cost, fixed_allocated=fixed_allocated, total_cost=total_cost),
+        offered_rpm=revenue / loaded,
+        break_even_rpm=be,
+        min_rpm=be * (1.0 + float(profile.min_margin_percent)),
+        target_rpm=be * (1.0 + float(profile.preferred_margin_percent)),
+        revenue=revenue,
+        profit=profit,
+        margin=profit / revenue if revenue > 0 else 0.0,
+    )
+
+def compute_costs(profile: ProfileLike, req: dict) -> CostBreakdown:
+    return pricing_context(profile, req).costs
+
+def offered_rpm(req: dict) -> float:
+    return float(req["offered_total_rate"]) / float(req["loaded_miles"])
+
+def break_even_rpm(profile: ProfileLike, req: dict) -> float:
+    return pricing_context(profile, req).break_even_rpm
+
+def target_rpm(profile: ProfileLike, req: dict) -> float:
+    return pricing_context(profile, req).target_rpm
+
+def decision_logic(profile: ProfileLike, req: dict, ctx: Optional[PricingContext] = None) -> Tuple[str, list[str]]:
+    reasons: list[str] = []
+    block = (profile.block_brokers or {}).get(req["broker_name"])
+    if block:
+        reasons.append(f"Broker is blocked: {block}")
+        return "NO-GO", reasons
+
+    dead = float(req.get("deadhead_miles", 0))
+    if dead > float(profile.max_deadhead_miles):
+        reasons.append(f"Deadhead {dead:.0f}mi exceeds soft cap {profile.max_deadhead_miles:.0f}mi (review)")
+
+    if ctx is None:
+        ctx = pricing_context(profile, req)
+    be = ctx.break_even_rpm
+    off = ctx.offered_rpm
+    min_rpm = ctx.min_rpm
+
+    if off >= min_rpm and dead <= float(profile.max_deadhead_miles):
+        reasons.append(f"Offered RPM ${off:.2f} meets minimum ${min_rpm:.2f}")
+        return "GO", reasons
+
+    if off < be:
+        reasons.append(f"Offered RPM ${off:.2f} is below break-even ${be:.2f}")
+        return "NO-GO", reasons
+
+    reasons.append(f"Offered RPM ${off:.2f} is between break-even ${be:.2f} and minimum ${min_rpm:.2f}")
+    return "REVIEW", reasons
+
+def negotiation_script(req: dict, be_rpm_value: float, tgt_rpm_value: float, off_rpm_value: Optional[float] = None) -> str:
+    """The built-in script for a request dict; request paths render the tenant's
+    template from script_inputs() instead."""
+    off_r = offered_rpm(req) if off_rpm_value is None else off_rpm_value
+    return DEFAULT_SCRIPT.render(ScriptValues(req, offered_rpm=off_r, break_even_rpm=be_rpm_value, target_rpm=tgt_rpm_value))
+
+
+# -----------------------------
+# Negotiation script templates
+# -----------------------------
+# Scripts are str.format templates over the fields of a recommendation log row, checked
+# and compiled once per (tenant, template_id, version). A log row stores only the
+# template id + version; its text is re-rendered from the row's own columns on read.
+SCRIPT_FIELDS: Dict[str, type] = {
+    "profile_id": str, "broker_name": str, "equipment_type": str, "fuel_region": str, "decision": str,
+    "origin_city": str, "origin_state": str, "dest_city": str, "dest_state": str,
+    "loaded_miles": float, "deadhead_miles": float, "offered_total_rate": float,
+    "offered_rpm": float, "break_even_rpm": float, "target_rpm": float, "target_total_rate": float,
+    "projected_profit": float, "projected_margin_percent": float,
+}
+_SCRIPT_SAMPLE = {name: ("text" if kind is str else 1234.5) for name, kind in SCRIPT_FIELDS.items()}
+
+class ScriptValues(dict):
+    """Template inputs: a log row (or request dict) plus fields derived from it."""
+    def __missing__(self, key):
+        if key == "target_total_rate":
+            return self["target_rpm"] * float(self["loaded_miles"])
+        if key == "deadhead_miles":
+            return 0.0
+        raise KeyError(key)
+
+def script_inputs(req: dict, decision: str, off: float, be: float, tgt: float, profit: float, margin: float,
+                  profile_id: Optional[str] = None) -> ScriptValues:
+    """SCRIPT_FIELDS for one priced load: exactly the values its log row stores."""
+    return ScriptValues(
+        profile_id=profile_id or req["profile_id"],
+        broker_name=req["broker_name"],
+        origin_city=req["origin_city"],
+        origin_state=req["origin_state"],
+        dest_city=req["dest_city"],
+        dest_state=req["dest_state"],
+        equipment_type=req["equipment_type"],
+        loaded_miles=req["loaded_miles"],
+        deadhead_miles=req["deadhead_miles"],
+        offered_total_rate=req["offered_total_rate"],
+        fuel_region=req["fuel_region"],
+        decision=decision,
+        offered_rpm=off,
+        break_even_rpm=be,
+        target_rpm=tgt,
+        projected_profit=profit,
+        projected_margin_percent=margin,
+    )
+
+class ScriptTemplateError(ValueError):
+    pass
+
+# The standard format-spec grammar, [[fill]align][sign][z][#][0][width][grouping][.precision][type];
+# anything else (and any width or precision over SCRIPT_SPEC_MAX_WIDTH) is refused at compile.
+_SCRIPT_SPEC = re.compile(r"(?:.?[<>=^])?[-+ ]?z?#?0?(?P<width>\d*)[,_]?(?:\.(?P<precision>\d+))?[bcdeEfFgGnosxX%]?", re.S)
+
+def _check_script_spec(field: str, spec: str) -> None:
+    m = _SCRIPT_SPEC.fullmatch(spec)
+    if m is None:
+        raise ScriptTemplateError(f"Invalid format spec in {{{field}:{spec}}}")
+    for part in ("width", "precision"):
+        if int(m[part] or 0) > SCRIPT_SPEC_MAX_WIDTH:
+            raise ScriptTemplateError(f"{part.title()} in {{{field}:{spec}}} is over {SCRIPT_SPEC_MAX_WIDTH}")
+
+@dataclass(frozen=True, slots=True)
+class CompiledScript:
+    template_id: str
+    version: int
+    body: str
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        return self.body.format_map(values if isinstance(values, ScriptValues) else ScriptValues(values))
+
+def compile_script(template_id: str, version: int, body: str) -> CompiledScript:
+    """Validate a template body: plain {field} / {field:spec} references to SCRIPT_FIELDS
+    only (no attribute or index access, no nested fields), and standard specs with width
+    and precision capped at SCRIPT_SPEC_MAX_WIDTH that format."""
+    if len(body) > SCRIPT_TEMPLATE_MAX_CHARS:
+        raise ScriptTemplateError(f"Template is longer than {SCRIPT_TEMPLATE_MAX_CHARS} characters")
+    try:
+        parts = list(string.Formatter().parse(body))
+    except ValueError as e:
+        raise ScriptTemplateError(f"Invalid template: {e}")
+    for _, field, spec, conversion in parts:
+        if field is None:
+            continue
+        if field not in SCRIPT_FIELDS:
+            raise ScriptTemplateError(f"Unknown field {{{field}}}; allowed: {', '.join(sorted(SCRIPT_FIELDS))}")
+        if conversion is not None or "{" in (spec or ""):
+            raise ScriptTemplateError(f"Unsupported conversion or nested field in {{{field}}}")
+        _check_script_spec(field, spec or "")
+    compiled = CompiledScript(template_id, version, body)
+    try:
+        compiled.render(_SCRIPT_SAMPLE)
+    except (ValueError, TypeError) as e:
+        raise ScriptTemplateError(f"Invalid format spec: {e}")
+    return compiled
+
+# Built-in templates are never stored and their ids are reserved. "default" v1 renders
+# exactly the script ADA has always produced.
+BUILTIN_SCRIPTS: Dict[Tuple[str, int], CompiledScript] = {
+    ("default", 1): compile_script("default", 1, (
+        "Hi — thanks for sending this over. For {origin_city}, {origin_state} → "
+        "{dest_city}, {dest_state} ({loaded_miles:.0f} loaded mi, {deadhead_miles:.0f} deadhead), "
+        "we’re currently at ${offered_rpm:.2f}/mi (${offered_total_rate:,.0f} total). "
+        "Given operating costs and deadhead, we need ${break_even_rpm:.2f}/mi to break even. "
+        "If you can do ${target_rpm:.2f}/mi (${target_total_rate:,.0f} total), we can confirm and roll now. "
+        "Can you check with your customer and get me as close as possible?"
+    )),
+}
+BUILTIN_SCRIPT_IDS = frozenset(tid for tid, _ in BUILTIN_SCRIPTS)
+DEFAULT_SCRIPT = BUILTIN_SCRIPTS[("default", 1)]
+
+class ScriptTemplateCache:
+    """Compiled templates by (tenant_id, template_id, version) -- immutable, so a plain
+    LRU -- plus each tenant's active template, which writers drop with invalidate().
+    Active entries carry the same TTL and cross-worker generation guard as ProfileCache."""
+
+    namespace = "scripts"
+
+    def __init__(self, max_entries: int = SCRIPT_TEMPLATE_CACHE_SIZE, ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS,
+                 generations=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._versions: "OrderedDict[Tuple[int, str, int], CompiledScript]" = OrderedDict()
+        self._active: Dict[int, Tuple[float, int, CompiledScript]] = {}
+        self._generations = generations or cache_generations
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, tenant_id: int) -> int:
+        return self._generations.read(self.namespace, tenant_id)
+
+    def get(self, tenant_id: int, template_id: str, version: int) -> Optional[CompiledScript]:
+        builtin = BUILTIN_SCRIPTS.get((template_id, version))
+        if builtin is not None:
+            return builtin
+        key = (tenant_id, template_id, version)
+        with self._lock:
+            compiled = self._versions.get(key)
+            if compiled is None:
+                self.misses += 1
+                return None
+            self._versions.move_to_end(key)
+            self.hits += 1
+            return compiled
+
+    def put(self, tenant_id: int, compiled: CompiledScript) -> None:
+        with self._lock:
+            self._versions[(tenant_id, compiled.template_id, compiled.version)] = compiled
+            while len(self._versions) > self.max_entries:
+                self._versions.popitem(last=False)
+
+    def active(self, tenant_id: int) -> Optional[CompiledScript]:
+        with self._lock:
+            entry = self._active.get(tenant_id)
+            if entry is None or entry[0] < time.monotonic() or entry[1] != self._generations.read(self.namespace, tenant_id):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[2]
+
+    def put_active(self, tenant_id: int, compiled: CompiledScript, generation: int) -> None:
+        with self._lock:
+            if self._generations.read(self.namespace, tenant_id) != generation:
+                return
+            self._active[tenant_id] = (time.monotonic() + self.ttl_seconds, generation, compiled)
+
+    def invalidate(self, tenant_id: int) -> None:
+        self._generations.bump(self.namespace, tenant_id)
+        with self._lock:
+            self._active.pop(tenant_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+            self._active.clear()
+            self._generations.bump_all(self.namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "versions": len(self._versions),
+                "max_entries": self.max_entries,
+                "active": len(self._active),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+script_cache = ScriptTemplateCache()
+
+def _active_script_stmt(tenant_id: int):
+    """Latest version of the tenant's selected template; no row means the built-in."""
+    return (
+        select(ScriptTemplate)
+        .join(Tenant, and_(Tenant.id == ScriptTemplate.tenant_id, Tenant.script_template_id == ScriptTemplate.template_id))
+        .where(ScriptTemplate.tenant_id == tenant_id)
+        .order_by(ScriptTemplate.version.desc())
+        .limit(1)
+    )
+
+def _store_active_script(tenant_id: int, row: Optional[ScriptTemplate], generation: int) -> CompiledScript:
+    compiled = DEFAULT_SCRIPT if row is None else compile_script(row.template_id, row.version, row.body)
+    script_cache.put_active(tenant_id, compiled, generation)
+    return compiled
+
+def get_active_script(db: Session, tenant_id: int) -> CompiledScript:
+    compiled = script_cache.active(tenant_id)
+    if compiled is None:
+        generation = script_cache.generation(tenant_id)
+        compiled = _store_active_script(tenant_id, db.execute(_active_script_stmt(tenant_id)).scalars().first(), generation)
+    return compiled
+
+def get_script_version(conn: Union[Session, Any], tenant_id: int, template_id: str, version: int) -> Optional[CompiledScript]:
+    """A specific template version (built-in or the tenant's), compiled once. conn may
+    be a Session or a Connection."""
+    compiled = script_cache.get(tenant_id, template_id, version)
+    if compiled is None:
+        row = conn.execute(select(ScriptTemplate.body).where(
+            ScriptTemplate.tenant_id == tenant_id,
+            ScriptTemplate.template_id == template_id,
+            ScriptTemplate.version == version,
+        )).first()
+        if row is None:
+            return None
+        compiled = compile_script(template_id, version, row.body)
+        script_cache.put(tenant_id, compiled)
+    return compiled
+
+def render_log_script(conn: Union[Session, Any], tenant_id: int, row: Mapping[str, Any]) -> str:
+    """negotiation_script for a stored log row: legacy rows carry their text, templated
+    rows are re-rendered from their own columns."""
+    if row["script_template_id"] is None:
+        return row["negotiation_script"]
+    compiled = get_script_version(conn, tenant_id, row["script_template_id"], row["script_template_version"])
+    return compiled.render(row) if compiled is not None else row["negotiation_script"]
+
+
+# -----------------------------
+# Batch (vectorized) pricing
+# -----------------------------
+# Same math as compute_costs / break_even_rpm / target_rpm / decision_logic, evaluated
+# column-wise over every load priced against one profile. Operation order mirrors the
+# scalar path so both produce identical floats.
+@dataclass
+class BatchPricing:
+    total_miles: np.ndarray
+    fuel_cost: np.ndarray
+    variable_cost: np.ndarray
+    fixed_allocated: np.ndarray
+    total_cost: np.ndarray
+    offered_rpm: np.ndarray
+    break_even_rpm: np.ndarray
+    min_rpm: np.ndarray
+    target_rpm: np.ndarray
+    revenue: np.ndarray
+    profit: np.ndarray
+    margin: np.ndarray
+    over_deadhead: np.ndarray
+    decision: np.ndarray
+    blocked: list[Optional[str]]
+
+def price_batch(profile: ProfileLike, reqs: list[dict]) -> BatchPricing:
+    n = len(reqs)
+    loaded = np.fromiter((float(r["loaded_miles"]) for r in reqs), dtype=np.float64, count=n)
+    dead = np.fromiter((float(r.get("deadhead_miles", 0)) for r in reqs), dtype=np.float64, count=n)
+    rate = np.fromiter((float(r["offered_total_rate"]) for r in reqs), dtype=np.float64, count=n)
+
+    region_prices: Dict[str, float] = {}
+    for r in reqs:
+        region = r.get("fuel_region", "National")
+        if region not in region_prices:
+            region_prices[region] = _fuel_price(profile, region)
+    f_price = np.fromiter((region_prices[r.get("fuel_region", "National")] for r in reqs), dtype=np.float64, count=n)
+
+    blocks = profile.block_brokers or {}
+    blocked = [blocks.get(r["broker_name"]) or None for r in reqs]
+
+    var_per_mile, fixed_per_mile = _per_mile_rates(profile)
+
+    total_miles = loaded + dead
+    fuel_cost = (total_miles / float(profile.mpg)) * f_price
+    variable_cost = var_per_mile * total_miles
+    fixed_allocated = fixed_per_mile * total_miles
+    total_cost = fuel_cost + variable_cost + fixed_allocated
+
+    off = rate / loaded
+    be = total_cost / loaded
+    min_rpm = be * (1.0 + float(profile.min_margin_percent))
+    tgt = be * (1.0 + float(profile.preferred_margin_percent))
+
+    profit = rate - total_cost
+    margin = np.divide(profit, rate, out=np.zeros(n), where=rate > 0)
+
+    over_deadhead = dead > float(profile.max_deadhead_miles)
+    decision = np.where(
+        (off >= min_rpm) & ~over_deadhead, "GO",
+        np.where(off < be, "NO-GO", "REVIEW"),
+    ).astype(object)
+    is_blocked = np.fromiter((b is not None for b in blocked), dtype=bool, count=n)
+    decision[is_blocked] = "NO-GO"
+
+    return BatchPricing(
+        total_miles=total_miles,
+        fuel_cost=fuel_cost,
+        variable_cost=variable_cost,
+        fixed_allocated=fixed_allocated,
+        total_cost=total_cost,
+        offered_rpm=off,
+        break_even_rpm=be,
+        min_rpm=min_rpm,
+        target_rpm=tgt,
+        revenue=rate,
+        profit=profit,
+        margin=margin,
+        over_deadhead=over_deadhead,
+        decision=decision,
+        blocked=blocked,
+    )
+
+def batch_reasons(profile: ProfileLike, req: dict, pricing: BatchPricing, i: int) -> list[str]:
+    """Reason strings for row i, worded exactly like decision_logic."""
+    if pricing.blocked[i] is not None:
+        return [f"Broker is blocked: {pricing.blocked[i]}"]
+
+    reasons: list[str] = []
+    if pricing.over_deadhead[i]:
+        dead = float(req.get("deadhead_miles", 0))
+        reasons.append(f"Deadhead {dead:.0f}mi exceeds soft cap {profile.max_deadhead_miles:.0f}mi (review)")
+
+    off = float(pricing.offered_rpm[i])
+    be = float(pricing.break_even_rpm[i])
+    min_rpm = float(pricing.min_rpm[i])
+    decision = pricing.decision[i]
+    if decision == "GO":
+        reasons.append(f"Offered RPM ${off:.2f} meets minimum ${min_rpm:.2f}")
+    elif decision == "NO-GO":
+        reasons.append(f"Offered RPM ${off:.2f} is below break-even ${be:.2f}")
+    else:
+        reasons.append(f"Offered RPM ${off:.2f} is between break-even ${be:.2f} and minimum ${min_rpm:.2f}")
+    return reasons
+
+def price_fleet(fleet: ProfileSet, req: dict) -> BatchPricing:
+    """One load against every profile in a ProfileSet: the price_batch math with the
+    load held fixed and the profile attributes as the columns. Row i is fleet.profiles[i]."""
+    n = len(fleet)
+    loaded = float(req["loaded_miles"])
+    dead = float(req.get("deadhead_miles", 0))
+    rate = float(req["offered_total_rate"])
+    f_price = fleet.fuel_prices(req.get("fuel_region", "National"))
+    blocked = fleet.blocked(req["broker_name"])
+
+    total_miles = loaded + dead
+    fuel_cost = (total_miles / fleet.mpg) * f_price
+    variable_cost = fleet.var_per_mile * total_miles
+    fixed_allocated = fleet.fixed_per_mile * total_miles
+    total_cost = fuel_cost + variable_cost + fixed_allocated
+
+    off = np.full(n, rate / loaded)
+    be = total_cost / loaded
+    min_rpm = be * (1.0 + fleet.min_margin_percent)
+    tgt = be * (1.0 + fleet.preferred_margin_percent)
+
+    profit = rate - total_cost
+    margin = profit / rate if rate > 0 else np.zeros(n)
+
+    over_deadhead = dead > fleet.max_deadhead_miles
+    decision = np.where(
+        (off >= min_rpm) & ~over_deadhead, "GO",
+        np.where(off < be, "NO-GO", "REVIEW"),
+    ).astype(object)
+    for i, reason in fleet.blocked_by_broker.get(req["broker_name"], ()):
+        decision[i] = "NO-GO"
+
+    return BatchPricing(
+        total_miles=np.full(n, total_miles),
+        fuel_cost=fuel_cost,
+        variable_cost=variable_cost,
+        fixed_allocated=fixed_allocated,
+        total_cost=total_cost,
+        offered_rpm=off,
+        break_even_rpm=be,
+        min_rpm=min_rpm,
+        target_rpm=tgt,
+        revenue=np.full(n, rate),
+        profit=profit,
+        margin=margin,
+        over_deadhead=over_deadhead,
+        decision=decision,
+        blocked=blocked,
+    )
+
+
+# -----------------------------
+# What-if sweep
+# -----------------------------
+# One load priced over a fuel-region x deadhead x rate grid. Costs only depend on
+# (region, deadhead), so they're computed on that plane and broadcast across rates;
+# operation order again mirrors pricing_context so every cell matches /recommend.
+DECISIONS = ("NO-GO", "REVIEW", "GO")
+
+@dataclass
+class SweepGrid:
+    rates: np.ndarray           # (R,)
+    deadhead_miles: np.ndarray  # (D,)
+    fuel_regions: List[str]     # (F,)
+    total_cost: np.ndarray      # (F, D)
+    break_even_rpm: np.ndarray  # (F, D)
+    min_rpm: np.ndarray         # (F, D)
+    target_rpm: np.ndarray      # (F, D)
+    over_deadhead: np.ndarray   # (D,)
+    decision: np.ndarray        # (F, D, R) index into DECISIONS
+    profit: np.ndarray          # (F, D, R)
+    margin: np.ndarray          # (F, D, R)
+    blocked: Optional[str]
+
+def price_sweep(profile: ProfileLike, req: dict, rates: np.ndarray, deadheads: np.ndarray, regions: List[str]) -> SweepGrid:
+    loaded = float(req["loaded_miles"])
+    rates = np.asarray(rates, dtype=np.float64)
+    dead = np.asarray(deadheads, dtype=np.float64)
+    f_price = np.array([_fuel_price(profile, region) for region in regions], dtype=np.float64)[:, None]
+    var_per_mile, fixed_per_mile = _per_mile_rates(profile)
+
+    total_miles = loaded + dead
+    fuel_cost = (total_miles / float(profile.mpg)) * f_price
+    variable_cost = var_per_mile * total_miles
+    fixed_allocated = fixed_per_mile * total_miles
+    total_cost = fuel_cost + variable_cost + fixed_allocated
+
+    be = total_cost / loaded
+    min_rpm = be * (1.0 + float(profile.min_margin_percent))
+    tgt = be * (1.0 + float(profile.preferred_margin_percent))
+
+    off = rates / loaded
+    profit = rates - total_cost[..., None]
+    margin = np.divide(profit, rates, out=np.zeros(profit.shape), where=rates > 0)
+
+    over_deadhead = dead > float(profile.max_deadhead_miles)
+    decision = np.where(off < be[..., None], 0, 1).astype(np.int8)
+    decision[(off >= min_rpm[..., None]) & ~over_deadhead[:, None]] = 2
+
+    blocked = (profile.block_brokers or {}).get(req["broker_name"]) or None
+    if blocked is not None:
+        decision[...] = 0
+
+    return SweepGrid(
+        rates=rates,
+        deadhead_miles=dead,
+        fuel_regions=list(regions),
+        total_cost=total_cost,
+        break_even_rpm=be,
+        min_rpm=min_rpm,
+        target_rpm=tgt,
+        over_deadhead=over_deadhead,
+        decision=decision,
+        profit=profit,
+        margin=margin,
+        blocked=blocked,
+    )
+
+def min_rate_for_rpm(rpm: np.ndarray, loaded: float) -> np.ndarray:
+    """Smallest float total rate r with r / loaded >= rpm, elementwise -- the exact
+    point where the decision comparisons flip, not just the nearest grid step."""
+    r = rpm * loaded
+    for _ in range(8):
+        short = r / loaded < rpm
+        if not short.any():
+            break
+        r = np.where(short, np.nextafter(r, np.inf), r)
+    for _ in range(8):
+        prev = np.nextafter(r, -np.inf)
+        enough = prev / loaded >= rpm
+        if not enough.any():
+            break
+        r = np.where(enough, prev, r)
+    return r
+
+def sweep_breakpoints(req: dict, grid: SweepGrid) -> List[List[List[Tuple[float, str, str]]]]:
+    """[region][deadhead] -> [(rate, from, to), ...] in ascending rate order."""
+    shape = grid.break_even_rpm.shape
+    if grid.blocked is not None:
+        return [[[] for _ in range(shape[1])] for _ in range(shape[0])]
+
+    loaded = float(req["loaded_miles"])
+    review_at = min_rate_for_rpm(grid.break_even_rpm, loaded).tolist()
+    go_at = min_rate_for_rpm(grid.min_rpm, loaded).tolist()
+    over = grid.over_deadhead.tolist()
+
+    out = []
+    for f in range(shape[0]):
+        row = []
+        for d in range(shape[1]):
+            review, go = review_at[f][d], go_at[f][d]
+            if over[d]:
+                flips = [(review, "NO-GO", "REVIEW")]
+            elif go <= review:
+                flips = [(go, "NO-GO", "GO")]
+            else:
+                flips = [(review, "NO-GO", "REVIEW"), (go, "REVIEW", "GO")]
+            row.append(flips)
+        out.append(row)
+    return out
+
+
+# -----------------------------
+# Recommendation log writer
+# -----------------------------
+class LogDictionary:
+    """Interned ids for the log dimension tables: per table, an LRU of value -> id.
+
+    A value the cache knows costs a dict lookup; the rest are looked up together, the
+    ones still missing inserted with ON CONFLICT DO NOTHING and looked up again, all in
+    the caller's transaction. Ids resolved inside a transaction are parked on the
+    connection and only cached once it commits, so a rollback never leaves an id in the
+    cache whose row does not exist."""
+
+    _PENDING = "ada_log_dictionary_pending"
+    _LOOKUP_CHUNK = 400  # values per IN (...) list
+
+    def __init__(self, max_size: int = LOG_DICT_CACHE_SIZE):
+        self.max_size = max_size  # per table
+        self._lock = threading.Lock()
+        self._dims = [(d.fk, d.model.__tablename__, itemgetter(*d.fields)) for d in LOG_DIMENSIONS]
+        self._columns = {d.model.__tablename__: d.columns for d in LOG_DIMENSIONS}
+        # per table: value (a str, or a tuple for two-column tables) -> id
+        self._ids: Dict[str, "OrderedDict[Any, int]"] = {name: OrderedDict() for name in self._columns}
+        self.hits = 0
+        self.misses = 0
+        self.inserted = 0
+
+    def install(self, bind) -> None:
+        event.listen(bind, "commit", self._on_commit)
+        for name in ("rollback", "rollback_savepoint"):
+            event.listen(bind, name, self._on_rollback)
+        event.listen(bind, "checkin", lambda dbapi_conn, record: record.info.pop(self._PENDING, None))
+
+    def _on_commit(self, conn) -> None:
+        pending = conn.info.pop(self._PENDING, None)
+        if pending:
+            with self._lock:
+                for (name, value), id_ in pending.items():
+                    cached = self._ids[name]
+                    cached[value] = id_
+                    if len(cached) > self.max_size:
+                        cached.popitem(last=False)
+
+    def _on_rollback(self, conn, *args) -> None:
+        conn.info.pop(self._PENDING, None)
+
+    def encode(self, conn: Union[Session, Any], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """recommendation_logs insert parameters for logical log rows (all with the same keys,
+        as executemany needs anyway)."""
+        if not rows:
+            return []
+        # column at a time: the per-row work is C-level map/zip over values the rows already hold
+        values = [list(map(get, rows)) for _, _, get in self._dims]
+        ids: Dict[str, Dict[Any, int]] = {name: {} for name in self._ids}
+        wanted = set()
+        with self._lock:
+            for (_, name, _), column in zip(self._dims, values):
+                cached, resolved = self._ids[name], ids[name]
+                for value in set(column):
+                    if value in resolved:
+                        continue
+                    found = cached.get(value)
+                    if found is None:
+                        wanted.add((name, value))
+                    else:
+                        cached.move_to_end(value)
+                        resolved[value] = found
+            self.hits += len(rows) * len(self._dims) - len(wanted)
+            self.misses += len(wanted)
+        if wanted:
+            for (name, value), id_ in self._resolve(conn, wanted).items():
+                ids[name][value] = id_
+        fk_ids = zip(*(map(ids[name].__getitem__, column) for (_, name, _), column in zip(self._dims, values)))
+        plain = [k for k in rows[0] if k not in LOG_DIMENSION_FIELDS]
+        take, fks = itemgetter(*plain), [fk for fk, _, _ in self._dims]
+        out = []
+        for row, row_ids in zip(rows, fk_ids):
+            params = dict(zip(plain, take(row)))
+            params.update(zip(fks, row_ids))
+            out.append(params)
+        return out
+
+    def _resolve(self, conn: Union[Session, Any], wanted: set) -> Dict[Tuple[str, Any], int]:
+        raw = conn.connection() if isinstance(conn, Session) else conn
+        pending = raw.info.setdefault(self._PENDING, {})
+        ids = {key: pending[key] for key in wanted if key in pending}
+        by_table: Dict[str, List[Any]] = {}
+        for name, value in wanted - ids.keys():
+            by_table.setdefault(name, []).append(value)
+        dialect = raw.dialect.name
+        for name, values in by_table.items():
+            table, columns = Base.metadata.tables[name], self._columns[name]
+            found = self._lookup(raw, table, columns, values)
+            new = [dict(zip(columns, v if len(columns) > 1 else (v,))) for v in values if v not in found]
+            if new:
+                if dialect in ("sqlite", "postgresql"):
+                    stmt = upsert_insert(dialect)(table)
+                    raw.execute(stmt.on_conflict_do_nothing(index_elements=list(columns)), new)
+                else:
+                    raw.execute(insert(table), new)
+                found.update(self._lookup(raw, table, columns, [v for v in values if v not in found]))
+                with self._lock:
+                    self.inserted += len(new)
+            for value, id_ in found.items():
+                ids[(name, value)] = pending[(name, value)] = id_
+        return ids
+
+    def _lookup(self, conn, table, columns: Tuple[str, ...], values: List[Any]) -> Dict[Any, int]:
+        cols = [table.c[c] for c in columns]
+        out: Dict[Any, int] = {}
+        for start in range(0, len(values), self._LOOKUP_CHUNK):
+            chunk = values[start:start + self._LOOKUP_CHUNK]
+            if len(cols) == 1:
+                for id_, value in conn.execute(select(table.c.id, cols[0]).where(cols[0].in_(chunk))):
+                    out[value] = id_
+            else:
+                for r in conn.execute(select(table.c.id, *cols).where(tuple_(*cols).in_(chunk))):
+                    out[tuple(r[1:])] = r[0]
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            for cached in self._ids.values():
+                cached.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": sum(map(len, self._ids.values())), "max_size": self.max_size, "hits": self.hits,
+                    "misses": self.misses, "inserted": self.inserted, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+log_dictionary = LogDictionary()
+for _engine in (engine, async_engine.sync_engine if async_engine is not None else None):
+    if _engine is not None:
+        log_dictionary.install(_engine)
+
+def write_logs(conn: Union[Session, Any], rows: List[Dict[str, Any]]) -> None:
+    """Insert logical log rows (strings, see LOG_FIELDS) with a single executemany of their
+    dimension-encoded form and fold them into the rollups. The caller owns the transaction."""
+    if rows:
+        conn.execute(insert(RecommendationLog), log_dictionary.encode(conn, rows))
+        apply_rollups(conn, rows)
+
+# ---- Rollups ----
+ROLLUP_DIMENSIONS = ("lane", "broker", "profile", "day")
+ROLLUP_COUNTERS = (
+    "loads", "go_count", "review_count", "nogo_count",
+    "sum_offered_total_rate", "sum_offered_rpm", "sum_break_even_rpm", "sum_projected_profit",
+)
+_DECISION_COUNTER = {"GO": "go_count", "REVIEW": "review_count", "NO-GO": "nogo_count"}
+
+def rollup_keys(row) -> Tuple[Tuple[str, str], ...]:
+    return (
+        ("lane", f"{row['origin_state']}→{row['dest_state']}"),
+        ("broker", row["broker_name"]),
+        ("profile", row["profile_id"]),
+        ("day", row["created_at"].date().isoformat()),
+    )
+
+def aggregate_rollups(rows) -> Dict[Tuple[int, str, str], Dict[str, float]]:
+    deltas: Dict[Tuple[int, str, str], Dict[str, float]] = {}
+    for row in rows:
+        for dimension, key in rollup_keys(row):
+            d = deltas.get((row["tenant_id"], dimension, key))
+            if d is None:
+                d = deltas[(row["tenant_id"], dimension, key)] = dict.fromkeys(ROLLUP_COUNTERS, 0)
+            d["loads"] += 1
+            counter = _DECISION_COUNTER.get(row["decision"])
+            if counter:
+                d[counter] += 1
+            d["sum_offered_total_rate"] += row["offered_total_rate"]
+            d["sum_offered_rpm"] += row["offered_rpm"]
+            d["sum_break_even_rpm"] += row["break_even_rpm"]
+            d["sum_projected_profit"] += row["projected_profit"]
+    return deltas
+
+def apply_rollups(conn: Union[Session, Any], rows) -> None:
+    """Add a batch of log rows to the rollup counters: one upsert per touched key."""
+    deltas = aggregate_rollups(rows)
+    if not deltas:
+        return
+    params = [
+        {"tenant_id": tenant_id, "dimension": dimension, "key": key, **d}
+        for (tenant_id, dimension, key), d in deltas.items()
+    ]
+    table = LogRollup.__table__
+    dialect = conn.get_bind().dialect.name if isinstance(conn, Session) else conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = upsert_insert(dialect)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["tenant_id", "dimension", "key"],
+            set_={c: table.c[c] + stmt.excluded[c] for c in ROLLUP_COUNTERS},
+        )
+        conn.execute(stmt, params)
+        return
+    for p in params:
+        changed = conn.execute(
+            update(table)
+            .where(table.c.tenant_id == p["tenant_id"], table.c.dimension == p["dimension"], table.c.key == p["key"])
+            .values({c: table.c[c] + p[c] for c in ROLLUP_COUNTERS})
+        ).rowcount
+        if not changed:
+            conn.execute(insert(table), p)
+
+def rebuild_rollups(tenant_id: Optional[int] = None, chunk_rows: int = 50000) -> int:
+    """Recompute rollups from the raw logs in id-ordered chunks, then from the archive;
+    returns rows scanned.
+
+    Safe with live traffic on SQLite and PostgreSQL: the old rollups are deleted and the
+    cutoff id read in one transaction that excludes log writers, so every log row is
+    counted either by its own write (id above the cutoff) or by this scan, never both.
+    SQLite gets that from its single write lock, taken by the delete before the cutoff is
+    read. On PostgreSQL, sequence ids are handed out before commit, so the transaction
+    takes a SHARE lock on the log table. That lock conflicts with the ROW EXCLUSIVE lock
+    each log INSERT holds, so in-flight writers commit first and later ones get ids past
+    the cutoff. On other databases, stop log writes while rebuilding. Archival waits
+    until the rebuild is done.
+    """
+    with archive_lock():
+        return _rebuild_rollups(tenant_id, chunk_rows)
+
+def _rebuild_rollups(tenant_id: Optional[int], chunk_rows: int) -> int:
+    L = RecommendationLog
+    with engine.begin() as conn:
+        max_q = select(func.max(L.id))
+        del_q = delete(LogRollup.__table__)
+        if tenant_id is not None:
+            max_q = max_q.where(L.tenant_id == tenant_id)
+            del_q = del_q.where(LogRollup.__table__.c.tenant_id == tenant_id)
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(f"LOCK TABLE {L.__tablename__} IN SHARE MODE"))
+        conn.execute(del_q)
+        max_id = conn.execute(max_q).scalar() or 0
+
+    cols = [LOG_FIELDS[name].label(name) for name in (
+        "id", "tenant_id", "origin_state", "dest_state", "broker_name", "profile_id", "created_at",
+        "decision", "offered_total_rate", "offered_rpm", "break_even_rpm", "projected_profit")]
+    scanned, last_id = 0, 0
+    while last_id < max_id:
+        with engine.begin() as conn:
+            q = select(*cols).select_from(LOG_FROM).where(L.id > last_id, L.id <= max_id)
+            if tenant_id is not None:
+                q = q.where(L.tenant_id == tenant_id)
+            rows = [r._mapping for r in conn.execute(q.order_by(L.id).limit(chunk_rows))]
+            if not rows:
+                break
+            apply_rollups(conn, rows)
+        scanned += len(rows)
+        last_id = rows[-1]["id"]
+
+    with engine.connect() as conn:
+        q = select(*LogArchive.__table__.columns)
+        if tenant_id is not None:
+            q = q.where(LogArchive.tenant_id == tenant_id)
+        entries = conn.execute(q).all()
+    for entry in entries:
+        chunk: List[Dict[str, Any]] = []
+        for r in iter_archive_rows(entry):
+            chunk.append(r._asdict())
+            if len(chunk) >= chunk_rows:
+                with engine.begin() as conn:
+                    apply_rollups(conn, chunk)
+                scanned += len(chunk)
+                chunk = []
+        if chunk:
+            with engine.begin() as conn:
+                apply_rollups(conn, chunk)
+            scanned += len(chunk)
+    return scanned
+
+def case_count(column, value):
+    return case((column == value, 1), else_=0)
+
+def rollup_mismatches(tenant_id: int, tolerance: float = 1e-6) -> List[str]:
+    """Compare the stored rollups with a brute-force GROUP BY over the raw logs plus an
+    aggregation of the tenant's archived rows."""
+    L = RecommendationLog
+    key_exprs = {
+        "lane": LOG_FIELDS["origin_state"] + "→" + LOG_FIELDS["dest_state"],
+        "broker": LOG_FIELDS["broker_name"],
+        "profile": L.profile_id,
+        "day": func.substr(cast(L.created_at, String), 1, 10),
+    }
+    problems: List[str] = []
+    with engine.connect() as conn:
+        archived: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for entry in archive_entries(conn, tenant_id):
+            for (_, dimension, key), d in aggregate_rollups(r._asdict() for r in iter_archive_rows(entry)).items():
+                total = archived.setdefault((dimension, key), dict.fromkeys(ROLLUP_COUNTERS, 0))
+                for c in ROLLUP_COUNTERS:
+                    total[c] += d[c]
+        for dimension, key_expr in key_exprs.items():
+            expected = {
+                r.key: {c: float(getattr(r, c) or 0) for c in ROLLUP_COUNTERS} for r in conn.execute(
+                    select(
+                        key_expr.label("key"),
+                        func.count().label("loads"),
+                        func.sum(case_count(L.decision, "GO")).label("go_count"),
+                        func.sum(case_count(L.decision, "REVIEW")).label("review_count"),
+                        func.sum(case_count(L.decision, "NO-GO")).label("nogo_count"),
+                        func.sum(L.offered_total_rate).label("sum_offered_total_rate"),
+                        func.sum(L.offered_rpm).label("sum_offered_rpm"),
+                        func.sum(L.break_even_rpm).label("sum_break_even_rpm"),
+                        func.sum(L.projected_profit).label("sum_projected_profit"),
+                    ).select_from(LOG_FROM).where(L.tenant_id == tenant_id).group_by(key_expr)
+                )
+            }
+            for (dim, key), d in archived.items():
+                if dim == dimension:
+                    e = expected.setdefault(key, dict.fromkeys(ROLLUP_COUNTERS, 0.0))
+                    for c in ROLLUP_COUNTERS:
+                        e[c] += d[c]
+            R = LogRollup
+            actual = {
+                r.key: r for r in conn.execute(
+                    select(R.key, *(getattr(R, c) for c in ROLLUP_COUNTERS))
+                    .where(R.tenant_id == tenant_id, R.dimension == dimension)
+                )
+            }
+            for key in sorted(set(expected) | set(actual)):
+                e, a = expected.get(key), actual.get(key)
+                if e is None or a is None:
+                    problems.append(f"{dimension}:{key} {'missing from rollups' if e else 'not in logs'}")
+                    continue
+                for c in ROLLUP_COUNTERS:
+                    ev, av = e[c], float(getattr(a, c) or 0)
+                    if abs(ev - av) > tolerance * max(1.0, abs(ev)):
+                        problems.append(f"{dimension}:{key} {c} rollup={av} logs={ev}")
+    return problems
+
+class LogWriter:
+    """Write-behind buffer for RecommendationLog rows.
+
+    Requests enqueue rows and return; a background thread flushes them with
+    executemany inserts whenever LOG_FLUSH_BATCH rows are waiting or every
+    LOG_FLUSH_INTERVAL_MS. The buffer is capped at LOG_QUEUE_MAX rows: once it is
+    full and stays full for one interval, submit() writes the caller's rows inline,
+    which pushes back on producers instead of growing without bound.
+
+    A chunk the database refuses outright (OperationalError: unreachable, locked) goes
+    back to the buffer whole. Any other failure is bisected down to the offending rows,
+    so the rest still land; those rows are retried on later flushes and, after
+    LOG_WRITE_ATTEMPTS failures, appended to LOG_DEAD_LETTER_PATH instead.
+    """
+
+    def __init__(self, batch_size: int = LOG_FLUSH_BATCH, interval_ms: float = LOG_FLUSH_INTERVAL_MS, max_queue: int = LOG_QUEUE_MAX):
+        self.batch_size = max(1, batch_size)
+        self.interval_s = max(0.001, interval_ms / 1000.0)
+        self.max_queue = max(self.batch_size, max_queue)
+        self._buf: deque = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._flushing = 0
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.row_failures = 0
+        self.dead_lettered = 0
+        self._attempts: Dict[int, int] = {}  # id(row) -> failed flushes, for rows back in the buffer
+        self._dead_letter_lock = threading.Lock()
+        self.inline_writes = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="ada-log-writer", daemon=True)
+            self._thread.start()
+
+    def try_submit(self, rows: List[Dict[str, Any]]) -> bool:
+        """Enqueue without ever blocking; False when the buffer has no room."""
+        with self._cond:
+            self._ensure_started()
+            if len(self._buf) + len(rows) > self.max_queue:
+                return False
+            self._buf.extend(rows)
+            self.enqueued += len(rows)
+            self.max_depth = max(self.max_depth, len(self._buf))
+            if len(self._buf) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def submit(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        with self._cond:
+            self._ensure_started()
+            has_room = lambda: len(self._buf) + len(rows) <= self.max_queue
+            if not has_room():
+                self._cond.notify_all()
+                self._cond.wait_for(has_room, timeout=self.interval_s)
+            if has_room():
+                self._buf.extend(rows)
+                self.enqueued += len(rows)
+                self.max_depth = max(self.max_depth, len(self._buf))
+                if len(self._buf) >= self.batch_size:
+                    self._cond.notify_all()
+                return
+            self.inline_writes += len(rows)
+        with engine.begin() as conn:
+            write_logs(conn, rows)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        n = min(self.batch_size, len(self._buf))
+        chunk = [self._buf.popleft() for _ in range(n)]
+        self._flushing += 1
+        return chunk
+
+    def _write(self, chunk: List[Dict[str, Any]]) -> bool:
+        """Flush one chunk; False when the database is unavailable (back off)."""
+        t0 = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                write_logs(conn, chunk)
+            failed = []
+        except OperationalError:
+            logger.warning("log flush of %d rows failed; will retry", len(chunk), exc_info=True)
+            with self._cond:
+                self._buf.extendleft(reversed(chunk))
+                self.flush_failures += 1
+                self._flushing -= 1
+                self._cond.notify_all()
+            return False
+        except Exception:
+            failed = self._bisect(chunk)
+        retry, dead = [], []
+        with self._cond:
+            for row, error in failed:
+                n = self._attempts.get(id(row), 0) + 1
+                if n < LOG_WRITE_ATTEMPTS:
+                    self._attempts[id(row)] = n
+                    retry.append(row)
+                else:
+                    self._attempts.pop(id(row), None)
+                    dead.append((row, error))
+            if self._attempts:
+                retried = {id(row) for row in retry}
+                for row in chunk:
+                    if id(row) not in retried:
+                        self._attempts.pop(id(row), None)
+            self._buf.extendleft(reversed(retry))
+            self.written += len(chunk) - len(failed)
+            self.row_failures += len(failed)
+            self.dead_lettered += len(dead)
+            self.flushes += 1
+            if failed:
+                self.flush_failures += 1
+            self.last_flush_ms = (time.perf_counter() - t0) * 1000
+            self._flushing -= 1
+            self._cond.notify_all()
+        if dead:
+            self._dead_letter(dead)
+        return True
+
+    def _bisect(self, rows: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Exception]]:
+        """Write rows in halves, each its own transaction; returns the rows (with their
+        errors) that fail on their own."""
+        try:
+            with engine.begin() as conn:
+                write_logs(conn, rows)
+            return []
+        except Exception as e:
+            if len(rows) == 1:
+                return [(rows[0], e)]
+        mid = len(rows) // 2
+        return self._bisect(rows[:mid]) + self._bisect(rows[mid:])
+
+    def _dead_letter(self, dead: List[Tuple[Dict[str, Any], Exception]]) -> None:
+        lines = "".join(json.dumps({"row": row, "error": f"{type(e).__name__}: {e}"}, default=str) + "\n" for row, e in dead)
+        logger.error("dropping %d log rows after %d failed writes (dead letter: %s)", len(dead), LOG_WRITE_ATTEMPTS,
+                     LOG_DEAD_LETTER_PATH or "none")
+        try:
+            if LOG_DEAD_LETTER_PATH is None:
+                raise OSError("no dead-letter path")
+            with self._dead_letter_lock, open(LOG_DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError:
+            logger.error("unwritten log rows:\n%s", lines)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._buf) >= self.batch_size or self._stopping, timeout=self.interval_s)
+                if not self._buf:
+                    if self._stopping:
+                        return
+                    continue
+                chunk = self._take()
+            if not self._write(chunk):
+                time.sleep(self.interval_s)  # DB unavailable; back off before retrying
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until everything submitted so far is written (or timeout)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if not self._buf:
+                    # an in-flight write may put failed rows back; keep draining those too
+                    self._cond.wait_for(lambda: self._flushing == 0 or self._buf, timeout=max(0.0, deadline - time.monotonic()))
+                    if not self._buf:
+                        return self._flushing == 0
+                    if time.monotonic() > deadline:
+                        return False
+                    continue
+                chunk = self._take()
+            if not self._write(chunk) and time.monotonic() > deadline:
+                return False
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "enabled": LOG_WRITE_BEHIND,
+                "queue_depth": len(self._buf),
+                "max_queue": self.max_queue,
+                "max_depth_seen": self.max_depth,
+                "batch_size": self.batch_size,
+                "interval_ms": self.interval_s * 1000,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "flushes": self.flushes,
+                "flush_failures": self.flush_failures,
+                "row_failures": self.row_failures,
+                "dead_lettered": self.dead_lettered,
+                "dead_letter_path": LOG_DEAD_LETTER_PATH,
+                "inline_writes": self.inline_writes,
+                "last_flush_ms": self.last_flush_ms,
+            }
+
+log_writer = LogWriter()
+atexit.register(log_writer.stop)
+
+def record_logs(db: Session, rows: List[Dict[str, Any]], durable: bool) -> None:
+    """Persist log rows: committed before returning when durable (or write-behind is
+    off), otherwise handed to the background writer."""
+    if durable or not LOG_WRITE_BEHIND:
+        write_logs(db, rows)
+        db.commit()
+    else:
+        log_writer.submit(rows)
+
+
+# -----------------------------
+# Idempotent recommendations
+# -----------------------------
+# Clients retry /recommend on timeouts and double-clicks. A repeat gets the stored
+# RecommendationOut back without being priced or logged again. With an Idempotency-Key
+# header the key identifies the request (reusing it for a different body is a 422);
+# without one, a hash of the validated load exactly as sent does (scoped by tenant, user
+# and resolved profile), and the stored answer is reused or joined only while the
+# compiled profile and script it was priced with are still the ones in cache. A repeat
+# that arrives while the first is still running waits for it.
+# Entries are per process: with several workers, a retry that lands elsewhere is priced again.
+class IdempotencyConflict(Exception):
+    pass
+
+def request_digest(req_dict: Mapping[str, Any]) -> bytes:
+    """Content hash of a validated load. Strings hash as sent: profile, broker, region and
+    city lookups are case-sensitive, so "Coyote" and "coyote" may price differently."""
+    return hashlib.blake2b(json.dumps(req_dict, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+@dataclass(eq=False)
+class _StoredRecommendation:
+    digest: bytes
+    pins: Optional[Tuple[Any, ...]]  # None: keyed by Idempotency-Key, replayed whatever changed since
+    ttl_seconds: float
+    future: Future
+    expires_at: float = float("inf")  # set once the result is stored
+
+class RecommendationClaim:
+    """RecommendationCache.claim(): `owner` prices the load and calls done() / fail();
+    everyone else gets the owner's result from result() / result_async()."""
+
+    def __init__(self, cache: Optional["RecommendationCache"], key, entry: Optional[_StoredRecommendation], owner: bool):
+        self._cache = cache
+        self._key = key
+        self._entry = entry
+        self.owner = owner
+
+    def done(self, out: Any) -> None:
+        if self._entry is not None:
+            self._cache._finish(self._key, self._entry, out)
+
+    def fail(self, exc: BaseException) -> None:
+        if self._entry is not None:
+            if not isinstance(exc, Exception):  # owner cancelled (client went away): waiters retry
+                exc = HTTPException(status_code=409, detail="An identical request was interrupted, retry")
+            self._cache._abandon(self._key, self._entry, exc)
+
+    @classmethod
+    def unshared(cls) -> "RecommendationClaim":
+        """An owner claim nobody else can join or replay."""
+        return cls(None, None, None, True)
+
+    def wait(self, timeout: float) -> bool:
+        """False if the owner is still running after `timeout` seconds."""
+        return not futures_wait([self._entry.future], timeout).not_done
+
+    def result(self, timeout: float = IDEMPOTENCY_WAIT_SECONDS) -> Any:
+        try:
+            return self._entry.future.result(timeout)
+        except FutureTimeoutError:
+            raise HTTPException(status_code=409, detail="An identical request is still in progress", headers={"Retry-After": "1"})
+
+    async def result_async(self, timeout: float = IDEMPOTENCY_WAIT_SECONDS) -> Any:
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self._entry.future)), timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=409, detail="An identical request is still in progress", headers={"Retry-After": "1"})
+
+class RecommendationCache:
+    """Stored /recommend responses per (tenant, user, Idempotency-Key or load digest), LRU + TTL."""
+
+    def __init__(self, max_entries: int = RECOMMEND_CACHE_SIZE, key_ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+                 dedupe_ttl_seconds: float = RECOMMEND_DEDUPE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.key_ttl_seconds = key_ttl_seconds
+        self.dedupe_ttl_seconds = dedupe_ttl_seconds
+        self._entries: "OrderedDict[tuple, _StoredRecommendation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.replays = 0  # answered from a stored response
+        self.joins = 0    # waited on an identical request in flight
+        self.conflicts = 0
+        self.evictions = 0
+
+    def claim(self, user: Principal, profile_id: str, req_dict: Mapping[str, Any], idempotency_key: Optional[str],
+              pins: Tuple[Any, ...]) -> RecommendationClaim:
+        digest = request_digest(req_dict)
+        if idempotency_key is not None:
+            key, pins, ttl = ("key", user.tenant_id, user.email, idempotency_key), None, self.key_ttl_seconds
+        else:
+            key, ttl = ("body", user.tenant_id, user.email, profile_id, digest), self.dedupe_ttl_seconds
+        if ttl <= 0 or self.max_entries <= 0:
+            return RecommendationClaim(None, key, None, True)
+
+        with self._lock:
+            self.lookups += 1
+            entry = self._entries.get(key)
+            if entry is not None and (
+                (entry.future.done() and entry.expires_at <= time.monotonic())
+                or (entry.pins is not None and any(a is not b for a, b in zip(entry.pins, pins)))
+            ):
+                del self._entries[key]  # an in-flight owner still answers its own caller
+                entry = None
+            if entry is not None:
+                if entry.digest != digest:
+                    self.conflicts += 1
+                    raise IdempotencyConflict
+                self._entries.move_to_end(key)
+                if entry.future.done():
+                    self.replays += 1
+                else:
+                    self.joins += 1
+                return RecommendationClaim(self, key, entry, False)
+
+            entry = self._entries[key] = _StoredRecommendation(digest, pins, ttl, Future())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return RecommendationClaim(self, key, entry, True)
+
+    def _finish(self, key, entry: _StoredRecommendation, out: Any) -> None:
+        with self._lock:
+            entry.expires_at = time.monotonic() + entry.ttl_seconds
+        entry.future.set_result(out)
+
+    def _abandon(self, key, entry: _StoredRecommendation, exc: BaseException) -> None:
+        """Errors are not stored: waiters see this one, the next retry runs again."""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.future.set_exception(exc)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            duplicates = self.replays + self.joins
+            return {"size": len(self._entries), "max_size": self.max_entries, "lookups": self.lookups,
+                    "replays": self.replays, "joins": self.joins, "conflicts": self.conflicts, "evictions": self.evictions,
+                    "duplicate_rate": duplicates / self.lookups if self.lookups else 0.0}
+
+recommendation_cache = RecommendationCache()
+
+
+# -----------------------------
+# Log retention + archive
+# -----------------------------
+# Rows older than a tenant's retention window are moved, oldest first, into one gzip
+# NDJSON file per tenant-month, LOG_ARCHIVE_BATCH_ROWS per transaction: the batch is
+# appended to the month file (fsync'd), then the catalog row is updated and the rows
+# deleted in one commit. An append that never commits is truncated away by the next
+# one, so a crash can neither lose nor duplicate rows. Since rows leave in
+# (created_at, id) order, every archived row sorts before every hot row of its tenant;
+# the log endpoints page through the hot table first and continue into the archive.
+# Rollups are not touched: analytics keep covering the full history. Without fcntl,
+# archivers are only serialized within the process.
+ARCHIVE_COLUMNS = LOG_COLUMNS
+ArchivedLog = namedtuple("ArchivedLog", [c.name for c in ARCHIVE_COLUMNS])
+_archive_thread_lock = threading.Lock()
+
+class ArchiveUnavailable(RuntimeError):
+    pass
+
+def archive_path(rel: str = "") -> str:
+    if not LOG_ARCHIVE_DIR:
+        raise ArchiveUnavailable("Log archival is off: set ADA_LOG_ARCHIVE_DIR to a persistent directory")
+    return os.path.join(LOG_ARCHIVE_DIR, rel)
+
+@contextmanager
+def archive_lock():
+    """Serialize archival (and rollup rebuilds, which read the archive) across threads
+    and, where flock exists, across processes sharing LOG_ARCHIVE_DIR."""
+    with _archive_thread_lock:
+        if not LOG_ARCHIVE_DIR:  # no archive to guard: nothing was ever moved out
+            yield
+            return
+        os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+        with open(os.path.join(LOG_ARCHIVE_DIR, ".lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _encode_archive_rows(rows) -> bytes:
+    names = ArchivedLog._fields
+    lines = (
+        json.dumps({k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in zip(names, row)}, separators=(",", ":"))
+        for row in rows
+    )
+    return gzip.compress(("\n".join(lines) + "\n").encode(), compresslevel=6)
+
+class _CommittedSlice(io.RawIOBase):
+    """The first `size` bytes of a file: the committed part of an archive."""
+
+    def __init__(self, f, size: int):
+        self.f = f
+        self.left = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self.left <= 0:
+            return 0
+        n = self.f.readinto(memoryview(b)[:min(len(b), self.left)]) or 0
+        self.left -= n
+        return n
+
+def iter_archive_rows(entry) -> Iterable[ArchivedLog]:
+    """Rows of one catalog entry in file (archival) order."""
+    with open(archive_path(entry.path), "rb") as f:
+        with gzip.GzipFile(fileobj=io.BufferedReader(_CommittedSlice(f, entry.bytes))) as gz:
+            for line in gz:
+                d = json.loads(line)
+                d["created_at"] = datetime.fromisoformat(d["created_at"])
+                yield ArchivedLog(**d)
+
+class ArchiveReadCache:
+    """Decoded, (created_at, id)-sorted archive months for the read endpoints, LRU-bounded
+    by total rows. Keyed by committed length, so a month that grows is re-read."""
+
+    def __init__(self, max_rows: int = LOG_ARCHIVE_CACHE_ROWS):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[int, str, int], List[ArchivedLog]]" = OrderedDict()
+        self._rows = 0
+        self.hits = 0
+        self.misses = 0
+
+    def rows(self, entry) -> List[ArchivedLog]:
+        key = (entry.tenant_id, entry.month, entry.bytes)
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return rows
+            self.misses += 1
+        rows = sorted(iter_archive_rows(entry), key=lambda r: (r.created_at, r.id))
+        if len(rows) <= self.max_rows:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = rows
+                    self._rows += len(rows)
+                while self._rows > self.max_rows:
+                    _, old = self._entries.popitem(last=False)
+                    self._rows -= len(old)
+        return rows
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"months": len(self._entries), "rows": self._rows, "max_rows": self.max_rows,
+                    "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+archive_cache = ArchiveReadCache()
+
+def archive_entries(conn: Union[Session, Any], tenant_id: int, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None, newest_first: bool = False) -> list:
+    """Catalog rows of the tenant's archive months overlapping [since, until)."""
+    A = LogArchive.__table__.c
+    q = select(*LogArchive.__table__.columns).where(A.tenant_id == tenant_id)
+    if since is not None:
+        q = q.where(A.max_created_at >= since)
+    if until is not None:
+        q = q.where(A.min_created_at < until)
+    return conn.execute(q.order_by(A.month.desc() if newest_first else A.month.asc())).all()
+
+def _append_archive(conn, tenant_id: int, month: str, rows: list) -> None:
+    table = LogArchive.__table__
+    entry = conn.execute(select(table).where(table.c.tenant_id == tenant_id, table.c.month == month)).first()
+    rel = os.path.join(f"tenant-{tenant_id}", f"{month}.ndjson.gz")
+    path = archive_path(rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    committed = entry.bytes if entry is not None else 0
+    blob = _encode_archive_rows(rows)
+    with open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b") as f:
+        f.truncate(committed)  # drop an append whose transaction never committed
+        f.seek(committed)
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    ids = [r.id for r in rows]
+    created = [r.created_at for r in rows]
+    if entry is None:
+        conn.execute(insert(table).values(
+            tenant_id=tenant_id, month=month, path=rel, rows=len(rows), bytes=len(blob),
+            min_id=min(ids), max_id=max(ids), min_created_at=min(created), max_created_at=max(created),
+            updated_at=datetime.utcnow(),
+        ))
+    else:
+        conn.execute(update(table).where(table.c.id == entry.id).values(
+            rows=entry.rows + len(rows), bytes=committed + len(blob),
+            min_id=min(entry.min_id, *ids), max_id=max(entry.max_id, *ids),
+            min_created_at=min(entry.min_created_at, *created), max_created_at=max(entry.max_created_at, *created),
+            updated_at=datetime.utcnow(),
+        ))
+
+def archive_tenant_logs(tenant_id: int, cutoff: datetime, batch_rows: int = LOG_ARCHIVE_BATCH_ROWS,
+                        max_batches: Optional[int] = None) -> int:
+    """Move the tenant's rows created before `cutoff` into the archive; returns rows moved.
+    Raises ArchiveUnavailable when LOG_ARCHIVE_DIR is unset."""
+    archive_path()
+    L = RecommendationLog
+    moved, batches = 0, 0
+    with archive_lock():
+        while max_batches is None or batches < max_batches:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    select(*ARCHIVE_COLUMNS).select_from(LOG_FROM)
+                    .where(L.tenant_id == tenant_id, L.created_at < cutoff)
+                    .order_by(L.created_at, L.id)
+                    .limit(max(1, batch_rows))
+                ).all()
+                if not rows:
+                    break
+                by_month: Dict[str, list] = {}
+                for r in rows:
+                    by_month.setdefault(r.created_at.strftime("%Y-%m"), []).append(r)
+                for month, group in by_month.items():
+                    _append_archive(conn, tenant_id, month, group)
+                ids = [r.id for r in rows]
+                for i in range(0, len(ids), LOG_ARCHIVE_DELETE_CHUNK):
+                    conn.execute(delete(L).where(L.id.in_(ids[i:i + LOG_ARCHIVE_DELETE_CHUNK])))
+            moved += len(rows)
+            batches += 1
+    return moved
+
+def retention_days(tenant_days: Optional[int]) -> int:
+    return LOG_RETENTION_DAYS if tenant_days is None else tenant_days
+
+def archive_logs(tenant_id: Optional[int] = None, now: Optional[datetime] = None,
+                 batch_rows: int = LOG_ARCHIVE_BATCH_ROWS) -> Dict[int, int]:
+    """Apply every tenant's retention policy (or just `tenant_id`'s); returns rows moved per tenant.
+    Raises ArchiveUnavailable when LOG_ARCHIVE_DIR is unset."""
+    archive_path()
+    now = now or datetime.utcnow()
+    q = select(Tenant.id, Tenant.log_retention_days)
+    if tenant_id is not None:
+        q = q.where(Tenant.id == tenant_id)
+    with engine.connect() as conn:
+        policies = conn.execute(q).all()
+    moved: Dict[int, int] = {}
+    for tid, days in policies:
+        days = retention_days(days)
+        if days > 0:
+            n = archive_tenant_logs(tid, now - timedelta(days=days), batch_rows)
+            if n:
+                moved[tid] = n
+    return moved
+
+def archived_logs_page(conn: Union[Session, Any], tenant_id: int, want: int, cursor: Optional[str], profile_id: Optional[str],
+                       broker_name: Optional[str], decision: Optional[str], since: Optional[datetime],
+                       until: Optional[datetime]) -> List[ArchivedLog]:
+    """Up to `want` archived rows, newest first, with the same filters / cursor as _logs_page_stmt."""
+    bound = decode_log_cursor(cursor) if cursor else None
+    upper = until
+    if bound is not None:
+        upper = bound[0] + timedelta(microseconds=1) if until is None else min(until, bound[0] + timedelta(microseconds=1))
+    out: List[ArchivedLog] = []
+    for entry in archive_entries(conn, tenant_id, since, upper, newest_first=True):
+        for r in reversed(archive_cache.rows(entry)):
+            if bound is not None and (r.created_at, r.id) >= bound:
+                continue
+            if ((profile_id is not None and r.profile_id != profile_id) or (broker_name is not None and r.broker_name != broker_name)
+                    or (decision is not None and r.decision != decision)
+                    or (since is not None and r.created_at < since) or (until is not None and r.created_at >= until)):
+                continue
+            out.append(r)
+            if len(out) >= want:
+                return out
+    return out
+
+def find_archived_log(conn: Union[Session, Any], tenant_id: int, log_id: int) -> Optional[ArchivedLog]:
+    A = LogArchive.__table__.c
+    q = select(*LogArchive.__table__.columns).where(A.tenant_id == tenant_id, A.min_id <= log_id, A.max_id >= log_id)
+    for entry in conn.execute(q).all():
+        for r in archive_cache.rows(entry):
+            if r.id == log_id:
+                return r
+    return None
+
+class RetentionWorker:
+    """Runs archive_logs() every LOG_ARCHIVE_INTERVAL_S seconds on a daemon thread."""
+
+    def __init__(self, interval_s: float = LOG_ARCHIVE_INTERVAL_S):
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.archived = 0
+        self.failures = 0
+        self.last_run_ms = 0.0
+
+    def start(self) -> None:
+        if self.interval_s > 0 and (self._thread is None or not self._thread.is_alive()):
+            if not LOG_ARCHIVE_DIR:
+                logger.error("ADA_LOG_ARCHIVE_INTERVAL is set but ADA_LOG_ARCHIVE_DIR is not; background archival is off")
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ada-log-retention", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            t0 = time.perf_counter()
+            try:
+                self.archived += sum(archive_logs().values())
+            except Exception:
+                self.failures += 1
+                logger.exception("log archival run failed; retrying in %.0fs", self.interval_s)
+            self.runs += 1
+            self.last_run_ms = (time.perf_counter() - t0) * 1000
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"interval_s": self.interval_s, "runs": self.runs, "archived": self.archived,
+                "failures": self.failures, "last_run_ms": self.last_run_ms}
+
+retention_worker = RetentionWorker()
+atexit.register(retention_worker.stop)
+
+
+# -----------------------------
+# Load-board ingestion
+# -----------------------------
+# A continuous feed of posted loads (pushed over HTTP, tailed from an NDJSON file or
+# read off a TCP socket) is queued per tenant, de-duplicated by content, priced in
+# chunks against the tenant's ProfileSet and fanned out to subscribers as GO/REVIEW
+# events. Feed evaluations are screening, not recommendations: they write no log rows.
+FEED_IDENTITY_FIELDS = (
+    "profile_id", "origin_city", "origin_state", "dest_city", "dest_state", "equipment_type",
+    "broker_name", "loaded_miles", "deadhead_miles", "offered_total_rate", "fuel_region",
+)
+
+def load_digest(load: dict) -> bytes:
+    """Content hash of a posted load; a repost with the same terms hashes the same."""
+    key = "\x1f".join(str(load.get(k)).strip().lower() for k in FEED_IDENTITY_FIELDS)
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+def price_matrix(fleet: ProfileSet, reqs: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """(decision index into DECISIONS, profit), both shaped (profiles, loads): the
+    price_fleet math broadcast over a chunk of loads."""
+    n = len(reqs)
+    loaded = np.fromiter((float(r["loaded_miles"]) for r in reqs), dtype=np.float64, count=n)
+    dead = np.fromiter((float(r.get("deadhead_miles", 0)) for r in reqs), dtype=np.float64, count=n)
+    rate = np.fromiter((float(r["offered_total_rate"]) for r in reqs), dtype=np.float64, count=n)
+
+    regions = [r.get("fuel_region", "National") for r in reqs]
+    columns = {region: i for i, region in enumerate(dict.fromkeys(regions))}
+    f_price = np.stack([fleet.fuel_prices(region) for region in columns], axis=1)[:, [columns[r] for r in regions]]
+
+    total_miles = loaded + dead
+    fuel_cost = (total_miles / fleet.mpg[:, None]) * f_price
+    variable_cost = fleet.var_per_mile[:, None] * total_miles
+    fixed_allocated = fleet.fixed_per_mile[:, None] * total_miles
+    total_cost = fuel_cost + variable_cost + fixed_allocated
+
+    off = rate / loaded
+    be = total_cost / loaded
+    min_rpm = be * (1.0 + fleet.min_margin_percent[:, None])
+    profit = rate - total_cost
+
+    over_deadhead = dead > fleet.max_deadhead_miles[:, None]
+    decision = np.where(off < be, 0, 1).astype(np.int8)
+    decision[(off >= min_rpm) & ~over_deadhead] = 2
+    for j, r in enumerate(reqs):
+        for i, _ in fleet.blocked_by_broker.get(r["broker_name"], ()):
+            decision[i, j] = 0
+    return decision, profit
+
+def screen_loads(fleet: ProfileSet, reqs: List[dict], rows: List[Optional[int]],
+                 max_cells: int = 1_000_000) -> List[Tuple[int, int, int]]:
+    """(load index, chosen profile row, matching profile count) for each load that is
+    GO or REVIEW on at least one allowed profile. rows[j] pins load j to one profile
+    row (None = any). GO beats REVIEW; ties go to the higher projected profit."""
+    hits: List[Tuple[int, int, int]] = []
+    step = max(1, max_cells // max(1, len(fleet)))
+    for start in range(0, len(reqs), step):
+        part = reqs[start:start + step]
+        decision, profit = price_matrix(fleet, part)
+        for j, row in enumerate(rows[start:start + step]):
+            if row is not None:
+                pinned = decision[row, j]
+                decision[:, j] = 0
+                decision[row, j] = pinned
+        matches = (decision > 0).sum(axis=0)
+        best = np.argmax(np.where(decision > 0, decision * 1e15 + profit, -np.inf), axis=0)
+        for j in np.flatnonzero(matches).tolist():
+            hits.append((start + j, int(best[j]), int(matches[j])))
+    return hits
+
+class IngestPipeline:
+    """Bounded, de-duplicating load-feed evaluator.
+
+    Producers offer() raw items (dicts or NDJSON lines) for a tenant. At most
+    INGEST_QUEUE_MAX loads wait in the queue: a non-blocking offer (the push endpoint)
+    is refused when full, while file and socket sources block, which slows the reader
+    down instead of buffering without bound. One worker thread takes up to
+    INGEST_CHUNK loads at a time, parses and de-duplicates them, screens them with
+    price_matrix, re-checks the winners through decision_logic and hands the GO/REVIEW
+    events to the tenant's subscribers. Subscribers never stall the worker.
+    """
+
+    def __init__(self, chunk_size: int = INGEST_CHUNK, max_queue: int = INGEST_QUEUE_MAX,
+                 dedupe_size: int = INGEST_DEDUPE_SIZE, dedupe_ttl_seconds: float = INGEST_DEDUPE_TTL_SECONDS):
+        self.chunk_size = max(1, chunk_size)
+        self.max_queue = max(self.chunk_size, max_queue)
+        self.dedupe_size = dedupe_size
+        self.dedupe_ttl_seconds = dedupe_ttl_seconds
+        self._buf: deque = deque()  # (tenant_id, items, enqueued wall time)
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._busy = 0
+        self._seen: "OrderedDict[Tuple[int, bytes], float]" = OrderedDict()
+        self._subscribers: Dict[int, Dict[int, Callable[[List[dict]], None]]] = {}
+        self._next_token = 0
+        self._recent: deque = deque()  # (monotonic, loads) per chunk, for the rolling rate
+        self.sources: Dict[str, "IngestSource"] = {}
+        self._next_source = 0
+        self._connections: Dict[int, int] = {}  # open socket connections per tenant
+        self.received = 0
+        self.rejected = 0
+        self.backpressure_waits = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.unknown_profile = 0
+        self.no_profiles = 0
+        self.evaluated = 0
+        self.emitted = {"GO": 0, "REVIEW": 0}
+        self.dropped_events = 0
+        self.failed = 0
+        self.chunks = 0
+        self.max_depth = 0
+        self.last_chunk_ms = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="ada-ingest", daemon=True)
+            self._thread.start()
+
+    def offer(self, tenant_id: int, items: List[Any], block: bool = False, timeout: Optional[float] = None) -> bool:
+        """Queue items for a tenant. Non-blocking offers return False when full; blocking
+        ones wait up to timeout for room."""
+        n = len(items)
+        if not n:
+            return True
+        with self._cond:
+            self._ensure_started()
+            has_room = lambda: self._queued == 0 or self._queued + n <= self.max_queue
+            if not has_room():
+                if not block:
+                    self.rejected += n
+                    return False
+                self.backpressure_waits += 1
+                if not self._cond.wait_for(lambda: has_room() or self._stopping, timeout=timeout) or self._stopping:
+                    return False
+            self._buf.append((tenant_id, items, time.time()))
+            self._queued += n
+            self.received += n
+            self.max_depth = max(self.max_depth, self._queued)
+            self._cond.notify_all()
+            return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._buf or self._stopping)
+                if not self._buf:
+                    return
+                batches, n = [], 0
+                while self._buf and n < self.chunk_size:
+                    batch = self._buf.popleft()
+                    batches.append(batch)
+                    n += len(batch[1])
+                self._queued -= n
+                self._busy += 1
+                self._cond.notify_all()
+            t0 = time.perf_counter()
+            try:
+                self._process(batches)
+            except Exception:
+                logger.exception("ingest chunk of %d loads failed", n)
+                with self._cond:
+                    self.failed += n
+            with self._cond:
+                now = time.monotonic()
+                self._recent.append((now, n))
+                while self._recent and self._recent[0][0] < now - 10.0:
+                    self._recent.popleft()
+                self.chunks += 1
+                self.last_chunk_ms = (time.perf_counter() - t0) * 1000
+                self._busy -= 1
+                self._cond.notify_all()
+
+    def _process(self, batches: List[Tuple[int, List[Any], float]]) -> None:
+        by_tenant: Dict[int, Tuple[List[dict], List[float]]] = {}
+        for tenant_id, items, enqueued_at in batches:
+            loads, stamps = by_tenant.setdefault(tenant_id, ([], []))
+            for item in items:
+                load = self._parse(tenant_id, item)
+                if load is not None:
+                    loads.append(load)
+                    stamps.append(enqueued_at)
+        for tenant_id, (loads, stamps) in by_tenant.items():
+            if loads:
+                self._publish(tenant_id, self._evaluate(tenant_id, loads, stamps))
+
+    def _parse(self, tenant_id: int, item: Any) -> Optional[dict]:
+        try:
+            if isinstance(item, (bytes, str)):
+                item = json.loads(item)
+            load = FeedLoad.model_validate(item).model_dump()
+            fill_miles([load])
+        except ValueError:  # bad JSON, pydantic ValidationError and UnknownLocation alike
+            self.invalid += 1
+            return None
+        if load["loaded_miles"] <= 0:
+            self.invalid += 1
+            return None
+
+        key = (tenant_id, load_digest(load))
+        now = time.monotonic()
+        seen_at = self._seen.get(key)
+        if seen_at is not None and now - seen_at < self.dedupe_ttl_seconds:
+            self.duplicates += 1
+            return None
+        self._seen[key] = now
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.dedupe_size:
+            self._seen.popitem(last=False)
+        return load
+
+    def _evaluate(self, tenant_id: int, loads: List[dict], stamps: List[float]) -> List[dict]:
+        with SessionLocal() as db:
+            fleet = get_profile_set(db, tenant_id)
+            template = get_active_script(db, tenant_id)
+        if not len(fleet):
+            self.no_profiles += len(loads)
+            return []
+
+        keep, rows = [], []
+        for j, load in enumerate(loads):
+            pid = load["profile_id"]
+            if pid is not None and pid not in fleet.index:
+                self.unknown_profile += 1
+                continue
+            keep.append(j)
+            rows.append(None if pid is None else fleet.index[pid])
+        reqs = [loads[j] for j in keep]
+        self.evaluated += len(reqs)
+
+        events = []
+        evaluated_at = time.time()
+        for j, row, matches in screen_loads(fleet, reqs, rows):
+            req, profile = reqs[j], fleet.profiles[row]
+            ctx = pricing_context(profile, req)
+            decision, reasons = decision_logic(profile, req, ctx)
+            if decision == "NO-GO":
+                continue
+            self.emitted[decision] += 1
+            inputs = script_inputs(req, decision, ctx.offered_rpm, ctx.break_even_rpm, ctx.target_rpm, ctx.profit, ctx.margin,
+                                   profile_id=profile.profile_id)
+            events.append({
+                "load_id": load_digest(req).hex(),
+                "load": req,
+                "profile_id": profile.profile_id,
+                "display_name": profile.display_name,
+                "matching_profiles": matches,
+                "decision": decision,
+                "reasons": reasons,
+                "offered_rpm": ctx.offered_rpm,
+                "break_even_rpm": ctx.break_even_rpm,
+                "target_rpm": ctx.target_rpm,
+                "target_total_rate": ctx.target_rpm * float(req["loaded_miles"]),
+                "projected_profit": ctx.profit,
+                "projected_margin_percent": ctx.margin,
+                "negotiation_script": template.render(inputs),
+                "ingested_at": stamps[keep[j]],
+                "evaluated_at": evaluated_at,
+            })
+        return events
+
+    def subscribe(self, tenant_id: int, callback: Callable[[List[dict]], None]) -> int:
+        """callback(events) runs on the worker thread and must not block."""
+        with self._cond:
+            self._next_token += 1
+            self._subscribers.setdefault(tenant_id, {})[self._next_token] = callback
+            return self._next_token
+
+    def unsubscribe(self, tenant_id: int, token: int) -> None:
+        with self._cond:
+            subs = self._subscribers.get(tenant_id, {})
+            subs.pop(token, None)
+            if not subs:
+                self._subscribers.pop(tenant_id, None)
+
+    def _publish(self, tenant_id: int, events: List[dict]) -> None:
+        if not events:
+            return
+        with self._cond:
+            callbacks = list(self._subscribers.get(tenant_id, {}).values())
+        for callback in callbacks:
+            try:
+                callback(events)
+            except Exception:
+                self.drop_events(len(events))
+
+    def drop_events(self, n: int) -> None:
+        """Count events a subscriber lost; safe from any thread."""
+        with self._cond:
+            self.dropped_events += n
+
+    def add_source(self, source: "IngestSource", limit: int = 0) -> Optional[str]:
+        """Register and start a source; None (source not started) when its tenant already
+        runs `limit` sources."""
+        with self._cond:
+            running = sum(1 for s in self.sources.values() if s.tenant_id == source.tenant_id and not s.done)
+            if limit and running >= limit:
+                return None
+            self._next_source += 1
+            source.id = f"{source.kind}-{self._next_source}"
+            self.sources[source.id] = source
+        source.start()
+        return source.id
+
+    def remove_source(self, source_id: str) -> Optional["IngestSource"]:
+        with self._cond:
+            source = self.sources.pop(source_id, None)
+        if source is not None:
+            source.stop()
+        return source
+
+    def open_connection(self, tenant_id: int, limit: int = 0) -> bool:
+        """Take one of a tenant's `limit` socket connection slots; False when none is free."""
+        with self._cond:
+            n = self._connections.get(tenant_id, 0)
+            if limit and n >= limit:
+                return False
+            self._connections[tenant_id] = n + 1
+            return True
+
+    def close_connection(self, tenant_id: int) -> None:
+        with self._cond:
+            n = self._connections.pop(tenant_id, 1) - 1
+            if n:
+                self._connections[tenant_id] = n
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Block until everything offered so far has been evaluated (or timeout)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._buf and self._busy == 0, timeout=timeout)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        for source_id in list(self.sources):
+            self.remove_source(source_id)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self, tenant_id: Optional[int] = None) -> Dict[str, Any]:
+        with self._cond:
+            window = (self._recent[-1][0] - self._recent[0][0]) if len(self._recent) > 1 else 0.0
+            return {
+                "queue_depth": self._queued,
+                "max_queue": self.max_queue,
+                "max_depth_seen": self.max_depth,
+                "chunk_size": self.chunk_size,
+                "received": self.received,
+                "rejected": self.rejected,
+                "backpressure_waits": self.backpressure_waits,
+                "invalid": self.invalid,
+                "duplicates": self.duplicates,
+                "dedupe_entries": len(self._seen),
+                "unknown_profile": self.unknown_profile,
+                "no_profiles": self.no_profiles,
+                "evaluated": self.evaluated,
+                "emitted": dict(self.emitted),
+                "dropped_events": self.dropped_events,
+                "failed": self.failed,
+                "chunks": self.chunks,
+                "last_chunk_ms": self.last_chunk_ms,
+                "loads_per_second": sum(n for _, n in self._recent) / window if window else 0.0,
+                "subscribers": sum(len(v) for k, v in self._subscribers.items() if tenant_id in (None, k)),
+                "open_connections": sum(n for k, n in self._connections.items() if tenant_id in (None, k)),
+                "sources": [s.describe() for s in self.sources.values() if tenant_id in (None, s.tenant_id)],
+            }
+
+class IngestSource(ABC):
+    """Reader thread that feeds NDJSON lines into the pipeline for one tenant. A reader
+    that fails is logged and started again after a back-off until stop()."""
+    kind = "source"
+    retry_seconds = 0.5  # first back-off; doubles per consecutive failure
+    max_retry_seconds = 30.0
+
+    def __init__(self, pipeline: IngestPipeline, tenant_id: int):
+        self.pipeline = pipeline
+        self.tenant_id = tenant_id
+        self.id: Optional[str] = None
+        self.lines = 0
+        self.error: Optional[str] = None
+        self.errors = 0
+        self.done = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._guarded_run, name=f"ada-ingest-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _guarded_run(self) -> None:
+        delay = self.retry_seconds
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._run()
+                    return
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                    self.errors += 1
+                    logger.exception("ingest source %s failed; restarting in %.1fs", self.id, delay)
+                if self._stop.wait(delay):
+                    return
+                delay = min(delay * 2, self.max_retry_seconds)
+        finally:
+            self.done = True
+
+    @abstractmethod
+    def _run(self) -> None:
+        """Read until the input ends or stop() is called."""
+
+    def _emit(self, lines: List[bytes]) -> bool:
+        """Hand lines to the pipeline, waiting (in short slices, so stop() is honoured)
+        while the queue is full."""
+        while not self._stop.is_set():
+            if self.pipeline.offer(self.tenant_id, lines, block=True, timeout=0.5):
+                self.lines += len(lines)
+                return True
+        return False
+
+    def describe(self) -> Dict[str, Any]:
+        return {"id": self.id, "kind": self.kind, "lines": self.lines, "done": self.done, "error": self.error,
+                "errors": self.errors}
+
+class FileSource(IngestSource):
+    """Reads an NDJSON file; with follow=True keeps tailing it like `tail -f`."""
+    kind = "file"
+
+    def __init__(self, pipeline: IngestPipeline, tenant_id: int, path: str, follow: bool = False, poll_seconds: float = 0.25):
+        super().__init__(pipeline, tenant_id)
+        self.path = path
+        self.follow = follow
+        self.poll_seconds = poll_seconds
+
+    def _run(self) -> None:
+        chunk: List[bytes] = []
+        with open(self.path, "rb") as f:
+            while not self._stop.is_set():
+                line = f.readline()
+                if line and self.follow and not line.endswith(b"\n"):
+                    f.seek(f.tell() - len(line))  # half-written line; re-read once it is complete
+                    line = b""
+                if line:
+                    if line.strip():
+                        chunk.append(line)
+                    if len(chunk) >= self.pipeline.chunk_size:
+                        self._emit(chunk)
+                        chunk = []
+                    continue
+                if chunk:
+                    self._emit(chunk)
+                    chunk = []
+                if not self.follow:
+                    return
+                time.sleep(self.poll_seconds)
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "path": self.path, "follow": self.follow}
+
+class SocketSource(IngestSource):
+    """Accepts TCP connections on host:port and reads NDJSON lines from each; port 0
+    picks a free port. A connection's first line must be the source's token (sent within
+    INGEST_HANDSHAKE_SECONDS), and a tenant holds at most INGEST_TENANT_CONNECTIONS open
+    at once. A full pipeline stops reading, so TCP flow control pushes back on the sender."""
+    kind = "socket"
+
+    def __init__(self, pipeline: IngestPipeline, tenant_id: int, host: str = INGEST_SOCKET_HOST, port: int = 0):
+        super().__init__(pipeline, tenant_id)
+        self._server = socket.create_server((host, port))
+        self._server.settimeout(0.5)
+        self.host, self.port = self._server.getsockname()[:2]
+        self.token = secrets.token_urlsafe(24)
+        self.connections = 0
+        self.refused = 0
+
+    def stop(self) -> None:
+        super().stop()
+        self._server.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stop.is_set():
+                    return  # stop() closed the listener
+                raise
+            if not self.pipeline.open_connection(self.tenant_id, INGEST_TENANT_CONNECTIONS):
+                self.refused += 1
+                conn.close()
+                continue
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), name=f"ada-ingest-{self.id}-conn", daemon=True).start()
+
+    def _handshake(self, conn: socket.socket) -> Optional[bytes]:
+        """Read the token line; returns the bytes after it, or None to drop the connection."""
+        deadline = time.monotonic() + INGEST_HANDSHAKE_SECONDS
+        data = b""
+        while b"\n" not in data:
+            if len(data) > 256 or time.monotonic() > deadline or self._stop.is_set():
+                return None
+            try:
+                chunk = conn.recv(256)
+            except socket.timeout:
+                continue
+            except OSError:
+                return None
+            if not chunk:
+                return None
+            data += chunk
+        line, _, rest = data.partition(b"\n")
+        return rest if hmac.compare_digest(line.strip(), self.token.encode()) else None
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            with conn:
+                conn.settimeout(0.5)
+                pending = self._handshake(conn)
+                if pending is None:
+                    self.refused += 1
+                    return
+                while not self._stop.is_set():
+                    try:
+                        data = conn.recv(1 << 16)
+                    except socket.timeout:
+                        continue
+                    except OSError:
+                        return
+                    if not data:
+                        break
+                    *lines, pending = (pending + data).split(b"\n")
+                    lines = [line for line in lines if line.strip()]
+                    if lines and not self._emit(lines):
+                        return
+                lines = [line for line in pending.split(b"\n") if line.strip()]  # may still hold the handshake's tail
+                if lines:
+                    self._emit(lines)
+        finally:
+            self.pipeline.close_connection(self.tenant_id)
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "host": self.host, "port": self.port, "connections": self.connections,
+                "refused": self.refused}
+
+ingest_pipeline = IngestPipeline()
+atexit.register(ingest_pipeline.stop)
 
 # -----------------------------
 # API schemas
@@ -337,8 +4552,26 @@ class ProfileIn(BaseModel):
 
     block_brokers: dict = Field(default_factory=dict)
 
-class LoadRequest(BaseModel):
-    profile_id: str
+class FuelPriceIn(BaseModel):
+    region: str = Field(..., min_length=1, max_length=60)
+    effective_date: date
+    price: float = Field(..., gt=0, le=50)  # $/gal
+
+class FuelPriceUpload(BaseModel):
+    prices: List[FuelPriceIn] = Field(..., min_length=1, max_length=MAX_FUEL_UPLOAD_ROWS)
+
+class ScriptTemplateIn(BaseModel):
+    template_id: str = Field(..., min_length=1, max_length=80, pattern=r"^[A-Za-z0-9_.-]+$")
+    body: str  # str.format over SCRIPT_FIELDS, e.g. "{origin_city} → {dest_city} at ${target_rpm:.2f}/mi"
+    activate: bool = True
+
+class ActiveScriptIn(BaseModel):
+    template_id: str
+
+class RetentionPolicyIn(BaseModel):
+    days: Optional[int] = Field(default=None, ge=0)  # None: server default; 0: keep every row hot
+
+class LoadDetails(BaseModel):
     origin_city: str
     origin_state: str
     dest_city: str
@@ -347,12 +4580,20 @@ class LoadRequest(BaseModel):
     equipment_type: str = "Van"
     broker_name: str
 
-    loaded_miles: float
-    deadhead_miles: float = 0.0
+    loaded_miles: Optional[float] = None    # None: origin -> dest from the geo table
+    deadhead_miles: Optional[float] = None  # None: truck_city/state -> origin, else 0
+    truck_city: Optional[str] = None        # where the truck is empty now
+    truck_state: Optional[str] = None
     offered_total_rate: float
     fuel_region: str = "National"
     notes: Optional[str] = None
 
+class LoadRequest(LoadDetails):
+    profile_id: str
+
+class FeedLoad(LoadDetails):
+    profile_id: Optional[str] = None  # None: screened against every profile in the tenant
+
 class RecommendationOut(BaseModel):
     decision: str
     reasons: list[str]
@@ -360,18 +4601,108 @@ class RecommendationOut(BaseModel):
     break_even_rpm: float
     target_rpm: float
     target_total_rate: float
+    loaded_miles: float    # as priced: given, or filled in from the geo table
+    deadhead_miles: float
     projected_revenue: float
     projected_total_cost: float
     projected_profit: float
     projected_margin_percent: float
     negotiation_script: str
 
+class BatchLoadRequest(BaseModel):
+    loads: list[LoadRequest] = Field(..., min_length=1)
+
+class BatchRecommendationOut(BaseModel):
+    count: int
+    results: list[RecommendationOut]
+
+class IngestPush(BaseModel):
+    loads: list[Dict[str, Any]] = Field(..., min_length=1)  # validated by the ingest worker, like file/socket lines
+
+class IngestSourceIn(BaseModel):
+    kind: Literal["file", "socket"]
+    path: Optional[str] = None  # file: relative to ADA_INGEST_DIR
+    follow: bool = False        # file: keep tailing
+    port: int = 0               # socket: one of ADA_INGEST_SOCKET_PORTS; 0 picks a free one
+
+class FleetRecommendation(RecommendationOut):
+    rank: int
+    profile_id: str
+    display_name: str
+
+class FleetRecommendationOut(BaseModel):
+    profiles_evaluated: int
+    decisions: Dict[str, int]  # GO / REVIEW / NO-GO counts across the whole fleet
+    results: list[FleetRecommendation]  # by projected profit, highest first
+
+class SweepRange(BaseModel):
+    start: float
+    stop: float
+    step: float = Field(..., gt=0)
+
+    def count(self) -> int:
+        return max(int(np.floor((self.stop - self.start) / self.step + 1e-9)) + 1, 0)
+
+    def values(self) -> np.ndarray:
+        return self.start + self.step * np.arange(self.count(), dtype=np.float64)
+
+class SweepRequest(BaseModel):
+    load: LoadRequest
+    rates: Optional[SweepRange] = None           # default: just load.offered_total_rate
+    deadhead_miles: Optional[SweepRange] = None  # default: just load.deadhead_miles
+    fuel_regions: Optional[list[str]] = None     # default: just load.fuel_region
+
+class SweepFlip(BaseModel):
+    total_rate: float
+    rpm: float
+    from_decision: str
+    to_decision: str
+
+class SweepCurve(BaseModel):
+    fuel_region: str
+    deadhead_miles: float
+    total_cost: float
+    break_even_rpm: float
+    min_rpm: float
+    target_rpm: float
+    flips: list[SweepFlip]
+
+class SweepOut(BaseModel):
+    profile_id: str
+    cells: int
+    blocked: Optional[str]
+    rates: list[float]
+    deadhead_miles: list[float]
+    fuel_regions: list[str]
+    decision: list[list[list[str]]]  # [fuel_region][deadhead][rate]
+    profit: list[list[list[float]]]
+    margin: list[list[list[float]]]
+    curves: list[SweepCurve]         # [fuel_region * deadhead], break-evens + exact flip rates
+
 
 # -----------------------------
 # App
 # -----------------------------
-app = FastAPI(title="ADA Wedge A - Multi-tenant + Roles (Single-file)", version="0.3.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MIGRATE_ON_STARTUP:
+        migrate_schema(engine)
+    if ASYNC_DB:
+        await run_in_threadpool(len, geo_table)  # read the city table now, not on the event loop mid-request
+    retention_worker.start()
+    yield
+    retention_worker.stop()
+    if request_profiler is not None:
+        request_profiler.stop()
+    ingest_pipeline.stop()
+    log_writer.stop()
+    hashing_executor.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+app = FastAPI(title="ADA Wedge A - Multi-tenant + Roles (Single-file)", version="0.3.0", lifespan=lifespan)
 
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # tighten in prod
@@ -379,6 +4710,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, registry=metrics_registry, profiler=request_profiler)
+
 @app.api_route("/", methods=["GET", "HEAD"])
 def home():
     return {"status": "ok"}
@@ -387,9 +4721,39 @@ def home():
 def health():
     return {"status": "ok", "utc": datetime.utcnow().isoformat()}
 
+# ---- Metrics ----
+def _subsystem_gauges() -> Iterable[Tuple[str, float]]:
+    """Numeric fields of the in-process subsystems' stats() as ada_<subsystem>_<field> gauges."""
+    sources = {
+        "profile_cache": profile_cache.stats,
+        "principal_cache": principal_cache.stats,
+        "script_cache": script_cache.stats,
+        "fuel_cache": fuel_cache.stats,
+        "lane_cache": lane_cache.stats,
+        "recommendation_cache": recommendation_cache.stats,
+        "log_dictionary": log_dictionary.stats,
+        "log_writer": log_writer.stats,
+        "hashing": hashing_executor.stats,
+        "admission": admission_controller.stats,
+        "ingest": ingest_pipeline.stats,
+        "archive_cache": archive_cache.stats,
+        "retention": retention_worker.stats,
+        "cache_generations": cache_generations.stats,
+    }
+    for subsystem, stats_fn in sources.items():
+        for key, value in stats_fn().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"ada_{subsystem}_{key}", value
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics(authorization: Optional[str] = Header(None)):
+        if not hmac.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+        return Response(metrics_registry.render(_subsystem_gauges()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ---- Auth ----
-@app.post("/auth/register", response_model=TokenResponse)
-def register(req: RegisterRequest, db: Session = Depends(get_db)):
+def _register_owner(db: Session, req: RegisterRequest, password_hash: str) -> TokenResponse:
     try:
         # create or fetch tenant
         tenant = db.query(Tenant).filter(Tenant.name == req.tenant_name).first()
@@ -407,7 +4771,7 @@ def register(req: RegisterRequest, db: Session = Depends(get_db)):
         user = User(
             tenant_id=tenant.id,
             email=req.email,
-            password_hash=hash_password(req.password),
+            password_hash=password_hash,
             role="OWNER"
         )
         db.add(user)
@@ -433,10 +4797,20 @@ def register(req: RegisterRequest, db: Session = Depends(get_db)):
             status_code=500,
             detail=f"Server error during registration: {type(e).__name__}: {str(e)}"
         )
+
+@app.post("/auth/register", response_model=TokenResponse)
+async def register(req: RegisterRequest, db: Session = Depends(get_db)):
+    # bcrypt runs on the hashing pool; the DB work stays on the regular threadpool
+    password_hash = await hashing_executor.hash(req.password)
+    return await run_in_threadpool(_register_owner, db, req, password_hash)
+
+def _find_user(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
 @app.post("/auth/login", response_model=TokenResponse)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form.username).first()
-    if not user or not verify_password(form.password, user.password_hash):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_find_user, db, form.username)
+    if not user or not await hashing_executor.verify(form.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token = create_access_token(
@@ -452,7 +4826,7 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
 
 
 @app.patch("/tenant/users/{email}", response_model=dict)
-def change_role(email: str, payload: ChangeRoleRequest, current_user: User = Depends(require_role({"OWNER"})), db: Session = Depends(get_db)):
+def change_role(email: str, payload: ChangeRoleRequest, current_user: Principal = Depends(require_role({"OWNER"})), db: Session = Depends(get_db)):
     # Only OWNER can change roles (keeps governance simple)
     u = db.query(User).filter(User.email == email, User.tenant_id == current_user.tenant_id).first()
     if not u:
@@ -461,10 +4835,11 @@ def change_role(email: str, payload: ChangeRoleRequest, current_user: User = Dep
         raise HTTPException(status_code=400, detail="Cannot change OWNER role")
     u.role = payload.role
     db.commit()
+    principal_cache.invalidate_user(current_user.tenant_id, u.email)
     return {"ok": True, "email": u.email, "role": u.role}
 
 @app.delete("/tenant/users/{email}", response_model=dict)
-def delete_user(email: str, current_user: User = Depends(require_role({"OWNER"})), db: Session = Depends(get_db)):
+def delete_user(email: str, current_user: Principal = Depends(require_role({"OWNER"})), db: Session = Depends(get_db)):
     u = db.query(User).filter(User.email == email, User.tenant_id == current_user.tenant_id).first()
     if not u:
         raise HTTPException(status_code=404, detail="User not found in your tenant")
@@ -472,35 +4847,33 @@ def delete_user(email: str, current_user: User = Depends(require_role({"OWNER"})
         raise HTTPException(status_code=400, detail="Cannot delete OWNER")
     db.delete(u)
     db.commit()
+    principal_cache.invalidate_user(current_user.tenant_id, email)
     return {"ok": True}
 
 # ---- Profiles ----
-@app.get("/profiles")
-def list_profiles(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    rows = (
-        db.query(CarrierCostProfile)
-        .filter(CarrierCostProfile.tenant_id == current_user.tenant_id)
+def _profile_stmt(tenant_id: int, profile_id: str):
+    return select(CarrierCostProfile).where(
+        CarrierCostProfile.tenant_id == tenant_id, CarrierCostProfile.profile_id == profile_id
+    )
+
+def _profile_list_stmt(tenant_id: int):
+    return (
+        select(CarrierCostProfile)
+        .where(CarrierCostProfile.tenant_id == tenant_id)
         .order_by(CarrierCostProfile.profile_id.asc())
-        .all()
     )
-    return [{
+
+def _profile_summary(r: CarrierCostProfile) -> Dict[str, Any]:
+    return {
         "profile_id": r.profile_id,
         "display_name": r.display_name,
         "mpg": r.mpg,
         "min_margin_percent": r.min_margin_percent,
         "preferred_margin_percent": r.preferred_margin_percent,
         "max_deadhead_miles": r.max_deadhead_miles,
-    } for r in rows]
+    }
 
-@app.get("/profiles/{profile_id}")
-def get_profile(profile_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    r = (
-        db.query(CarrierCostProfile)
-        .filter(CarrierCostProfile.tenant_id == current_user.tenant_id, CarrierCostProfile.profile_id == profile_id)
-        .first()
-    )
-    if not r:
-        raise HTTPException(status_code=404, detail="Profile not found")
+def _profile_detail(r: CarrierCostProfile) -> Dict[str, Any]:
     return {
         "profile_id": r.profile_id,
         "display_name": r.display_name,
@@ -520,115 +4893,599 @@ def get_profile(profile_id: str, current_user: User = Depends(get_current_user),
         "block_brokers": r.block_brokers or {},
     }
 
-@app.post("/profiles")
-def upsert_profile(payload: ProfileIn, current_user: User = Depends(require_role({"OWNER", "ADMIN"})), db: Session = Depends(get_db)):
-    r = (
-        db.query(CarrierCostProfile)
-        .filter(CarrierCostProfile.tenant_id == current_user.tenant_id, CarrierCostProfile.profile_id == payload.profile_id)
-        .first()
-    )
+def _apply_profile(r: Optional[CarrierCostProfile], payload: ProfileIn, tenant_id: int) -> CarrierCostProfile:
+    """Copy the payload onto r (a new row when r is None); the caller adds and commits."""
     if not r:
         r = CarrierCostProfile(
-            tenant_id=current_user.tenant_id,
+            tenant_id=tenant_id,
             profile_id=payload.profile_id,
             display_name=payload.display_name
         )
-        db.add(r)
-
     for k, v in payload.model_dump().items():
         setattr(r, k, v)
     r.updated_at = datetime.utcnow()
+    return r
+
+@app.get("/profiles")
+def list_profiles(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    rows = db.execute(_profile_list_stmt(current_user.tenant_id)).scalars()
+    return [_profile_summary(r) for r in rows]
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    r = db.execute(_profile_stmt(current_user.tenant_id, profile_id)).scalars().first()
+    if not r:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _profile_detail(r)
 
+@app.post("/profiles")
+def upsert_profile(payload: ProfileIn, current_user: Principal = Depends(require_role({"OWNER", "ADMIN"})), db: Session = Depends(get_db)):
+    r = db.execute(_profile_stmt(current_user.tenant_id, payload.profile_id)).scalars().first()
+    db.add(_apply_profile(r, payload, current_user.tenant_id))
     db.commit()
+    profile_cache.invalidate(current_user.tenant_id, payload.profile_id)
     return {"ok": True, "profile_id": payload.profile_id}
 
 @app.delete("/profiles/{profile_id}")
-def delete_profile(profile_id: str, current_user: User = Depends(require_role({"OWNER", "ADMIN"})), db: Session = Depends(get_db)):
-    r = (
-        db.query(CarrierCostProfile)
-        .filter(CarrierCostProfile.tenant_id == current_user.tenant_id, CarrierCostProfile.profile_id == profile_id)
-        .first()
-    )
+def delete_profile(profile_id: str, current_user: Principal = Depends(require_role({"OWNER", "ADMIN"})), db: Session = Depends(get_db)):
+    r = db.execute(_profile_stmt(current_user.tenant_id, profile_id)).scalars().first()
     if not r:
         raise HTTPException(status_code=404, detail="Profile not found")
     db.delete(r)
     db.commit()
+    profile_cache.invalidate(current_user.tenant_id, profile_id)
     return {"ok": True}
 
+# ---- Fuel prices ----
+def _fuel_index_out(db: Session, tenant_id: int, as_of: date) -> Dict[str, Any]:
+    current, next_change = _fuel_stmts(tenant_id, as_of)
+    fuel = build_fuel_prices(tenant_id, as_of, db.execute(current).all(), db.execute(next_change).scalar())
+    return {
+        "as_of": fuel.as_of.isoformat(),
+        "next_change": fuel.next_change.isoformat() if fuel.next_change else None,
+        "prices": [
+            {"region": region, "price": price, "effective_date": fuel.sources[region][0].isoformat(), "scope": fuel.sources[region][1]}
+            for region, price in sorted(fuel.prices.items())
+        ],
+    }
+
+@app.get("/fuel-prices")
+def get_fuel_price_index(as_of: Optional[date] = None, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Prices recommendations use as of a date (default today, UTC): global index with the
+    tenant's own prices on top. Regions not listed fall back to each profile's own prices."""
+    return _fuel_index_out(db, current_user.tenant_id, as_of or datetime.utcnow().date())
+
+@app.post("/fuel-prices")
+def upload_fuel_prices(payload: FuelPriceUpload, current_user: Principal = Depends(require_role({"OWNER", "ADMIN"})), db: Session = Depends(get_db)):
+    """Bulk insert / replace the tenant's (region, effective_date) prices. Dated rows take
+    effect on that day; the next recommendation already prices with today's."""
+    rows = upsert_fuel_prices(db, current_user.tenant_id, [p.model_dump() for p in payload.prices])
+    db.commit()
+    fuel_cache.invalidate(current_user.tenant_id)
+    return {"ok": True, "rows": rows, **_fuel_index_out(db, current_user.tenant_id, datetime.utcnow().date())}
+
+@app.delete("/fuel-prices/{region}")
+def delete_fuel_prices(region: str, effective_date: Optional[date] = None, current_user: Principal = Depends(require_role({"OWNER", "ADMIN"})),
+                       db: Session = Depends(get_db)):
+    """Drop the tenant's own prices for a region (one date, or all), reverting to the global index."""
+    stmt = delete(FuelPrice).where(FuelPrice.tenant_id == current_user.tenant_id, FuelPrice.region == region)
+    if effective_date is not None:
+        stmt = stmt.where(FuelPrice.effective_date == effective_date)
+    deleted = db.execute(stmt).rowcount
+    db.commit()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="No tenant fuel prices for that region")
+    fuel_cache.invalidate(current_user.tenant_id)
+    return {"ok": True, "deleted": deleted}
+
+# ---- Lane distances ----
+@app.get("/lanes/distance")
+def lane_distance(origin_city: str, origin_state: str, dest_city: str, dest_state: str,
+                  current_user: Principal = Depends(get_current_user)):
+    """The loaded_miles a load on this lane gets when it leaves them out."""
+    try:
+        (miles,) = lane_cache.miles([(origin_city, origin_state, dest_city, dest_state)])
+    except UnknownLocation as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"origin": f"{origin_city}, {origin_state}", "dest": f"{dest_city}, {dest_state}", "miles": miles,
+            "circuity": lane_cache.circuity}
+
+# ---- Script templates ----
+def _script_version_out(r: ScriptTemplate) -> Dict[str, Any]:
+    return {"template_id": r.template_id, "version": r.version, "created_by": r.created_by, "created_at": r.created_at.isoformat()}
+
+@app.get("/script-templates")
+def list_script_templates(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    active = get_active_script(db, current_user.tenant_id)
+    rows = db.execute(
+        select(ScriptTemplate).where(ScriptTemplate.tenant_id == current_user.tenant_id)
+        .order_by(ScriptTemplate.template_id, ScriptTemplate.version)
+    ).scalars()
+    return {
+        "active": {"template_id": active.template_id, "version": active.version},
+        "builtin": [{"template_id": tid, "version": v, "body": c.body} for (tid, v), c in BUILTIN_SCRIPTS.items()],
+        "templates": [_script_version_out(r) for r in rows],
+        "fields": sorted(SCRIPT_FIELDS),
+    }
+
+@app.get("/script-templates/{template_id}/{version}")
+def get_script_template(template_id: str, version: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    compiled = get_script_version(db, current_user.tenant_id, template_id, version)
+    if compiled is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"template_id": compiled.template_id, "version": compiled.version, "body": compiled.body}
+
+@app.post("/script-templates")
+def create_script_template(payload: ScriptTemplateIn, current_user: Principal = Depends(require_role({"OWNER", "ADMIN"})), db: Session = Depends(get_db)):
+    """Add a new version of a template (versions are immutable) and optionally make it
+    the tenant's active template."""
+    if payload.template_id in BUILTIN_SCRIPT_IDS:
+        raise HTTPException(status_code=400, detail=f"Template id '{payload.template_id}' is reserved")
+    latest = db.execute(select(func.max(ScriptTemplate.version)).where(
+        ScriptTemplate.tenant_id == current_user.tenant_id, ScriptTemplate.template_id == payload.template_id,
+    )).scalar()
+    try:
+        compiled = compile_script(payload.template_id, (latest or 0) + 1, payload.body)
+    except ScriptTemplateError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    db.add(ScriptTemplate(
+        tenant_id=current_user.tenant_id, template_id=compiled.template_id, version=compiled.version,
+        body=compiled.body, created_by=current_user.email,
+    ))
+    if payload.activate:
+        db.execute(update(Tenant).where(Tenant.id == current_user.tenant_id).values(script_template_id=compiled.template_id))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Template was changed concurrently, retry")
+    script_cache.put(current_user.tenant_id, compiled)
+    script_cache.invalidate(current_user.tenant_id)
+    return {"template_id": compiled.template_id, "version": compiled.version, "active": payload.activate}
+
+@app.put("/script-templates/active")
+def set_active_script_template(payload: ActiveScriptIn, current_user: Principal = Depends(require_role({"OWNER", "ADMIN"})), db: Session = Depends(get_db)):
+    if payload.template_id in BUILTIN_SCRIPT_IDS:
+        template_id = None
+    else:
+        exists = db.execute(select(ScriptTemplate.id).where(
+            ScriptTemplate.tenant_id == current_user.tenant_id, ScriptTemplate.template_id == payload.template_id,
+        ).limit(1)).first()
+        if not exists:
+            raise HTTPException(status_code=404, detail="Template not found")
+        template_id = payload.template_id
+    db.execute(update(Tenant).where(Tenant.id == current_user.tenant_id).values(script_template_id=template_id))
+    db.commit()
+    script_cache.invalidate(current_user.tenant_id)
+    active = get_active_script(db, current_user.tenant_id)
+    return {"template_id": active.template_id, "version": active.version}
+
+def require_operator(authorization: Optional[str] = Header(None)) -> None:
+    """Service-wide introspection (every tenant's cache traffic) is for operators, not tenant admins."""
+    if not OPERATOR_TOKEN:
+        raise HTTPException(status_code=403, detail="Operator endpoints are disabled (set ADA_OPERATOR_TOKEN)")
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {OPERATOR_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid operator token")
+
+@app.get("/cache/stats", dependencies=[Depends(require_operator)])
+def cache_stats():
+    return {"profiles": profile_cache.stats(), "principals": principal_cache.stats(), "scripts": script_cache.stats(),
+            "fuel": fuel_cache.stats(), "lanes": lane_cache.stats(), "recommendations": recommendation_cache.stats(),
+            "log_dictionary": log_dictionary.stats(), "archive": archive_cache.stats(), "generations": cache_generations.stats()}
+
+@app.get("/auth/hashing/stats", dependencies=[Depends(require_operator)])
+def hashing_stats():
+    return hashing_executor.stats()
+
+@app.get("/admission/stats")
+def admission_stats(current_user: Principal = Depends(require_role({"OWNER", "ADMIN"}))):
+    """This tenant's queueing / rate-limit counters, plus service-wide totals."""
+    return {**admission_controller.tenant_stats(current_user.tenant_id), "service": admission_controller.stats()}
+
 # ---- Recommend + logs ----
-@app.post("/recommend", response_model=RecommendationOut)
-def recommend(req: LoadRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    profile = (
-        db.query(CarrierCostProfile)
-        .filter(CarrierCostProfile.tenant_id == current_user.tenant_id, CarrierCostProfile.profile_id == req.profile_id)
-        .first()
-    )
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
+def _log_values(user: Principal, inputs: ScriptValues, template: CompiledScript) -> Dict[str, Any]:
+    return {
+        "tenant_id": user.tenant_id,
+        "user_email": user.email,
+        "user_role": user.role,
+        **inputs,
+        "negotiation_script": "",  # re-rendered from the template + this row on read
+        "script_template_id": template.template_id,
+        "script_template_version": template.version,
+        "created_at": datetime.utcnow(),
+    }
+
+def _fill_miles(req_dicts: List[dict], batch: bool = False) -> None:
+    try:
+        fill_miles(req_dicts)
+    except UnknownLocation as e:
+        raise HTTPException(status_code=422, detail=f"loads[{e.index}]: {e}" if batch else str(e))
 
+def _load_dict(req: LoadRequest) -> dict:
     req_dict = req.model_dump()
-    costs = compute_costs(profile, req_dict)
-    off = offered_rpm(req_dict)
-    be = break_even_rpm(profile, req_dict)
-    tgt = target_rpm(profile, req_dict)
-    decision, reasons = decision_logic(profile, req_dict)
-
-    revenue = float(req.offered_total_rate)
-    profit = revenue - float(costs.total_cost)
-    margin = profit / revenue if revenue > 0 else 0.0
-
-    script = negotiation_script(req_dict, be_rpm_value=be, tgt_rpm_value=tgt)
-
-    log = RecommendationLog(
-        tenant_id=current_user.tenant_id,
-        user_email=current_user.email,
-        user_role=current_user.role,
-        profile_id=req.profile_id,
-        broker_name=req.broker_name,
-        origin_city=req.origin_city,
-        origin_state=req.origin_state,
-        dest_city=req.dest_city,
-        dest_state=req.dest_state,
-        equipment_type=req.equipment_type,
-        loaded_miles=req.loaded_miles,
-        deadhead_miles=req.deadhead_miles,
-        offered_total_rate=req.offered_total_rate,
-        fuel_region=req.fuel_region,
-        decision=decision,
-        offered_rpm=off,
-        break_even_rpm=be,
-        target_rpm=tgt,
-        projected_profit=profit,
-        projected_margin_percent=margin,
-        negotiation_script=script,
-    )
-    db.add(log)
-    db.commit()
+    _fill_miles([req_dict])
+    if req_dict["loaded_miles"] <= 0:
+        raise HTTPException(status_code=422, detail="loaded_miles must be > 0")
+    return req_dict
+
+def _recommend_one(profile: CompiledProfile, req_dict: dict, user: Principal,
+                   template: CompiledScript) -> Tuple[RecommendationOut, Dict[str, Any]]:
+    with stage("pricing"):
+        ctx = pricing_context(profile, req_dict)
+        decision, reasons = decision_logic(profile, req_dict, ctx)
+    with stage("script"):
+        inputs = script_inputs(req_dict, decision, ctx.offered_rpm, ctx.break_even_rpm, ctx.target_rpm, ctx.profit, ctx.margin)
+        script = template.render(inputs)
 
-    return RecommendationOut(
+    log_row = _log_values(user, inputs, template)
+    out = RecommendationOut(
         decision=decision,
         reasons=reasons,
-        offered_rpm=off,
-        break_even_rpm=be,
-        target_rpm=tgt,
-        target_total_rate=tgt * float(req.loaded_miles),
-        projected_revenue=revenue,
-        projected_total_cost=float(costs.total_cost),
-        projected_profit=profit,
-        projected_margin_percent=margin,
+        offered_rpm=ctx.offered_rpm,
+        break_even_rpm=ctx.break_even_rpm,
+        target_rpm=ctx.target_rpm,
+        target_total_rate=ctx.target_rpm * float(req_dict["loaded_miles"]),
+        loaded_miles=req_dict["loaded_miles"],
+        deadhead_miles=req_dict["deadhead_miles"],
+        projected_revenue=ctx.revenue,
+        projected_total_cost=ctx.costs.total_cost,
+        projected_profit=ctx.profit,
+        projected_margin_percent=ctx.margin,
         negotiation_script=script,
     )
+    return out, log_row
 
-@app.get("/logs/recent")
-def recent_logs(limit: int = 20, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    rows = (
-        db.query(RecommendationLog)
-        .filter(RecommendationLog.tenant_id == current_user.tenant_id)
-        .order_by(RecommendationLog.created_at.desc())
-        .limit(min(limit, 100))
-        .all()
+def _batch_groups(payload: BatchLoadRequest) -> Tuple[List[dict], Dict[str, List[int]]]:
+    """Validate a batch and group load indexes by profile_id."""
+    if len(payload.loads) > MAX_BATCH_LOADS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_LOADS} loads)")
+
+    req_dicts = [r.model_dump() for r in payload.loads]
+    _fill_miles(req_dicts, batch=True)
+    for i, r in enumerate(req_dicts):
+        if r["loaded_miles"] <= 0:
+            raise HTTPException(status_code=422, detail=f"loads[{i}]: loaded_miles must be > 0")
+
+    groups: Dict[str, list[int]] = {}
+    for i, r in enumerate(req_dicts):
+        groups.setdefault(r["profile_id"], []).append(i)
+    return req_dicts, groups
+
+def _recommend_many(profiles: Dict[str, CompiledProfile], req_dicts: List[dict], groups: Dict[str, List[int]],
+                    user: Principal, template: CompiledScript) -> Tuple[List[RecommendationOut], List[Dict[str, Any]]]:
+    missing = sorted(set(groups) - set(profiles))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {', '.join(missing)}")
+
+    results: list[Optional[RecommendationOut]] = [None] * len(req_dicts)
+    log_rows: list[Optional[Dict[str, Any]]] = [None] * len(req_dicts)
+    for profile_id, idxs in groups.items():
+        profile = profiles[profile_id]
+        group_reqs = [req_dicts[i] for i in idxs]
+        pricing = price_batch(profile, group_reqs)
+        for j, i in enumerate(idxs):
+            r = group_reqs[j]
+            decision = str(pricing.decision[j])
+            off = float(pricing.offered_rpm[j])
+            be = float(pricing.break_even_rpm[j])
+            tgt = float(pricing.target_rpm[j])
+            profit = float(pricing.profit[j])
+            margin = float(pricing.margin[j])
+            inputs = script_inputs(r, decision, off, be, tgt, profit, margin)
+            script = template.render(inputs)
+            results[i] = RecommendationOut(
+                decision=decision,
+                reasons=batch_reasons(profile, r, pricing, j),
+                offered_rpm=off,
+                break_even_rpm=be,
+                target_rpm=tgt,
+                target_total_rate=tgt * float(r["loaded_miles"]),
+                loaded_miles=r["loaded_miles"],
+                deadhead_miles=r["deadhead_miles"],
+                projected_revenue=float(pricing.revenue[j]),
+                projected_total_cost=float(pricing.total_cost[j]),
+                projected_profit=profit,
+                projected_margin_percent=margin,
+                negotiation_script=script,
+            )
+            log_rows[i] = _log_values(user, inputs, template)
+    return results, log_rows
+
+def _claim(user: Principal, req_dict: dict, idempotency_key: Optional[str], profile: CompiledProfile,
+           template: CompiledScript) -> RecommendationClaim:
+    try:
+        return recommendation_cache.claim(user, profile.profile_id, req_dict, idempotency_key, (profile, template))
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+@app.post("/recommend", response_model=RecommendationOut)
+def recommend(req: LoadRequest, response: Response, durable: bool = False,
+              idempotency_key: Optional[str] = Header(None, max_length=255),
+              current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Repeats (same Idempotency-Key, or the same load from the same user shortly after)
+    return the first answer, marked Idempotent-Replayed, and write no second log row."""
+    req_dict = _load_dict(req)
+    with stage("profile"):
+        profile = get_compiled_profile(db, current_user.tenant_id, req.profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    with stage("template"):
+        template = get_active_script(db, current_user.tenant_id)
+    claim = _claim(current_user, req_dict, idempotency_key, profile, template)
+    if not claim.owner and idempotency_key is None and not claim.wait(IDEMPOTENCY_SYNC_WAIT_SECONDS):
+        claim = RecommendationClaim.unshared()  # rather than parking this thread any longer
+    if not claim.owner:
+        out = claim.result(IDEMPOTENCY_SYNC_WAIT_SECONDS)
+        response.headers["Idempotent-Replayed"] = "true"
+        if durable and LOG_WRITE_BEHIND:
+            log_writer.flush()  # the first request's row may still be buffered
+        return out
+    try:
+        out, log_row = _recommend_one(profile, req_dict, current_user, template)
+        with stage("log"):
+            record_logs(db, [log_row], durable)
+    except BaseException as e:
+        claim.fail(e)
+        raise
+    claim.done(out)
+    return out
+
+@app.post("/recommend/batch", response_model=BatchRecommendationOut)
+def recommend_batch(payload: BatchLoadRequest, durable: bool = False, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    req_dicts, groups = _batch_groups(payload)
+    with stage("profile"):
+        profiles = get_compiled_profiles(db, current_user.tenant_id, list(groups))
+    with stage("template"):
+        template = get_active_script(db, current_user.tenant_id)
+    with stage("pricing"):
+        results, log_rows = _recommend_many(profiles, req_dicts, groups, current_user, template)
+
+    # one executemany for the whole batch
+    with stage("log"):
+        record_logs(db, log_rows, durable)
+
+    return BatchRecommendationOut(count=len(results), results=results)
+
+# ---- Fleet fan-out (read-only: no log rows) ----
+def _recommend_fleet(fleet: ProfileSet, load: LoadDetails, limit: int, decision: Optional[str],
+                     template: CompiledScript) -> FleetRecommendationOut:
+    req_dict = load.model_dump()
+    _fill_miles([req_dict])
+    if req_dict["loaded_miles"] <= 0:
+        raise HTTPException(status_code=422, detail="loaded_miles must be > 0")
+    if not len(fleet):
+        raise HTTPException(status_code=404, detail="No profiles configured")
+
+    pricing = price_fleet(fleet, req_dict)
+    idxs = np.argsort(-pricing.profit, kind="stable")
+    if decision is not None:
+        idxs = idxs[pricing.decision[idxs] == decision]
+    labels, counts = np.unique(pricing.decision.astype(str), return_counts=True)
+
+    loaded = float(req_dict["loaded_miles"])
+    results = []
+    for rank, i in enumerate(idxs[:max(1, limit)].tolist(), start=1):
+        profile = fleet.profiles[i]
+        off = float(pricing.offered_rpm[i])
+        be = float(pricing.break_even_rpm[i])
+        tgt = float(pricing.target_rpm[i])
+        profit = float(pricing.profit[i])
+        margin = float(pricing.margin[i])
+        row_decision = str(pricing.decision[i])
+        inputs = script_inputs(req_dict, row_decision, off, be, tgt, profit, margin, profile_id=profile.profile_id)
+        results.append(FleetRecommendation(
+            rank=rank,
+            profile_id=profile.profile_id,
+            display_name=profile.display_name,
+            decision=row_decision,
+            reasons=batch_reasons(profile, req_dict, pricing, i),
+            offered_rpm=off,
+            break_even_rpm=be,
+            target_rpm=tgt,
+            target_total_rate=tgt * loaded,
+            loaded_miles=loaded,
+            deadhead_miles=req_dict["deadhead_miles"],
+            projected_revenue=float(pricing.revenue[i]),
+            projected_total_cost=float(pricing.total_cost[i]),
+            projected_profit=profit,
+            projected_margin_percent=margin,
+            negotiation_script=template.render(inputs),
+        ))
+    return FleetRecommendationOut(
+        profiles_evaluated=len(fleet),
+        decisions={d: int(c) for d, c in zip(labels.tolist(), counts.tolist())},
+        results=results,
+    )
+
+@app.post("/recommend/fleet", response_model=FleetRecommendationOut)
+def recommend_fleet(
+    load: LoadDetails,
+    limit: int = 25,
+    decision: Optional[Literal["GO", "REVIEW", "NO-GO"]] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    return _recommend_fleet(get_profile_set(db, current_user.tenant_id), load, limit, decision,
+                            get_active_script(db, current_user.tenant_id))
+
+# ---- Load-board ingestion ----
+@app.post("/ingest/loads")
+def ingest_loads(payload: IngestPush, current_user: Principal = Depends(get_current_user)):
+    if len(payload.loads) > MAX_BATCH_LOADS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_LOADS} loads)")
+    if not ingest_pipeline.offer(current_user.tenant_id, payload.loads):
+        raise HTTPException(status_code=503, detail="Ingest queue is full, retry shortly", headers={"Retry-After": "1"})
+    return {"accepted": len(payload.loads), "queue_depth": ingest_pipeline.stats()["queue_depth"]}
+
+@app.post("/ingest/sources")
+def add_ingest_source(payload: IngestSourceIn, current_user: Principal = Depends(require_role({"OWNER", "ADMIN"}))):
+    if payload.kind == "file":
+        if not INGEST_DIR:
+            raise HTTPException(status_code=400, detail="File sources are disabled (set ADA_INGEST_DIR)")
+        root = os.path.realpath(INGEST_DIR)
+        path = os.path.realpath(os.path.join(root, payload.path or ""))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            raise HTTPException(status_code=400, detail="path must name a file under ADA_INGEST_DIR")
+        source = FileSource(ingest_pipeline, current_user.tenant_id, path, follow=payload.follow)
+    else:
+        if not INGEST_SOCKET_PORTS:
+            raise HTTPException(status_code=400, detail="Socket sources are disabled (set ADA_INGEST_SOCKET_PORTS)")
+        if payload.port and payload.port not in INGEST_SOCKET_PORTS:
+            raise HTTPException(status_code=400, detail="port is not in ADA_INGEST_SOCKET_PORTS")
+        source = None
+        for port in [payload.port] if payload.port else sorted(INGEST_SOCKET_PORTS):
+            try:
+                source = SocketSource(ingest_pipeline, current_user.tenant_id, port=port)
+                break
+            except OSError as e:
+                error = e
+        if source is None:
+            raise HTTPException(status_code=409, detail=f"Cannot listen on port {payload.port or 'in ADA_INGEST_SOCKET_PORTS'}: "
+                                                        f"{error.strerror}")
+    if ingest_pipeline.add_source(source, INGEST_TENANT_SOURCES) is None:
+        source.stop()
+        raise HTTPException(status_code=429, detail=f"Tenant already runs {INGEST_TENANT_SOURCES} ingest sources")
+    if isinstance(source, SocketSource):
+        return {**source.describe(), "token": source.token}  # shown once: the first line each connection sends
+    return source.describe()
+
+@app.get("/ingest/sources")
+def list_ingest_sources(current_user: Principal = Depends(require_role({"OWNER", "ADMIN"}))):
+    return ingest_pipeline.stats(current_user.tenant_id)["sources"]
+
+@app.delete("/ingest/sources/{source_id}")
+def remove_ingest_source(source_id: str, current_user: Principal = Depends(require_role({"OWNER", "ADMIN"}))):
+    source = ingest_pipeline.sources.get(source_id)
+    if source is None or source.tenant_id != current_user.tenant_id:
+        raise HTTPException(status_code=404, detail="Source not found")
+    ingest_pipeline.remove_source(source_id)
+    return {"ok": True}
+
+@app.get("/ingest/stats")
+def ingest_stats(current_user: Principal = Depends(require_role({"OWNER", "ADMIN"}))):
+    return ingest_pipeline.stats(current_user.tenant_id)
+
+def _enqueue_latest(queue: asyncio.Queue, events: List[dict]) -> None:
+    if queue.full():
+        ingest_pipeline.drop_events(len(queue.get_nowait()))  # slow client: lose the oldest chunk
+    queue.put_nowait(events)
+
+@app.get("/ingest/stream")
+async def ingest_stream(decision: Optional[Literal["GO", "REVIEW"]] = None, current_user: Principal = Depends(get_current_user)):
+    """Server-sent events: one `GO` / `REVIEW` event per matching feed load."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_SUBSCRIBER_QUEUE)
+    token = ingest_pipeline.subscribe(current_user.tenant_id, lambda events: loop.call_soon_threadsafe(_enqueue_latest, queue, events))
+
+    async def stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    events = await asyncio.wait_for(queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                body = "".join(
+                    f"event: {e['decision']}\ndata: {json.dumps(e)}\n\n" for e in events if decision in (None, e["decision"])
+                )
+                if body:
+                    yield body
+        finally:
+            ingest_pipeline.unsubscribe(current_user.tenant_id, token)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# ---- What-if sweep (read-only: no log rows) ----
+def _sweep_axes(payload: SweepRequest) -> Tuple[dict, np.ndarray, np.ndarray, List[str]]:
+    req_dict = payload.load.model_dump()
+    _fill_miles([req_dict])
+    if req_dict["loaded_miles"] <= 0:
+        raise HTTPException(status_code=422, detail="load.loaded_miles must be > 0")
+
+    regions = list(dict.fromkeys(payload.fuel_regions)) if payload.fuel_regions else [req_dict["fuel_region"]]
+    n_rates = payload.rates.count() if payload.rates else 1
+    n_deadheads = payload.deadhead_miles.count() if payload.deadhead_miles else 1
+    if not n_rates or not n_deadheads:
+        raise HTTPException(status_code=400, detail="Sweep range is empty (stop < start)")
+
+    # size-check before materialising any axis
+    cells = n_rates * n_deadheads * len(regions)
+    if cells > MAX_SWEEP_CELLS:
+        raise HTTPException(status_code=400, detail=f"Sweep too large: {cells} cells (max {MAX_SWEEP_CELLS})")
+
+    rates = payload.rates.values() if payload.rates else np.array([req_dict["offered_total_rate"]], dtype=np.float64)
+    deadheads = payload.deadhead_miles.values() if payload.deadhead_miles else np.array([req_dict["deadhead_miles"]], dtype=np.float64)
+    return req_dict, rates, deadheads, regions
+
+def _sweep(profile: CompiledProfile, payload: SweepRequest) -> SweepOut:
+    req_dict, rates, deadheads, regions = _sweep_axes(payload)
+    grid = price_sweep(profile, req_dict, rates, deadheads, regions)
+    breakpoints = sweep_breakpoints(req_dict, grid)
+
+    loaded = float(req_dict["loaded_miles"])
+    total_cost = grid.total_cost.tolist()
+    be, min_rpm, tgt = grid.break_even_rpm.tolist(), grid.min_rpm.tolist(), grid.target_rpm.tolist()
+    dead = grid.deadhead_miles.tolist()
+    curves = [
+        SweepCurve(
+            fuel_region=region,
+            deadhead_miles=dead[d],
+            total_cost=total_cost[f][d],
+            break_even_rpm=be[f][d],
+            min_rpm=min_rpm[f][d],
+            target_rpm=tgt[f][d],
+            flips=[SweepFlip(total_rate=r, rpm=r / loaded, from_decision=a, to_decision=b) for r, a, b in breakpoints[f][d]],
+        )
+        for f, region in enumerate(regions)
+        for d in range(len(dead))
+    ]
+    return SweepOut(
+        profile_id=profile.profile_id,
+        cells=int(grid.decision.size),
+        blocked=grid.blocked,
+        rates=grid.rates.tolist(),
+        deadhead_miles=dead,
+        fuel_regions=grid.fuel_regions,
+        decision=np.array(DECISIONS, dtype=object)[grid.decision].tolist(),
+        profit=grid.profit.tolist(),
+        margin=grid.margin.tolist(),
+        curves=curves,
     )
-    return [{
+
+@app.post("/recommend/sweep", response_model=SweepOut)
+def recommend_sweep(payload: SweepRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    profile = get_compiled_profile(db, current_user.tenant_id, payload.load.profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _sweep(profile, payload)
+
+@app.get("/logs/writer/stats", dependencies=[Depends(require_operator)])
+def log_writer_stats():
+    return log_writer.stats()
+
+LOG_SUMMARY_COLUMNS = tuple(LOG_FIELDS[name].label(name) for name in (
+    "id",
+    "created_at",
+    "user_email",
+    "user_role",
+    "profile_id",
+    "broker_name",
+    "origin_city",
+    "origin_state",
+    "dest_city",
+    "dest_state",
+    "offered_total_rate",
+    "offered_rpm",
+    "decision",
+    "projected_profit",
+    "projected_margin_percent",
+))
+
+def _log_summary(r) -> Dict[str, Any]:
+    return {
         "created_at": r.created_at.isoformat(),
         "user": r.user_email,
         "role": r.user_role,
@@ -640,4 +5497,639 @@ def recent_logs(limit: int = 20, current_user: User = Depends(get_current_user),
         "decision": r.decision,
         "projected_profit": r.projected_profit,
         "projected_margin_percent": r.projected_margin_percent,
-    } for r in rows]
+    }
+
+def encode_log_cursor(created_at: datetime, log_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{log_id}".encode()).decode().rstrip("=")
+
+def decode_log_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, log_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _recent_logs_stmt(tenant_id: int, limit: int):
+    return (
+        select(*LOG_SUMMARY_COLUMNS).select_from(LOG_FROM)
+        .where(RecommendationLog.tenant_id == tenant_id)
+        .order_by(RecommendationLog.created_at.desc(), RecommendationLog.id.desc())
+        .limit(min(limit, 100))
+    )
+
+def _logs_page_stmt(tenant_id: int, limit: int, cursor: Optional[str], profile_id: Optional[str], broker_name: Optional[str],
+                    decision: Optional[str], since: Optional[datetime], until: Optional[datetime]):
+    q = select(*LOG_SUMMARY_COLUMNS).select_from(LOG_FROM).where(RecommendationLog.tenant_id == tenant_id)
+    if profile_id is not None:
+        q = q.where(RecommendationLog.profile_id == profile_id)
+    if broker_name is not None:
+        q = q.where(RecommendationLog.broker_id == select(LogBroker.id).where(LogBroker.name == broker_name).scalar_subquery())
+    if decision is not None:
+        q = q.where(RecommendationLog.decision == decision)
+    if since is not None:
+        q = q.where(RecommendationLog.created_at >= since)
+    if until is not None:
+        q = q.where(RecommendationLog.created_at < until)
+    if cursor:
+        c_at, c_id = decode_log_cursor(cursor)
+        # the bare `created_at <= c_at` gives the planner an index range; the OR only
+        # trims ties at the boundary timestamp
+        q = q.where(
+            RecommendationLog.created_at <= c_at,
+            or_(RecommendationLog.created_at < c_at, RecommendationLog.id < c_id),
+        )
+    return q.order_by(RecommendationLog.created_at.desc(), RecommendationLog.id.desc()).limit(limit + 1)
+
+def _log_order(r) -> Tuple[datetime, int]:
+    return r.created_at, r.id
+
+def _archived_floor(rows: list, limit: int, since: Optional[datetime]) -> Optional[datetime]:
+    """Archived rows older than a full page of hot ones cannot make the page: read only
+    the archive months that reach that far."""
+    return rows[-1].created_at if len(rows) > limit else since
+
+def _merge_archived(rows: list, archived: list, limit: int) -> list:
+    """Hot and archived rows, newest first. The write-behind buffer can commit a row into a
+    month that is already archived, so the two streams interleave rather than one
+    following the other."""
+    return list(itertools.islice(heapq.merge(rows, archived, key=_log_order, reverse=True), limit + 1))
+
+def _logs_page(rows: list, limit: int) -> Dict[str, Any]:
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [{"id": r.id, **_log_summary(r)} for r in rows],
+        "next_cursor": encode_log_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+    }
+
+@app.get("/logs/recent")
+def recent_logs(limit: int = 20, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    return [_log_summary(r) for r in db.execute(_recent_logs_stmt(current_user.tenant_id, limit))]
+
+@app.get("/logs")
+def list_logs(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    profile_id: Optional[str] = None,
+    broker_name: Optional[str] = None,
+    decision: Optional[Literal["GO", "REVIEW", "NO-GO"]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_archived: bool = False,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Newest-first log history, paged by an opaque (created_at, id) cursor.
+
+    Each filter is an equality on the second column of a (tenant_id, <col>, created_at, id)
+    index, so a page is an index range scan whatever its depth. include_archived merges in
+    the archived rows by the same (created_at, id) order; the cursor format is the same."""
+    limit = max(1, min(limit, 500))
+    q = _logs_page_stmt(current_user.tenant_id, limit, cursor, profile_id, broker_name, decision, since, until)
+    rows = db.execute(q).all()
+    if include_archived:
+        archived = archived_logs_page(db, current_user.tenant_id, limit + 1, cursor, profile_id, broker_name, decision,
+                                      _archived_floor(rows, limit, since), until)
+        rows = _merge_archived(rows, archived, limit)
+    return _logs_page(rows, limit)
+
+def _log_script_stmt(tenant_id: int, log_id: int):
+    return (
+        select(RecommendationLog.negotiation_script, RecommendationLog.script_template_id, RecommendationLog.script_template_version,
+               *(LOG_FIELDS[name].label(name) for name in SCRIPT_FIELDS if name != "target_total_rate"))
+        .select_from(LOG_FROM)
+        .where(RecommendationLog.tenant_id == tenant_id, RecommendationLog.id == log_id)
+    )
+
+def _archived_script_row(conn: Union[Session, Any], tenant_id: int, log_id: int) -> Mapping[str, Any]:
+    archived = find_archived_log(conn, tenant_id, log_id)
+    if archived is None:
+        raise HTTPException(status_code=404, detail="Log not found")
+    return archived._asdict()
+
+def _log_script_out(log_id: int, mapping: Mapping[str, Any], script: str) -> Dict[str, Any]:
+    return {
+        "log_id": log_id,
+        "template_id": mapping["script_template_id"],
+        "template_version": mapping["script_template_version"],
+        "negotiation_script": script,
+    }
+
+@app.get("/logs/{log_id}/script")
+def log_script(log_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    row = db.execute(_log_script_stmt(current_user.tenant_id, log_id)).first()
+    mapping = row._mapping if row is not None else _archived_script_row(db, current_user.tenant_id, log_id)
+    return _log_script_out(log_id, mapping, render_log_script(db, current_user.tenant_id, mapping))
+
+# ---- Log retention ----
+def _retention_out(db: Session, tenant_id: int) -> Dict[str, Any]:
+    tenant_days = db.execute(select(Tenant.log_retention_days).where(Tenant.id == tenant_id)).scalar()
+    oldest = db.execute(select(func.min(RecommendationLog.created_at)).where(RecommendationLog.tenant_id == tenant_id)).scalar()
+    months = archive_entries(db, tenant_id)
+    return {
+        "retention_days": retention_days(tenant_days),
+        "tenant_override": tenant_days,
+        "default_days": LOG_RETENTION_DAYS,
+        "oldest_hot_log": oldest.isoformat() if oldest else None,
+        "archived_rows": sum(m.rows for m in months),
+        "archived_bytes": sum(m.bytes for m in months),
+        "archive": [{"month": m.month, "rows": m.rows, "bytes": m.bytes, "from": m.min_created_at.isoformat(),
+                     "to": m.max_created_at.isoformat()} for m in months],
+    }
+
+def _retention_update_stmt(tenant_id: int, payload: RetentionPolicyIn):
+    if payload.days and not LOG_ARCHIVE_DIR:
+        raise HTTPException(status_code=400, detail="Log archival is off: set ADA_LOG_ARCHIVE_DIR to a persistent directory")
+    return update(Tenant).where(Tenant.id == tenant_id).values(log_retention_days=payload.days)
+
+@app.get("/logs/retention")
+def get_log_retention(current_user: Principal = Depends(require_role({"OWNER", "ADMIN"})), db: Session = Depends(get_db)):
+    return _retention_out(db, current_user.tenant_id)
+
+@app.put("/logs/retention")
+def set_log_retention(payload: RetentionPolicyIn, current_user: Principal = Depends(require_role({"OWNER"})), db: Session = Depends(get_db)):
+    db.execute(_retention_update_stmt(current_user.tenant_id, payload))
+    db.commit()
+    return _retention_out(db, current_user.tenant_id)
+
+@app.post("/logs/retention/run")
+def run_log_retention(current_user: Principal = Depends(require_role({"OWNER", "ADMIN"}))):
+    """Archive this tenant's rows past its retention window now, instead of waiting for
+    the background worker / CLI."""
+    t0 = time.perf_counter()
+    try:
+        moved = archive_logs(current_user.tenant_id).get(current_user.tenant_id, 0)
+    except ArchiveUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"archived": moved, "elapsed_ms": (time.perf_counter() - t0) * 1000}
+
+# ---- Log export ----
+LOG_EXPORT_COLUMNS = tuple(c for c in LOG_COLUMNS if c.name not in ("tenant_id", "negotiation_script"))
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv", "columnar": "application/x-ndjson"}
+
+def _export_value(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+def _encode_export_chunk(fmt: str, names: List[str], chunk) -> str:
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in chunk:
+            writer.writerow([_export_value(v) for v in row])
+        return buf.getvalue()
+    if fmt == "columnar":
+        return json.dumps({"rows": len(chunk), "data": [[_export_value(v) for v in col] for col in zip(*chunk)]}) + "\n"
+    return "".join(json.dumps(dict(zip(names, map(_export_value, row)))) + "\n" for row in chunk)
+
+def _archived_export_rows(conn, tenant_id: int, since: Optional[datetime], until: Optional[datetime]) -> Iterable[ArchivedLog]:
+    """The tenant's archived rows, oldest first (months are disjoint, each is sorted)."""
+    for entry in archive_entries(conn, tenant_id, since, until):
+        for r in archive_cache.rows(entry):
+            if (since is None or r.created_at >= since) and (until is None or r.created_at < until):
+                yield r
+
+def iter_log_export(tenant_id: int, fmt: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    include_script: bool = False, include_archived: bool = False):
+    """Yield the tenant's log history as encoded chunks, oldest first.
+
+    Rows come off a server-side cursor EXPORT_CHUNK_ROWS at a time and each chunk is
+    encoded and released before the next is fetched, so memory stays flat however
+    many rows are exported. "columnar" writes a header line with the column names,
+    then one line per chunk holding one array per column. include_script re-renders
+    each templated row's negotiation_script. include_archived merges in the archived
+    months by the same (created_at, id) order.
+    """
+    cols = LOG_EXPORT_COLUMNS + ((RecommendationLog.negotiation_script,) if include_script else ())
+    names = [c.name for c in cols]
+    q = select(*cols).select_from(LOG_FROM).where(RecommendationLog.tenant_id == tenant_id)
+    if since is not None:
+        q = q.where(RecommendationLog.created_at >= since)
+    if until is not None:
+        q = q.where(RecommendationLog.created_at < until)
+    q = q.order_by(RecommendationLog.created_at.asc(), RecommendationLog.id.asc())
+
+    if fmt == "csv":
+        buf = io.StringIO()
+        csv.writer(buf).writerow(names)
+        yield buf.getvalue()
+    elif fmt == "columnar":
+        yield json.dumps({"columns": names}) + "\n"
+
+    # own connection: the request's Session is closed before the body is streamed
+    fields = names[:-1] if include_script else names
+    with engine.connect() as conn:
+        chunks = conn.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS).execute(q).partitions()
+        if include_archived:
+            # a write-behind commit can land in an already archived month: merge, don't append
+            merged = heapq.merge(_archived_export_rows(conn, tenant_id, since, until),
+                                 itertools.chain.from_iterable(chunks), key=_log_order)
+            chunks = iter(lambda: list(itertools.islice(merged, EXPORT_CHUNK_ROWS)), [])
+        for chunk in chunks:
+            if include_script:
+                chunk = [tuple(getattr(r, n) for n in fields) + (render_log_script(conn, tenant_id, r._asdict()),) for r in chunk]
+            elif include_archived:
+                chunk = [tuple(getattr(r, n) for n in fields) for r in chunk]
+            yield _encode_export_chunk(fmt, names, chunk)
+
+def _export_response(tenant_id: int, fmt: str, since: Optional[datetime], until: Optional[datetime],
+                     include_script: bool, include_archived: bool) -> StreamingResponse:
+    filename = {"ndjson": "recommendation_logs.ndjson", "csv": "recommendation_logs.csv",
+                "columnar": "recommendation_logs.columnar.ndjson"}[fmt]
+    return StreamingResponse(
+        iter_log_export(tenant_id, fmt, since, until, include_script, include_archived),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/logs/export")
+def export_logs(
+    format: Literal["ndjson", "csv", "columnar"] = "ndjson",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_script: bool = False,
+    include_archived: bool = False,
+    current_user: Principal = Depends(get_current_user),
+):
+    return _export_response(current_user.tenant_id, format, since, until, include_script, include_archived)
+
+# ---- Analytics (answered from log_rollups) ----
+def _rollup_out(r) -> Dict[str, Any]:
+    loads = r.loads or 0
+    return {
+        "key": r.key,
+        "loads": loads,
+        "decisions": {"GO": r.go_count, "REVIEW": r.review_count, "NO-GO": r.nogo_count},
+        "avg_offered_rpm": r.sum_offered_rpm / loads if loads else 0.0,
+        "avg_break_even_rpm": r.sum_break_even_rpm / loads if loads else 0.0,
+        "avg_rpm_over_break_even": (r.sum_offered_rpm - r.sum_break_even_rpm) / loads if loads else 0.0,
+        "total_offered": r.sum_offered_total_rate,
+        "total_projected_profit": r.sum_projected_profit,
+        "avg_projected_profit": r.sum_projected_profit / loads if loads else 0.0,
+    }
+
+def _rollups_stmt(tenant_id: int, dimension: str, key: Optional[str], order_by: str, limit: int):
+    R = LogRollup
+    q = select(R).where(R.tenant_id == tenant_id, R.dimension == dimension)
+    if key is not None:
+        return q.where(R.key == key)
+    order = {"loads": R.loads.desc(), "profit": R.sum_projected_profit.desc(), "key": R.key.asc()}[order_by]
+    return q.order_by(order).limit(max(1, min(limit, 500)))
+
+def _rollup_key_out(dimension: str, key: str, r) -> Dict[str, Any]:
+    if r is None:
+        raise HTTPException(status_code=404, detail=f"No {dimension} rollup for {key!r}")
+    return _rollup_out(r)
+
+@app.get("/analytics/{dimension}")
+def analytics(
+    dimension: Literal["lane", "broker", "profile", "day"],
+    key: Optional[str] = None,
+    order_by: Literal["loads", "profit", "key"] = "loads",
+    limit: int = 50,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Per-tenant aggregates by lane (origin_state→dest_state), broker, profile or UTC day.
+    A single key is one unique-index lookup; listings read only the rollup rows."""
+    q = _rollups_stmt(current_user.tenant_id, dimension, key, order_by, limit)
+    if key is not None:
+        return _rollup_key_out(dimension, key, db.execute(q).scalar_one_or_none())
+    return [_rollup_out(r) for r in db.execute(q).scalars()]
+
+
+# -----------------------------
+# Async request path (ASYNC_DB)
+# -----------------------------
+# With an async driver in ADA_DATABASE_URL, the hot routes below replace their sync
+# counterparts: each in-flight request then holds a coroutine instead of a threadpool
+# thread. They share the statements, caches and pricing helpers used above.
+def _install_async_routes() -> None:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    router = APIRouter()
+
+    async def get_current_user_async(db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)) -> Principal:
+        with stage("auth"):
+            cached = principal_cache.get(token)
+            if cached is not None:
+                return cached
+
+            payload, email, tenant_id = _token_claims(token)
+            generation = principal_cache.generation(tenant_id)
+            user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+            return _verified_principal(token, payload, tenant_id, user, generation)
+
+    def require_role_async(allowed: set[str]):
+        async def _guard(user: Principal = Depends(get_current_user_async)) -> Principal:
+            if user.role not in allowed:
+                raise HTTPException(status_code=403, detail=f"Requires role: {', '.join(sorted(allowed))}")
+            return user
+        return _guard
+
+    async def get_fuel_prices_async(db: AsyncSession, tenant_id: int) -> FuelPrices:
+        fuel = fuel_cache.get(tenant_id)
+        if fuel is None:
+            generation = fuel_cache.generation(tenant_id)
+            as_of = datetime.utcnow().date()
+            current, next_change = _fuel_stmts(tenant_id, as_of)
+            rows = (await db.execute(current)).all()
+            fuel = _store_fuel(tenant_id, as_of, rows, (await db.execute(next_change)).scalar(), generation)
+        return fuel
+
+    async def get_compiled_profiles_async(db: AsyncSession, tenant_id: int, profile_ids: List[str]) -> Dict[str, CompiledProfile]:
+        fuel = await get_fuel_prices_async(db, tenant_id)
+        found, missing = _cached_profiles(tenant_id, profile_ids, fuel)
+        if missing:
+            generation = profile_cache.generation(tenant_id)
+            _store_profiles((await db.execute(_profiles_stmt(tenant_id, missing))).scalars(), generation, found, fuel)
+        return found
+
+    async def get_active_script_async(db: AsyncSession, tenant_id: int) -> CompiledScript:
+        compiled = script_cache.active(tenant_id)
+        if compiled is None:
+            generation = script_cache.generation(tenant_id)
+            compiled = _store_active_script(tenant_id, (await db.execute(_active_script_stmt(tenant_id))).scalars().first(), generation)
+        return compiled
+
+    async def record_logs_async(db: AsyncSession, rows: List[Dict[str, Any]], durable: bool) -> None:
+        if durable or not LOG_WRITE_BEHIND:
+            await db.run_sync(write_logs, rows)
+            await db.commit()
+        elif not log_writer.try_submit(rows):
+            # buffer full: let the blocking submit apply backpressure off the event loop
+            await run_in_threadpool(log_writer.submit, rows)
+
+    @router.get("/profiles")
+    async def list_profiles_async(current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+        rows = (await db.execute(_profile_list_stmt(current_user.tenant_id))).scalars()
+        return [_profile_summary(r) for r in rows]
+
+    @router.get("/profiles/{profile_id}")
+    async def get_profile_async(profile_id: str, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+        r = (await db.execute(_profile_stmt(current_user.tenant_id, profile_id))).scalars().first()
+        if not r:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return _profile_detail(r)
+
+    @router.post("/profiles")
+    async def upsert_profile_async(payload: ProfileIn, current_user: Principal = Depends(require_role_async({"OWNER", "ADMIN"})), db: AsyncSession = Depends(get_async_db)):
+        r = (await db.execute(_profile_stmt(current_user.tenant_id, payload.profile_id))).scalars().first()
+        db.add(_apply_profile(r, payload, current_user.tenant_id))
+        await db.commit()
+        profile_cache.invalidate(current_user.tenant_id, payload.profile_id)
+        return {"ok": True, "profile_id": payload.profile_id}
+
+    @router.delete("/profiles/{profile_id}")
+    async def delete_profile_async(profile_id: str, current_user: Principal = Depends(require_role_async({"OWNER", "ADMIN"})), db: AsyncSession = Depends(get_async_db)):
+        r = (await db.execute(_profile_stmt(current_user.tenant_id, profile_id))).scalars().first()
+        if not r:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        await db.delete(r)
+        await db.commit()
+        profile_cache.invalidate(current_user.tenant_id, profile_id)
+        return {"ok": True}
+
+    @router.post("/recommend", response_model=RecommendationOut)
+    async def recommend_async(req: LoadRequest, response: Response, durable: bool = False,
+                              idempotency_key: Optional[str] = Header(None, max_length=255),
+                              current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+        req_dict = _load_dict(req)
+        with stage("profile"):
+            profile = (await get_compiled_profiles_async(db, current_user.tenant_id, [req.profile_id])).get(req.profile_id)
+        if not profile:
+            raise HTTPException(status_code=404, detail="Profile not found")
+
+        with stage("template"):
+            template = await get_active_script_async(db, current_user.tenant_id)
+        claim = _claim(current_user, req_dict, idempotency_key, profile, template)
+        if not claim.owner:
+            out = await claim.result_async()
+            response.headers["Idempotent-Replayed"] = "true"
+            if durable and LOG_WRITE_BEHIND:
+                await run_in_threadpool(log_writer.flush)  # the first request's row may still be buffered
+            return out
+        try:
+            out, log_row = _recommend_one(profile, req_dict, current_user, template)
+            with stage("log"):
+                await record_logs_async(db, [log_row], durable)
+        except BaseException as e:
+            claim.fail(e)
+            raise
+        claim.done(out)
+        return out
+
+    @router.post("/recommend/batch", response_model=BatchRecommendationOut)
+    async def recommend_batch_async(payload: BatchLoadRequest, durable: bool = False, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+        req_dicts, groups = _batch_groups(payload)
+        with stage("profile"):
+            profiles = await get_compiled_profiles_async(db, current_user.tenant_id, list(groups))
+        with stage("template"):
+            template = await get_active_script_async(db, current_user.tenant_id)
+        with stage("pricing"):
+            results, log_rows = _recommend_many(profiles, req_dicts, groups, current_user, template)
+        with stage("log"):
+            await record_logs_async(db, log_rows, durable)
+        return BatchRecommendationOut(count=len(results), results=results)
+
+    @router.post("/recommend/fleet", response_model=FleetRecommendationOut)
+    async def recommend_fleet_async(
+        load: LoadDetails,
+        limit: int = 25,
+        decision: Optional[Literal["GO", "REVIEW", "NO-GO"]] = None,
+        current_user: Principal = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db),
+    ):
+        fuel = await get_fuel_prices_async(db, current_user.tenant_id)
+        fleet = profile_cache.get_fleet(current_user.tenant_id, fuel)
+        if fleet is None:
+            generation = profile_cache.generation(current_user.tenant_id)
+            rows = (await db.execute(_fleet_stmt(current_user.tenant_id))).scalars()
+            fleet = _store_fleet(current_user.tenant_id, rows, generation, fuel)
+        template = await get_active_script_async(db, current_user.tenant_id)
+        return _recommend_fleet(fleet, load, limit, decision, template)
+
+    @router.post("/recommend/sweep", response_model=SweepOut)
+    async def recommend_sweep_async(payload: SweepRequest, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+        profile = (await get_compiled_profiles_async(db, current_user.tenant_id, [payload.load.profile_id])).get(payload.load.profile_id)
+        if not profile:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return _sweep(profile, payload)
+
+    @router.get("/logs/recent")
+    async def recent_logs_async(limit: int = 20, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+        return [_log_summary(r) for r in await db.execute(_recent_logs_stmt(current_user.tenant_id, limit))]
+
+    @router.get("/logs")
+    async def list_logs_async(
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        profile_id: Optional[str] = None,
+        broker_name: Optional[str] = None,
+        decision: Optional[Literal["GO", "REVIEW", "NO-GO"]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        include_archived: bool = False,
+        current_user: Principal = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db),
+    ):
+        limit = max(1, min(limit, 500))
+        q = _logs_page_stmt(current_user.tenant_id, limit, cursor, profile_id, broker_name, decision, since, until)
+        rows = (await db.execute(q)).all()
+        if include_archived:
+            def archived():  # file reads + decoding: off the event loop
+                with engine.connect() as conn:
+                    return archived_logs_page(conn, current_user.tenant_id, limit + 1, cursor, profile_id, broker_name,
+                                              decision, _archived_floor(rows, limit, since), until)
+
+            rows = _merge_archived(rows, await run_in_threadpool(archived), limit)
+        return _logs_page(rows, limit)
+
+    @router.get("/logs/export")
+    async def export_logs_async(
+        format: Literal["ndjson", "csv", "columnar"] = "ndjson",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        include_script: bool = False,
+        include_archived: bool = False,
+        current_user: Principal = Depends(get_current_user_async),
+    ):
+        # the body still streams from a sync server-side cursor (and archive files), one
+        # chunk per threadpool hop; only auth moves onto the event loop
+        return _export_response(current_user.tenant_id, format, since, until, include_script, include_archived)
+
+    @router.get("/logs/{log_id}/script")
+    async def log_script_async(log_id: int, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+        row = (await db.execute(_log_script_stmt(current_user.tenant_id, log_id))).first()
+        if row is not None:
+            mapping = row._mapping
+        else:
+            def archived():  # file reads + decoding: off the event loop
+                with engine.connect() as conn:
+                    return _archived_script_row(conn, current_user.tenant_id, log_id)
+
+            mapping = await run_in_threadpool(archived)
+        return _log_script_out(log_id, mapping, await db.run_sync(render_log_script, current_user.tenant_id, mapping))
+
+    @router.get("/logs/retention")
+    async def get_log_retention_async(current_user: Principal = Depends(require_role_async({"OWNER", "ADMIN"})), db: AsyncSession = Depends(get_async_db)):
+        return await db.run_sync(_retention_out, current_user.tenant_id)
+
+    @router.put("/logs/retention")
+    async def set_log_retention_async(payload: RetentionPolicyIn, current_user: Principal = Depends(require_role_async({"OWNER"})), db: AsyncSession = Depends(get_async_db)):
+        await db.execute(_retention_update_stmt(current_user.tenant_id, payload))
+        await db.commit()
+        return await db.run_sync(_retention_out, current_user.tenant_id)
+
+    @router.get("/analytics/{dimension}")
+    async def analytics_async(
+        dimension: Literal["lane", "broker", "profile", "day"],
+        key: Optional[str] = None,
+        order_by: Literal["loads", "profit", "key"] = "loads",
+        limit: int = 50,
+        current_user: Principal = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db),
+    ):
+        q = _rollups_stmt(current_user.tenant_id, dimension, key, order_by, limit)
+        if key is not None:
+            return _rollup_key_out(dimension, key, (await db.execute(q)).scalar_one_or_none())
+        return [_rollup_out(r) for r in (await db.execute(q)).scalars()]
+
+    # swap out the sync routes these replace, then mount the async ones
+    replaced = {(route.path, method) for route in router.routes for method in route.methods}
+    app.router.routes[:] = [
+        r for r in app.router.routes
+        if not (isinstance(r, APIRoute) and any((r.path, m) in replaced for m in r.methods))
+    ]
+    app.include_router(router)
+
+if ASYNC_DB:
+    _install_async_routes()
+
+
+# -----------------------------
+# Maintenance CLI
+# -----------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ADA maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("init-db", help="create missing tables, columns and indexes (run at deploy with ADA_MIGRATE_ON_STARTUP=0)")
+
+    p = sub.add_parser("rebuild-rollups", help="recompute log_rollups from recommendation_logs")
+    p.add_argument("--tenant-id", type=int)
+    p.add_argument("--chunk-rows", type=int, default=50000)
+
+    p = sub.add_parser("verify-rollups", help="compare log_rollups with a brute-force aggregation")
+    p.add_argument("--tenant-id", type=int)
+
+    p = sub.add_parser("encode-logs", help="convert a legacy recommendation_logs table to the dictionary-encoded layout "
+                                           "(API stopped; resumable)")
+    p.add_argument("--chunk-rows", type=int, default=50000)
+
+    sub.add_parser("db-info", help="print effective pool settings and SQLite pragmas")
+
+    p = sub.add_parser("archive-logs", help="move logs past each tenant's retention window to the archive")
+    p.add_argument("--tenant-id", type=int)
+    p.add_argument("--batch-rows", type=int, default=LOG_ARCHIVE_BATCH_ROWS)
+
+    p = sub.add_parser("import-fuel-prices", help="bulk insert / replace fuel prices from a CSV (region,effective_date,price)")
+    p.add_argument("path")
+    p.add_argument("--tenant-id", type=int, default=GLOBAL_FUEL_TENANT, help="default: the global index")
+
+    args = parser.parse_args(argv)
+    if args.command == "init-db":
+        t0 = time.perf_counter()
+        migrate_schema(engine)
+        print(f"schema up to date in {time.perf_counter() - t0:.2f}s")
+        return 0
+    if MIGRATE_ON_STARTUP:  # as a server start would
+        migrate_schema(engine)
+    if args.command == "rebuild-rollups":
+        t0 = time.perf_counter()
+        scanned = rebuild_rollups(args.tenant_id, args.chunk_rows)
+        print(f"rebuilt rollups from {scanned} log rows in {time.perf_counter() - t0:.1f}s")
+        return 0
+    if args.command == "verify-rollups":
+        with SessionLocal() as db:
+            tenant_ids = [args.tenant_id] if args.tenant_id is not None else [t for (t,) in db.query(Tenant.id)]
+        problems = [p for t in tenant_ids for p in (f"tenant {t}: {m}" for m in rollup_mismatches(t))]
+        for line in problems:
+            print(line)
+        print(f"{len(problems)} mismatches across {len(tenant_ids)} tenant(s)")
+        return 1 if problems else 0
+    if args.command == "encode-logs":
+        t0 = time.perf_counter()
+        copied = encode_legacy_logs(engine, args.chunk_rows,
+                                    progress=lambda n: print(f"  {n} rows encoded ({time.perf_counter() - t0:.1f}s)"))
+        migrate_schema(engine)  # the columns / indexes skipped while the table was legacy
+        print(f"encoded {copied} log rows in {time.perf_counter() - t0:.1f}s")
+        return 0
+    if args.command == "db-info":
+        for k, v in database_settings().items():
+            print(f"{k}: {v}")
+        return 0
+    if args.command == "archive-logs":
+        t0 = time.perf_counter()
+        try:
+            moved = archive_logs(args.tenant_id, batch_rows=args.batch_rows)
+        except ArchiveUnavailable as e:
+            print(e, file=sys.stderr)
+            return 1
+        for tenant_id, n in sorted(moved.items()):
+            print(f"tenant {tenant_id}: archived {n} rows")
+        print(f"archived {sum(moved.values())} rows in {time.perf_counter() - t0:.1f}s")
+        return 0
+    if args.command == "import-fuel-prices":
+        with open(args.path, newline="") as f:
+            prices = [FuelPriceIn(**row).model_dump() for row in csv.DictReader(f)]
+        with engine.begin() as conn:
+            rows = upsert_fuel_prices(conn, args.tenant_id, prices)
+        fuel_cache.invalidate(args.tenant_id)  # reaches running workers when they share ADA_CACHE_BUS=shm
+        scope = "global index" if args.tenant_id == GLOBAL_FUEL_TENANT else f"tenant {args.tenant_id}"
+        print(f"wrote {rows} fuel prices to the {scope}")
+        return 0
+    return 2
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,286 @@
+"""
+Shared helpers for the ADA benchmark scripts.
+
+Every script runs the app in-process against a throwaway SQLite file unless
+ADA_DATABASE_URL is already set, e.g.:
+
+    python bench/bench_batch_recommend.py --n 1000
+
+Scripts that take --save-baseline / --compare store their summary as JSON (by default
+under bench/baselines/, which is machine-specific and not committed) and exit 1 when a
+later run regresses past --tolerance.
+"""
+
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT, "bench", "baselines")
+
+
+def load_app():
+    """Point ADA at a temp database (unless configured) and import the app module.
+
+    The scripts replay deterministic loads, so /recommend's content dedupe is off unless
+    ADA_RECOMMEND_DEDUPE_TTL is set: every request is priced and logged. The schema is
+    migrated here, as `app.py init-db` would at deploy, so scripts can use the database
+    before (or without) starting the app."""
+    if "ADA_DATABASE_URL" not in os.environ:
+        tmp = tempfile.mkdtemp(prefix="ada-bench-")
+        os.environ["ADA_DATABASE_URL"] = f"sqlite:///{tmp}/ada.db"
+    os.environ.setdefault("ADA_RECOMMEND_DEDUPE_TTL", "0")
+    os.environ.setdefault("ADA_MIGRATE_ON_STARTUP", "0")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app as ada
+    ada.migrate_schema(ada.engine)
+    return ada
+
+
+def register(client, tenant_name: str, email: str, password: str = "bench-password") -> Dict[str, str]:
+    r = client.post("/auth/register", json={"tenant_name": tenant_name, "email": email, "password": password})
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def create_profile(client, headers: Dict[str, str], profile_id: str = "truck-1", **overrides) -> None:
+    body = {"profile_id": profile_id, "display_name": profile_id.title(), "block_brokers": {"Slow Pay Logistics": "90-day pay"}}
+    body.update(overrides)
+    client.post("/profiles", json=body, headers=headers).raise_for_status()
+
+
+BROKERS = ["TQL", "CH Robinson", "Coyote", "Echo", "Slow Pay Logistics", "Landstar", "RXO"]
+LANES = [
+    ("Dallas", "TX", "Atlanta", "GA", 780, "Southeast"),
+    ("Chicago", "IL", "Columbus", "OH", 355, "Midwest"),
+    ("Los Angeles", "CA", "Phoenix", "AZ", 372, "West"),
+    ("Newark", "NJ", "Charlotte", "NC", 530, "Northeast"),
+    ("Denver", "CO", "Salt Lake City", "UT", 520, "Southwest"),
+]
+
+
+def sample_load(i: int, profile_id: str = "truck-1") -> dict:
+    """Deterministic, varied load so batches exercise GO / REVIEW / NO-GO and blocked brokers."""
+    oc, os_, dc, ds, miles, region = LANES[i % len(LANES)]
+    return {
+        "profile_id": profile_id,
+        "origin_city": oc,
+        "origin_state": os_,
+        "dest_city": dc,
+        "dest_state": ds,
+        "broker_name": BROKERS[i % len(BROKERS)],
+        "loaded_miles": miles,
+        "deadhead_miles": float((i * 37) % 220),
+        "offered_total_rate": round(miles * (1.6 + (i % 23) * 0.06), 2),
+        "fuel_region": region,
+    }
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def summarize(samples_s: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    ms = [s * 1000.0 for s in samples_s]
+    return {
+        "n": len(ms),
+        "mean_ms": sum(ms) / len(ms) if ms else 0.0,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+    }
+
+
+def timeit(fn: Callable[[], object], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def tenant_id_for(ada, tenant_name: str) -> int:
+    with ada.SessionLocal() as db:
+        return db.query(ada.Tenant.id).filter(ada.Tenant.name == tenant_name).scalar()
+
+
+def seed_logs(ada, tenant_id: int, rows: int, other_tenants: int = 0, chunk: int = 50000,
+              start: datetime = datetime(2024, 1, 1), through_app: bool = False):
+    """Bulk-insert synthetic log rows 7s apart; every (other_tenants + 1)th row belongs
+    to tenant_id, the rest to the following tenant ids. through_app=True goes through
+    ada.write_logs (so derived tables are maintained) instead of a raw insert."""
+    from sqlalchemy import insert
+
+    rng = random.Random(7)
+    t0 = time.perf_counter()
+    with ada.engine.begin() as conn:
+        for base in range(0, rows, chunk):
+            batch = []
+            for i in range(base, min(rows, base + chunk)):
+                oc, os_, dc, ds, miles, region = LANES[i % len(LANES)]
+                rpm = 1.7 + rng.random()
+                be = 2.05 + (i % 3) * 0.05
+                profit = (rpm - be) * miles
+                batch.append({
+                    "tenant_id": tenant_id + i % (other_tenants + 1),
+                    "user_email": f"dispatcher{i % 5}@bench.example.com",
+                    "user_role": "DISPATCHER",
+                    "profile_id": f"truck-{i % 20}",
+                    "broker_name": BROKERS[i % len(BROKERS)],
+                    "origin_city": oc, "origin_state": os_, "dest_city": dc, "dest_state": ds,
+                    "equipment_type": "Van",
+                    "loaded_miles": miles, "deadhead_miles": 25.0, "offered_total_rate": rpm * miles,
+                    "fuel_region": region,
+                    "decision": "GO" if rpm >= be * 1.15 else ("NO-GO" if rpm < be else "REVIEW"),
+                    "offered_rpm": rpm, "break_even_rpm": be, "target_rpm": be * 1.25,
+                    "projected_profit": profit, "projected_margin_percent": profit / (rpm * miles),
+                    "negotiation_script": "", "script_template_id": "default", "script_template_version": 1,
+                    "created_at": start + timedelta(seconds=i * 7),
+                })
+            if through_app:
+                ada.write_logs(conn, batch)
+            else:
+                conn.execute(insert(ada.RecommendationLog), ada.log_dictionary.encode(conn, batch))
+    print(f"seeded {rows:,} rows in {time.perf_counter() - t0:.1f}s")
+
+
+def seed_tenants(ada, tenants: int, profiles: int, users: int, password: str = "bench-password",
+                 prefix: str = "seed") -> List[dict]:
+    """Insert `tenants` tenants with one OWNER plus `users` - 1 DISPATCHERs and `profiles`
+    varied profiles each, straight into the database (one bcrypt hash shared by every user).
+    Returns [{"id", "name", "emails", "profile_ids"}] in tenant id order."""
+    from sqlalchemy import insert
+
+    rng = random.Random(17)
+    password_hash = ada.hash_password(password)
+    t0 = time.perf_counter()
+    with ada.SessionLocal() as db:
+        names = [f"{prefix}-{t:04d}" for t in range(tenants)]
+        db.execute(insert(ada.Tenant), [{"name": n} for n in names])
+        ids = dict(db.query(ada.Tenant.name, ada.Tenant.id).filter(ada.Tenant.name.in_(names)))
+        seeded, user_rows, profile_rows = [], [], []
+        for name in names:
+            tid = ids[name]
+            emails = [f"u{u}@{name}.example.com" for u in range(max(1, users))]
+            for u, email in enumerate(emails):
+                user_rows.append({"tenant_id": tid, "email": email, "password_hash": password_hash,
+                                  "role": "OWNER" if u == 0 else "DISPATCHER"})
+            profile_ids = [f"truck-{p}" for p in range(profiles)]
+            for pid in profile_ids:
+                body = ada.ProfileIn(
+                    profile_id=pid, display_name=pid.title(),
+                    driver_pay_per_mile=rng.uniform(0.55, 0.85), mpg=rng.uniform(5.8, 7.4),
+                    fixed_costs_per_day=rng.uniform(150, 260), max_deadhead_miles=rng.choice([75, 100, 150, 200]),
+                    block_brokers={"Slow Pay Logistics": "90-day pay"} if rng.random() < 0.3 else {},
+                )
+                profile_rows.append(ada._apply_profile(None, body, tid))
+            seeded.append({"id": tid, "name": name, "emails": emails, "profile_ids": profile_ids})
+        db.execute(insert(ada.User), user_rows)
+        db.add_all(profile_rows)
+        db.commit()
+    seeded.sort(key=lambda t: t["id"])
+    print(f"seeded {tenants} tenants x ({users} users, {profiles} profiles) in {time.perf_counter() - t0:.1f}s")
+    return seeded
+
+
+def baseline_path(name: str, path: str = None) -> str:
+    return path or os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, float]], config: dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    meta = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "saved_at": datetime.utcnow().isoformat(timespec="seconds"), "config": config}
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, sort_keys=True)
+    print(f"baseline saved to {path}")
+
+
+def compare_baseline(path: str, results: Dict[str, Dict[str, float]], config: dict, tolerance: float) -> int:
+    """Print per-metric deltas against a saved baseline; returns the number of regressions.
+    Keys ending in _ms / _ns are lower-is-better, everything else higher-is-better."""
+    with open(path) as f:
+        baseline = json.load(f)
+    meta = baseline["meta"]
+    if meta.get("config") != config:
+        print(f"warning: baseline config {meta.get('config')} differs from this run {config}")
+    if (meta.get("python"), meta.get("cpus")) != (platform.python_version(), os.cpu_count()):
+        print(f"warning: baseline was taken on python {meta.get('python')} / {meta.get('cpus')} cpus")
+    regressions = 0
+    print(f"vs baseline {path} ({meta.get('saved_at')}), tolerance {tolerance:.0%}:")
+    for name, metrics in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"  {name:32s} (not in baseline)")
+            continue
+        cells = []
+        for key, value in metrics.items():
+            old = base.get(key)
+            if not isinstance(old, (int, float)) or not old:
+                continue
+            change = value / old - 1
+            lower_is_better = key.endswith(("_ms", "_ns"))
+            worse = change > tolerance if lower_is_better else change < -tolerance
+            regressions += worse
+            cells.append(f"{key} {change:+.1%}{' REGRESSED' if worse else ''}")
+        print(f"  {name:32s} " + "  ".join(cells))
+    print(f"{regressions} regression(s)")
+    return regressions
+
+
+def add_baseline_args(parser) -> None:
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare against the stored baseline (exit 1 on regression)")
+    parser.add_argument("--baseline", help="baseline file (default: bench/baselines/<script>.json)")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown before flagging")
+
+
+def handle_baseline(args, name: str, results: Dict[str, Dict[str, float]], config: dict) -> int:
+    """Apply --save-baseline / --compare; returns the process exit code."""
+    path = baseline_path(name, args.baseline)
+    status = 0
+    if args.compare:
+        if not os.path.exists(path):
+            print(f"no baseline at {path}; run with --save-baseline first")
+            return 2
+        status = 1 if compare_baseline(path, results, config, args.tolerance) else 0
+    if args.save_baseline:
+        save_baseline(path, results, config)
+    return status
+
+
+async def drive_concurrently(send, concurrency: int, total: int) -> List[float]:
+    """Run `total` calls of the coroutine factory `send(i)` across `concurrency` workers;
+    returns per-call latencies in seconds."""
+    import asyncio
+
+    latencies: List[float] = []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            t0 = time.perf_counter()
+            await send(i)
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def async_client(app):
+    import httpx
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver")
@@ -0,0 +1,73 @@
+"""
+Sync vs async database stack under high client concurrency.
+
+Each mode runs in its own interpreter, since ADA_DATABASE_URL picks the stack at import:
+sync uses sqlite:///..., async uses sqlite+aiosqlite:///... on a fresh file.
+
+    python bench/bench_async_db.py --clients 500 --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import async_client, drive_concurrently, sample_load, summarize
+
+
+def run_child(args):
+    from _common import load_app, register, create_profile
+
+    os.environ.setdefault("ADA_ADMISSION_CONCURRENCY", "0")  # the DB stacks alone, not the slot cap
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-async", "owner@bench-async.example.com")
+        create_profile(client, headers)
+
+    async def go():
+        async with async_client(ada.app) as client:
+            async def send(i):
+                if i % 10 == 9:
+                    r = await client.get("/logs/recent", headers=headers)
+                else:
+                    r = await client.post("/recommend", json=sample_load(i), headers=headers)
+                r.raise_for_status()
+
+            await drive_concurrently(send, min(args.clients, 50), args.clients)  # warm-up
+            t0 = time.perf_counter()
+            latencies = await drive_concurrently(send, args.clients, args.requests)
+            return time.perf_counter() - t0, latencies
+
+    elapsed, latencies = asyncio.run(go())
+    ada.log_writer.stop()
+    print(json.dumps({"async": ada.ASYNC_DB, "rps": args.requests / elapsed, **summarize(latencies)}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args)
+
+    print(f"{args.clients} concurrent clients, {args.requests} requests (90% /recommend, 10% /logs/recent)")
+    for label, scheme in (("sync", "sqlite"), ("async", "sqlite+aiosqlite")):
+        env = dict(os.environ, ADA_DATABASE_URL=f"{scheme}:///{tempfile.mkdtemp(prefix='ada-bench-')}/ada.db")
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--clients", str(args.clients), "--requests", str(args.requests)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{label:6s} {r['rps']:8.0f} req/s   p50 {r['p50_ms']:8.1f} ms   p99 {r['p99_ms']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
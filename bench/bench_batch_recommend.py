@@ -0,0 +1,52 @@
+"""
+N single POST /recommend calls vs one POST /recommend/batch of N loads.
+
+    python bench/bench_batch_recommend.py --n 1000
+"""
+
+import argparse
+import time
+
+from _common import load_app, register, create_profile, sample_load
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--profiles", type=int, default=3)
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-batch", "owner@bench-batch.example.com")
+        profile_ids = [f"truck-{p}" for p in range(args.profiles)]
+        for pid in profile_ids:
+            create_profile(client, headers, pid)
+        loads = [sample_load(i, profile_ids[i % len(profile_ids)]) for i in range(args.n)]
+
+        t0 = time.perf_counter()
+        singles = []
+        for load in loads:
+            r = client.post("/recommend", json=load, headers=headers)
+            r.raise_for_status()
+            singles.append(r.json())
+        single_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        r = client.post("/recommend/batch", json={"loads": loads}, headers=headers)
+        r.raise_for_status()
+        batch_s = time.perf_counter() - t0
+        batched = r.json()["results"]
+
+    mismatches = sum(1 for a, b in zip(singles, batched) if a != b)
+    print(f"loads={args.n} profiles={args.profiles}")
+    print(f"single calls : {single_s * 1000:9.1f} ms total  {single_s / args.n * 1e6:8.1f} us/load")
+    print(f"one batch    : {batch_s * 1000:9.1f} ms total  {batch_s / args.n * 1e6:8.1f} us/load")
+    print(f"speedup      : {single_s / batch_s:9.1f}x")
+    print(f"result mismatches vs single path: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Cross-worker cache consistency and hit rate with several processes.
+
+Worker processes share one SQLite file and one ADA_CACHE_BUS backend. Each worker calls
+get_compiled_profile / get_current_user for Zipf-picked tenants at a fixed --rate
+(open loop, so adding workers adds load instead of splitting it). Meanwhile the
+coordinator keeps rewriting a profile's display_name and flipping a user's role (commit,
+then invalidate), the way upsert_profile and change_role do. Every write is bracketed by
+a per-tenant sequence number (odd while a write is in flight). A read that starts and
+ends on the same even number must return exactly that version; anything else is a
+stale hit. Each backend runs in its own interpreter, since ADA_CACHE_BUS is read at import:
+
+  local  per-process generations: other workers keep serving what they cached
+  shm    generation counters shared through a memory-mapped file
+
+    python bench/bench_cache_bus.py --workers 1,2,4 --seconds 5
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROLES = ("DISPATCHER", "ADMIN")
+
+
+def reader(worker: int, tokens: list, tenant_ids: list, profiles: int, skew: float, rate: float, seq_profile, seq_role, go, stop, out):
+    from _common import load_app
+
+    ada = load_app()
+    rng = random.Random(worker)
+    weights = [1.0 / (rank + 1) ** skew for rank in range(len(tenant_ids))]
+    lookups = checked = stale = 0
+    out.put("ready")
+    go.wait()
+    next_at = time.perf_counter()
+    with ada.SessionLocal() as db:
+        while not stop.is_set():
+            next_at += 1.0 / rate
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            t = rng.choices(range(len(tenant_ids)), weights)[0]
+            if rng.random() < 0.5:
+                pid = f"truck-{rng.randrange(profiles)}"
+                s1 = seq_profile[t]
+                compiled = ada.get_compiled_profile(db, tenant_ids[t], pid)
+                if pid == "truck-0" and s1 % 2 == 0 and seq_profile[t] == s1:
+                    checked += 1
+                    stale += compiled.display_name != f"v{s1 // 2}"
+            else:
+                s1 = seq_role[t]
+                principal = ada.get_current_user(db=db, token=tokens[t])
+                if s1 % 2 == 0 and seq_role[t] == s1:
+                    checked += 1
+                    stale += principal.role != ROLES[(s1 // 2) % 2]
+            db.rollback()  # end the read transaction so the next miss sees committed writes
+            lookups += 1
+    out.put({"lookups": lookups, "checked": checked, "stale": stale,
+             "profiles": ada.profile_cache.stats(), "principals": ada.principal_cache.stats()})
+    ada.log_writer.stop()
+
+
+def write(ada, t: int, tenant_id: int, email: str, seq_profile, seq_role, flip_role: bool) -> float:
+    """One write + invalidate like upsert_profile / change_role; returns the invalidate() cost."""
+    seq = seq_role if flip_role else seq_profile
+    seq[t] += 1  # odd: write in flight
+    version = (seq[t] + 1) // 2
+    with ada.SessionLocal() as db:
+        if flip_role:
+            db.query(ada.User).filter(ada.User.email == email).update({"role": ROLES[version % 2]})
+        else:
+            db.query(ada.CarrierCostProfile).filter(
+                ada.CarrierCostProfile.tenant_id == tenant_id, ada.CarrierCostProfile.profile_id == "truck-0",
+            ).update({"display_name": f"v{version}"})
+        db.commit()
+    t0 = time.perf_counter()
+    if flip_role:
+        ada.principal_cache.invalidate_user(tenant_id, email)
+    else:
+        ada.profile_cache.invalidate(tenant_id, "truck-0")
+    cost = time.perf_counter() - t0
+    seq[t] += 1  # even: published
+    return cost
+
+
+def run_child(args):
+    from _common import load_app, register, tenant_id_for
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    tenant_ids, emails = [], []
+    with TestClient(ada.app) as client:
+        for t in range(args.tenants):
+            headers = register(client, f"bench-bus-{t}", f"owner@bench-bus-{t}.example.com")
+            for p in range(args.profiles):
+                client.post("/profiles", json={"profile_id": f"truck-{p}", "display_name": "v0"}, headers=headers).raise_for_status()
+            tenant_ids.append(tenant_id_for(ada, f"bench-bus-{t}"))
+    with ada.SessionLocal() as db:
+        for t, tenant_id in enumerate(tenant_ids):
+            email = f"dispatcher@bench-bus-{t}.example.com"
+            db.add(ada.User(email=email, password_hash="-", role=ROLES[0], tenant_id=tenant_id))
+            emails.append(email)
+        db.commit()
+    tokens = [ada.create_access_token(sub=e, tenant_id=tid, role=ROLES[0]) for e, tid in zip(emails, tenant_ids)]
+
+    ctx = multiprocessing.get_context("spawn")
+    rng = random.Random(0)
+    seq_profile = ctx.RawArray("q", args.tenants)  # shared across runs: versions keep counting up in the DB
+    seq_role = ctx.RawArray("q", args.tenants)
+    for n in (int(w) for w in args.workers.split(",")):
+        go, stop, out = ctx.Event(), ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=reader, args=(w, tokens, tenant_ids, args.profiles, args.skew, args.rate, seq_profile, seq_role, go, stop, out))
+                 for w in range(n)]
+        for p in procs:
+            p.start()
+        for _ in procs:
+            out.get()  # imported and connected
+        go.set()
+        time.sleep(args.warmup)
+        writes, costs = 0, []
+        deadline = time.monotonic() + args.seconds
+        while time.monotonic() < deadline:
+            t = rng.randrange(args.tenants)
+            costs.append(write(ada, t, tenant_ids[t], emails[t], seq_profile, seq_role, flip_role=writes % 2 == 1))
+            writes += 1
+            time.sleep(args.write_interval_ms / 1000.0)
+        stop.set()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+        def hit_rate(cache):
+            hits = sum(r[cache]["hits"] for r in results)
+            return hits / max(1, hits + sum(r[cache]["misses"] for r in results))
+
+        costs.sort()
+        print(json.dumps({
+            "workers": n, "writes": writes, "lookups": sum(r["lookups"] for r in results),
+            "lookups_per_s": sum(r["lookups"] for r in results) / (args.seconds + args.warmup),
+            "checked": sum(r["checked"] for r in results), "stale": sum(r["stale"] for r in results),
+            "profile_hit_rate": hit_rate("profiles"), "principal_hit_rate": hit_rate("principals"),
+            "invalidate_us_p50": costs[len(costs) // 2] * 1e6 if costs else 0.0,
+        }), flush=True)
+    ada.log_writer.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--profiles", type=int, default=10, help="profiles per tenant")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of tenant popularity")
+    parser.add_argument("--seconds", type=float, default=5.0, help="measured run per worker count")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--rate", type=float, default=2000.0, help="lookups per second per worker")
+    parser.add_argument("--write-interval-ms", type=float, default=100.0)
+    parser.add_argument("--backends", default="local,shm")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.backend:
+        return run_child(args)
+
+    print(f"{args.tenants} tenants x {args.profiles} profiles, Zipf {args.skew}, {args.rate:g} lookups/s per worker, "
+          f"one write every {args.write_interval_ms:g} ms "
+          f"(alternating profile upsert / role change), {args.seconds:g}s per run, {os.cpu_count()} CPUs")
+    print(f"{'backend':8s} {'workers':>7s} {'lookups/s':>10s} {'writes':>7s} {'checked':>8s} {'stale':>6s} "
+          f"{'profile hit':>11s} {'principal hit':>13s} {'invalidate':>11s}")
+    failed = False
+    for backend in args.backends.split(","):
+        tmp = tempfile.mkdtemp(prefix=f"ada-bus-{backend}-")
+        env = dict(os.environ, ADA_DATABASE_URL=f"sqlite:///{tmp}/ada.db", ADA_CACHE_BUS=backend,
+                   ADA_CACHE_BUS_PATH=os.path.join(tmp, "bus"), ADA_PRINCIPAL_CACHE_TTL="3600", ADA_PROFILE_CACHE_TTL="3600")
+        cmd = [sys.executable, __file__, "--backend", backend] + [
+            f"--{k.replace('_', '-')}={v}" for k, v in vars(args).items() if k not in ("backend", "backends")]
+        proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for line in proc.stdout:
+            if not line.startswith("{"):
+                continue
+            r = json.loads(line)
+            print(f"{backend:8s} {r['workers']:7d} {r['lookups_per_s']:10,.0f} {r['writes']:7d} {r['checked']:8,d} {r['stale']:6,d} "
+                  f"{r['profile_hit_rate']:11.2%} {r['principal_hit_rate']:13.2%} {r['invalidate_us_p50']:9.1f}us")
+            failed |= backend != "local" and r["stale"] > 0
+        if proc.wait():
+            raise SystemExit(proc.returncode)
+    if failed:
+        print("stale reads with a shared backend")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Streams a multi-million-row export through iter_log_export (the generator behind
+GET /logs/export) and checks that resident memory stays under a fixed ceiling.
+Exits non-zero if the ceiling is exceeded.
+
+    python bench/bench_export.py --rows 3000000 --rss-ceiling-mb 64
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from _common import load_app, register, seed_logs, tenant_id_for
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--rss-ceiling-mb", type=float, default=64.0, help="allowed RSS growth while exporting")
+    parser.add_argument("--formats", nargs="+", default=["ndjson", "csv", "columnar"])
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-export", "owner@bench-export.example.com")
+        tenant_id = tenant_id_for(ada, "bench-export")
+        seed_logs(ada, tenant_id, args.rows)
+        # sanity check the HTTP path end to end on a small window
+        r = client.get("/logs/export", params={"format": "csv", "until": "2024-01-01T01:00:00"}, headers=headers)
+        r.raise_for_status()
+
+    failed = False
+    for fmt in args.formats:
+        baseline = current_rss_mb()
+        peak = [baseline]
+        done = threading.Event()
+
+        def sample():
+            while not done.is_set():
+                peak[0] = max(peak[0], current_rss_mb())
+                time.sleep(0.05)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        t0 = time.perf_counter()
+        total_bytes = 0
+        for chunk in ada.iter_log_export(tenant_id, fmt):
+            total_bytes += len(chunk)
+        elapsed = time.perf_counter() - t0
+        done.set()
+        sampler.join()
+
+        growth = peak[0] - baseline
+        ok = growth <= args.rss_ceiling_mb
+        failed |= not ok
+        print(f"{fmt:9s} {args.rows:,} rows  {total_bytes / 1e6:8.1f} MB out  {elapsed:6.1f}s "
+              f"({args.rows / elapsed:,.0f} rows/s)  RSS growth {growth:6.1f} MB  {'OK' if ok else 'OVER CEILING'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+One load priced against every profile in a tenant: N POST /recommend calls (one per
+profile_id) vs one POST /recommend/fleet, cold (profiles loaded) and warm (ProfileSet
+cached). Every fleet row is checked against the single-profile response.
+
+    python bench/bench_fleet.py --profiles 1000
+"""
+
+import argparse
+import random
+import time
+
+from _common import load_app, register, sample_load, summarize, tenant_id_for
+
+
+def seed_profiles(ada, tenant_id: int, n: int) -> None:
+    """n varied profiles inserted directly (POST /profiles would commit one at a time)."""
+    rng = random.Random(7)
+    rows = []
+    for i in range(n):
+        body = ada.ProfileIn(
+            profile_id=f"truck-{i:05d}",
+            display_name=f"Truck {i}",
+            driver_pay_per_mile=rng.uniform(0.55, 0.85),
+            maintenance_per_mile=rng.uniform(0.10, 0.20),
+            fixed_costs_per_day=rng.uniform(150, 260),
+            target_miles_per_day=rng.uniform(380, 560),
+            mpg=rng.uniform(5.8, 7.4),
+            min_margin_percent=rng.uniform(0.08, 0.20),
+            preferred_margin_percent=rng.uniform(0.20, 0.32),
+            max_deadhead_miles=rng.choice([75, 100, 150, 200]),
+            block_brokers={"Slow Pay Logistics": "90-day pay"} if i % 3 == 0 else {},
+        )
+        if i % 5 == 0:
+            body.fuel_price_by_region = {"National": 3.90, "Southeast": rng.uniform(3.4, 3.9)}
+        rows.append(ada._apply_profile(None, body, tenant_id))
+    with ada.SessionLocal() as db:
+        db.add_all(rows)
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-fleet", "owner@bench-fleet.example.com")
+        seed_profiles(ada, tenant_id_for(ada, "bench-fleet"), args.profiles)
+        load = sample_load(4)  # Slow Pay Logistics (blocked by every third profile), Southwest fuel
+        load.pop("profile_id")
+        load.update(deadhead_miles=60.0, offered_total_rate=round(load["loaded_miles"] * 2.55, 2))  # straddles the break-evens
+
+        t0 = time.perf_counter()
+        singles = {}
+        for i in range(args.profiles):
+            pid = f"truck-{i:05d}"
+            r = client.post("/recommend", json={**load, "profile_id": pid}, headers=headers)
+            r.raise_for_status()
+            singles[pid] = r.json()
+        single_s = time.perf_counter() - t0
+
+        ada.profile_cache.clear()
+        t0 = time.perf_counter()
+        r = client.post(f"/recommend/fleet?limit={args.profiles}", json=load, headers=headers)
+        cold_s = time.perf_counter() - t0
+        r.raise_for_status()
+        fleet = r.json()
+
+        warm = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            client.post("/recommend/fleet?limit=10", json=load, headers=headers).raise_for_status()
+            warm.append(time.perf_counter() - t0)
+
+        fleet_set = ada.profile_cache.get_fleet(tenant_id_for(ada, "bench-fleet"))
+        compute = []
+        req = dict(load, deadhead_miles=float(load["deadhead_miles"]), equipment_type="Van", notes=None)
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            ada.price_fleet(fleet_set, req)
+            compute.append(time.perf_counter() - t0)
+
+    mismatches = 0
+    for row in fleet["results"]:
+        single = singles[row["profile_id"]]
+        if any(row[k] != v for k, v in single.items()):
+            mismatches += 1
+    profits = [row["projected_profit"] for row in fleet["results"]]
+
+    print(f"profiles={args.profiles} decisions={fleet['decisions']}")
+    print(f"{args.profiles} x /recommend : {single_s * 1000:9.1f} ms total")
+    print(f"/recommend/fleet cold : {cold_s * 1000:9.1f} ms (one query + compile)")
+    print(f"/recommend/fleet warm : {summarize(warm)}")
+    print(f"price_fleet only      : {summarize(compute)}")
+    print(f"rows checked vs /recommend: {len(fleet['results'])}  mismatches: {mismatches}")
+    print(f"ranked by profit: {profits == sorted(profits, reverse=True)}")
+    if mismatches or len(fleet["results"]) != args.profiles or profits != sorted(profits, reverse=True):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
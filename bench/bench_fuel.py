@@ -0,0 +1,113 @@
+"""
+Rolling out a daily diesel price update, three ways, and what it costs /recommend.
+
+  rewrite  POST /profiles for every profile with a new fuel_price_by_region (the old way)
+  tenant   one POST /fuel-prices per tenant (every region in one upload)
+  global   one upsert into the global index + fuel_cache.invalidate(0) (`import-fuel-prices`)
+
+After each update every sampled tenant's next /recommend must price fuel at the new
+value (checked against the projected_total_cost the endpoint returns). /recommend latency is
+reported in steady state and for the first request per tenant after an update, which
+pays for re-resolving that tenant's cached profiles.
+
+    python bench/bench_fuel.py --tenants 200 --profiles 20
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from _common import load_app, sample_load, seed_tenants, summarize
+
+REGIONS = ("National", "Northeast", "Southeast", "Midwest", "Southwest", "West")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--profiles", type=int, default=20, help="profiles per tenant")
+    parser.add_argument("--sample", type=int, default=50, help="tenants probed with /recommend after each update")
+    parser.add_argument("--requests", type=int, default=2000, help="steady-state /recommend requests timed")
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    today = datetime.utcnow().date()
+    with TestClient(ada.app) as client:
+        tenants = seed_tenants(ada, args.tenants, args.profiles, 1, prefix="fuel")
+        headers = {t["id"]: {"Authorization": f"Bearer {ada.create_access_token(sub=t['emails'][0], tenant_id=t['id'], role='OWNER')}"}
+                   for t in tenants}
+        probe = tenants[:: max(1, len(tenants) // args.sample)][: args.sample]
+
+        def recommend(t, i):
+            load = dict(sample_load(i, t["profile_ids"][i % len(t["profile_ids"])]), fuel_region=REGIONS[i % len(REGIONS)])
+            t0 = time.perf_counter()
+            r = client.post("/recommend", json=load, headers=headers[t["id"]])
+            elapsed = time.perf_counter() - t0
+            r.raise_for_status()
+            return elapsed, load, r.json()
+
+        def steady(label):
+            samples = [recommend(probe[i % len(probe)], i)[0] for i in range(args.requests)]
+            s = summarize(samples)
+            print(f"  /recommend steady state ({label}): p50 {s['p50_ms']:.3f} ms  p99 {s['p99_ms']:.3f} ms")
+
+        def verify(label, price_for):
+            firsts, wrong = [], 0
+            for i, t in enumerate(probe):
+                elapsed, load, out = recommend(t, i)
+                firsts.append(elapsed)
+                with ada.SessionLocal() as db:
+                    profile = ada.get_compiled_profile(db, t["id"], load["profile_id"])
+                miles = load["loaded_miles"] + load["deadhead_miles"]
+                fuel_cost = miles / profile.mpg * price_for(t, load["fuel_region"])
+                expected = fuel_cost + (profile.var_per_mile + profile.fixed_per_mile) * miles
+                wrong += abs(out["projected_total_cost"] - expected) > 1e-6
+            s = summarize(firsts)
+            print(f"  first /recommend per tenant after {label}: p50 {s['p50_ms']:.3f} ms  p99 {s['p99_ms']:.3f} ms  "
+                  f"wrong fuel prices {wrong}/{len(probe)}")
+            if wrong:
+                raise SystemExit(1)
+
+        for i, t in enumerate(probe):  # warm every cache on the probe tenants
+            recommend(t, i)
+        print(f"{args.tenants} tenants x {args.profiles} profiles ({args.tenants * args.profiles:,} profiles), {len(REGIONS)} regions")
+        steady("profile JSON prices")
+
+        day1 = {region: 4.10 + k * 0.05 for k, region in enumerate(REGIONS)}
+        t0 = time.perf_counter()
+        for t in tenants:
+            for pid in t["profile_ids"]:
+                body = client.get(f"/profiles/{pid}", headers=headers[t["id"]]).json()
+                body["fuel_price_by_region"] = day1
+                client.post("/profiles", json=body, headers=headers[t["id"]]).raise_for_status()
+        print(f"rewrite: {args.tenants * args.profiles:,} profile rewrites in {time.perf_counter() - t0:.2f}s")
+        verify("rewrite", lambda t, region: day1[region])
+
+        day2 = {region: 4.20 + k * 0.05 for k, region in enumerate(REGIONS)}
+        t0 = time.perf_counter()
+        for t in tenants:
+            prices = [{"region": r, "effective_date": str(today), "price": p} for r, p in day2.items()]
+            client.post("/fuel-prices", json={"prices": prices}, headers=headers[t["id"]]).raise_for_status()
+        print(f"tenant: {args.tenants:,} uploads in {time.perf_counter() - t0:.2f}s")
+        verify("tenant uploads", lambda t, region: day2[region])
+        with ada.engine.begin() as conn:  # hand every tenant over to the global index
+            conn.execute(ada.delete(ada.FuelPrice))
+        ada.fuel_cache.clear()
+
+        day3 = {region: 4.30 + k * 0.05 for k, region in enumerate(REGIONS)}
+        t0 = time.perf_counter()
+        with ada.engine.begin() as conn:
+            ada.upsert_fuel_prices(conn, ada.GLOBAL_FUEL_TENANT, [{"region": r, "effective_date": today, "price": p} for r, p in day3.items()])
+        ada.fuel_cache.invalidate(ada.GLOBAL_FUEL_TENANT)
+        print(f"global: one upsert of {len(day3)} rows in {(time.perf_counter() - t0) * 1000:.2f} ms")
+        verify("global import", lambda t, region: day3[region])
+        steady("global fuel index")
+        print(f"fuel cache: {ada.fuel_cache.stats()}")
+    ada.log_writer.stop()
+    ada.hashing_executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Retried and double-clicked /recommend requests: correctness under concurrency, and what
+the stored-response cache saves.
+
+  burst   --burst identical requests fired at once, with one Idempotency-Key and then
+          with no key (content hash): every response must be identical, exactly one log
+          row written, all but one marked Idempotent-Replayed
+  guards  a key reused with another body is a 422; an identical load after a profile
+          update is priced again
+  retry   --loads distinct loads, each sent --retries extra times by --concurrency
+          clients; dedupe off (ADA_RECOMMEND_DEDUPE_TTL=0) vs on: log rows written,
+          latency of first sends vs repeats, duplicate rate from recommendation_cache.stats()
+
+    python bench/bench_idempotency.py --burst 50 --loads 500 --retries 2
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from sqlalchemy import func, select
+
+from _common import async_client, create_profile, load_app, register, sample_load, summarize, tenant_id_for
+
+
+def log_rows(ada, tenant_id: int) -> int:
+    ada.log_writer.flush()
+    with ada.SessionLocal() as db:
+        return db.execute(select(func.count()).select_from(ada.RecommendationLog)
+                          .where(ada.RecommendationLog.tenant_id == tenant_id)).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=50, help="identical requests fired at once")
+    parser.add_argument("--loads", type=int, default=500, help="distinct loads in the retry run")
+    parser.add_argument("--retries", type=int, default=2, help="extra sends of every load")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ADA_RECOMMEND_DEDUPE_TTL", "30")
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-idem", "owner@bench-idem.example.com")
+        create_profile(client, headers)
+    tenant_id = tenant_id_for(ada, "bench-idem")
+    failures = []
+
+    def check(ok: bool, what: str) -> None:
+        print(f"  {'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    async def go():
+        async with async_client(ada.app) as client:
+            print(f"burst: {args.burst} identical requests at once")
+            for label, extra, load in (("Idempotency-Key", {"Idempotency-Key": "burst-1"}, sample_load(10_001)),
+                                       ("content hash", {}, sample_load(10_002))):
+                before = log_rows(ada, tenant_id)
+                rs = await asyncio.gather(*(client.post("/recommend", json=load, headers={**headers, **extra})
+                                            for _ in range(args.burst)))
+                bodies = {r.text for r in rs}
+                replayed = sum(r.headers.get("Idempotent-Replayed") == "true" for r in rs)
+                check(all(r.status_code == 200 for r in rs) and len(bodies) == 1, f"{label}: {args.burst} identical 200 responses")
+                check(replayed == args.burst - 1, f"{label}: {replayed} marked Idempotent-Replayed")
+                check(log_rows(ada, tenant_id) - before == 1, f"{label}: one log row")
+
+            print("guards")
+            r = await client.post("/recommend", json=sample_load(10_003), headers={**headers, "Idempotency-Key": "burst-1"})
+            check(r.status_code == 422, "key reused with another body -> 422")
+            load = sample_load(10_004)
+            first = (await client.post("/recommend", json=load, headers=headers)).json()
+            (await client.post("/profiles", json={"profile_id": "truck-1", "display_name": "Truck 1", "mpg": 5.0},
+                               headers=headers)).raise_for_status()
+            r = await client.post("/recommend", json=load, headers=headers)
+            check("Idempotent-Replayed" not in r.headers and r.json()["break_even_rpm"] > first["break_even_rpm"],
+                  "profile update -> priced again")
+
+            print(f"retry: {args.loads} loads x {1 + args.retries} sends, {args.concurrency} clients")
+            for label, ttl in (("dedupe off", 0.0), ("dedupe on", 30.0)):
+                ada.recommendation_cache.clear()
+                ada.recommendation_cache.dedupe_ttl_seconds = ttl
+                stats0 = ada.recommendation_cache.stats()
+                offset = 20_000 if ttl else 40_000
+                sends = [offset + i for i in range(args.loads) for _ in range(1 + args.retries)]
+                firsts, repeats, seen = [], [], set()
+                queue = iter(sends)
+                before = log_rows(ada, tenant_id)
+
+                async def worker():
+                    for i in queue:
+                        repeat = i in seen
+                        seen.add(i)
+                        t0 = time.perf_counter()
+                        (await client.post("/recommend", json=sample_load(i), headers=headers)).raise_for_status()
+                        (repeats if repeat else firsts).append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+                elapsed = time.perf_counter() - t0
+                rows = log_rows(ada, tenant_id) - before
+                stats = ada.recommendation_cache.stats()
+                lookups = stats["lookups"] - stats0["lookups"]
+                dupes = stats["replays"] + stats["joins"] - stats0["replays"] - stats0["joins"]
+                f, rp = summarize(firsts), summarize(repeats)
+                print(f"  {label:10s} {len(sends) / elapsed:7,.0f} req/s  log rows {rows:5,d}  "
+                      f"first p50 {f['p50_ms']:.2f} ms  repeat p50 {rp['p50_ms']:.2f} ms  "
+                      f"duplicate rate {dupes / lookups if lookups else 0.0:.1%}")
+                if ttl:
+                    check(rows == args.loads, "dedupe on: one log row per distinct load")
+
+    asyncio.run(go())
+    ada.log_writer.stop()
+    ada.hashing_executor.shutdown()
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
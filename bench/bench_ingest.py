@@ -0,0 +1,170 @@
+"""
+Replay a load-board feed through the ingestion pipeline.
+
+  max    : an NDJSON file read by a FileSource as fast as the pipeline accepts it
+  paced  : a producer offering --rate loads/s (default 10k) while a subscriber times
+           ingest -> event latency
+
+Every --repost-th load is an exact repost of an earlier one and must be deduped.
+Emitted events are spot-checked against price_fleet, and un-emitted loads are checked
+to have no GO/REVIEW profile.
+
+    python bench/bench_ingest.py --loads 200000 --rate 10000 --profiles 25
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from _common import load_app, register, create_profile, sample_load, summarize, tenant_id_for
+
+
+def feed_lines(n: int, repost_every: int) -> list:
+    rng = random.Random(3)
+    lines, fresh = [], []
+    for i in range(n):
+        if repost_every and i % repost_every == repost_every - 1 and fresh:
+            lines.append(rng.choice(fresh))
+            continue
+        load = sample_load(i)
+        load.pop("profile_id")
+        load["offered_total_rate"] = round(load["offered_total_rate"] + (i // 23) * 0.01, 2)  # unique terms per load
+        line = (json.dumps(load) + "\n").encode()
+        fresh.append(line)
+        lines.append(line)
+    return lines
+
+
+def expected_best(ada, fleet, load):
+    """(profile_id, decision) the pipeline should pick, or None when every profile says NO-GO."""
+    pricing = ada.price_fleet(fleet, load)
+    best = None
+    for i, decision in enumerate(pricing.decision):
+        if decision == "NO-GO":
+            continue
+        key = (decision == "GO", float(pricing.profit[i]))
+        if best is None or key > best[0]:
+            best = (key, fleet.profiles[i].profile_id, decision)
+    return None if best is None else best[1:]
+
+
+def check(ada, fleet, lines, events, sample: int) -> int:
+    rng = random.Random(5)
+    by_id = {e["load_id"]: e for e in events}
+    errors = 0
+    for line in rng.sample(lines, min(sample, len(lines))):
+        load = ada.FeedLoad.model_validate_json(line).model_dump()
+        event = by_id.get(ada.load_digest(load).hex())
+        want = expected_best(ada, fleet, load)
+        got = None if event is None else (event["profile_id"], event["decision"])
+        if want != got:
+            errors += 1
+    return errors
+
+
+def run_max(ada, tenant_id, lines, path) -> dict:
+    pipeline = ada.IngestPipeline()
+    events = []
+    pipeline.subscribe(tenant_id, events.extend)
+    t0 = time.perf_counter()
+    source = ada.FileSource(pipeline, tenant_id, path)
+    pipeline.add_source(source)
+    while not source.done:
+        time.sleep(0.01)
+    pipeline.drain()
+    elapsed = time.perf_counter() - t0
+    stats = pipeline.stats()
+    pipeline.stop()
+    return {"elapsed": elapsed, "stats": stats, "events": events}
+
+
+def run_paced(ada, tenant_id, lines, rate: float, tick_s: float = 0.01) -> dict:
+    pipeline = ada.IngestPipeline()
+    events, latencies = [], []
+
+    def on_events(batch):
+        now = time.time()
+        events.extend(batch)
+        latencies.extend(now - e["ingested_at"] for e in batch)
+
+    pipeline.subscribe(tenant_id, on_events)
+    per_tick = max(1, int(rate * tick_s))
+    t0 = time.perf_counter()
+    for k, start in enumerate(range(0, len(lines), per_tick)):
+        pipeline.offer(tenant_id, lines[start:start + per_tick], block=True)
+        delay = t0 + (k + 1) * tick_s - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    offered_s = time.perf_counter() - t0
+    pipeline.drain()
+    elapsed = time.perf_counter() - t0
+    stats = pipeline.stats()
+    pipeline.stop()
+    return {"elapsed": elapsed, "offered_s": offered_s, "stats": stats, "events": events, "latencies": latencies}
+
+
+def report(name, n, result):
+    stats = result["stats"]
+    print(f"[{name}] {n} loads in {result['elapsed']:.2f}s -> {n / result['elapsed']:,.0f} loads/s"
+          + (f" (offered over {result['offered_s']:.2f}s)" if "offered_s" in result else ""))
+    print(f"  evaluated={stats['evaluated']} duplicates={stats['duplicates']} invalid={stats['invalid']} "
+          f"emitted={stats['emitted']} rejected={stats['rejected']} max_depth={stats['max_depth_seen']} "
+          f"backpressure_waits={stats['backpressure_waits']}")
+    if result.get("latencies"):
+        print(f"  ingest -> event latency: {summarize(result['latencies'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loads", type=int, default=200000)
+    parser.add_argument("--rate", type=float, default=10000.0)
+    parser.add_argument("--profiles", type=int, default=25)
+    parser.add_argument("--repost", type=int, default=10, help="every Nth load is a repost")
+    parser.add_argument("--check", type=int, default=1000)
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-ingest", "owner@bench-ingest.example.com")
+        for p in range(args.profiles):
+            create_profile(client, headers, f"truck-{p}", mpg=5.5 + (p % 9) * 0.25,
+                           driver_pay_per_mile=0.55 + (p % 7) * 0.04, max_deadhead_miles=75 + (p % 4) * 50)
+        tenant_id = tenant_id_for(ada, "bench-ingest")
+        with ada.SessionLocal() as db:
+            fleet = ada.get_profile_set(db, tenant_id)
+
+        lines = feed_lines(args.loads, args.repost)
+        unique = len(set(lines))
+        path = os.path.join(tempfile.mkdtemp(prefix="ada-ingest-"), "feed.ndjson")
+        with open(path, "wb") as f:
+            f.writelines(lines)
+
+        print(f"profiles={args.profiles} loads={args.loads} unique={unique} reposts={args.loads - unique}")
+        failures = 0
+        for name, result in (("max", run_max(ada, tenant_id, lines, path)),
+                             ("paced", run_paced(ada, tenant_id, lines, args.rate))):
+            report(name, args.loads, result)
+            stats = result["stats"]
+            errors = check(ada, fleet, lines, result["events"], args.check)
+            print(f"  spot-checked {args.check} loads vs price_fleet: {errors} errors")
+            failures += errors
+            failures += stats["duplicates"] != args.loads - unique or stats["evaluated"] != unique
+            failures += bool(stats["rejected"] or stats["failed"])
+
+        # the HTTP push path feeds the module-level pipeline
+        r = client.post("/ingest/loads", json={"loads": [json.loads(line) for line in lines[:2000]]}, headers=headers)
+        r.raise_for_status()
+        ada.ingest_pipeline.drain()
+        print(f"[push] POST /ingest/loads: {r.json()} -> {client.get('/ingest/stats', headers=headers).json()['evaluated']} evaluated")
+
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
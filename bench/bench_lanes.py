@@ -0,0 +1,104 @@
+"""
+Lane distance lookups: cached vs cold, vectorized vs per-lane, and what filling in miles
+adds to /recommend.
+
+  lookup     lane_cache.miles() for one lane already in the LRU, and for one new lane
+  batch      fill_miles() over --batch loads on distinct, uncached lanes (one numpy pass)
+             against a per-lane math.* haversine loop
+  recommend  /recommend p50/p99 with loaded/deadhead miles given vs left out (cached lanes)
+
+    python bench/bench_lanes.py --batch 5000 --requests 2000
+"""
+
+import argparse
+import itertools
+import math
+import random
+import time
+import timeit
+
+from _common import create_profile, load_app, register, sample_load, summarize
+
+
+def scalar_miles(geo, lanes, circuity):
+    out = []
+    for fc, fs, tc, ts in lanes:
+        a, b = geo.locate(fc, fs), geo.locate(tc, ts)
+        lat1, lon1, lat2, lon2 = geo.lat[a], geo.lon[a], geo.lat[b], geo.lon[b]
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        out.append(round(2 * 3958.8 * math.asin(math.sqrt(min(h, 1.0))) * circuity, 1))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=5000, help="loads per fill_miles batch (distinct lanes)")
+    parser.add_argument("--requests", type=int, default=2000, help="/recommend requests timed per variant")
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    places = list(ada.geo_table._load())
+    print(f"geo table: {len(places)} places, circuity {ada.ROAD_CIRCUITY}")
+    rng = random.Random(0)
+    lanes = [(a[0], a[1], b[0], b[1]) for a, b in itertools.permutations(places, 2)]
+    rng.shuffle(lanes)
+
+    hot = lanes[0]
+    ada.lane_cache.miles([hot])
+    n = 200000
+    hit_ns = min(timeit.repeat(lambda: ada.lane_cache.miles([hot]), number=n, repeat=5)) / n * 1e9
+    cold = iter(lanes[1:])
+    t0 = time.perf_counter()
+    for _ in range(2000):
+        ada.lane_cache.miles([next(cold)])
+    miss_ns = (time.perf_counter() - t0) / 2000 * 1e9
+    print(f"lookup: cached lane {hit_ns / 1000:.2f} us, new lane {miss_ns / 1000:.2f} us")
+
+    batch = lanes[5000:5000 + args.batch]
+    loads = [{"origin_city": fc, "origin_state": fs, "dest_city": tc, "dest_state": ts} for fc, fs, tc, ts in batch]
+    ada.lane_cache.clear()
+    t0 = time.perf_counter()
+    ada.fill_miles(loads)
+    vector_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    expected = scalar_miles(ada.geo_table, batch, ada.lane_cache.circuity)
+    scalar_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    ada.fill_miles([{k: v for k, v in r.items() if k != "loaded_miles"} for r in loads])
+    cached_s = time.perf_counter() - t0
+    mismatches = sum(abs(r["loaded_miles"] - e) > 0.051 for r, e in zip(loads, expected))
+    print(f"batch of {len(batch):,} lanes: vectorized cold {vector_s * 1000:.1f} ms "
+          f"({vector_s / len(batch) * 1e6:.2f} us/load), cached {cached_s * 1000:.1f} ms, "
+          f"per-lane math loop {scalar_s * 1000:.1f} ms; mismatches {mismatches}")
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-lanes", "owner@bench-lanes.example.com")
+        create_profile(client, headers)
+
+        def run(strip):
+            samples = []
+            for i in range(args.requests):
+                load = sample_load(i)
+                if strip:
+                    load.pop("loaded_miles")
+                    load.pop("deadhead_miles")
+                t0 = time.perf_counter()
+                client.post("/recommend", json=load, headers=headers).raise_for_status()
+                samples.append(time.perf_counter() - t0)
+            return summarize(samples)
+
+        run(True)  # warm
+        for label, strip in (("miles given", False), ("miles filled in", True)):
+            s = run(strip)
+            print(f"/recommend {label:16s} p50 {s['p50_ms']:.3f} ms  p99 {s['p99_ms']:.3f} ms")
+    print(f"lane cache: {ada.lane_cache.stats()}")
+    ada.log_writer.stop()
+    ada.hashing_executor.shutdown()
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
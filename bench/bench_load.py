@@ -0,0 +1,152 @@
+"""
+In-process load generator: realistic multi-tenant traffic against the FastAPI app.
+
+Seeds --tenants tenants (each with --users users and --profiles profiles) and --logs
+log rows spread across them, then replays a deterministic schedule of requests per
+traffic mix over an in-process ASGI transport with --concurrency clients. Tenants are
+picked with a Zipf(--skew) distribution, so a few large tenants carry most traffic.
+
+  recommend-heavy  single /recommend dominated, some batch / fleet / log reads
+  login-burst      a shift change: 15% of requests are bcrypt logins on top of normal traffic
+  log-reads        history pages, recent logs and rollup analytics
+
+Reports throughput plus p50/p95/p99 per mix and per operation; --save-baseline /
+--compare store and check the numbers (bench/baselines/load.json by default).
+
+    python bench/bench_load.py --tenants 50 --logs 500000 --requests 5000 --concurrency 32
+    python bench/bench_load.py --mix recommend-heavy --compare
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from _common import (
+    add_baseline_args, async_client, handle_baseline, load_app, sample_load, seed_logs, seed_tenants, summarize,
+)
+
+MIXES = {
+    "recommend-heavy": {"recommend": 80, "recommend_batch": 4, "fleet": 4, "logs_recent": 8, "logs_page": 4},
+    "login-burst": {"login": 15, "recommend": 70, "logs_recent": 15},
+    "log-reads": {"logs_page": 45, "logs_recent": 20, "analytics": 25, "recommend": 10},
+}
+
+
+def schedule(mix: dict, tenants: list, n: int, skew: float, seed: int) -> list:
+    """Deterministic [(op, tenant, user_index, i)] for one mix."""
+    rng = random.Random(seed)
+    ops, op_weights = list(mix), list(mix.values())
+    tenant_weights = [1.0 / (rank + 1) ** skew for rank in range(len(tenants))]
+    picks = []
+    for i in range(n):
+        tenant = rng.choices(tenants, tenant_weights)[0]
+        picks.append((rng.choices(ops, op_weights)[0], tenant, rng.randrange(len(tenant["emails"])), i))
+    return picks
+
+
+def request_for(op: str, tenant: dict, user: int, i: int, tokens: dict, password: str):
+    """(method, url, kwargs) for one scheduled operation."""
+    headers = {"Authorization": f"Bearer {tokens[tenant['emails'][user]]}"}
+    profile_id = tenant["profile_ids"][i % len(tenant["profile_ids"])]
+    if op == "recommend":
+        return "POST", "/recommend", {"json": sample_load(i, profile_id), "headers": headers}
+    if op == "recommend_batch":
+        loads = [sample_load(i + k, tenant["profile_ids"][(i + k) % len(tenant["profile_ids"])]) for k in range(50)]
+        return "POST", "/recommend/batch", {"json": {"loads": loads}, "headers": headers}
+    if op == "fleet":
+        load = sample_load(i)
+        load.pop("profile_id")
+        return "POST", "/recommend/fleet?limit=10", {"json": load, "headers": headers}
+    if op == "login":
+        return "POST", "/auth/login", {"data": {"username": tenant["emails"][user], "password": password}}
+    if op == "logs_recent":
+        return "GET", "/logs/recent?limit=20", {"headers": headers}
+    if op == "logs_page":
+        return "GET", f"/logs?limit=50&profile_id=truck-{i % 20}", {"headers": headers}
+    if op == "analytics":
+        return "GET", f"/analytics/{('lane', 'broker', 'profile', 'day')[i % 4]}?limit=20", {"headers": headers}
+    raise ValueError(op)
+
+
+async def replay(client, picks: list, concurrency: int, tokens: dict, password: str) -> dict:
+    latencies = {op: [] for op in {p[0] for p in picks}}
+    errors = {}
+    queue = iter(picks)
+
+    async def worker():
+        for op, tenant, user, i in queue:
+            method, url, kwargs = request_for(op, tenant, user, i, tokens, password)
+            t0 = time.perf_counter()
+            r = await client.request(method, url, **kwargs)
+            latencies[op].append(time.perf_counter() - t0)
+            if r.status_code >= 400:
+                key = f"{op}:{r.status_code}"
+                errors[key] = errors.get(key, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"elapsed": time.perf_counter() - t0, "latencies": latencies, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--users", type=int, default=3, help="users per tenant")
+    parser.add_argument("--profiles", type=int, default=10, help="profiles per tenant")
+    parser.add_argument("--logs", type=int, default=200000, help="log rows seeded across all tenants")
+    parser.add_argument("--mix", default="all", choices=["all", *MIXES])
+    parser.add_argument("--requests", type=int, default=3000, help="requests per mix")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of tenant popularity (0 = uniform)")
+    parser.add_argument("--seed", type=int, default=1)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    password = "bench-password"
+    print(f"tenants={args.tenants} users/tenant={args.users} profiles/tenant={args.profiles} logs={args.logs:,} "
+          f"concurrency={args.concurrency} skew={args.skew}")
+    with TestClient(ada.app):  # lifespan: tables, writer, hashing pool
+        tenants = seed_tenants(ada, args.tenants, args.profiles, args.users, password, prefix="load")
+        if args.logs:
+            seed_logs(ada, tenants[0]["id"], args.logs, other_tenants=args.tenants - 1, through_app=True)
+    tokens = {email: ada.create_access_token(sub=email, tenant_id=t["id"], role="OWNER" if u == 0 else "DISPATCHER")
+              for t in tenants for u, email in enumerate(t["emails"])}
+
+    mixes = MIXES if args.mix == "all" else {args.mix: MIXES[args.mix]}
+    config = {k: getattr(args, k) for k in ("tenants", "users", "profiles", "logs", "requests", "concurrency", "skew", "seed")}
+    results = {}
+    failed = [0]
+
+    async def go():
+        async with async_client(ada.app) as client:
+            warm = schedule(MIXES["recommend-heavy"], tenants, min(500, args.requests), args.skew, args.seed + 999)
+            await replay(client, warm, args.concurrency, tokens, password)
+            for offset, (name, mix) in enumerate(mixes.items()):
+                run = await replay(client, schedule(mix, tenants, args.requests, args.skew, args.seed + offset),
+                                   args.concurrency, tokens, password)
+                everything = [s for samples in run["latencies"].values() for s in samples]
+                overall = summarize(everything)
+                results[name] = {"rps": len(everything) / run["elapsed"],
+                                 **{k: overall[k] for k in ("p50_ms", "p95_ms", "p99_ms")}}
+                print(f"[{name}] {len(everything)} requests in {run['elapsed']:.2f}s -> {results[name]['rps']:,.0f} req/s  "
+                      f"p50 {overall['p50_ms']:.2f} ms  p95 {overall['p95_ms']:.2f} ms  p99 {overall['p99_ms']:.2f} ms"
+                      + (f"  errors {run['errors']}" if run["errors"] else ""))
+                for op, samples in sorted(run["latencies"].items(), key=lambda kv: -len(kv[1])):
+                    s = summarize(samples)
+                    results[f"{name}/{op}"] = {k: s[k] for k in ("p50_ms", "p95_ms", "p99_ms")}
+                    print(f"    {op:16s} n={s['n']:6d}  p50 {s['p50_ms']:8.2f}  p95 {s['p95_ms']:8.2f}  p99 {s['p99_ms']:8.2f} ms")
+                failed[0] += sum(run["errors"].values())
+
+    asyncio.run(go())
+    ada.log_writer.stop()
+    ada.hashing_executor.shutdown()
+    status = handle_baseline(args, "load", results, config)
+    raise SystemExit(status or (1 if failed[0] else 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+recommendation_logs with its repeated strings inline (the legacy layout) vs dictionary-
+encoded into the log_* dimension tables, on the same multi-million-row history.
+
+Each layout gets its own SQLite file and the same rows: dispatchers, brokers, cities,
+equipment types and fuel regions drawn from realistic pools (--brokers names, every city
+in data/us_cities.csv). Reported per layout:
+
+  size     table and index bytes from dbstat (dimension tables counted for the encoded one)
+  insert   rows/s of --chunk-row executemany transactions (encoded: through LogDictionary)
+  scan     one tenant's full history, oldest first, as the export reads it (best of 3)
+  page     a 50-row newest-first page at depth, plain and filtered by broker
+
+then the legacy file is converted in place with encode_legacy_logs() (`app.py encode-logs`) and checked
+row for row against the encoded one.
+
+    python bench/bench_log_encoding.py --rows 2000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, event, insert, select
+
+from _common import BROKERS, load_app, summarize, timeit
+
+TENANTS = 20
+
+
+def legacy_table(ada, metadata: MetaData) -> Table:
+    """recommendation_logs as it was before the dimension tables."""
+    by_fk = {d.fk: d for d in ada.LOG_DIMENSIONS}
+    cols = []
+    for c in ada.RecommendationLog.__table__.columns:
+        d = by_fk.get(c.name)
+        if d is None:
+            cols.append(Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable))
+        else:
+            cols += [Column(f, d.model.__table__.c[col].type, nullable=False) for f, col in zip(d.fields, d.columns)]
+    return Table(
+        "recommendation_logs", metadata, *cols,
+        Index("ix_logs_tenant_created_id", "tenant_id", "created_at", "id"),
+        Index("ix_logs_tenant_profile_created_id", "tenant_id", "profile_id", "created_at", "id"),
+        Index("ix_logs_tenant_broker_created_id", "tenant_id", "broker_name", "created_at", "id"),
+        Index("ix_logs_tenant_decision_created_id", "tenant_id", "decision", "created_at", "id"),
+    )
+
+
+def history(ada, rows: int, chunk: int, brokers: int):
+    rng = random.Random(11)
+    places = list(ada.geo_table._load())
+    broker_names = BROKERS + [f"{rng.choice(('Blue', 'Summit', 'Prairie', 'Coastal', 'Iron'))} Freight Partners {n}"
+                              for n in range(max(0, brokers - len(BROKERS)))]
+    regions = ("National", "Northeast", "Southeast", "Midwest", "Southwest", "West")
+    start = datetime(2024, 1, 1)
+    for base in range(0, rows, chunk):
+        batch = []
+        for i in range(base, min(rows, base + chunk)):
+            tenant = 1 + i % TENANTS
+            (oc, os_), (dc, ds) = rng.sample(places, 2)
+            miles = 150.0 + rng.random() * 1200
+            rpm = 1.6 + rng.random()
+            be = 2.0 + rng.random() * 0.3
+            profit = (rpm - be) * miles
+            batch.append({
+                "id": i + 1,
+                "tenant_id": tenant,
+                "user_email": f"dispatcher{rng.randrange(12)}@tenant{tenant}.example.com",
+                "user_role": "DISPATCHER" if rng.random() < 0.9 else "OWNER",
+                "profile_id": f"truck-{rng.randrange(40)}",
+                "broker_name": broker_names[min(len(broker_names) - 1, int(rng.paretovariate(1.2))) - 1],
+                "origin_city": oc, "origin_state": os_, "dest_city": dc, "dest_state": ds,
+                "equipment_type": rng.choice(("Van", "Van", "Van", "Reefer", "Flatbed")),
+                "loaded_miles": miles, "deadhead_miles": rng.random() * 150, "offered_total_rate": rpm * miles,
+                "fuel_region": rng.choice(regions),
+                "decision": "GO" if rpm >= be * 1.15 else ("NO-GO" if rpm < be else "REVIEW"),
+                "offered_rpm": rpm, "break_even_rpm": be, "target_rpm": be * 1.25,
+                "projected_profit": profit, "projected_margin_percent": profit / (rpm * miles),
+                "negotiation_script": "", "script_template_id": "default", "script_template_version": 1,
+                "created_at": start + timedelta(seconds=i * 3),
+            })
+        yield batch
+
+
+def sizes(eng) -> dict:
+    with eng.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        return dict(conn.exec_driver_sql("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").all())
+
+
+def open_db(ada, path: str):
+    eng = create_engine(f"sqlite:///{path}", **ada.build_engine_kwargs())
+    event.listen(eng, "connect", ada._sqlite_pragmas)
+    others = [t for t in ada.Base.metadata.sorted_tables if t.name != "recommendation_logs"]
+    ada.Base.metadata.create_all(eng, tables=others)
+    with eng.begin() as conn:
+        conn.execute(insert(ada.Tenant), [{"id": t, "name": f"t{t}"} for t in range(1, TENANTS + 1)])
+    return eng
+
+
+def run(ada, label: str, eng, table, cols, source, broker_filter, args) -> dict:
+    dictionary = None
+    if label == "encoded":
+        dictionary = ada.LogDictionary()  # ids are per database: not the app's process-wide cache
+        dictionary.install(eng)
+    t0 = time.perf_counter()
+    for batch in history(ada, args.rows, args.chunk, args.brokers):
+        with eng.begin() as conn:
+            conn.execute(insert(table), dictionary.encode(conn, batch) if dictionary else batch)
+    insert_s = time.perf_counter() - t0
+    by_name = sizes(eng)
+    names = {"recommendation_logs"} | ({d.model.__tablename__ for d in ada.LOG_DIMENSIONS} if dictionary else set())
+    table_bytes = sum(v for k, v in by_name.items() if k in names)
+    index_bytes = sum(v for k, v in by_name.items() if k.startswith(("ix_logs_", "sqlite_autoindex_log_")))
+
+    L = table.c
+    with eng.connect() as conn:
+        q = select(*cols).select_from(source).where(L.tenant_id == 1).order_by(L.created_at, L.id)
+        scan_s = float("inf")
+        for _ in range(3):  # best of three: the first also pays for compiling the statement
+            t0 = time.perf_counter()
+            scanned = 0
+            for part in conn.execution_options(stream_results=True, yield_per=5000).execute(q).partitions():
+                scanned += len(part)
+            scan_s = min(scan_s, time.perf_counter() - t0)
+
+        newest = (L.created_at.desc(), L.id.desc())
+        anchor = conn.execute(select(L.created_at, L.id).where(L.tenant_id == 1).order_by(*newest)
+                              .offset(scanned // 2).limit(1)).one()
+        page = select(*cols).select_from(source).where(
+            L.tenant_id == 1, L.created_at <= anchor.created_at,
+            (L.created_at < anchor.created_at) | (L.id < anchor.id)).order_by(*newest).limit(50)
+        plain = summarize(timeit(lambda: conn.execute(page).all(), args.repeat))
+        broker = summarize(timeit(lambda: conn.execute(page.where(broker_filter("Coyote"))).all(), args.repeat))
+    out = {"insert_rps": args.rows / insert_s, "table_bytes": table_bytes, "index_bytes": index_bytes,
+           "file_bytes": os.path.getsize(eng.url.database), "scan_rps": scanned / scan_s, "scanned": scanned,
+           "page_ms": plain["p50_ms"], "broker_page_ms": broker["p50_ms"]}
+    if dictionary:
+        out["dictionary"] = dictionary.stats()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--chunk", type=int, default=20000, help="rows per insert transaction")
+    parser.add_argument("--brokers", type=int, default=3000, help="distinct broker names (Pareto-weighted)")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    ada = load_app()
+    tmp = tempfile.mkdtemp(prefix="ada-encoding-")
+    legacy_eng = open_db(ada, os.path.join(tmp, "legacy.db"))
+    legacy = legacy_table(ada, MetaData())
+    legacy.create(legacy_eng)
+    encoded_eng = open_db(ada, os.path.join(tmp, "encoded.db"))
+    ada.RecommendationLog.__table__.create(encoded_eng)
+
+    results = {
+        "legacy": run(ada, "legacy", legacy_eng, legacy, list(legacy.c), legacy,
+                      lambda name: legacy.c.broker_name == name, args),
+        "encoded": run(ada, "encoded", encoded_eng, ada.RecommendationLog.__table__, ada.LOG_COLUMNS, ada.LOG_FROM,
+                       lambda name: ada.RecommendationLog.broker_id == select(ada.LogBroker.id)
+                       .where(ada.LogBroker.name == name).scalar_subquery(), args),
+    }
+    lg, en = results["legacy"], results["encoded"]
+    print(f"{args.rows:,} rows, {TENANTS} tenants, {args.brokers:,} brokers, {len(ada.geo_table)} cities; "
+          f"scan = one tenant ({lg['scanned']:,} rows)")
+    print(f"{'':8s} {'table MB':>9s} {'index MB':>9s} {'file MB':>8s} {'insert rows/s':>14s} {'scan rows/s':>12s} "
+          f"{'page p50':>9s} {'broker page':>12s}")
+    for label, r in results.items():
+        print(f"{label:8s} {r['table_bytes'] / 2**20:9.1f} {r['index_bytes'] / 2**20:9.1f} {r['file_bytes'] / 2**20:8.1f} "
+              f"{r['insert_rps']:14,.0f} {r['scan_rps']:12,.0f} {r['page_ms']:7.3f}ms {r['broker_page_ms']:10.3f}ms")
+    print(f"encoded / legacy: table {en['table_bytes'] / lg['table_bytes']:.2f}x, index {en['index_bytes'] / lg['index_bytes']:.2f}x, "
+          f"insert {en['insert_rps'] / lg['insert_rps']:.2f}x, scan {en['scan_rps'] / lg['scan_rps']:.2f}x")
+    print(f"log dictionary: {en['dictionary']}")
+
+    t0 = time.perf_counter()
+    copied = ada.encode_legacy_logs(legacy_eng)
+    migrate_s = time.perf_counter() - t0
+    order = (ada.RecommendationLog.id,)
+    with legacy_eng.connect() as a, encoded_eng.connect() as b:
+        q = select(*ada.LOG_COLUMNS).select_from(ada.LOG_FROM).order_by(*order)
+        ra = a.execution_options(stream_results=True, yield_per=20000).execute(q)
+        rb = b.execution_options(stream_results=True, yield_per=20000).execute(q)
+        mismatches = sum(x != y for x, y in zip(ra, rb))
+    after = sizes(legacy_eng)
+    print(f"migration: {copied:,} rows encoded in place in {migrate_s:.1f}s ({copied / migrate_s:,.0f} rows/s); "
+          f"recommendation_logs now {after.get('recommendation_logs', 0) / 2**20:.1f} MB; "
+          f"rows differing from the encoded run: {mismatches}")
+    if copied != args.rows or mismatches:
+        raise SystemExit(1)
+    ada.log_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
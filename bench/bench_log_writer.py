@@ -0,0 +1,53 @@
+"""
+/recommend throughput with write-behind logging vs durable (synchronous) logging
+at 1, 10 and 100 concurrent dispatchers.
+
+    python bench/bench_log_writer.py --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from _common import load_app, register, create_profile, sample_load, summarize, drive_concurrently, async_client
+
+
+async def run(ada, headers, concurrency: int, total: int, durable: bool):
+    url = "/recommend?durable=true" if durable else "/recommend"
+    async with async_client(ada.app) as client:
+        async def send(i):
+            r = await client.post(url, json=sample_load(i), headers=headers)
+            r.raise_for_status()
+
+        t0 = time.perf_counter()
+        latencies = await drive_concurrently(send, concurrency, total)
+        elapsed = time.perf_counter() - t0
+    ada.log_writer.flush()
+    return total / elapsed, summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-logs", "owner@bench-logs.example.com")
+        create_profile(client, headers)
+
+    print(f"{'mode':12s} {'conc':>5s} {'req/s':>9s} {'p50 ms':>8s} {'p99 ms':>8s}")
+    for concurrency in args.concurrency:
+        for durable in (True, False):
+            rps, stats = asyncio.run(run(ada, headers, concurrency, args.requests, durable))
+            mode = "durable" if durable else "write-behind"
+            print(f"{mode:12s} {concurrency:5d} {rps:9.0f} {stats['p50_ms']:8.2f} {stats['p99_ms']:8.2f}")
+    ada.log_writer.stop()
+    print("writer:", ada.log_writer.stats())
+
+
+if __name__ == "__main__":
+    main()
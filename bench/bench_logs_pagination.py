@@ -0,0 +1,75 @@
+"""
+Seeds a large recommendation_logs table and compares page latency at increasing
+depth for OFFSET paging vs the keyset cursor used by GET /logs.
+
+    python bench/bench_logs_pagination.py --rows 3000000
+"""
+
+import argparse
+from datetime import datetime
+
+from sqlalchemy import select, text
+
+from _common import load_app, register, summarize, timeit, seed_logs, tenant_id_for
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--other-tenants", type=int, default=3)
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-pages", "owner@bench-pages.example.com")
+        tenant_id = tenant_id_for(ada, "bench-pages")
+        seed_logs(ada, tenant_id, args.rows, args.other_tenants)
+        tenant_rows = args.rows // (args.other_tenants + 1)
+
+        with ada.engine.connect() as conn:
+            plan = conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM recommendation_logs WHERE tenant_id = :t "
+                "AND created_at <= :c AND (created_at < :c OR id < :i) ORDER BY created_at DESC, id DESC LIMIT 50"
+            ), {"t": tenant_id, "c": datetime(2030, 1, 1), "i": 0}).all()
+            print("keyset plan:", " | ".join(r[-1] for r in plan))
+
+        stats = summarize(timeit(lambda: client.get("/logs/recent", params={"limit": 100}, headers=headers), args.repeat))
+        print(f"/logs/recent (100 rows)        p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms")
+
+        L = ada.RecommendationLog
+        order = (L.created_at.desc(), L.id.desc())
+        print(f"{'depth':>10s} {'OFFSET sql':>11s} {'keyset sql':>11s} {'GET /logs':>10s}   (p50 ms)")
+        for depth in (0, 10_000, 100_000, 1_000_000, tenant_rows - args.page * 2):
+            if depth < 0 or depth >= tenant_rows:
+                continue
+            with ada.engine.connect() as conn:
+                def offset_page():
+                    conn.execute(select(*ada.LOG_SUMMARY_COLUMNS).select_from(ada.LOG_FROM).where(L.tenant_id == tenant_id)
+                                 .order_by(*order).offset(depth).limit(args.page)).all()
+                offset_stats = summarize(timeit(offset_page, max(3, args.repeat // 4)))
+                anchor = conn.execute(select(L.created_at, L.id).where(L.tenant_id == tenant_id)
+                                      .order_by(*order).offset(max(0, depth - 1)).limit(1)).one()
+
+                def keyset_page():
+                    conn.execute(select(*ada.LOG_SUMMARY_COLUMNS).select_from(ada.LOG_FROM).where(
+                        L.tenant_id == tenant_id, L.created_at <= anchor.created_at,
+                        (L.created_at < anchor.created_at) | (L.id < anchor.id),
+                    ).order_by(*order).limit(args.page)).all()
+                keyset_sql_stats = summarize(timeit(keyset_page, args.repeat))
+            params = {"limit": args.page}
+            if depth:
+                params["cursor"] = ada.encode_log_cursor(anchor.created_at, anchor.id)
+            keyset_stats = summarize(timeit(lambda: client.get("/logs", params=params, headers=headers), args.repeat))
+            print(f"{depth:10,d} {offset_stats['p50_ms']:11.2f} {keyset_sql_stats['p50_ms']:11.2f} {keyset_stats['p50_ms']:10.2f}")
+
+        filtered = summarize(timeit(lambda: client.get(
+            "/logs", params={"broker_name": "Coyote", "decision": "GO", "limit": args.page}, headers=headers), args.repeat))
+        print(f"/logs?broker_name&decision     p50 {filtered['p50_ms']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
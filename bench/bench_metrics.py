@@ -0,0 +1,141 @@
+"""
+Cost of the request instrumentation on POST /recommend.
+
+Each configuration runs in its own interpreter, since ADA_METRICS / ADA_PROFILE_SLOW_MS
+are read at import:
+
+  off       ADA_METRICS=0 (no middleware, no cursor hooks; stage() is a no-op)
+  metrics   ADA_METRICS=1 (the default once ADA_METRICS_TOKEN is set)
+  profiler  ADA_METRICS=1 + sampling profiler armed (ADA_PROFILE_SLOW_MS=1000, so the
+            sampler runs during every request but nothing is slow enough to be dumped)
+
+Requests are sent one at a time over an in-process ASGI transport so the per-request
+cost is not hidden behind concurrency; configurations are interleaved over --rounds.
+The metrics run also prints the mean time per stage taken from /metrics.
+
+    python bench/bench_metrics.py --requests 5000 --rounds 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import async_client, sample_load, summarize
+
+CONFIGS = {
+    "off": {"ADA_METRICS": "0"},
+    "metrics": {"ADA_METRICS": "1", "ADA_METRICS_TOKEN": "bench"},
+    "profiler": {"ADA_METRICS": "1", "ADA_METRICS_TOKEN": "bench", "ADA_PROFILE_SLOW_MS": "1000"},
+}
+
+
+def stage_means(text: str) -> dict:
+    sums, counts = {}, {}
+    for m in re.finditer(r'ada_request_stage_seconds_(sum|count)\{method="POST",route="/recommend",stage="([^"]+)"\} (\S+)', text):
+        (sums if m.group(1) == "sum" else counts)[m.group(2)] = float(m.group(3))
+    return {k: sums[k] / counts[k] * 1e6 for k in sums if counts.get(k)}
+
+
+def bookkeeping_us(ada, n: int = 100000) -> float:
+    """Direct per-request cost of what the middleware + stage timers do around a request."""
+    if not ada.METRICS_ENABLED:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            for name in ("auth", "profile", "template", "pricing", "script", "log"):
+                with ada.stage(name):
+                    pass
+        return (time.perf_counter() - t0) / n * 1e6
+    registry = ada.MetricsRegistry()
+    for name, (kind, help_text, buckets) in ada.metrics_registry._meta.items():
+        registry.describe(name, kind, help_text, buckets)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        stats = ada.RequestStats()
+        token = ada._current_request.set(stats)
+        for name in ("auth", "profile", "template", "pricing", "script", "log"):
+            with ada.stage(name):
+                pass
+        ada._current_request.reset(token)
+        registry.observe_request("POST", "/recommend", 200, time.perf_counter() - stats.started, stats)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def run_child(args):
+    from _common import load_app, register, create_profile
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-metrics", "owner@bench-metrics.example.com")
+        create_profile(client, headers)
+
+    async def go():
+        async with async_client(ada.app) as client:
+            for i in range(200):  # warm caches
+                (await client.post("/recommend", json=sample_load(i), headers=headers)).raise_for_status()
+            latencies = []
+            t0 = time.perf_counter()
+            for i in range(args.requests):
+                t1 = time.perf_counter()
+                r = await client.post("/recommend", json=sample_load(i), headers=headers)
+                latencies.append(time.perf_counter() - t1)
+                r.raise_for_status()
+            elapsed = time.perf_counter() - t0
+            metrics = (await client.get("/metrics", headers={"Authorization": "Bearer bench"})).text if ada.METRICS_ENABLED else ""
+            return elapsed, latencies, metrics
+
+    elapsed, latencies, metrics = asyncio.run(go())
+    ada.log_writer.stop()
+    print(json.dumps({"rps": args.requests / elapsed, **summarize(latencies), "stages_us": stage_means(metrics),
+                      "profiles_written": metrics.count('ada_profiles_written_total{route="/recommend"}'),
+                      "bookkeeping_us": bookkeeping_us(ada)}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args)
+
+    results = {name: [] for name in CONFIGS}
+    for _ in range(args.rounds):
+        for name, env in CONFIGS.items():
+            tmp = tempfile.mkdtemp(prefix="ada-metrics-")
+            child_env = {k: v for k, v in os.environ.items() if not k.startswith(("ADA_METRICS", "ADA_PROFILE"))}
+            child_env.update(env, ADA_DATABASE_URL=f"sqlite:///{tmp}/ada.db", ADA_PROFILE_DIR=os.path.join(tmp, "profiles"))
+            out = subprocess.run([sys.executable, __file__, "--child", "--requests", str(args.requests)],
+                                 env=child_env, check=True, capture_output=True, text=True).stdout
+            results[name].append(json.loads(out.strip().splitlines()[-1]))
+
+    base = statistics.median(r["mean_ms"] for r in results["off"])
+    print(f"POST /recommend, {args.requests} sequential requests x {args.rounds} rounds (medians across rounds)")
+    for name, runs in results.items():
+        mean = statistics.median(r["mean_ms"] for r in runs)
+        p50 = statistics.median(r["p50_ms"] for r in runs)
+        p99 = statistics.median(r["p99_ms"] for r in runs)
+        rps = statistics.median(r["rps"] for r in runs)
+        print(f"{name:9s}: {rps:8,.0f} req/s  mean {mean:.3f} ms  p50 {p50:.3f} ms  p99 {p99:.3f} ms  "
+              f"overhead {(mean - base) * 1000:+7.1f} us ({(mean / base - 1) * 100:+.1f}%)")
+
+    for name, runs in results.items():
+        print(f"{name:9s}: instrumentation bookkeeping measured directly: {statistics.median(r['bookkeeping_us'] for r in runs):.2f} us/request")
+    stages = results["metrics"][-1]["stages_us"]
+    print("stage means from /metrics (us): " + "  ".join(f"{k}={v:.1f}" for k, v in sorted(stages.items(), key=lambda kv: -kv[1])))
+    if any(r["profiles_written"] for r in results["profiler"]):
+        print("unexpected: profiler dumped requests under the 1000 ms threshold")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
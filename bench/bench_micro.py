@@ -0,0 +1,75 @@
+"""
+Micro-benchmarks of the per-request building blocks, in ns/op.
+
+Each case is timed with timeit over --repeat batches sized to ~--target-ms each; the
+minimum is the most stable number for comparing builds, the median shows jitter.
+
+    python bench/bench_micro.py                       # print the table
+    python bench/bench_micro.py --save-baseline       # store bench/baselines/micro.json
+    python bench/bench_micro.py --compare             # exit 1 if any case got slower
+"""
+
+import argparse
+import statistics
+import timeit
+
+from _common import add_baseline_args, handle_baseline, load_app, sample_load
+
+
+def cases(ada) -> dict:
+    profile = ada.compile_profile(ada.CarrierCostProfile(
+        tenant_id=1, **ada.ProfileIn(profile_id="truck-1", display_name="Truck 1",
+                                     block_brokers={"Slow Pay Logistics": "90-day pay"}).model_dump()))
+    req = ada.LoadRequest(**sample_load(3)).model_dump()
+    ctx = ada.pricing_context(profile, req)
+    decision, _ = ada.decision_logic(profile, req, ctx)
+    inputs = ada.script_inputs(req, decision, ctx.offered_rpm, ctx.break_even_rpm, ctx.target_rpm, ctx.profit, ctx.margin)
+    token = ada.create_access_token(sub="owner@bench-micro.example.com", tenant_id=1, role="OWNER")
+    batch = [ada.LoadRequest(**sample_load(i)).model_dump() for i in range(1000)]
+
+    return {
+        "compute_costs": (lambda: ada.compute_costs(profile, req), 1),
+        "pricing_context": (lambda: ada.pricing_context(profile, req), 1),
+        "decision_logic": (lambda: ada.decision_logic(profile, req), 1),
+        "decision_logic(ctx)": (lambda: ada.decision_logic(profile, req, ctx), 1),
+        "negotiation_script": (lambda: ada.negotiation_script(req, ctx.break_even_rpm, ctx.target_rpm, ctx.offered_rpm), 1),
+        "script_template.render": (lambda: ada.DEFAULT_SCRIPT.render(inputs), 1),
+        "create_access_token": (lambda: ada.create_access_token(sub="owner@bench-micro.example.com", tenant_id=1, role="OWNER"), 1),
+        "decode_token": (lambda: ada.decode_token(token), 1),
+        "LoadRequest.model_validate": (lambda: ada.LoadRequest.model_validate(sample_load(3)), 1),
+        "price_batch (per load, n=1000)": (lambda: ada.price_batch(profile, batch), len(batch)),
+    }
+
+
+def measure(fn, per_call: int, repeat: int, target_ms: float) -> dict:
+    timer = timeit.Timer(fn)
+    number = 1
+    while timer.timeit(number) < target_ms / 1000.0:
+        number *= 2
+    runs = [t / number / per_call * 1e9 for t in timer.repeat(repeat, number)]
+    return {"min_ns": min(runs), "median_ns": statistics.median(runs)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--target-ms", type=float, default=100.0, help="approximate duration of one timed batch")
+    parser.add_argument("--only", help="comma-separated case names")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    ada = load_app()
+    selected = cases(ada)
+    if args.only:
+        selected = {k: v for k, v in selected.items() if k in args.only.split(",")}
+
+    results = {}
+    print(f"{'case':32s} {'min ns/op':>12s} {'median ns/op':>13s} {'ops/s (min)':>13s}")
+    for name, (fn, per_call) in selected.items():
+        r = results[name] = measure(fn, per_call, args.repeat, args.target_ms)
+        print(f"{name:32s} {r['min_ns']:12,.0f} {r['median_ns']:13,.0f} {1e9 / r['min_ns']:13,.0f}")
+    raise SystemExit(handle_baseline(args, "micro", results, {"repeat": args.repeat, "only": args.only}))
+
+
+if __name__ == "__main__":
+    main()
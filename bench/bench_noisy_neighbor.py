@@ -0,0 +1,147 @@
+"""
+A small tenant's /recommend latency while a noisy neighbor saturates the service, with
+admission control off and on.
+
+  small   one dispatcher sending --small-rate requests/s (open loop: sends don't wait for
+          answers) for --seconds
+  noisy   --noisy-clients closed-loop clients of another tenant, a scripted /recommend loop
+          sending as fast as answers come back (--batch-every n: every n-th request is a
+          200-load /recommend/batch instead)
+
+Scenarios, each run alone first and then under the noisy load:
+
+  off          no slot cap, no rate limits: everyone shares the threadpool
+  fair         --slots in-flight slots (default: the app's ADMISSION_CONCURRENCY), per-tenant
+               weighted fair queuing
+  fair+limit   the same, plus a --noisy-rate token bucket on the noisy tenant's role
+               (its excess gets 429 + Retry-After)
+
+Reported per scenario: the small tenant's p50 / p99 alone vs under load, the noisy tenant's
+throughput and 429s, and both tenants' average admission queue wait (/admission/stats). Exits 1
+if, with fair queuing, the small tenant's p99 under load exceeds --flat-factor x its p99
+alone (plus --flat-slack-ms for timer noise).
+
+    python bench/bench_noisy_neighbor.py --seconds 5 --noisy-clients 64
+"""
+
+import argparse
+import asyncio
+import time
+
+from _common import async_client, create_profile, load_app, register, sample_load, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each phase")
+    parser.add_argument("--small-rate", type=float, default=20.0, help="small tenant requests/s")
+    parser.add_argument("--noisy-clients", type=int, default=64)
+    parser.add_argument("--batch-every", type=int, default=0, help="every n-th noisy request is a batch; 0: none")
+    parser.add_argument("--slots", type=int, help="in-flight slots for the fair scenarios (default: ADMISSION_CONCURRENCY)")
+    parser.add_argument("--noisy-rate", type=float, default=50.0, help="requests/s allowed per (tenant, role) in fair+limit")
+    parser.add_argument("--flat-factor", type=float, default=2.0)
+    parser.add_argument("--flat-slack-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        small = register(client, "bench-small", "owner@bench-small.example.com")
+        create_profile(client, small)
+        noisy = register(client, "bench-noisy", "owner@bench-noisy.example.com")
+        create_profile(client, noisy)
+    batch = {"loads": [sample_load(i) for i in range(200)]}
+    ctl = ada.admission_controller
+    slots = args.slots or ada.ADMISSION_CONCURRENCY
+
+    async def small_tenant(stop_at: float, latencies: list):
+        async with async_client(ada.app) as client:
+            async def one(i):
+                t0 = time.perf_counter()
+                (await client.post("/recommend", json=sample_load(i), headers=small)).raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+
+            tasks, i, next_at = [], 0, time.perf_counter()
+            while next_at < stop_at:
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                tasks.append(asyncio.create_task(one(i)))
+                i += 1
+                next_at += 1.0 / args.small_rate
+            await asyncio.gather(*tasks)
+
+    async def noisy_tenant(stop_at: float, counts: dict):
+        async with async_client(ada.app) as client:
+            async def worker(w):
+                n = 0
+                while time.perf_counter() < stop_at:
+                    n += 1
+                    if args.batch_every and n % args.batch_every == 0:
+                        r = await client.post("/recommend/batch", json=batch, headers=noisy)
+                    else:
+                        r = await client.post("/recommend", json=sample_load(w * 100_000 + n), headers=noisy)
+                    if r.status_code == 429:
+                        counts["429"] += 1
+                        assert r.headers.get("Retry-After"), "429 without Retry-After"
+                        await asyncio.sleep(min(float(r.headers["Retry-After"]), max(0.0, stop_at - time.perf_counter())))
+                    else:
+                        r.raise_for_status()
+                        counts["ok"] += 1
+
+            await asyncio.gather(*(worker(w) for w in range(args.noisy_clients)))
+
+    async def phase(with_noise: bool):
+        latencies, counts = [], {"ok": 0, "429": 0}
+        stop_at = time.perf_counter() + args.seconds
+        jobs = [small_tenant(stop_at, latencies)]
+        if with_noise:
+            jobs.append(noisy_tenant(stop_at, counts))
+        await asyncio.gather(*jobs)
+        return summarize(latencies), counts
+
+    scenarios = (
+        ("off", 0, {}),
+        ("fair", slots, {}),
+        ("fair+limit", slots, {"OWNER": (args.noisy_rate, args.noisy_rate)}),
+    )
+    failures = []
+
+    def waited_ms(client, headers, before=None):
+        """(admitted, total queue wait in ms) for the caller's tenant; with `before`, the
+        average wait since that snapshot."""
+        st = client.get("/admission/stats", headers=headers).json()
+        now = (st["admitted"], st["wait_avg_ms"] * st["admitted"])
+        if before is None:
+            return now
+        n = now[0] - before[0]
+        return (now[1] - before[1]) / n if n else 0.0
+
+    print(f"small tenant {args.small_rate:g} req/s; noisy tenant {args.noisy_clients} clients; {slots} slots"
+          f"{f', every {args.batch_every}th a 200-load batch' if args.batch_every else ''}; {args.seconds:g}s per phase")
+    with TestClient(ada.app) as client:
+        for label, slots, limits in scenarios:
+            ctl.concurrency, ctl.rate_limits = slots, limits
+            ctl._buckets.clear()
+            asyncio.run(phase(False))  # warm
+            alone, _ = asyncio.run(phase(False))
+            s0, n0 = waited_ms(client, small), waited_ms(client, noisy)
+            loaded, counts = asyncio.run(phase(True))
+            s_wait, n_wait = waited_ms(client, small, s0), waited_ms(client, noisy, n0)
+            print(f"  {label:10s} small p50 {alone['p50_ms']:6.2f} -> {loaded['p50_ms']:7.2f} ms   "
+                  f"p99 {alone['p99_ms']:6.2f} -> {loaded['p99_ms']:7.2f} ms   "
+                  f"noisy {counts['ok'] / args.seconds:6.0f} ok/s, {counts['429']:5d} x 429   "
+                  f"avg queue wait small {s_wait:.2f} ms / noisy {n_wait:.2f} ms")
+            if slots and loaded["p99_ms"] > alone["p99_ms"] * args.flat_factor + args.flat_slack_ms:
+                failures.append(label)
+            if limits and not counts["429"]:
+                failures.append(f"{label}: no 429s")
+    print(f"admission: {ctl.stats()}")
+    ada.log_writer.stop()
+    ada.hashing_executor.shutdown()
+    if failures:
+        print(f"small tenant p99 not flat / limits not applied: {', '.join(failures)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Micro-benchmark of the per-request pricing path.
+
+"before" is the call sequence /recommend used to make, run on verbatim copies of the
+pre-PricingContext functions kept below (the app's compute_costs / break_even_rpm /
+target_rpm are now thin wrappers over pricing_context, so calling them would time the
+new code twice): compute_costs, offered_rpm, break_even_rpm, target_rpm and
+decision_logic each re-deriving the cost breakdown. "after" builds one PricingContext
+and feeds it to decision_logic and the script.
+
+    python bench/bench_pricing_path.py --iterations 50000
+"""
+
+import argparse
+from dataclasses import dataclass
+from typing import Tuple
+
+from _common import load_app, sample_load, summarize, timeit
+
+
+class legacy:
+    """The pricing functions as they were before PricingContext."""
+
+    @dataclass
+    class CostBreakdown:
+        fuel_cost: float
+        variable_cost: float
+        fixed_allocated: float
+        total_cost: float
+
+    @staticmethod
+    def _fuel_price(profile, region: str) -> float:
+        prices = profile.fuel_price_by_region or {}
+        return float(prices.get(region, prices.get("National", 3.85)))
+
+    @staticmethod
+    def compute_costs(profile, req: dict) -> "legacy.CostBreakdown":
+        total_miles = float(req["loaded_miles"]) + float(req.get("deadhead_miles", 0))
+
+        f_price = legacy._fuel_price(profile, req.get("fuel_region", "National"))
+        gallons = total_miles / float(profile.mpg)
+        fuel_cost = gallons * f_price
+
+        var_per_mile = (
+            float(profile.driver_pay_per_mile)
+            + float(profile.maintenance_per_mile)
+            + float(profile.insurance_per_mile)
+            + float(profile.tires_per_mile)
+            + float(profile.permits_tolls_per_mile)
+            + float(profile.other_variable_per_mile)
+        )
+        variable_cost = var_per_mile * total_miles
+
+        fixed_per_mile = float(profile.fixed_costs_per_day) / float(profile.target_miles_per_day)
+        fixed_allocated = fixed_per_mile * total_miles
+
+        total_cost = fuel_cost + variable_cost + fixed_allocated
+        return legacy.CostBreakdown(fuel_cost=fuel_cost, variable_cost=variable_cost, fixed_allocated=fixed_allocated,
+                                    total_cost=total_cost)
+
+    @staticmethod
+    def offered_rpm(req: dict) -> float:
+        return float(req["offered_total_rate"]) / float(req["loaded_miles"])
+
+    @staticmethod
+    def break_even_rpm(profile, req: dict) -> float:
+        costs = legacy.compute_costs(profile, req)
+        return costs.total_cost / float(req["loaded_miles"])
+
+    @staticmethod
+    def target_rpm(profile, req: dict) -> float:
+        be = legacy.break_even_rpm(profile, req)
+        return be * (1.0 + float(profile.preferred_margin_percent))
+
+    @staticmethod
+    def decision_logic(profile, req: dict) -> Tuple[str, list]:
+        reasons = []
+        block = (profile.block_brokers or {}).get(req["broker_name"])
+        if block:
+            reasons.append(f"Broker is blocked: {block}")
+            return "NO-GO", reasons
+
+        dead = float(req.get("deadhead_miles", 0))
+        if dead > float(profile.max_deadhead_miles):
+            reasons.append(f"Deadhead {dead:.0f}mi exceeds soft cap {profile.max_deadhead_miles:.0f}mi (review)")
+
+        be = legacy.break_even_rpm(profile, req)
+        off = legacy.offered_rpm(req)
+        min_rpm = be * (1.0 + float(profile.min_margin_percent))
+
+        if off >= min_rpm and dead <= float(profile.max_deadhead_miles):
+            reasons.append(f"Offered RPM ${off:.2f} meets minimum ${min_rpm:.2f}")
+            return "GO", reasons
+
+        if off < be:
+            reasons.append(f"Offered RPM ${off:.2f} is below break-even ${be:.2f}")
+            return "NO-GO", reasons
+
+        reasons.append(f"Offered RPM ${off:.2f} is between break-even ${be:.2f} and minimum ${min_rpm:.2f}")
+        return "REVIEW", reasons
+
+    @staticmethod
+    def negotiation_script(req: dict, be_rpm_value: float, tgt_rpm_value: float) -> str:
+        off_r = legacy.offered_rpm(req)
+        return (
+            f"Hi — thanks for sending this over. For {req['origin_city']}, {req['origin_state']} → "
+            f"{req['dest_city']}, {req['dest_state']} ({float(req['loaded_miles']):.0f} loaded mi, {float(req.get('deadhead_miles',0)):.0f} deadhead), "
+            f"we’re currently at ${off_r:.2f}/mi (${float(req['offered_total_rate']):,.0f} total). "
+            f"Given operating costs and deadhead, we need ${be_rpm_value:.2f}/mi to break even. "
+            f"If you can do ${tgt_rpm_value:.2f}/mi (${tgt_rpm_value * float(req['loaded_miles']):,.0f} total), we can confirm and roll now. "
+            f"Can you check with your customer and get me as close as possible?"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+
+    ada = load_app()
+    profile = ada.CarrierCostProfile(tenant_id=1, **ada.ProfileIn(profile_id="truck-1", display_name="Truck 1").model_dump())
+    req = ada.LoadRequest(**sample_load(3)).model_dump()
+
+    def before():
+        costs = legacy.compute_costs(profile, req)
+        off = legacy.offered_rpm(req)
+        be = legacy.break_even_rpm(profile, req)
+        tgt = legacy.target_rpm(profile, req)
+        decision, reasons = legacy.decision_logic(profile, req)
+        profit = float(req["offered_total_rate"]) - costs.total_cost
+        return (decision, reasons), legacy.negotiation_script(req, be_rpm_value=be, tgt_rpm_value=tgt), off, profit
+
+    def after():
+        ctx = ada.pricing_context(profile, req)
+        decision, reasons = ada.decision_logic(profile, req, ctx)
+        return ((decision, reasons), ada.negotiation_script(req, ctx.break_even_rpm, ctx.target_rpm, ctx.offered_rpm),
+                ctx.offered_rpm, ctx.profit)
+
+    assert before() == after(), (before(), after())
+    for name, fn in (("before", before), ("after", after)):
+        timeit(fn, 1000)  # warm-up
+        stats = summarize(timeit(fn, args.iterations))
+        print(f"{name:6s}  mean {stats['mean_ms'] * 1000:7.2f} us   p50 {stats['p50_ms'] * 1000:7.2f} us   p99 {stats['p99_ms'] * 1000:7.2f} us")
+
+
+if __name__ == "__main__":
+    main()
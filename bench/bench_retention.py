@@ -0,0 +1,151 @@
+"""
+Insert latency and /logs/recent latency as total log history grows.
+
+History is added in --steps chunks of --days-per-step simulated days (--rows-per-day rows
+across --tenants tenants). After each chunk, a durable single-row log insert
+(write_logs + commit, the /recommend?durable=true write) and GET /logs/recent are timed.
+Each mode runs in its own interpreter on a fresh SQLite file:
+
+  legacy     the pre-retention single-column indexes re-created, no retention
+  indexes    current indexes, no retention (the hot table holds all history)
+  retention  current indexes + a --window-days policy applied after every chunk
+
+    python bench/bench_retention.py --steps 10 --rows-per-day 30000 --days-per-step 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from _common import BROKERS, LANES, summarize
+
+LEGACY_INDEXES = ("id", "tenant_id", "user_email", "user_role", "profile_id", "broker_name")
+PHYSICAL_COLUMN = {"user_email": "log_user_id", "user_role": "log_user_id", "broker_name": "broker_id"}
+
+
+def history_rows(tenant_ids, start: datetime, days: int, per_day: int, offset: int):
+    step = timedelta(seconds=86400 / per_day)
+    for i in range(days * per_day):
+        n = offset + i
+        oc, os_, dc, ds, miles, region = LANES[n % len(LANES)]
+        rpm = 1.7 + (n % 97) / 97.0
+        yield {
+            "tenant_id": tenant_ids[n % len(tenant_ids)], "user_email": f"dispatcher{n % 50}@t{n % len(tenant_ids)}.example.com",
+            "user_role": "DISPATCHER", "profile_id": f"truck-{n % 40}", "broker_name": BROKERS[n % len(BROKERS)],
+            "origin_city": oc, "origin_state": os_, "dest_city": dc, "dest_state": ds, "equipment_type": "Van",
+            "loaded_miles": float(miles), "deadhead_miles": 25.0, "offered_total_rate": rpm * miles, "fuel_region": region,
+            "decision": "GO" if rpm > 2.4 else "REVIEW", "offered_rpm": rpm, "break_even_rpm": 2.1, "target_rpm": 2.6,
+            "projected_profit": (rpm - 2.1) * miles, "projected_margin_percent": (rpm - 2.1) / rpm,
+            "negotiation_script": "", "script_template_id": "default", "script_template_version": 1,
+            "created_at": start + step * i,
+        }
+
+
+def run_child(args):
+    from sqlalchemy import insert, text
+
+    from _common import load_app, register, tenant_id_for
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-retention-0", "owner@bench-retention.example.com")
+        tenant_ids = [tenant_id_for(ada, "bench-retention-0")]
+        for t in range(1, args.tenants):
+            register(client, f"bench-retention-{t}", f"owner@bench-retention-{t}.example.com")
+            tenant_ids.append(tenant_id_for(ada, f"bench-retention-{t}"))
+        if args.mode == "legacy":  # after load_app()'s migrate_schema, which drops retired indexes
+            with ada.engine.begin() as conn:
+                for col in LEGACY_INDEXES:
+                    conn.execute(text(f"CREATE INDEX ix_recommendation_logs_{col} ON recommendation_logs ({PHYSICAL_COLUMN.get(col, col)})"))
+
+        sim_start = datetime(2023, 1, 1)
+        total = 0
+        for step in range(args.steps):
+            day0 = step * args.days_per_step
+            batch = []
+            with ada.engine.begin() as conn:
+                for row in history_rows(tenant_ids, sim_start + timedelta(days=day0), args.days_per_step, args.rows_per_day, total):
+                    batch.append(row)
+                    if len(batch) == 20000:
+                        conn.execute(insert(ada.RecommendationLog), ada.log_dictionary.encode(conn, batch))
+                        batch = []
+                if batch:
+                    conn.execute(insert(ada.RecommendationLog), ada.log_dictionary.encode(conn, batch))
+            total += args.days_per_step * args.rows_per_day
+            sim_now = sim_start + timedelta(days=day0 + args.days_per_step)
+
+            archived, archive_s = 0, 0.0
+            if args.mode == "retention":
+                t0 = time.perf_counter()
+                for tid in tenant_ids:
+                    archived += ada.archive_tenant_logs(tid, sim_now - timedelta(days=args.window_days))
+                archive_s = time.perf_counter() - t0
+
+            template = next(history_rows(tenant_ids[:1], sim_now, 1, 1, 0))
+            inserts = []
+            for k in range(args.samples):
+                row = dict(template, created_at=sim_now + timedelta(seconds=k), offered_total_rate=1000.0 + k)
+                t0 = time.perf_counter()
+                with ada.engine.begin() as conn:
+                    ada.write_logs(conn, [row])
+                inserts.append(time.perf_counter() - t0)
+
+            reads = []
+            for _ in range(args.samples):
+                t0 = time.perf_counter()
+                client.get("/logs/recent?limit=20", headers=headers).raise_for_status()
+                reads.append(time.perf_counter() - t0)
+
+            with ada.engine.connect() as conn:
+                hot = conn.execute(text("SELECT count(*) FROM recommendation_logs")).scalar()
+            size = sum(os.path.getsize(ada.engine.url.database + ext) for ext in ("", "-wal") if os.path.exists(ada.engine.url.database + ext))
+            print(json.dumps({"step": step, "history": total, "hot": hot, "db_mb": size / 2**20,
+                              "insert": summarize(inserts), "recent": summarize(reads),
+                              "archived": archived, "archive_rows_per_s": archived / archive_s if archive_s else 0.0}), flush=True)
+    ada.log_writer.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--days-per-step", type=int, default=10)
+    parser.add_argument("--rows-per-day", type=int, default=30000)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--window-days", type=int, default=30)
+    parser.add_argument("--samples", type=int, default=300)
+    parser.add_argument("--modes", default="legacy,indexes,retention")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return run_child(args)
+
+    print(f"{args.steps} steps x {args.days_per_step} days x {args.rows_per_day:,} rows/day, {args.tenants} tenants, "
+          f"window {args.window_days} days; insert = durable single-row write_logs + commit")
+    for mode in args.modes.split(","):
+        tmp = tempfile.mkdtemp(prefix=f"ada-retention-{mode}-")
+        env = dict(os.environ, ADA_DATABASE_URL=f"sqlite:///{tmp}/ada.db", ADA_LOG_ARCHIVE_DIR=os.path.join(tmp, "archive"))
+        cmd = [sys.executable, __file__, "--mode", mode] + [
+            f"--{k.replace('_', '-')}={v}" for k, v in vars(args).items() if k not in ("mode", "modes")]
+        print(f"[{mode}]")
+        print(f"  {'history':>10s} {'hot rows':>10s} {'db MiB':>8s} {'insert p50':>11s} {'p99':>8s} "
+              f"{'recent p50':>11s} {'p99':>8s} {'archived/s':>11s}")
+        proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for line in proc.stdout:
+            if not line.startswith("{"):
+                continue
+            r = json.loads(line)
+            print(f"  {r['history']:>10,} {r['hot']:>10,} {r['db_mb']:8.0f} {r['insert']['p50_ms']:9.3f}ms {r['insert']['p99_ms']:6.2f}ms "
+                  f"{r['recent']['p50_ms']:9.3f}ms {r['recent']['p99_ms']:6.2f}ms {r['archive_rows_per_s']:11,.0f}")
+        if proc.wait():
+            raise SystemExit(proc.returncode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Checks incremental rollups against a brute-force aggregation of the raw logs, times
+a chunked rebuild, and compares /analytics latency with an on-demand GROUP BY.
+Exits non-zero on any mismatch.
+
+    python bench/bench_rollups.py --rows 1000000
+"""
+
+import argparse
+import sys
+import time
+
+from sqlalchemy import func, select
+
+from _common import load_app, register, create_profile, sample_load, seed_logs, summarize, tenant_id_for, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-rollups", "owner@bench-rollups.example.com")
+        create_profile(client, headers)
+        tenant_id = tenant_id_for(ada, "bench-rollups")
+
+        t0 = time.perf_counter()
+        seed_logs(ada, tenant_id, args.rows, through_app=True)
+        print(f"incremental maintenance: {args.rows / (time.perf_counter() - t0):,.0f} rows/s including log insert")
+        # live path: single, batch, durable and write-behind requests
+        for i in range(50):
+            client.post("/recommend", json=sample_load(i), headers=headers).raise_for_status()
+        client.post("/recommend/batch?durable=true", json={"loads": [sample_load(i) for i in range(200)]}, headers=headers).raise_for_status()
+        ada.log_writer.flush()
+
+        failed = False
+        problems = ada.rollup_mismatches(tenant_id)
+        print(f"incremental vs brute force: {len(problems)} mismatches")
+        failed |= bool(problems)
+
+        t0 = time.perf_counter()
+        scanned = ada.rebuild_rollups(tenant_id)
+        print(f"rebuild: {scanned:,} rows in {time.perf_counter() - t0:.1f}s")
+        problems = ada.rollup_mismatches(tenant_id)
+        print(f"rebuilt vs brute force:     {len(problems)} mismatches")
+        failed |= bool(problems)
+        for line in problems[:10]:
+            print("  ", line)
+
+        L = ada.RecommendationLog
+        lane = ada.LOG_FIELDS["origin_state"] + "→" + ada.LOG_FIELDS["dest_state"]
+        with ada.engine.connect() as conn:
+            scan = summarize(timeit(lambda: conn.execute(
+                select(lane, func.count(), func.avg(L.offered_rpm), func.sum(L.projected_profit))
+                .select_from(ada.LOG_FROM).where(L.tenant_id == tenant_id).group_by(lane)).all(), max(3, args.repeat // 5)))
+        rollup = summarize(timeit(lambda: client.get("/analytics/lane", headers=headers), args.repeat))
+        point = summarize(timeit(lambda: client.get("/analytics/broker", params={"key": "Coyote"}, headers=headers), args.repeat))
+        print(f"lane GROUP BY over logs  p50 {scan['p50_ms']:9.2f} ms")
+        print(f"GET /analytics/lane      p50 {rollup['p50_ms']:9.2f} ms")
+        print(f"GET /analytics/broker?key p50 {point['p50_ms']:8.2f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+recommendation_logs storage with the negotiation script stored in full (legacy rows)
+vs templated rows ("" + template id/version, text re-rendered on read).
+
+Each mode gets its own SQLite file with the app's pragmas. Reports insert throughput,
+file size, bytes/row and read throughput (legacy: fetch the text; templated: fetch the
+row's inputs and render), and checks rendered text == stored text on a sample.
+
+    python bench/bench_script_storage.py --rows 2000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert, select
+
+from _common import BROKERS, LANES, load_app
+
+
+def rows_for(ada, n: int, templated: bool, chunk: int):
+    rng = random.Random(11)
+    start = datetime(2024, 1, 1)
+    for base in range(0, n, chunk):
+        batch = []
+        for i in range(base, min(n, base + chunk)):
+            oc, os_, dc, ds, miles, region = LANES[i % len(LANES)]
+            rate = round(miles * (1.6 + rng.random() * 1.4), 2)
+            req = {
+                "profile_id": f"truck-{i % 20}", "broker_name": BROKERS[i % len(BROKERS)],
+                "origin_city": oc, "origin_state": os_, "dest_city": dc, "dest_state": ds, "equipment_type": "Van",
+                "loaded_miles": float(miles), "deadhead_miles": float((i * 37) % 220), "offered_total_rate": rate,
+                "fuel_region": region,
+            }
+            be = 2.0 + rng.random() * 0.4
+            off = rate / miles
+            profit = (off - be) * miles
+            inputs = ada.script_inputs(req, "GO" if off >= be * 1.15 else ("NO-GO" if off < be else "REVIEW"),
+                                       off, be, be * 1.25, profit, profit / rate)
+            batch.append({
+                "tenant_id": 1, "user_email": f"dispatcher{i % 5}@bench.example.com", "user_role": "DISPATCHER",
+                **inputs,
+                "negotiation_script": "" if templated else ada.DEFAULT_SCRIPT.render(inputs),
+                "script_template_id": "default" if templated else None,
+                "script_template_version": 1 if templated else None,
+                "created_at": start + timedelta(seconds=i * 7),
+            })
+        yield batch
+
+
+def run(ada, path: str, rows: int, templated: bool, chunk: int, read_rows: int) -> dict:
+    eng = create_engine(f"sqlite:///{path}", **ada.build_engine_kwargs())
+    event.listen(eng, "connect", ada._sqlite_pragmas)
+    ada.Base.metadata.create_all(eng)
+    dictionary = ada.LogDictionary()  # ids are per database: not the app's process-wide cache
+    dictionary.install(eng)
+    with eng.begin() as conn:
+        conn.execute(insert(ada.Tenant), [{"id": 1, "name": "bench"}])
+
+    t0 = time.perf_counter()
+    for batch in rows_for(ada, rows, templated, chunk):
+        with eng.begin() as conn:
+            conn.execute(insert(ada.RecommendationLog), dictionary.encode(conn, batch))
+    insert_s = time.perf_counter() - t0
+    with eng.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(path)
+
+    log = ada.RecommendationLog
+    cols = [log.negotiation_script, log.script_template_id, log.script_template_version]
+    cols += [ada.LOG_FIELDS[name].label(name) for name in ada.SCRIPT_FIELDS if name != "target_total_rate"]
+    scripts = []
+    t0 = time.perf_counter()
+    with eng.connect() as conn:
+        for row in conn.execute(select(*cols).select_from(ada.LOG_FROM).order_by(log.id.desc()).limit(read_rows)):
+            scripts.append(ada.render_log_script(conn, 1, row._mapping))
+    read_s = time.perf_counter() - t0
+    eng.dispose()
+    return {"insert_s": insert_s, "size": size, "read_s": read_s, "scripts": scripts}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--chunk", type=int, default=20000)
+    parser.add_argument("--read", type=int, default=200_000)
+    args = parser.parse_args()
+
+    ada = load_app()
+    tmp = tempfile.mkdtemp(prefix="ada-scripts-")
+    results = {}
+    for name, templated in (("full text", False), ("templated", True)):
+        r = results[name] = run(ada, os.path.join(tmp, f"{name.replace(' ', '_')}.db"), args.rows, templated, args.chunk, args.read)
+        print(f"{name:10s}: insert {args.rows / r['insert_s']:>9,.0f} rows/s  file {r['size'] / 2**20:8.1f} MiB "
+              f"({r['size'] / args.rows:6.1f} B/row)  read+script {args.read / r['read_s']:>9,.0f} rows/s")
+
+    full, tmpl = results["full text"], results["templated"]
+    mismatches = sum(a != b for a, b in zip(full["scripts"], tmpl["scripts"]))
+    print(f"size saved: {(1 - tmpl['size'] / full['size']) * 100:.1f}%  "
+          f"rendered vs stored text mismatches: {mismatches}/{len(full['scripts'])}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
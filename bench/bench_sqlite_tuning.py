@@ -0,0 +1,98 @@
+"""
+Mixed read/write concurrency against /recommend (durable writes) and /logs/recent,
+with the default SQLite pragmas vs SQLite's stock settings (rollback journal,
+synchronous=FULL, no busy timeout). Each configuration runs in its own interpreter
+on a fresh database file.
+
+    python bench/bench_sqlite_tuning.py --clients 64 --requests 4000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import async_client, drive_concurrently, sample_load, summarize
+
+CONFIGS = {
+    "stock": {"ADA_SQLITE_JOURNAL_MODE": "DELETE", "ADA_SQLITE_SYNCHRONOUS": "FULL",
+              "ADA_SQLITE_BUSY_TIMEOUT_MS": "0", "ADA_SQLITE_MMAP_SIZE": "0", "ADA_SQLITE_CACHE_SIZE_KB": "2000"},
+    "tuned": {},
+}
+
+
+def run_child(args):
+    from _common import load_app, register, create_profile
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-sqlite", "owner@bench-sqlite.example.com")
+        create_profile(client, headers)
+
+    errors = [0]
+    write_lat, read_lat = [], []
+
+    async def go():
+        async with async_client(ada.app) as client:
+            async def send(i):
+                t0 = time.perf_counter()
+                is_read = i % args.read_every == 0
+                try:
+                    if is_read:
+                        r = await client.get("/logs/recent", params={"limit": 50}, headers=headers)
+                    else:
+                        r = await client.post("/recommend?durable=true", json=sample_load(i), headers=headers)
+                    ok = r.status_code == 200
+                except Exception:  # e.g. "database is locked" surfacing from the app
+                    ok = False
+                errors[0] += not ok
+                (read_lat if is_read else write_lat).append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            await drive_concurrently(send, args.clients, args.requests)
+            return time.perf_counter() - t0
+
+    try:
+        elapsed = asyncio.run(go())
+    finally:
+        ada.log_writer.stop()
+    w, r = summarize(write_lat), summarize(read_lat)
+    print(json.dumps({"rps": args.requests / elapsed, "errors": errors[0],
+                      "write_p50": w["p50_ms"], "write_p99": w["p99_ms"], "read_p50": r["p50_ms"], "read_p99": r["p99_ms"]}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--read-every", type=int, default=3, help="every Nth request is a /logs/recent read")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args)
+
+    print(f"{args.clients} clients, {args.requests} requests, 1 in {args.read_every} is a read")
+    for label, overrides in CONFIGS.items():
+        env = dict(os.environ, ADA_DATABASE_URL=f"sqlite:///{tempfile.mkdtemp(prefix='ada-bench-')}/ada.db", **overrides)
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--clients", str(args.clients),
+             "--requests", str(args.requests), "--read-every", str(args.read_every)],
+            env=env, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            print(f"{label:6s} failed:\n{out.stderr[-2000:]}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{label:6s} {r['rps']:7.0f} req/s  errors {r['errors']:5d}  "
+              f"write p50/p99 {r['write_p50']:7.1f}/{r['write_p99']:8.1f} ms  "
+              f"read p50/p99 {r['read_p50']:7.1f}/{r['read_p99']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Cold start: how long a fresh worker process takes to import the app and to answer its
+first /health and its first /recommend.
+
+Every sample is a new interpreter, the way an autoscaled instance starts:
+
+  interpreter  `python -c pass`, the floor
+  deps         importing fastapi / sqlalchemy / numpy / pydantic / jose, without the app
+  import       `import app` (no database work since schema setup moved out of import)
+  serve        `uvicorn app:app` spawned, then /health polled until it answers 200 and a
+               /recommend sent with a token issued beforehand (no bcrypt on this path),
+               with the schema migrated at startup (ADA_MIGRATE_ON_STARTUP=1) and with it
+               left to `python app.py init-db` at deploy (=0)
+
+The database is a throwaway SQLite file holding one tenant and profile. Children may write
+bytecode (PYTHONDONTWRITEBYTECODE is dropped) and the first sample of each kind is
+discarded, so the numbers are for a warm page cache and compiled .pyc files, as on an image
+built with `python -m compileall`. Exits 1 when the p50 to first /recommend with init-db
+exceeds --budget-ms.
+
+    python bench/bench_startup.py --runs 7 --budget-ms 1500
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from _common import ROOT, add_baseline_args, create_profile, handle_baseline, load_app, register, sample_load, summarize
+
+DEPS = "import fastapi, fastapi.security, sqlalchemy.orm, numpy, pydantic, jose.jwt"
+
+
+def child_env(**overrides) -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    env.update(overrides)
+    return env
+
+
+def timed_import(code: str, env: dict) -> float:
+    """Seconds spent in `code` inside a fresh interpreter (interpreter startup excluded)."""
+    out = subprocess.run([sys.executable, "-c", f"import time; t0 = time.perf_counter(); {code}; "
+                          f"print(time.perf_counter() - t0)"], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return float(out.split()[-1])
+
+
+def interpreter(env: dict) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], cwd=ROOT, env=env, check=True)
+    return time.perf_counter() - t0
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url: str, body: bytes = None, headers: dict = None) -> int:
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json", **(headers or {})})
+    with urllib.request.urlopen(req, timeout=10) as r:
+        r.read()
+        return r.status
+
+
+def serve(env: dict, headers: dict, load: bytes, timeout_s: float = 30.0):
+    """(seconds to first /health 200, seconds to first /recommend 200), both from spawn."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+                             "--log-level", "warning"], cwd=ROOT, env=env, stderr=subprocess.PIPE, text=True)
+    try:
+        while True:
+            try:
+                if request(f"{base}/health") == 200:
+                    break
+            except OSError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited: {proc.stderr.read()[-2000:]}")
+            if time.perf_counter() - t0 > timeout_s:
+                raise RuntimeError("server did not answer /health")
+            time.sleep(0.002)
+        health_s = time.perf_counter() - t0
+        status = request(f"{base}/recommend", load, headers)
+        recommend_s = time.perf_counter() - t0
+        if status != 200:
+            raise RuntimeError(f"/recommend returned {status}")
+        return health_s, recommend_s
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7, help="samples per measurement (after one discarded warm-up)")
+    parser.add_argument("--budget-ms", type=float, default=1500.0,
+                        help="p50 spawn-to-first-/recommend allowed with init-db at deploy")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    if "ADA_DATABASE_URL" not in os.environ:
+        os.environ["ADA_DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='ada-startup-')}/ada.db"
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-startup", "owner@bench-startup.example.com")
+        create_profile(client, headers)
+    ada.hashing_executor.shutdown()
+    load = json.dumps(sample_load(1)).encode()
+
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "app.py", "init-db"], cwd=ROOT, env=child_env(), check=True, capture_output=True)
+    init_db_s = time.perf_counter() - t0
+
+    env = child_env(ADA_METRICS="1", ADA_METRICS_TOKEN="bench", ADA_RECOMMEND_DEDUPE_TTL="0")
+    measures = {
+        "interpreter": lambda: interpreter(env),
+        "deps": lambda: timed_import(DEPS, env),
+        "import": lambda: timed_import("import app", env),
+    }
+    results = {}
+    for name, fn in measures.items():
+        fn()
+        results[name] = summarize([fn() for _ in range(args.runs)])
+    for label, migrate in (("migrate at startup", "1"), ("init-db at deploy", "0")):
+        serve_env = {**env, "ADA_MIGRATE_ON_STARTUP": migrate}
+        serve(serve_env, headers, load)
+        samples = [serve(serve_env, headers, load) for _ in range(args.runs)]
+        results[f"{label} /health"] = summarize([h for h, _ in samples])
+        results[f"{label} /recommend"] = summarize([r for _, r in samples])
+
+    print(f"{args.runs} cold processes each; `python app.py init-db` on the seeded database: {init_db_s * 1000:.0f} ms")
+    for name, s in results.items():
+        print(f"  {name:32s} p50 {s['p50_ms']:8.1f} ms   p99 {s['p99_ms']:8.1f} ms")
+    p50 = results["init-db at deploy /recommend"]["p50_ms"]
+    within = p50 <= args.budget_ms
+    print(f"budget: first /recommend p50 {p50:.0f} ms vs {args.budget_ms:.0f} ms -> {'ok' if within else 'OVER'}")
+    ada.log_writer.stop()
+    status = handle_baseline(args, "bench_startup", {k: {"p50_ms": v["p50_ms"]} for k, v in results.items()},
+                             {"runs": args.runs})
+    raise SystemExit(status or (0 if within else 1))
+
+
+if __name__ == "__main__":
+    main()
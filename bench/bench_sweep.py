@@ -0,0 +1,93 @@
+"""
+POST /recommend/sweep: a rates x deadheads x regions grid in one call, checked against
+the scalar pricing_context / decision_logic path.
+
+    python bench/bench_sweep.py --rates 100 --deadheads 100
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from _common import load_app, register, create_profile, sample_load, summarize, tenant_id_for
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", type=int, default=100)
+    parser.add_argument("--deadheads", type=int, default=100)
+    parser.add_argument("--regions", default="National")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--check", type=int, default=2000, help="cells re-priced through the scalar path")
+    args = parser.parse_args()
+
+    ada = load_app()
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as client:
+        headers = register(client, "bench-sweep", "owner@bench-sweep.example.com")
+        create_profile(client, headers, "truck-1")
+        load = sample_load(0, "truck-1")
+        load["broker_name"] = "Acme Freight"
+        payload = {
+            "load": load,
+            "rates": {"start": 500.0, "stop": 500.0 + 25.0 * (args.rates - 1), "step": 25.0},
+            "deadhead_miles": {"start": 0.0, "stop": 5.0 * (args.deadheads - 1), "step": 5.0},
+            "fuel_regions": args.regions.split(","),
+        }
+
+        logs_before = len(client.get("/logs/recent?limit=100", headers=headers).json())
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            r = client.post("/recommend/sweep", json=payload, headers=headers)
+            samples.append(time.perf_counter() - t0)
+            r.raise_for_status()
+        out = r.json()
+        logs_after = len(client.get("/logs/recent?limit=100", headers=headers).json())
+
+        with ada.SessionLocal() as db:
+            profile = ada.get_compiled_profile(db, tenant_id_for(ada, "bench-sweep"), "truck-1")
+
+    model = ada.SweepRequest.model_validate(payload)
+    req_dict, rates, deadheads, regions = ada._sweep_axes(model)
+    compute = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        grid = ada.price_sweep(profile, req_dict, rates, deadheads, regions)
+        ada.sweep_breakpoints(req_dict, grid)
+        compute.append(time.perf_counter() - t0)
+
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    for _ in range(args.check):
+        f, d, k = rng.integers(len(regions)), rng.integers(len(deadheads)), rng.integers(len(rates))
+        req = dict(req_dict, fuel_region=regions[f], deadhead_miles=float(deadheads[d]), offered_total_rate=float(rates[k]))
+        ctx = ada.pricing_context(profile, req)
+        decision, _ = ada.decision_logic(profile, req, ctx)
+        if decision != out["decision"][f][d][k] or ctx.profit != out["profit"][f][d][k]:
+            mismatches += 1
+
+    flip_errors = 0
+    for curve in out["curves"]:
+        req = dict(req_dict, fuel_region=curve["fuel_region"], deadhead_miles=curve["deadhead_miles"])
+        for flip in curve["flips"]:
+            at = dict(req, offered_total_rate=flip["total_rate"])
+            below = dict(req, offered_total_rate=float(np.nextafter(flip["total_rate"], -np.inf)))
+            if (ada.decision_logic(profile, at)[0] != flip["to_decision"]
+                    or ada.decision_logic(profile, below)[0] != flip["from_decision"]):
+                flip_errors += 1
+
+    print(f"cells={out['cells']} ({len(rates)} rates x {len(deadheads)} deadheads x {len(regions)} regions)")
+    print(f"HTTP round trip   : {summarize(samples)}")
+    print(f"price + breakpoints: {summarize(compute)}")
+    print(f"cells re-checked vs scalar path: {args.check}  mismatches: {mismatches}")
+    print(f"breakpoints checked: {sum(len(c['flips']) for c in out['curves'])}  errors: {flip_errors}")
+    print(f"log rows written by sweeps: {logs_after - logs_before}")
+    if mismatches or flip_errors or logs_after != logs_before:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Shared fixtures: one app module per test session, on a throwaway SQLite file.
+
+app.py reads its configuration at import, so the environment is set here before the
+first test imports it. Tests share the database and keep apart by tenant name.
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix="ada-tests-")
+
+os.environ["ADA_DATABASE_URL"] = f"sqlite:///{TMP}/ada.db"
+os.environ["ADA_LOG_ARCHIVE_DIR"] = os.path.join(TMP, "archive")
+os.environ["ADA_HASH_EXECUTOR"] = "thread"  # spawn workers would re-import app from sys.path
+os.environ["ADA_CACHE_BUS"] = "local"
+os.environ["ADA_METRICS_TOKEN"] = "test-metrics"
+os.environ.setdefault("ADA_SECRET_KEY", "test-secret")
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def ada():
+    import app
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(ada):
+    from fastapi.testclient import TestClient
+
+    with TestClient(ada.app) as c:
+        yield c
+
+
+@pytest.fixture
+def tenant(client):
+    """Register a fresh tenant; returns (auth headers, tenant name)."""
+
+    def make(prefix: str = "t"):
+        name = f"{prefix}-{uuid.uuid4().hex[:8]}"
+        r = client.post("/auth/register", json={"tenant_name": name, "email": f"owner@{name}.example.com",
+                                                "password": "test-password"})
+        r.raise_for_status()
+        return {"Authorization": f"Bearer {r.json()['access_token']}"}, name
+
+    return make
+
+
+def tenant_id(ada, name: str) -> int:
+    with ada.SessionLocal() as db:
+        return db.query(ada.Tenant.id).filter(ada.Tenant.name == name).scalar()
+
+
+def load(i: int = 0, **overrides) -> dict:
+    body = {
+        "profile_id": "truck-1",
+        "origin_city": "Dallas", "origin_state": "TX", "dest_city": "Atlanta", "dest_state": "GA",
+        "broker_name": "Coyote",
+        "loaded_miles": 780.0,
+        "deadhead_miles": float(i % 50),
+        "offered_total_rate": 1800.0 + i,
+        "fuel_region": "Southeast",
+    }
+    body.update(overrides)
+    return body
+
+
+def create_profile(client, headers, profile_id: str = "truck-1", **overrides) -> None:
+    body = {"profile_id": profile_id, "display_name": profile_id.title()}
+    body.update(overrides)
+    client.post("/profiles", json=body, headers=headers).raise_for_status()
@@ -0,0 +1,74 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT, tenant_id
+
+
+def admission_series(ada, metric_tenants=frozenset()) -> list:
+    registry = ada.MetricsRegistry()
+    registry.describe("ada_admission_requests_total", "counter", "")
+    registry.describe("ada_admission_wait_seconds", "histogram", "")
+    ctl = ada.AdmissionController(concurrency=4, rate_limits={"DISPATCHER": (0.0, 1.0)}, registry=registry,
+                                  metric_tenants=metric_tenants)
+
+    async def go():
+        for tenant_id in range(1, 51):
+            for _ in range(2):  # the second is rate limited
+                try:
+                    await ctl.acquire(tenant_id, "DISPATCHER")
+                    ctl.release(tenant_id)
+                except ada.AdmissionRejected:
+                    pass
+
+    asyncio.run(go())
+    return [line for line in registry.render().splitlines() if line.startswith("ada_admission_requests_total")]
+
+
+def test_admission_series_have_no_tenant_label_by_default(ada):
+    assert admission_series(ada) == ['ada_admission_requests_total{outcome="admitted"} 50',
+                                     'ada_admission_requests_total{outcome="rate_limited"} 50']
+
+
+def test_unlisted_tenants_share_one_series(ada):
+    series = admission_series(ada, {7})
+    assert len(series) == 4
+    assert 'ada_admission_requests_total{tenant="7",outcome="admitted"} 1' in series
+    assert 'ada_admission_requests_total{tenant="other",outcome="rate_limited"} 49' in series
+
+
+@pytest.mark.parametrize("token,ok", [(None, False), ("m-secret", True)])
+def test_per_tenant_series_need_the_metrics_token(tmp_path, token, ok):
+    env = {"ADA_MIGRATE_ON_STARTUP": "0", "ADA_CACHE_BUS": "local", "ADA_DATABASE_URL": f"sqlite:///{tmp_path}/ada.db",
+           "ADA_ADMISSION_METRIC_TENANTS": "1,2", **({"ADA_METRICS_TOKEN": token} if token else {})}
+    r = subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert (r.returncode == 0) == ok, r.stderr
+    assert ok or "ADA_METRICS_TOKEN" in r.stderr
+
+
+def test_admission_class_follows_the_current_role(ada, client, tenant, monkeypatch):
+    owner, name = tenant("admission-role")
+    tid = tenant_id(ada, name)
+    email = f"admin@{name}.example.com"
+    with ada.SessionLocal() as db:
+        db.add(ada.User(email=email, password_hash="unused", role="ADMIN", tenant_id=tid))
+        db.commit()
+    admin = {"Authorization": f"Bearer {ada.create_access_token(sub=email, tenant_id=tid, role='ADMIN')}"}
+    seen = []
+    acquire = ada.admission_controller.acquire
+
+    async def spy(tenant_id, role, cost=1.0):
+        seen.append(role)
+        return await acquire(tenant_id, role, cost)
+
+    monkeypatch.setattr(ada.admission_controller, "acquire", spy)
+    client.post("/recommend", json={}, headers=admin)
+    client.post("/recommend", json={}, headers=admin)
+    assert client.patch(f"/tenant/users/{email}", json={"role": "DISPATCHER"}, headers=owner).status_code == 200
+    client.post("/recommend", json={}, headers=admin)  # the token still says ADMIN
+    assert seen == ["ADMIN", "ADMIN", "DISPATCHER"]
+    assert client.delete(f"/tenant/users/{email}", headers=owner).status_code == 200
+    assert client.post("/recommend", json={}, headers=admin).status_code == 401  # passed through, not admitted
+    assert len(seen) == 3
@@ -0,0 +1,29 @@
+from conftest import tenant_id
+
+
+def test_hashing_stats_are_operator_only(ada, client, tenant, monkeypatch):
+    owner, _ = tenant("hash-stats")
+    monkeypatch.setattr(ada, "OPERATOR_TOKEN", "op-secret")
+    assert client.get("/auth/hashing/stats", headers=owner).status_code == 401
+    r = client.get("/auth/hashing/stats", headers={"Authorization": "Bearer op-secret"})
+    assert r.status_code == 200 and r.json().keys() == ada.hashing_executor.stats().keys()
+
+
+def test_role_change_and_deletion_apply_to_cached_tokens(ada, client, tenant):
+    owner, name = tenant("principals")
+    tid = tenant_id(ada, name)
+    email = f"admin@{name}.example.com"
+    with ada.SessionLocal() as db:
+        db.add(ada.User(email=email, password_hash="unused", role="ADMIN", tenant_id=tid))
+        db.commit()
+    admin = {"Authorization": f"Bearer {ada.create_access_token(sub=email, tenant_id=tid, role='ADMIN')}"}
+
+    hits = ada.principal_cache.hits
+    for _ in range(2):
+        assert client.get("/admission/stats", headers=admin).status_code == 200
+    assert ada.principal_cache.hits > hits  # the second call was served from the cache
+
+    assert client.patch(f"/tenant/users/{email}", json={"role": "DISPATCHER"}, headers=owner).status_code == 200
+    assert client.get("/admission/stats", headers=admin).status_code == 403
+    assert client.delete(f"/tenant/users/{email}", headers=owner).status_code == 200
+    assert client.get("/admission/stats", headers=admin).status_code == 401
@@ -0,0 +1,53 @@
+from sqlalchemy import event, func, select
+
+from conftest import create_profile, load, tenant_id
+
+
+def fleet_loads() -> list:
+    loads = [load(i, profile_id="truck-1" if i % 2 else "truck-2", offered_total_rate=1200.0 + 150 * i) for i in range(12)]
+    loads[3]["broker_name"] = "Slow Pay"                       # blocked on truck-2 only
+    loads[5]["deadhead_miles"] = 400.0                         # over the deadhead cap
+    loads[6].pop("loaded_miles"), loads[6].pop("deadhead_miles")  # filled from the city table
+    return loads
+
+
+def log_count(ada, tid: int) -> int:
+    with ada.SessionLocal() as db:
+        L = ada.RecommendationLog
+        return db.execute(select(func.count()).select_from(L).where(L.tenant_id == tid)).scalar()
+
+
+def test_batch_matches_single_requests(ada, client, tenant):
+    headers, name = tenant("batch")
+    create_profile(client, headers)
+    create_profile(client, headers, "truck-2", mpg=5.5, block_brokers={"Slow Pay": "90-day pay"})
+    tid = tenant_id(ada, name)
+    loads = fleet_loads()
+
+    inserts = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO recommendation_logs"):
+            inserts.append(len(parameters) if executemany else 1)
+
+    event.listen(ada.engine, "before_cursor_execute", count)
+    try:
+        batch = client.post("/recommend/batch", params={"durable": True}, json={"loads": loads}, headers=headers)
+    finally:
+        event.remove(ada.engine, "before_cursor_execute", count)
+    assert batch.status_code == 200, batch.text
+    assert inserts == [len(loads)]  # one executemany for the whole batch
+    assert log_count(ada, tid) == len(loads)
+
+    singles = [client.post("/recommend", json=body, headers=headers).json() for body in loads]
+    assert batch.json() == {"count": len(loads), "results": singles}
+    assert {r["decision"] for r in singles} == {"GO", "REVIEW", "NO-GO"}
+
+
+def test_unknown_profile_fails_the_whole_batch(ada, client, tenant):
+    headers, name = tenant("batch-404")
+    create_profile(client, headers)
+    loads = [load(1), load(2, profile_id="ghost"), load(3)]
+    r = client.post("/recommend/batch", params={"durable": True}, json={"loads": loads}, headers=headers)
+    assert r.status_code == 404 and r.json()["detail"] == "Profile not found: ghost"
+    assert log_count(ada, tenant_id(ada, name)) == 0
@@ -0,0 +1,71 @@
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import ROOT
+
+
+def compiled(tenant_id: int, profile_id: str = "truck-1"):
+    return SimpleNamespace(tenant_id=tenant_id, profile_id=profile_id)
+
+
+@pytest.fixture
+def workers(ada, tmp_path):
+    """Two workers' views of one shared generations file."""
+    path = str(tmp_path / "bus")
+    return ada.SharedGenerations(path, slots=1024), ada.SharedGenerations(path, slots=1024)
+
+
+def test_invalidate_in_one_worker_retires_the_others_entries(ada, workers):
+    a, b = ada.ProfileCache(generations=workers[0]), ada.ProfileCache(generations=workers[1])
+    for cache in (a, b):
+        cache.put(compiled(7), cache.generation(7))
+        cache.put(compiled(8), cache.generation(8))
+    b.invalidate(7, "truck-1")
+    assert a.get(7, "truck-1") is None and a.invalidations == 1
+    assert a.get(8, "truck-1") is not None and b.get(8, "truck-1") is not None
+
+
+def test_bump_from_another_process(ada, tmp_path):
+    path = str(tmp_path / "bus")
+    cache = ada.ProfileCache(generations=ada.SharedGenerations(path, slots=1024))
+    cache.put(compiled(3), cache.generation(3))
+    code = f"import app; app.SharedGenerations({path!r}, slots=1024).bump('profiles', 3)"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                   env={"ADA_MIGRATE_ON_STARTUP": "0", "ADA_CACHE_BUS": "local",
+                        "ADA_DATABASE_URL": f"sqlite:///{tmp_path}/ada.db"})
+    assert cache.get(3, "truck-1") is None
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_clear_bumps_generations(ada, workers, shared):
+    gens = workers if shared else (ada.LocalGenerations(),) * 2
+    a, b = ada.ProfileCache(generations=gens[0]), ada.ProfileCache(generations=gens[1])
+    loading = a.generation(5)  # a load that started before the clear
+    b.put(compiled(5), b.generation(5))
+    a.clear()
+    a.put(compiled(5), loading)
+    assert a.get(5, "truck-1") is None  # must not land
+    assert b.get(5, "truck-1") is None  # every worker's view of the namespace moved on
+    a.put(compiled(5), a.generation(5))
+    assert a.get(5, "truck-1") is not None
+
+
+def test_clear_is_per_namespace(ada):
+    gens = ada.LocalGenerations()
+    profiles, scripts = ada.ProfileCache(generations=gens), ada.ScriptTemplateCache(generations=gens)
+    before = scripts.generation(1)
+    profiles.clear()
+    assert scripts.generation(1) == before
+
+
+def test_cache_stats_need_the_operator_token(ada, client, tenant, monkeypatch):
+    owner, _ = tenant("stats")
+    monkeypatch.setattr(ada, "OPERATOR_TOKEN", None)
+    assert client.get("/cache/stats", headers=owner).status_code == 403
+    monkeypatch.setattr(ada, "OPERATOR_TOKEN", "op-secret")
+    assert client.get("/cache/stats", headers=owner).status_code == 401  # a tenant owner is not an operator
+    r = client.get("/cache/stats", headers={"Authorization": "Bearer op-secret"})
+    assert r.status_code == 200 and "recommendations" in r.json()
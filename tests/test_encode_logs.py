@@ -0,0 +1,70 @@
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, MetaData, Table, create_engine, insert, inspect, select
+
+
+def legacy_db(ada, path, rows: int):
+    """A database whose recommendation_logs still stores its strings inline."""
+    eng = create_engine(f"sqlite:///{path}")
+    by_fk = {d.fk: d for d in ada.LOG_DIMENSIONS}
+    cols = []
+    for c in ada.RecommendationLog.__table__.columns:
+        d = by_fk.get(c.name)
+        if d is None:
+            cols.append(Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable))
+        else:
+            cols += [Column(f, d.model.__table__.c[col].type, nullable=False) for f, col in zip(d.fields, d.columns)]
+    legacy = Table("recommendation_logs", MetaData(), *cols)
+    legacy.create(eng)
+    t0 = datetime(2025, 1, 1)
+    data = [{
+        "id": i + 1, "tenant_id": 1 + i % 2, "user_email": f"d{i % 3}@example.com", "user_role": "DISPATCHER",
+        "profile_id": "truck-1", "broker_name": ("Coyote", "TQL", "Echo")[i % 3],
+        "origin_city": "Dallas", "origin_state": "TX", "dest_city": ("Atlanta", "Memphis")[i % 2],
+        "dest_state": ("GA", "TN")[i % 2], "equipment_type": "Dry Van", "fuel_region": "Southeast",
+        "loaded_miles": 700.0 + i, "deadhead_miles": 10.0, "offered_total_rate": 1800.0 + i,
+        "offered_rpm": 2.5, "break_even_rpm": 2.1, "target_rpm": 2.6, "projected_profit": 250.0,
+        "projected_margin_percent": 12.0, "decision": "GO", "negotiation_script": "",
+        "created_at": t0 + timedelta(minutes=i),
+    } for i in range(rows)]
+    with eng.begin() as conn:
+        conn.execute(insert(legacy), [{k: v for k, v in d.items() if k in legacy.c} for d in data])
+    return eng, data
+
+
+def encoded(ada, eng) -> list:
+    with eng.connect() as conn:
+        return [r._asdict() for r in conn.execute(select(*ada.LOG_COLUMNS).select_from(ada.LOG_FROM)
+                                                  .order_by(ada.RecommendationLog.id))]
+
+
+def test_migration_only_warns_about_the_legacy_layout(ada, tmp_path, caplog):
+    eng, _ = legacy_db(ada, tmp_path / "legacy.db", 5)
+    with caplog.at_level(logging.WARNING, logger="ada"):
+        ada._migrate_schema(eng)
+    assert "encode-logs" in caplog.text
+    assert "broker_name" in {c["name"] for c in inspect(eng).get_columns("recommendation_logs")}
+
+
+def test_encode_logs_copies_in_resumable_chunks(ada, tmp_path):
+    eng, data = legacy_db(ada, tmp_path / "legacy.db", 10)
+    ada._migrate_schema(eng)  # dimension tables exist; the log table is left alone
+
+    def interrupt(n):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        ada.encode_legacy_logs(eng, chunk_rows=4, progress=interrupt)
+    assert ada.legacy_log_layout(eng) and len(encoded(ada, eng)) == 4
+
+    seen = []
+    assert ada.encode_legacy_logs(eng, chunk_rows=4, progress=seen.append) == 6
+    assert seen == [4, 6] and not ada.legacy_log_layout(eng)
+    rows = encoded(ada, eng)
+    assert [r["id"] for r in rows] == list(range(1, 11))
+    for row, want in zip(rows, data):
+        assert {k: row[k] for k in ("broker_name", "dest_city", "user_email", "created_at")} == \
+               {k: want[k] for k in ("broker_name", "dest_city", "user_email", "created_at")}
+    assert ada.encode_legacy_logs(eng) == 0
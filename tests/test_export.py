@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import tenant_id
+from test_log_writer import log_rows
+from test_logs import walk
+
+ROWS, ARCHIVED, CHUNK = 23, 7, 5
+
+
+@pytest.fixture
+def exported(ada, client, tenant, monkeypatch):
+    """A tenant with ROWS hot rows and ARCHIVED older archived ones, exported CHUNK rows at a time."""
+    headers, name = tenant("export")
+    tid = tenant_id(ada, name)
+    now = datetime.utcnow()
+    rows = log_rows(ada, tid, ARCHIVED + ROWS)
+    archived_month = datetime(now.year - 1, 6, 15)  # one archive month
+    for i, row in enumerate(rows):
+        row["created_at"] = archived_month + timedelta(minutes=i) if i < ARCHIVED else now - timedelta(days=1, minutes=ROWS - i)
+    rows.reverse()  # inserted newest first: the export must still come out oldest first
+    with ada.engine.begin() as conn:
+        ada.write_logs(conn, rows)
+    assert ada.archive_tenant_logs(tid, now - timedelta(days=100)) == ARCHIVED
+    monkeypatch.setattr(ada, "EXPORT_CHUNK_ROWS", CHUNK)
+    return headers, tid
+
+
+def names(ada, include_script: bool = False) -> list:
+    return [c.name for c in ada.LOG_EXPORT_COLUMNS] + (["negotiation_script"] if include_script else [])
+
+
+@pytest.mark.parametrize("include_archived", [False, True])
+def test_ndjson_rows_columns_and_order(ada, client, exported, include_archived):
+    headers, _ = exported
+    r = client.get("/logs/export", params={"include_archived": include_archived}, headers=headers)
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert len(rows) == ROWS + (ARCHIVED if include_archived else 0)
+    assert all(list(row) == names(ada) for row in rows)
+    stamps = [row["created_at"] for row in rows]
+    assert stamps == sorted(stamps)
+
+
+def test_csv_header_and_rows(ada, client, exported):
+    headers, _ = exported
+    r = client.get("/logs/export", params={"format": "csv", "include_script": True}, headers=headers)
+    table = list(csv.reader(io.StringIO(r.text)))
+    assert table[0] == names(ada, include_script=True)
+    assert len(table) == 1 + ROWS and all(len(row) == len(table[0]) for row in table)
+    assert all(row[-1].startswith("Hi") for row in table[1:])  # scripts re-rendered from the template
+
+
+def test_columnar_chunks(ada, client, exported):
+    headers, _ = exported
+    lines = client.get("/logs/export", params={"format": "columnar", "include_archived": True},
+                       headers=headers).text.splitlines()
+    assert json.loads(lines[0]) == {"columns": names(ada)}
+    chunks = [json.loads(line) for line in lines[1:]]
+    assert [c["rows"] for c in chunks] == [5, 5, 5, 5, 5, 5]  # one stream, archived rows merged in
+    assert all(len(c["data"]) == len(names(ada)) and all(len(col) == c["rows"] for col in c["data"]) for c in chunks)
+
+
+def test_export_streams_one_chunk_at_a_time(ada, client, exported):
+    headers, tid = exported
+    chunks = ada.iter_log_export(tid, "ndjson")
+    first = next(chunks)
+    assert first.count("\n") == CHUNK  # encoded and handed over before the rest is fetched
+    assert [c.count("\n") for c in chunks] == [5, 5, 5, 3]
+    with client.stream("GET", "/logs/export", headers=headers) as r:
+        assert "content-length" not in r.headers
+        assert sum(chunk.count(b"\n") for chunk in r.iter_bytes()) == ROWS
+
+
+def test_late_row_in_archived_month_is_merged(ada, client, exported):
+    headers, tid = exported
+    late = log_rows(ada, tid, 1)[0]
+    late["created_at"] = datetime(datetime.utcnow().year - 1, 6, 15, 0, 3, 30)  # write-behind after archival
+    with ada.engine.begin() as conn:
+        ada.write_logs(conn, [late])
+    page = client.get("/logs", params={"include_archived": True, "limit": 500}, headers=headers).json()["items"]
+    assert len(page) == ROWS + ARCHIVED + 1
+    keys = [(item["created_at"], item["id"]) for item in page]
+    assert keys == sorted(keys, reverse=True)
+    assert walk(client, headers, include_archived=True) == [item["id"] for item in page]
+    rows = [json.loads(line) for line in client.get("/logs/export", params={"include_archived": True},
+                                                    headers=headers).text.splitlines()]
+    assert [(row["created_at"], row["id"]) for row in rows] == keys[::-1]
@@ -0,0 +1,34 @@
+import pytest
+
+from conftest import create_profile, load
+
+
+@pytest.fixture
+def fleet(client, tenant):
+    headers, _ = tenant("fleet")
+    for i, mpg in enumerate((3.0, 4.5, 5.5, 6.5, 7.5, 9.0)):
+        create_profile(client, headers, f"truck-{i}", mpg=mpg, max_deadhead_miles=100.0 if i != 4 else 10.0)
+    body = {k: v for k, v in load(0, deadhead_miles=40.0, offered_total_rate=1900.0).items() if k != "profile_id"}
+    return headers, body
+
+
+def test_fleet_is_ranked_by_projected_profit(client, fleet):
+    headers, body = fleet
+    out = client.post("/recommend/fleet", json=body, headers=headers).json()
+    results = out["results"]
+    assert out["profiles_evaluated"] == len(results) == 6
+    assert [r["rank"] for r in results] == list(range(1, 7))
+    profits = [r["projected_profit"] for r in results]
+    assert profits == sorted(profits, reverse=True)
+    assert out["decisions"] == {"GO": 1, "REVIEW": 3, "NO-GO": 2}
+    assert client.post("/recommend/fleet", params={"limit": 2}, json=body, headers=headers).json()["results"] == results[:2]
+
+
+@pytest.mark.parametrize("decision", ["GO", "REVIEW", "NO-GO"])
+def test_decision_filter(client, fleet, decision):
+    headers, body = fleet
+    everything = client.post("/recommend/fleet", json=body, headers=headers).json()
+    out = client.post("/recommend/fleet", params={"decision": decision}, json=body, headers=headers).json()
+    assert out["decisions"] == everything["decisions"]  # counts still cover the whole fleet
+    assert [r["profile_id"] for r in out["results"]] == [r["profile_id"] for r in everything["results"] if r["decision"] == decision]
+    assert len(out["results"]) == everything["decisions"].get(decision, 0)
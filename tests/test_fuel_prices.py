@@ -0,0 +1,27 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import create_profile, load
+
+
+def test_upload_reprices_the_next_recommendation(client, tenant):
+    headers, _ = tenant("fuel")
+    create_profile(client, headers)
+    profile = client.get("/profiles/truck-1", headers=headers).json()
+    body = load(0, fuel_region="Southeast")
+    before = client.post("/recommend", json=body, headers=headers).json()["projected_total_cost"]
+
+    today = datetime.utcnow().date().isoformat()
+    prices = [{"region": "Southeast", "effective_date": today, "price": 6.25}]
+    assert client.post("/fuel-prices", json={"prices": prices}, headers=headers).status_code == 200
+    r = client.post("/recommend", json=body, headers=headers)
+    after = r.json()["projected_total_cost"]
+
+    assert "Idempotent-Replayed" not in r.headers  # the same body is priced again, not replayed
+    assert after > before
+    gallons = (body["loaded_miles"] + body["deadhead_miles"]) / profile["mpg"]
+    old_price = profile["fuel_price_by_region"].get("Southeast", profile["fuel_price_by_region"].get("National"))
+    assert after - before == pytest.approx(gallons * (6.25 - old_price))
+    assert client.get("/profiles/truck-1", headers=headers).json() == profile  # no profile rewrite
+
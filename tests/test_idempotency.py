@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+from sqlalchemy import func, select
+
+from conftest import create_profile, load, tenant_id
+
+
+def log_rows(ada, tid: int) -> int:
+    ada.log_writer.flush()
+    with ada.SessionLocal() as db:
+        return db.execute(select(func.count()).select_from(ada.RecommendationLog)
+                          .where(ada.RecommendationLog.tenant_id == tid)).scalar()
+
+
+def burst(ada, requests):
+    """Send (json, headers) pairs concurrently through the ASGI app."""
+    async def go():
+        transport = httpx.ASGITransport(app=ada.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await asyncio.gather(*(c.post("/recommend", json=body, headers=h) for body, h in requests))
+    return asyncio.run(go())
+
+
+def test_concurrent_identical_requests_price_and_log_once(ada, client, tenant):
+    headers, name = tenant("idem")
+    create_profile(client, headers)
+    tid = tenant_id(ada, name)
+    for extra, body in (({"Idempotency-Key": "k-1"}, load(1)), ({}, load(2))):
+        before = log_rows(ada, tid)
+        rs = burst(ada, [(body, {**headers, **extra})] * 20)
+        assert all(r.status_code == 200 for r in rs)
+        assert len({r.text for r in rs}) == 1
+        assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in rs) == 19
+        assert log_rows(ada, tid) - before == 1
+
+
+def test_near_identical_requests_are_not_deduped(ada, client, tenant):
+    headers, name = tenant("near")
+    create_profile(client, headers, block_brokers={"Slow Pay Logistics": "90-day pay"})
+    create_profile(client, headers, "Truck-1", mpg=4.0)
+    tid = tenant_id(ada, name)
+    before = log_rows(ada, tid)
+
+    blocked, other = burst(ada, [(load(3, broker_name="Slow Pay Logistics"), headers),
+                                 (load(3, broker_name="slow pay logistics"), headers)])
+    assert blocked.json()["decision"] == "NO-GO" and other.json()["decision"] != "NO-GO"
+
+    lower, upper = burst(ada, [(load(4), headers), (load(4, profile_id="Truck-1"), headers)])
+    assert upper.json()["break_even_rpm"] > lower.json()["break_even_rpm"]
+
+    spaced = client.post("/recommend", json=load(5, origin_city="Dallas "), headers=headers)
+    assert spaced.status_code in (200, 422)
+    for r in (blocked, other, lower, upper):
+        assert "Idempotent-Replayed" not in r.headers
+    assert log_rows(ada, tid) - before == 4 + (spaced.status_code == 200)
+
+
+def test_key_reused_with_another_body_is_422(client, tenant):
+    headers, _ = tenant("idem-key")
+    create_profile(client, headers)
+    h = {**headers, "Idempotency-Key": "k-2"}
+    assert client.post("/recommend", json=load(6), headers=h).status_code == 200
+    assert client.post("/recommend", json=load(6, broker_name="coyote"), headers=h).status_code == 422
+
+
+def test_sync_waiter_is_bounded(ada):
+    cache = ada.RecommendationCache(dedupe_ttl_seconds=30)
+    user = ada.Principal(id=1, email="a@example.com", tenant_id=1, role="OWNER")
+    pins = (object(), object())
+    owner = cache.claim(user, "truck-1", load(7), None, pins)
+    joiner = cache.claim(user, "truck-1", load(7), None, pins)
+    assert owner.owner and not joiner.owner
+    assert not joiner.wait(0.01)  # still running: the route prices it itself instead
+    owner.done("answer")
+    assert joiner.wait(0.01) and joiner.result() == "answer"
+    # another resolved profile (same body) never joins
+    assert cache.claim(user, "truck-1", load(7), None, (object(), pins[1])).owner
@@ -0,0 +1,115 @@
+import socket
+import time
+
+import pytest
+
+from conftest import create_profile
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.fixture
+def ports(ada, monkeypatch):
+    allowed = frozenset(free_port() for _ in range(3))
+    monkeypatch.setattr(ada, "INGEST_SOCKET_PORTS", allowed)
+    return allowed
+
+
+def test_socket_sources_need_an_allow_listed_port(ada, client, tenant, monkeypatch):
+    headers, _ = tenant("sock-off")
+    monkeypatch.setattr(ada, "INGEST_SOCKET_PORTS", frozenset())
+    assert client.post("/ingest/sources", json={"kind": "socket"}, headers=headers).status_code == 400
+    monkeypatch.setattr(ada, "INGEST_SOCKET_PORTS", frozenset({free_port()}))
+    r = client.post("/ingest/sources", json={"kind": "socket", "port": free_port()}, headers=headers)
+    assert r.status_code == 400
+
+
+def test_socket_connections_must_send_the_token(ada, client, tenant, ports):
+    headers, _ = tenant("sock")
+    create_profile(client, headers)
+    src = client.post("/ingest/sources", json={"kind": "socket"}, headers=headers).json()
+    assert src["port"] in ports and src["token"]
+    assert "token" not in client.get("/ingest/sources", headers=headers).json()[0]
+    line = b'{"origin_city": "Dallas", "origin_state": "TX", "dest_city": "Atlanta", "dest_state": "GA", ' \
+           b'"broker_name": "Coyote", "loaded_miles": 780, "offered_total_rate": 2400, "fuel_region": "Southeast"}\n'
+
+    with socket.create_connection(("127.0.0.1", src["port"])) as s:
+        s.sendall(b"wrong-token\n" + line)
+    with socket.create_connection(("127.0.0.1", src["port"])) as s:
+        s.sendall(src["token"].encode() + b"\n" + line)
+
+    described = lambda: client.get("/ingest/sources", headers=headers).json()[0]
+    assert wait_for(lambda: described()["lines"] == 1 and described()["refused"] == 1)
+    assert wait_for(lambda: client.get("/ingest/stats", headers=headers).json()["open_connections"] == 0)
+    client.delete(f"/ingest/sources/{src['id']}", headers=headers)
+
+
+def test_sources_and_connections_are_capped_per_tenant(ada, client, tenant, ports, monkeypatch):
+    headers, name = tenant("sock-cap")
+    monkeypatch.setattr(ada, "INGEST_TENANT_SOURCES", 2)
+    monkeypatch.setattr(ada, "INGEST_TENANT_CONNECTIONS", 1)
+    made = [client.post("/ingest/sources", json={"kind": "socket"}, headers=headers) for _ in range(3)]
+    assert [r.status_code for r in made] == [200, 200, 429]
+    port = made[0].json()["port"]
+
+    held = socket.create_connection(("127.0.0.1", port))
+    described = lambda: client.get("/ingest/sources", headers=headers).json()[0]
+    assert wait_for(lambda: described()["connections"] == 1)
+    with socket.create_connection(("127.0.0.1", port)) as extra:
+        assert extra.recv(1) == b""  # closed straight away: the tenant's one slot is taken
+    assert described()["refused"] == 1
+    held.close()
+    for r in made[:2]:
+        client.delete(f"/ingest/sources/{r.json()['id']}", headers=headers)
+
+
+def test_failing_reader_is_logged_and_restarted(ada, caplog):
+    class Flaky(ada.IngestSource):
+        kind = "flaky"
+        retry_seconds = 0.01
+        runs = 0
+
+        def _run(self):
+            Flaky.runs += 1
+            if Flaky.runs < 3:
+                raise ValueError("boom")
+
+    source = Flaky(ada.ingest_pipeline, tenant_id=0)
+    with caplog.at_level("ERROR", logger="ada"):
+        source.start()
+        assert wait_for(lambda: source.done)
+    assert Flaky.runs == 3 and source.errors == 2 and source.error == "ValueError: boom"
+    assert sum(r.exc_info is not None for r in caplog.records) == 2
+    with pytest.raises(TypeError):
+        ada.IngestSource(ada.ingest_pipeline, 0)
+
+
+def test_failed_chunk_is_counted_and_logged(ada, caplog, monkeypatch):
+    pipeline = ada.IngestPipeline()
+
+    def down(tenant_id, loads, stamps):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(pipeline, "_evaluate", down)
+    load = {"origin_city": "Dallas", "origin_state": "TX", "dest_city": "Atlanta", "dest_state": "GA",
+            "broker_name": "Coyote", "loaded_miles": 780, "offered_total_rate": 2400, "fuel_region": "Southeast"}
+    with caplog.at_level("ERROR", logger="ada"):
+        assert pipeline.offer(0, [load, {**load, "offered_total_rate": 2500}])
+        assert wait_for(lambda: pipeline.chunks == 1)
+    pipeline.stop()
+    assert pipeline.failed == 2 and pipeline.evaluated == 0
+    (record,) = [r for r in caplog.records if "ingest chunk" in r.getMessage()]
+    assert record.getMessage() == "ingest chunk of 2 loads failed" and "database is down" in record.exc_text
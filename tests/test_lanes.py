@@ -0,0 +1,33 @@
+from conftest import create_profile, load
+
+
+def distance(client, headers, origin, dest) -> float:
+    r = client.get("/lanes/distance", params={"origin_city": origin[0], "origin_state": origin[1],
+                                              "dest_city": dest[0], "dest_state": dest[1]}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()["miles"]
+
+
+def test_omitted_miles_are_filled(client, tenant):
+    headers, _ = tenant("lanes")
+    create_profile(client, headers)
+    body = load(0)
+    del body["loaded_miles"], body["deadhead_miles"]
+
+    r = client.post("/recommend", json=body, headers=headers).json()
+    assert r["loaded_miles"] == distance(client, headers, ("Dallas", "TX"), ("Atlanta", "GA")) > 0
+    assert r["deadhead_miles"] == 0
+
+    r = client.post("/recommend", json={**body, "truck_city": "fort worth", "truck_state": "tx"}, headers=headers).json()
+    assert r["deadhead_miles"] == distance(client, headers, ("Fort Worth", "TX"), ("Dallas", "TX")) > 0
+
+
+def test_unknown_city_is_422(client, tenant):
+    headers, _ = tenant("lanes-422")
+    create_profile(client, headers)
+    body = load(0, origin_city="Atlantis")
+    del body["loaded_miles"]
+    r = client.post("/recommend", json=body, headers=headers)
+    assert r.status_code == 422 and r.json()["detail"] == "Unknown location: Atlantis, TX"
+    r = client.post("/recommend/batch", json={"loads": [load(1), body]}, headers=headers)
+    assert r.status_code == 422 and r.json()["detail"] == "loads[1]: Unknown location: Atlantis, TX"
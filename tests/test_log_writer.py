@@ -0,0 +1,46 @@
+import json
+
+from sqlalchemy import func, select
+
+from conftest import load, tenant_id
+
+
+def log_rows(ada, tid: int, n: int, **overrides) -> list:
+    user = ada.Principal(id=1, email="owner@example.com", tenant_id=tid, role="OWNER")
+    template = ada.BUILTIN_SCRIPTS[("default", 1)]
+    rows = []
+    for i in range(n):
+        inputs = ada.script_inputs(load(i, equipment_type="Dry Van"), "GO", 2.3, 1.9, 2.4, 300.0, 13.0)
+        rows.append({**ada._log_values(user, inputs, template), **overrides})
+    return rows
+
+
+def test_bad_rows_are_isolated_then_dead_lettered(ada, client, tenant, tmp_path, monkeypatch):
+    _, name = tenant("writer")
+    tid = tenant_id(ada, name)
+    dead_letter = tmp_path / "dead.ndjson"
+    monkeypatch.setattr(ada, "LOG_DEAD_LETTER_PATH", str(dead_letter))
+    monkeypatch.setattr(ada, "LOG_WRITE_ATTEMPTS", 3)
+
+    good = log_rows(ada, tid, 40)
+    bad = log_rows(ada, tid, 1, tenant_id=None)  # NOT NULL: fails on its own, every time
+    writer = ada.LogWriter(batch_size=16, interval_ms=5)
+    writer.submit(good[:20] + bad + good[20:])
+    assert writer.flush(10)
+    writer.stop()
+
+    st = writer.stats()
+    assert (st["written"], st["dead_lettered"], st["row_failures"], st["queue_depth"]) == (40, 1, 3, 0)
+    with ada.SessionLocal() as db:
+        L = ada.RecommendationLog
+        assert db.execute(select(func.count()).select_from(L).where(L.tenant_id == tid)).scalar() == 40
+    lines = dead_letter.read_text().splitlines()
+    assert len(lines) == 1 and "IntegrityError" in json.loads(lines[0])["error"]
+
+
+def test_writer_stats_are_operator_only(ada, client, tenant, monkeypatch):
+    owner, _ = tenant("writer-stats")
+    monkeypatch.setattr(ada, "OPERATOR_TOKEN", "op-secret")
+    assert client.get("/logs/writer/stats", headers=owner).status_code == 401
+    r = client.get("/logs/writer/stats", headers={"Authorization": "Bearer op-secret"})
+    assert r.status_code == 200 and "dead_letter_path" in r.json()
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from conftest import tenant_id
+from test_log_writer import log_rows
+
+
+@pytest.fixture
+def tied(ada, client, tenant):
+    """A tenant whose log rows mostly share one created_at, with mixed decisions / profiles."""
+    headers, name = tenant("pages")
+    tid = tenant_id(ada, name)
+    stamp = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+    rows = log_rows(ada, tid, 11)
+    for i, row in enumerate(rows):
+        row["created_at"] = stamp if i < 8 else stamp - timedelta(seconds=i)
+        row["decision"] = "REVIEW" if i % 3 else "GO"
+        row["profile_id"] = "truck-2" if i % 2 else "truck-1"
+    with ada.engine.begin() as conn:
+        ada.write_logs(conn, rows[::2])  # interleave: ids no longer follow list order
+        ada.write_logs(conn, rows[1::2])
+    return headers, tid
+
+
+def walk(client, headers, **params) -> list:
+    ids, cursor = [], None
+    while True:
+        page = client.get("/logs", params={"limit": 2, **params, **({"cursor": cursor} if cursor else {})},
+                          headers=headers).json()
+        assert len(page["items"]) <= 2
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("filters", [{}, {"decision": "REVIEW"}, {"profile_id": "truck-2"}])
+def test_pages_cover_ties_exactly_once(ada, client, tied, filters):
+    headers, tid = tied
+    L = ada.RecommendationLog
+    q = select(L.id).where(L.tenant_id == tid).order_by(L.created_at.desc(), L.id.desc())
+    for column, value in filters.items():
+        q = q.where(getattr(L, column) == value)
+    with ada.SessionLocal() as db:
+        expected = list(db.execute(q).scalars())
+    assert len(expected) > 2
+    assert walk(client, headers, **filters) == expected
+
+
+@pytest.mark.parametrize("cursor", ["garbage!", "bm90LWEtY3Vyc29y", "//79"])
+def test_malformed_cursor_is_400(client, tied, cursor):
+    headers, _ = tied
+    r = client.get("/logs", params={"cursor": cursor}, headers=headers)
+    assert r.status_code == 400 and r.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+
+def test_metrics_need_the_token(client):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer test-metric"}).status_code == 401
+    r = client.get("/metrics", headers={"Authorization": "Bearer test-metrics"})
+    assert r.status_code == 200 and "ada_http_requests_total" in r.text
+
+
+@pytest.mark.parametrize("env,enabled", [
+    ({}, "False"),
+    ({"ADA_OPERATOR_TOKEN": "op"}, "True"),
+    ({"ADA_METRICS": "1"}, None),  # on without a token: refused at startup
+])
+def test_metrics_are_off_without_a_token(tmp_path, env, enabled):
+    env = {"ADA_MIGRATE_ON_STARTUP": "0", "ADA_CACHE_BUS": "local", "ADA_DATABASE_URL": f"sqlite:///{tmp_path}/ada.db", **env}
+    r = subprocess.run([sys.executable, "-c", "import app; print(app.METRICS_ENABLED)"], cwd=ROOT, env=env,
+                       capture_output=True, text=True)
+    if enabled is None:
+        assert r.returncode != 0 and "ADA_METRICS_TOKEN" in r.stderr
+    else:
+        assert r.returncode == 0 and r.stdout.split()[-1] == enabled, r.stderr
@@ -0,0 +1,34 @@
+import fcntl
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def init_db(tmp_path, **env):
+    env = {**os.environ, "ADA_DATABASE_URL": f"sqlite:///{tmp_path}/fresh.db",
+           "ADA_MIGRATE_LOCK_PATH": str(tmp_path / "migrate.lock"), **env}
+    return subprocess.Popen([sys.executable, "app.py", "init-db"], cwd=ROOT, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def test_concurrent_workers_migrate_one_at_a_time(tmp_path):
+    procs = [init_db(tmp_path) for _ in range(4)]
+    for p in procs:
+        _, err = p.communicate(timeout=120)
+        assert p.returncode == 0, err[-2000:]
+
+
+def test_migration_waits_for_the_lock(tmp_path):
+    with open(tmp_path / "migrate.lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        proc = init_db(tmp_path)
+        try:
+            proc.wait(timeout=3)
+            raise AssertionError("init-db ran while another process held the migration lock")
+        except subprocess.TimeoutExpired:
+            pass
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    _, err = proc.communicate(timeout=120)
+    assert proc.returncode == 0, err[-2000:]
@@ -0,0 +1,56 @@
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from conftest import tenant_id
+from test_log_writer import log_rows
+
+
+def hot_rows(ada, tid: int) -> int:
+    with ada.SessionLocal() as db:
+        L = ada.RecommendationLog
+        return db.execute(select(func.count()).select_from(L).where(L.tenant_id == tid)).scalar()
+
+
+def test_archive_deletes_in_sub_batches(ada, client, tenant, monkeypatch):
+    headers, name = tenant("retain")
+    tid = tenant_id(ada, name)
+    old = datetime.utcnow() - timedelta(days=90)
+    with ada.engine.begin() as conn:
+        ada.write_logs(conn, log_rows(ada, tid, 120, created_at=old) + log_rows(ada, tid, 5))
+    deletes = []
+    monkeypatch.setattr(ada, "LOG_ARCHIVE_DELETE_CHUNK", 7)
+    real_delete = ada.delete
+    monkeypatch.setattr(ada, "delete", lambda table: deletes.append(table) or real_delete(table))
+
+    assert ada.archive_tenant_logs(tid, datetime.utcnow() - timedelta(days=30), batch_rows=100) == 120
+    assert len(deletes) == 15 + 3  # 100-row batch in 7s, then the last 20
+    assert hot_rows(ada, tid) == 5
+    page = client.get("/logs?include_archived=true&limit=200", headers=headers).json()
+    assert len(page["items"]) == 125
+
+
+def test_archival_refuses_without_a_directory(ada, client, tenant, monkeypatch):
+    headers, _ = tenant("no-archive")
+    monkeypatch.setattr(ada, "LOG_ARCHIVE_DIR", None)
+    r = client.post("/logs/retention/run", headers=headers)
+    assert r.status_code == 400 and "ADA_LOG_ARCHIVE_DIR" in r.json()["detail"]
+    assert client.put("/logs/retention", json={"days": 30}, headers=headers).status_code == 400
+    assert client.put("/logs/retention", json={"days": 0}, headers=headers).status_code == 200
+
+
+def test_worker_failures_are_logged(ada, monkeypatch, caplog):
+    def fail():
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(ada, "archive_logs", fail)
+    worker = ada.RetentionWorker(interval_s=0.01)
+    with caplog.at_level("ERROR", logger="ada"):
+        worker.start()
+        deadline = time.monotonic() + 5
+        while not worker.failures and time.monotonic() < deadline:
+            time.sleep(0.01)
+        worker.stop()
+    assert worker.failures >= 1
+    assert any(r.exc_info and "disk full" in str(r.exc_info[1]) for r in caplog.records)
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.mark.parametrize("body", ["{offered_rpm:.2f}", "{offered_total_rate:,.0f}", "{broker_name:*^30s}",
+                                  "{offered_rpm:+08.3e}", "{broker_name: <64}"])
+def test_standard_specs_compile(ada, body):
+    ada.compile_script("t", 1, body)
+
+
+@pytest.mark.parametrize("body", ["{offered_rpm:999999999}", "{offered_rpm:.65f}", "{offered_rpm:0100}",
+                                  "{broker_name:>{loaded_miles}}", "{offered_rpm:.2f!}"])
+def test_oversized_or_odd_specs_are_refused(ada, body):
+    with pytest.raises(ada.ScriptTemplateError):
+        ada.compile_script("t", 1, body)
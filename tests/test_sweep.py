@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from conftest import create_profile, load
+
+
+@pytest.fixture
+def swept(client, tenant):
+    headers, _ = tenant("sweep")
+    create_profile(client, headers)
+    body = {"load": load(0, deadhead_miles=20.0), "rates": {"start": 1000, "stop": 4000, "step": 250}}
+    r = client.post("/recommend/sweep", json=body, headers=headers)
+    assert r.status_code == 200, r.text
+    return headers, r.json()
+
+
+def test_flip_rates_are_exact(client, swept):
+    headers, out = swept
+    (curve,) = out["curves"]
+    assert [(f["from_decision"], f["to_decision"]) for f in curve["flips"]] == [("NO-GO", "REVIEW"), ("REVIEW", "GO")]
+    for flip in curve["flips"]:
+        at = flip["total_rate"]
+        below = float(np.nextafter(at, -np.inf))
+        for rate, expected in ((at, flip["to_decision"]), (below, flip["from_decision"])):
+            r = client.post("/recommend", json=load(0, deadhead_miles=20.0, offered_total_rate=rate), headers=headers)
+            assert r.json()["decision"] == expected, (rate, flip)
+
+
+def test_sweep_writes_no_logs(client, swept):
+    headers, _ = swept
+    assert client.get("/logs", headers=headers).json()["items"] == []
+
+
+def test_empty_range_is_400(client, swept):
+    headers, _ = swept
+    r = client.post("/recommend/sweep", json={"load": load(), "rates": {"start": 2000, "stop": 1000, "step": 10}},
+                    headers=headers)
+    assert r.status_code == 400 and "empty" in r.json()["detail"]
+
+
+def test_oversize_grid_is_400(ada, client, swept, monkeypatch):
+    headers, _ = swept
+    monkeypatch.setattr(ada, "MAX_SWEEP_CELLS", 100)
+    body = {"load": load(), "rates": {"start": 1000, "stop": 2000, "step": 10},
+            "deadhead_miles": {"start": 0, "stop": 1, "step": 1}}  # 101 x 2 cells
+    r = client.post("/recommend/sweep", json=body, headers=headers)
+    assert r.status_code == 400 and "202 cells" in r.json()["detail"]